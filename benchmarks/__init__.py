@@ -0,0 +1,7 @@
+"""
+Benchmarks of the parser binaries on synthetic DEEP captures.
+
+`generate.generate_capture` writes a capture of any size with a realistic symbol skew and message mix, and
+`run.run_benchmarks` runs iex_parser, iex_parser_threaded, iex_parser_all_threaded and iex_parser_split on it and
+measures their throughput, peak memory and output size. Run `python -m benchmarks --help` for the command line.
+"""
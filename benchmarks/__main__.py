@@ -0,0 +1,58 @@
+import argparse
+import os
+import sys
+import tempfile
+
+from .generate import MAX_EVENTS_PER_PACKET, generate_capture
+from .run import BINARIES, compare_to_baseline, format_results, load_results, run_benchmarks, save_results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the parser binaries on a synthetic DEEP capture.")
+    parser.add_argument("--capture", help="Capture to benchmark. Generated (and kept) if it does not exist. Default is a temporary capture.")
+    parser.add_argument("--size", type=float, default=1.0, help="Size of the generated capture in GB. Default is 1.")
+    parser.add_argument("--symbols", type=int, default=8000, help="Number of symbols of the generated capture. Default is 8000.")
+    parser.add_argument("--filter-symbols", type=int, default=100,
+                        help="iex_parser and iex_parser_threaded parse this many of the most active symbols of a generated capture, "
+                             "listed in `<capture>.symbols.txt`. Default is 100.")
+    parser.add_argument("--events-per-packet", type=int, default=MAX_EVENTS_PER_PACKET,
+                        help=f"Maximum number of events of different symbols in a packet of the generated capture. Default is {MAX_EVENTS_PER_PACKET}.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated capture.")
+    parser.add_argument("--binaries", nargs="+", choices=list(BINARIES), help="Binaries to run. Default is all of them.")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs of each binary, the fastest is reported. Default is 1.")
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    parser.add_argument("--baseline", help="Compare the results to this JSON file of earlier results and exit with 1 if they regressed.")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative regression against the baseline. Default is 0.1.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        capture = args.capture or os.path.join(work_dir, "synthetic_deep.pcap")
+        # The most active symbols are kept next to the capture, so later runs on it filter the same symbols
+        symbols_file = capture + ".symbols.txt"
+        capture_bytes = packets = None
+        if not os.path.exists(capture):
+            print(f"Generating {args.size:g} GB capture {capture}")
+            generated = generate_capture(capture, size=int(args.size * 1e9), symbols=args.symbols,
+                                         max_events_per_packet=args.events_per_packet, seed=args.seed)
+            capture_bytes, packets = generated["bytes"], generated["packets"]
+            with open(symbols_file, "w") as f:
+                f.write("\n".join(generated["symbols"][:args.filter_symbols]) + "\n")
+        if not os.path.exists(symbols_file):
+            symbols_file = None
+
+        results = run_benchmarks(capture, os.path.join(work_dir, "output"), args.binaries, symbols_file, args.repeat,
+                                 capture_bytes, packets)
+    print(format_results(results))
+    if args.output:
+        save_results(results, args.output)
+
+    if args.baseline:
+        regressions = compare_to_baseline(results, load_results(args.baseline), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import gzip
+import random
+import string
+
+# The packets are written with the capture helpers of iex_cppparser.captures
+from iex_cppparser.captures import (OFFICIAL_PRICE, PCAP_GLOBAL_HEADER, PRICE_LEVEL_UPDATE, SECURITY_DIRECTORY, SECURITY_EVENT,
+                                    SYSTEM_EVENT, TRADE_REPORT, TRADING_STATUS, packet, symbol_field)
+
+# Up to 4 events of at most 9 messages fit an IEX-TP packet into a 1500 byte Ethernet frame
+MAX_EVENTS_PER_PACKET = 4
+
+# 2023-10-02 09:30 America/New_York in nanoseconds since epoch
+DEFAULT_START_NS = 1696253400000000000
+
+
+def make_symbols(count: int, rng: random.Random) -> list:
+    """
+    Returns count distinct tickers of 1 to 5 capital letters, in a random order. The first symbols are the most active ones.
+    """
+    symbols = set()
+    while len(symbols) < count:
+        length = rng.choice((1, 2, 3, 3, 4, 4, 4, 4, 5))
+        symbols.add("".join(rng.choice(string.ascii_uppercase) for _ in range(length)))
+    symbols = sorted(symbols)
+    rng.shuffle(symbols)
+    return symbols
+
+
+def generate_capture(path: str, size: int = None, packets: int = None, symbols: int = 8000, zipf_exponent: float = 1.1,
+                     trade_ratio: float = 0.05, event_ratio: float = 0.01, max_events_per_packet: int = MAX_EVENTS_PER_PACKET,
+                     mean_gap_ns: int = 200000, seed: int = 0, start_ns: int = DEFAULT_START_NS) -> dict:
+    """
+    This function writes a synthetic IEX DEEP capture for benchmarks.
+
+    The capture starts with the system events of the start of the day and a security directory and trading status message
+    for every symbol, and ends with the end of day system events. In between, each packet holds the events of 1 to
+    max_events_per_packet different symbols, like the packets of a real feed. An event is a transaction of 1 or more price
+    level updates (the last one with the event flag set), a trade followed by the price level updates it caused, or rarely
+    a security event or official price. Symbols are drawn from a Zipf distribution, so a few symbols get most of the
+    messages like on a real day.
+
+    Parameters:
+        path (str): The file to write. A name ending in `.gz` writes a gzip compressed capture (at compression level 1).
+
+        size (int): Stop after this many bytes of (uncompressed) capture. Either size or packets must be set.
+
+        packets (int): Stop after this many packets of market data.
+
+        symbols (int): Number of symbols. Default is 8000, about the number of symbols IEX quotes.
+
+        zipf_exponent (float): Skew of the symbol activity. The symbol of rank r gets a share proportional to 1 / r ** zipf_exponent.
+
+        trade_ratio (float): Share of the events that are a trade.
+
+        event_ratio (float): Share of the events that are a security event or official price.
+
+        max_events_per_packet (int): Maximum number of events in a packet, the number is drawn uniformly from 1 to this.
+            Default is 4, the most that always fit an Ethernet frame.
+
+        mean_gap_ns (int): Mean time between packets in nanoseconds.
+
+        seed (int): Seed of the random generator, the same seed writes the same capture.
+
+        start_ns (int): Capture time of the first packet in nanoseconds since epoch.
+
+    Returns:
+        dict: "packets", "events" (of market data), "messages" (by message type), "trades", "price_levels", "bytes" (uncompressed)
+        and "symbols" (the tickers, most active first).
+    """
+    if size is None and packets is None:
+        raise ValueError("Either size or packets must be set")
+
+    rng = random.Random(seed)
+    tickers = make_symbols(symbols, rng)
+    fields = [symbol_field(ticker) for ticker in tickers]
+    cumulative_weights = []
+    total = 0.0
+    for rank in range(1, symbols + 1):
+        total += 1.0 / rank ** zipf_exponent
+        cumulative_weights.append(total)
+    # Prices in 1/10000 dollars, between 1 and 500 dollars
+    mid_prices = [rng.randint(100, 50000) * 100 for _ in range(symbols)]
+
+    stats = {"packets": 0, "events": 0, "messages": {}, "trades": 0, "price_levels": 0, "bytes": len(PCAP_GLOBAL_HEADER),
+             "symbols": tickers}
+    state = {"time": start_ns, "sequence": 1, "stream_offset": 0, "trade_id": 1}
+    out = gzip.open(path, "wb", compresslevel=1) if path.endswith(".gz") else open(path, "wb")
+
+    def write_packet(messages):
+        record = packet(messages, state["time"], capture_time=state["time"] + 15000, sequence=state["sequence"],
+                        stream_offset=state["stream_offset"])
+        out.write(record)
+        state["stream_offset"] += sum(2 + len(message) for message in messages)
+        state["sequence"] += len(messages)
+        state["time"] += max(1, int(rng.expovariate(1.0 / mean_gap_ns)))
+        stats["packets"] += 1
+        stats["bytes"] += len(record)
+        for message in messages:
+            message_type = message[:1].decode()
+            stats["messages"][message_type] = stats["messages"].get(message_type, 0) + 1
+
+    def price_levels(symbol, timestamp):
+        # A transaction updates a few levels around the mid price, the last update ends the transaction
+        count = 1
+        while count < 8 and rng.random() < 0.4:
+            count += 1
+        messages = []
+        for i in range(count):
+            side = b"8" if rng.random() < 0.5 else b"5"
+            offset = rng.randint(0, 20) * 100
+            price = mid_prices[symbol] - offset if side == b"8" else mid_prices[symbol] + 100 + offset
+            size = 0 if rng.random() < 0.2 else rng.randint(1, 50) * 100
+            messages.append(PRICE_LEVEL_UPDATE.pack(side, 1 if i == count - 1 else 0, timestamp, fields[symbol], size, price))
+        stats["price_levels"] += count
+        return messages
+
+    def market_event(symbol, timestamp):
+        kind = rng.random()
+        if kind < event_ratio:
+            if rng.random() < 0.5:
+                return [SECURITY_EVENT.pack(b"E", ord("O"), timestamp, fields[symbol])]
+            return [OFFICIAL_PRICE.pack(b"X", ord("Q"), timestamp, fields[symbol], mid_prices[symbol])]
+        if kind < event_ratio + trade_ratio:
+            price = mid_prices[symbol] + rng.randint(-2, 2) * 100
+            trade = TRADE_REPORT.pack(b"T", 0, timestamp, fields[symbol], rng.randint(1, 100) * 10, price, state["trade_id"])
+            state["trade_id"] += 1
+            stats["trades"] += 1
+            return [trade] + price_levels(symbol, timestamp)
+        # Prices drift by a cent now and then
+        mid_prices[symbol] = max(100, mid_prices[symbol] + rng.choice((-100, 0, 0, 0, 100)))
+        return price_levels(symbol, timestamp)
+
+    out.write(PCAP_GLOBAL_HEADER)
+    for event in (b"O", b"S"):
+        write_packet([SYSTEM_EVENT.pack(b"S", event[0], state["time"])])
+    for first in range(0, symbols, max_events_per_packet):
+        timestamp = state["time"]
+        messages = []
+        for symbol in range(first, min(first + max_events_per_packet, symbols)):
+            messages.append(SECURITY_DIRECTORY.pack(b"D", 0x80, timestamp, fields[symbol], 100, mid_prices[symbol], 1))
+            messages.append(TRADING_STATUS.pack(b"H", ord("T"), timestamp, fields[symbol], b"    "))
+        write_packet(messages)
+    write_packet([SYSTEM_EVENT.pack(b"S", ord("R"), state["time"])])
+
+    draws = []
+    market_packets = 0
+    while (packets is None or market_packets < packets) and (size is None or stats["bytes"] < size):
+        # The events of a packet are of different symbols, a symbol drawn twice is skipped
+        events = min(rng.randint(1, max_events_per_packet), symbols)
+        packet_symbols = []
+        while len(packet_symbols) < events:
+            if not draws:
+                draws = rng.choices(range(symbols), cum_weights=cumulative_weights, k=65536)
+            symbol = draws.pop()
+            if symbol not in packet_symbols:
+                packet_symbols.append(symbol)
+        timestamp = state["time"]
+        write_packet([message for symbol in packet_symbols for message in market_event(symbol, timestamp)])
+        stats["events"] += events
+        market_packets += 1
+
+    for event in (b"M", b"E", b"C"):
+        write_packet([SYSTEM_EVENT.pack(b"S", event[0], state["time"])])
+    out.close()
+    return stats
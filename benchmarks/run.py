@@ -0,0 +1,179 @@
+import glob
+import json
+import os
+import shutil
+import subprocess
+import time
+
+from iex_cppparser import dir_path
+from iex_cppparser.stats import ParseStats, stats_path
+
+# The parser binaries, with the extra arguments they are benchmarked with. The serial parser takes no options.
+BINARIES = {
+    "iex_parser": [],
+    "iex_parser_threaded": [],
+    "iex_parser_all_threaded": [],
+    "iex_parser_split": [],
+}
+
+# Metrics compared against a baseline, and whether higher is better
+METRICS = {
+    "megabytes_per_second": True,
+    "packets_per_second": True,
+    "peak_rss_mb": False,
+}
+
+
+def run_benchmark(name: str, capture: str, work_dir: str, symbols: str = "ALL", extra_args: list = None, capture_bytes: int = None,
+                  packets: int = None) -> dict:
+    """
+    This function runs one parser binary on a capture and measures it.
+
+    Parameters:
+        name (str): Name of the binary in `iex_cppparser/bin`, e.g. "iex_parser_threaded".
+
+        capture (str): The capture to parse.
+
+        work_dir (str): An empty folder for the output, which is deleted after it is measured.
+
+        symbols (str): Path to a symbols file, or "ALL". iex_parser_threaded needs a symbols file to do its filtering work.
+
+        extra_args (list): Extra arguments for the binary, e.g. ["--shards=4"].
+
+        capture_bytes (int): Uncompressed size of the capture, used for the throughput when the binary writes no stats file.
+        Default is the size of the capture file.
+
+        packets (int): Number of packets of the capture, used for the packet rate when the binary writes no stats file.
+
+    Returns:
+        dict: "binary", "seconds" (wall clock), "cpu_seconds" (user and system time), "peak_rss_mb", "output_bytes",
+        "output_files", "megabytes_per_second" and "packets_per_second" (None if it is not known).
+
+    Raises:
+        RuntimeError: If the binary exits with an error.
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    prefix = os.path.join(work_dir, "bench")
+    command = [os.path.join(dir_path, "bin", name + ".out"), capture, prefix, symbols]
+    if name != "iex_parser":
+        command.append(f"--stats={stats_path(prefix)}")
+    command.extend(extra_args if extra_args is not None else BINARIES.get(name, []))
+
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    # wait4 reports the resource usage of this child alone, so several benchmarks do not mix their peak RSS
+    _, status, usage = os.wait4(process.pid, 0)
+    seconds = time.perf_counter() - start
+    process.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+    if process.returncode != 0:
+        raise RuntimeError(f"{name} exited with code {process.returncode} while parsing {capture}")
+
+    stats = ParseStats.load(stats_path(prefix))
+    outputs = [path for path in glob.glob(prefix + "_*") if not path.endswith(".stats.json")]
+    output_bytes = 0
+    for path in outputs:
+        if os.path.isdir(path):
+            output_bytes += sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+        else:
+            output_bytes += os.path.getsize(path)
+    if capture_bytes is None:
+        capture_bytes = stats.bytes_read if stats is not None else os.path.getsize(capture)
+    if stats is not None:
+        packets = stats.packets_read
+    shutil.rmtree(work_dir)
+
+    return {
+        "binary": name,
+        "seconds": seconds,
+        "cpu_seconds": usage.ru_utime + usage.ru_stime,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": usage.ru_maxrss / 1024,
+        "output_bytes": output_bytes,
+        "output_files": len(outputs),
+        "megabytes_per_second": capture_bytes / seconds / 1e6,
+        "packets_per_second": packets / seconds if packets is not None else None,
+    }
+
+
+def run_benchmarks(capture: str, work_dir: str, binaries: list = None, symbols_file: str = None, repeat: int = 1, capture_bytes: int = None,
+                   packets: int = None) -> list:
+    """
+    This function runs each parser binary `repeat` times on a capture and keeps the fastest run of each.
+
+    Parameters:
+        capture (str): The capture to parse.
+
+        work_dir (str): A folder for the output of the runs.
+
+        binaries (list): Names of the binaries to run. Default is all of `BINARIES`.
+
+        symbols_file (str): Symbols file for iex_parser and iex_parser_threaded. Default is "ALL".
+
+        repeat (int): Number of runs of each binary.
+
+        capture_bytes (int): Uncompressed size of the capture, see `run_benchmark`.
+
+        packets (int): Number of packets of the capture, see `run_benchmark`.
+
+    Returns:
+        list: The result of the fastest run of each binary, see `run_benchmark`.
+    """
+    results = []
+    for name in binaries or list(BINARIES):
+        symbols = symbols_file if symbols_file is not None and name in ("iex_parser", "iex_parser_threaded") else "ALL"
+        runs = [run_benchmark(name, capture, os.path.join(work_dir, name), symbols, capture_bytes=capture_bytes, packets=packets)
+                for _ in range(repeat)]
+        results.append(min(runs, key=lambda result: result["seconds"]))
+    return results
+
+
+def compare_to_baseline(results: list, baseline: list, tolerance: float = 0.1) -> list:
+    """
+    This function compares benchmark results to a baseline.
+
+    Parameters:
+        results (list): Results of `run_benchmarks`.
+
+        baseline (list): Earlier results of `run_benchmarks`, e.g. loaded with `load_results`. Binaries missing from either are not compared.
+
+        tolerance (float): Allowed relative regression of each metric, 0.1 for 10%.
+
+    Returns:
+        list: A message for every regressed metric, empty if nothing regressed.
+    """
+    baseline_by_binary = {result["binary"]: result for result in baseline}
+    regressions = []
+    for result in results:
+        reference = baseline_by_binary.get(result["binary"])
+        if reference is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            value, expected = result.get(metric), reference.get(metric)
+            if value is None or not expected:
+                continue
+            change = (value - expected) / expected
+            if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+                regressions.append(f"{result['binary']}: {metric} {value:.1f} vs {expected:.1f} in the baseline ({change:+.0%})")
+    return regressions
+
+
+def format_results(results: list) -> str:
+    """
+    Returns the results as a table.
+    """
+    lines = [f"{'binary':<26}{'seconds':>9}{'cpu s':>9}{'MB/s':>9}{'packets/s':>12}{'peak RSS MB':>13}{'output MB':>11}"]
+    for result in results:
+        packets = f"{result['packets_per_second']:.0f}" if result["packets_per_second"] is not None else "-"
+        lines.append(f"{result['binary']:<26}{result['seconds']:>9.2f}{result['cpu_seconds']:>9.2f}{result['megabytes_per_second']:>9.1f}"
+                     f"{packets:>12}{result['peak_rss_mb']:>13.1f}{result['output_bytes'] / 1e6:>11.1f}")
+    return "\n".join(lines)
+
+
+def save_results(results: list, path: str):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+def load_results(path: str) -> list:
+    with open(path) as f:
+        return json.load(f)
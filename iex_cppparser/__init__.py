@@ -1,14 +1,50 @@
 import os
 from datetime import timedelta, datetime
-from .download import download_hist_file
+from .download import download_hist_file, get_hist_data, get_hist_files, iter_hist_file
+from .manifest import output_prefix, write_manifest, is_complete
+# Importing the logger loads the log settings from a .env file, which the parser binaries inherit
+from .logger import log_config
+from .stats import ParseStats, stats_path
 import glob
+import re
 import subprocess
+import tempfile
 import argparse
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Path to the directory this package is installed in. Used for base path for running C++ binary files
 dir_path = os.path.dirname(os.path.realpath(__file__))
 
+# DEEP system event codes: start of messages, start of system hours, start of regular market hours,
+# end of regular market hours, end of system hours and end of messages
+SYSTEM_EVENTS = ("O", "S", "R", "M", "E", "C")
+
+# DEEP and DEEP+ message types that parse_file can select with `types`, and the suffix of the file they are written to
+MESSAGE_TYPES = {
+    "T": "trd",   # trade report
+    "8": "prl",   # price level update, buy side
+    "5": "prl",   # price level update, sell side
+    "S": "sys",   # system event
+    "D": "dir",   # security directory
+    "H": "sts",   # trading status
+    "O": "hlt",   # operational halt status
+    "P": "ssp",   # short sale price test status
+    "E": "sev",   # security event
+    "I": "rli",   # retail liquidity indicator
+    "X": "ofp",   # official price
+    "B": "brk",   # trade break
+    "A": "auc",   # auction information
+    "a": "ord",   # DEEP+ add order
+    "M": "ord",   # DEEP+ order modify
+    "R": "ord",   # DEEP+ order delete
+    "L": "ord",   # DEEP+ order executed
+    "C": "ord",   # DEEP+ clear book
+}
+
+# The trades and order messages of a DEEP+ capture, which has order messages instead of price level updates
+DEEP_PLUS_TYPES = "TaMRLC"
+
 def valid_date(s: str) -> str:
     """
     This function checks if a given string represents a valid date in the format YYYY-MM-DD.
@@ -26,21 +62,95 @@ def valid_date(s: str) -> str:
     return s
 
 
-def parse_file(file_path: str, parsed_folder: str, symbol: str, split: bool = False):
+def uncompressed_sibling(file_path: str):
+    """
+    Returns the uncompressed copy of a `.pcap.gz` file, the `.pcap` file next to it, if it exists and is not older than the
+    `.pcap.gz` file. Returns None otherwise.
+    """
+    if not file_path.endswith(".pcap.gz"):
+        return None
+    sibling = file_path[:-len(".gz")]
+    if not os.path.isfile(sibling) or os.path.getmtime(sibling) < os.path.getmtime(file_path):
+        return None
+    return sibling
+
+def parse_file(file_path: str, parsed_folder: str, symbol: str, split: bool = False, output_format: str = "csv", batch_size: int = None, threads: int = None, shards=None, book_depth: int = None, start_ns: int = None, end_ns: int = None, stop_after_event: str = None, index: bool = False, checkpoint: bool = False, types=None, prefer_uncompressed: bool = True, chunked: bool = False, chunk_size: int = None, source=None, layout: str = "flat"):
     """
     This function parses a file using the IEX parser and redirects the output to a specified folder.
     
     Parameters:
-        file_path (str): The path to the file to be parsed.
+        file_path (str): The path to the file to be parsed. Either the `.pcap.gz` file downloaded from IEX (or transcoded by `transcode_file`) or an uncompressed pcap/pcap-ng file.
 
         parsed_folder (str): The path to the folder where the parsed output should be saved.
 
-        symbol (str): Path to a txt file with symbols to parse. Must have one symbol per line. If "ALL", all symbols are parsed.
+        symbol (str or list): Path to a txt file with symbols to parse. Must have one symbol per line. If "ALL", all symbols are parsed. A list of symbols is accepted too.
+
+        split (bool): Whether to split the output files. One file per letter of the alphabet is generated, or per shard or symbol (see shards). Default is False. Without shards, split=True will slow down the parsing process as it will not be multi-threaded. USe this only if you have memory constraints.
+
+        output_format (str): "csv" (default) or "npy". With "npy" the records are written as typed NumPy column files that can be memory mapped with `iex_cppparser.columnar.load_columns`. Not supported with split=True.
+
+        batch_size (int): Number of records buffered per column before they are written when output_format="npy". Default is the parser's default (65536).
+
+        threads (int): Number of decoder threads of the (non split) parser, or of writer threads with shards="symbol". Default is one per available core.
+
+        shards: How to split the output with split=True. None (default) splits by the first letter of the symbol on a single thread.
+        An integer N splits into N files per message type by a hash of the symbol, decoded and written by one thread per shard.
+        "symbol" writes one file per symbol and message type.
+
+        book_depth (int): If set, the price level order book of every symbol is rebuilt and the top `book_depth` levels per side are written
+        to a file ending in `_book.csv` at every transaction boundary that changes them. Not supported with split=True.
+
+        start_ns (int): Only parse packets captured at or after this time, in nanoseconds since epoch. Earlier packets are skipped
+        on their pcap header alone.
+
+        end_ns (int): Only parse packets captured before this time, in nanoseconds since epoch. The parser stops reading at the first packet
+        captured at or after it.
+
+        stop_after_event (str): Stop reading after the packet with this DEEP system event, e.g. "M" for the end of regular market hours
+        or "E" for the end of system hours. One of "O", "S", "R", "M", "E" and "C".
 
-        split (bool): Whether to split the output files. One file per letter of the alphabet is generated. Default is False. Using split=True will slow down the parsing process as it will not be multi-threaded. USe this only if you have memory constraints.
+        index (bool): Whether to use a sidecar index of the file, `<file_path>.idx` (of the uncompressed copy when it is parsed instead). If it does not exist it is written while parsing.
+        If it does, only the parts of the file that hold packets in the time window and messages of the selected symbols are read,
+        which makes repeated extractions from the same file much faster. Classic pcap files only. Not supported with split=True. Default is False.
+
+        checkpoint (bool): Whether to checkpoint the parse to `<output prefix>.checkpoint` every 10 million packets. If the parse is
+        interrupted, parsing the file again with the same settings continues from the last checkpoint instead of starting over,
+        and once a parse is complete parsing again does nothing. CSV output without split, book_depth or index only. Default is False.
+
+        types (str or list): The DEEP message types to parse, one character per type, e.g. "T" for trades only or "T85DH" to add
+        the security directory and trading status. See `MESSAGE_TYPES` for all types. Types that are not selected are skipped
+        right after their type byte is read, so a trades only parse is faster. Default is "T85", trades and price level updates.
+        With split=True only trades and price level updates are supported. For DEEP+ captures, `DEEP_PLUS_TYPES` selects the
+        trades and the order messages, which are applied to an order by order book (CSV output without checkpoint only).
+
+        prefer_uncompressed (bool): Whether to parse the uncompressed copy of a `.pcap.gz` file instead, if a `.pcap` file that is
+        not older sits next to it (see `uncompressed_sibling`). Uncompressed files are mapped into memory and parsed in place,
+        which is much faster for days that are parsed again and again. The output files are named after file_path either way.
+        Default is True.
+
+        chunked (bool): Whether to cut the capture into chunks on packet boundaries and have `threads` workers each read and
+        decode whole chunks, instead of reading every packet on one thread. The output is the same, in capture order. Needs an
+        uncompressed file (see prefer_uncompressed) or index=True with an existing index, and CSV output without split,
+        book_depth, checkpoint or the DEEP+ order messages; otherwise the file is parsed as usual. Default is False.
+
+        chunk_size (int): Bytes of the capture per chunk with chunked=True. Default is the parser's default (8 MiB).
+
+        source (iterable of bytes): If set, the capture is read from these blocks, e.g. `iex_cppparser.download.iter_hist_file`,
+        which are piped into the parser as they arrive, and file_path only names the output. The parser decompresses gzip
+        blocks itself. If the parser stops before the end of the capture (end_ns or stop_after_event), the source is closed
+        without reading the rest. Not supported with index, checkpoint or chunked. Default is None.
+
+        layout (str): "flat" (default) names the output files after file_path, see Output. "hive" writes one file per symbol into
+        a Hive partitioned tree under parsed_folder, `type=trd/date=2023-10-30/symbol=AAPL/part-0.csv`, which query engines
+        can prune on date and symbol. Parsing a symbol again only replaces its own partitions. The date is the one in the
+        name of the HIST file, otherwise the UTC date of the first packet parsed. Implies split=True with shards="symbol".
         
     Returns:
-        None
+        ParseStats: The throughput counters of the parse (packets and bytes read, messages by type, records written, busy time of
+        the threads, ...), see `iex_cppparser.stats.ParseStats`. None if the parser wrote no stats file.
+
+    Raises:
+        RuntimeError: If the parser exits with an error, e.g. because the file cannot be read.
 
     Output:
         Two files are generated:
@@ -49,7 +159,66 @@ def parse_file(file_path: str, parsed_folder: str, symbol: str, split: bool = Fa
         
         - The file ending in `_prl.csv` contains the price level updates.
 
+        With output_format="npy", two directories ending in `_trd` and `_prl` are generated instead, with one `.npy` file per column and a `symbols.txt` dictionary.
+
+        With book_depth, a file ending in `_book.csv` contains the order book snapshots.
+
+        Every other message type selected with types is written to a file of its own, e.g. `_dir.csv` for the security directory.
+
+        With the DEEP+ order messages selected, a file ending in `_ord.csv` contains the order events, and a file ending in
+        `_lvl.csv` the new size and order count of every price level an order event changed.
+
+        With split=True, one file per letter (`_trd_a.csv`), shard (`_trd_shard000.csv`) or symbol (`_trd_AAPL.csv`) is generated
+        for each message type, and a `.txt` file lists the generated files. With layout="hive", the files of the symbols are
+        `type=trd/date=<date>/symbol=<symbol>/part-0.csv` (and `type=prl/...`) in parsed_folder instead.
+
+        The counters of the parse are written to a file ending in `.stats.json` every 10 seconds while parsing and when parsing ends.
+
     """
+    if layout not in (None, "flat", "hive"):
+        raise ValueError(f"Unsupported layout {layout}. Use 'flat' or 'hive'.")
+    if layout == "hive":
+        if shards not in (None, "symbol"):
+            raise ValueError("layout='hive' writes one file per symbol and is not supported with shards=N")
+        split, shards = True, "symbol"
+    if output_format not in ("csv", "npy"):
+        raise ValueError(f"Unsupported output format {output_format}. Use 'csv' or 'npy'.")
+    if split and output_format != "csv":
+        raise ValueError("Columnar output is not supported with split=True")
+    if book_depth is not None and (split or book_depth < 1):
+        raise ValueError("book_depth must be a positive integer and is not supported with split=True")
+    if split and index:
+        raise ValueError("index is not supported with split=True")
+    if checkpoint and (split or output_format != "csv" or book_depth is not None or index):
+        raise ValueError("checkpoint is only supported for CSV output without split, book_depth or index")
+    if chunked and split:
+        raise ValueError("chunked is not supported with split=True")
+    if source is not None and (index or checkpoint or chunked):
+        raise ValueError("index, checkpoint and chunked need the file on disk and are not supported with source")
+    if chunk_size is not None and (not chunked or chunk_size < 1):
+        raise ValueError("chunk_size must be a positive integer and needs chunked=True")
+    for name, time_ns in (("start_ns", start_ns), ("end_ns", end_ns)):
+        if time_ns is not None and (not isinstance(time_ns, int) or time_ns < 0):
+            raise ValueError(f"{name} must be a non-negative integer (nanoseconds since epoch), got {time_ns}")
+    if stop_after_event is not None and stop_after_event not in SYSTEM_EVENTS:
+        raise ValueError(f"stop_after_event must be one of the system events {', '.join(SYSTEM_EVENTS)}, got {stop_after_event}")
+    if types is not None:
+        types = "".join(types)
+        unknown = [t for t in types if t not in MESSAGE_TYPES]
+        if not types or unknown:
+            raise ValueError(f"types must be DEEP message types ({', '.join(MESSAGE_TYPES)}), got {types!r}")
+        if split and any(MESSAGE_TYPES[t] not in ("trd", "prl") for t in types):
+            raise ValueError("Only trades (T) and price level updates (8 and 5) are supported with split=True")
+        if book_depth is not None and "8" not in types and "5" not in types:
+            raise ValueError("book_depth needs the price level updates, add 8 and 5 to types")
+        if (output_format != "csv" or checkpoint) and any(MESSAGE_TYPES[t] == "ord" for t in types):
+            raise ValueError("The DEEP+ order messages (a, M, R, L and C) are only supported for CSV output without checkpoint")
+    if shards is not None:
+        if not split:
+            raise ValueError("shards requires split=True")
+        if shards != "symbol" and (not isinstance(shards, int) or shards < 1):
+            raise ValueError(f"shards must be a positive integer or 'symbol', got {shards}")
+
     if split==True:
         # Use compiled C++ binary to parse and split output files
         IEX_PARSER = os.path.join(dir_path, 'bin/iex_parser_split.out')
@@ -61,12 +230,143 @@ def parse_file(file_path: str, parsed_folder: str, symbol: str, split: bool = Fa
             # Use compiled C++ binary to parse selected symbols
             IEX_PARSER =  os.path.join(dir_path, 'bin/iex_parser_threaded.out')
     
-    parsed_prefix = os.path.join(parsed_folder, os.path.basename(file_path).replace(".pcap.gz", ""))
-        
-    command2 =f"gunzip -d -c {file_path} | tcpdump -r - -w - -s 0 |  {IEX_PARSER} /dev/stdin {parsed_prefix} {symbol}"
-    subprocess.run(command2, shell=True)
+    parsed_prefix = output_prefix(file_path, parsed_folder)
+
+    # The output is named after file_path, but an uncompressed copy is read if there is one
+    input_path = file_path
+    if source is not None:
+        # The parsers read standard input for "-"
+        input_path = "-"
+    elif prefer_uncompressed and uncompressed_sibling(file_path) is not None:
+        input_path = uncompressed_sibling(file_path)
+
+    # The parsers read the symbols from a file
+    symbols_file = None
+    if isinstance(symbol, (list, tuple, set)):
+        # A checkpoint compares the symbols by content, so every parse can use its own file
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+            f.write("\n".join(sorted(symbol)) + "\n")
+        symbols_file = f.name
+        symbol = symbols_file
+
+    # The parser decompresses the file itself on a read-ahead thread, or maps an uncompressed file into memory, so no
+    # gunzip/tcpdump pipeline is needed
+    command = [IEX_PARSER, input_path, parsed_prefix, symbol, f"--stats={stats_path(parsed_prefix)}"]
+    if output_format != "csv":
+        command.append(f"--format={output_format}")
+    if batch_size is not None:
+        command.append(f"--batch-size={batch_size}")
+    if threads is not None and (not split or shards == "symbol"):
+        command.append(f"--threads={threads}")
+    if shards is not None:
+        command.append(f"--shards={shards}")
+    if layout == "hive":
+        command.append("--layout=hive")
+        hist_date = re.match(r"data_feeds_(\d{4})(\d{2})(\d{2})_", os.path.basename(file_path))
+        if hist_date is not None:
+            command.append(f"--date={'-'.join(hist_date.groups())}")
+    if book_depth is not None:
+        command.append(f"--book-depth={book_depth}")
+    if start_ns is not None:
+        command.append(f"--start-ns={start_ns}")
+    if end_ns is not None:
+        command.append(f"--end-ns={end_ns}")
+    if stop_after_event is not None:
+        command.append(f"--stop-after-event={stop_after_event}")
+    if index:
+        # The offsets of an index belong to the file it was built from
+        index_path = input_path + ".idx"
+        command.append(f"--index={index_path}" if os.path.exists(index_path) else f"--write-index={index_path}")
+    if checkpoint:
+        command.append(f"--checkpoint={parsed_prefix}.checkpoint")
+    if types is not None:
+        command.append(f"--types={types}")
+    if chunked:
+        command.append("--decode=chunks")
+    if chunk_size is not None:
+        command.append(f"--chunk-size={chunk_size}")
+    try:
+        result = subprocess.run(command) if source is None else _feed_parser(command, source)
+    finally:
+        if symbols_file is not None:
+            os.remove(symbols_file)
+    if result.returncode != 0:
+        raise RuntimeError(f"Parser exited with code {result.returncode} while parsing {file_path if source is not None else input_path}")
+    return ParseStats.load(stats_path(parsed_prefix))
+
+def _feed_parser(command: list, source) -> subprocess.CompletedProcess:
+    """
+    Runs a parser that reads the capture from standard input and writes the blocks of source to it. A parser that stops
+    early closes its end of the pipe, after which the rest of source is not read. The parser is killed if source fails.
+    """
+    process = subprocess.Popen(command, stdin=subprocess.PIPE)
+    try:
+        try:
+            for block in source:
+                process.stdin.write(block)
+        except BrokenPipeError:
+            # The parser stopped before the end of the capture
+            pass
+        finally:
+            if hasattr(source, "close"):
+                source.close()
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    return subprocess.CompletedProcess(command, process.wait())
+
+def transcode_file(file_path: str, output_folder: str, block_size: int = None, level: int = None, threads: int = None) -> str:
+    """
+    This function rewrites a pcap file into a block compressed file that the parsers decompress on all cores at once.
+    IEX publishes each day as a single gzip stream, which can only be decompressed from start to end on one core.
+    The transcoded file is a series of gzip members that each hold whole packets, so it is still a valid `.pcap.gz` file,
+    and it keeps the name of the original file so parsing it produces the same output files.
+
+    Parameters:
+        file_path (str): The path to the file to be transcoded. Either the `.pcap.gz` file downloaded from IEX or an uncompressed pcap file.
+
+        output_folder (str): The folder the transcoded file is written to. Must not be the folder of file_path.
+
+        block_size (int): Uncompressed size of each block in bytes, at most 16 MiB. Default is 1 MiB.
+
+        level (int): The gzip compression level, 1 to 9. Default is 6.
+
+        threads (int): Number of compression threads. Default is one per available core.
+
+    Returns:
+        str: The path to the transcoded file.
+
+    Raises:
+        ValueError: If output_folder is the folder of file_path.
+
+        RuntimeError: If the transcoder exits with an error, e.g. because the file cannot be read.
+
+    Output:
+        The transcoded file and a block table next to it (`<file>.blocks.csv`), with the offsets, sizes, first packet and first capture time of every block.
 
-def parse_date(date_str: str, download_dir: str, parsed_folder: str, symbol: str, download: bool = True, split: bool = False):
+    """
+    output_path = os.path.join(output_folder, os.path.basename(file_path))
+    if os.path.abspath(output_path) == os.path.abspath(file_path):
+        raise ValueError("The transcoded file must be written to a different folder than the original file")
+
+    command = [os.path.join(dir_path, 'bin/iex_transcode.out'), file_path, output_path]
+    if block_size is not None:
+        command.append(f"--block-size={block_size}")
+    if level is not None:
+        command.append(f"--level={level}")
+    if threads is not None:
+        command.append(f"--threads={threads}")
+    result = subprocess.run(command)
+    if result.returncode != 0:
+        raise RuntimeError(f"Transcoder exited with code {result.returncode} while transcoding {file_path}")
+    return output_path
+
+def parse_date(date_str: str, download_dir: str, parsed_folder: str, symbol: str, download: bool = True, split: bool = False, output_format: str = "csv", batch_size: int = None, start_ns: int = None, end_ns: int = None, stop_after_event: str = None, resume: bool = False, stream: bool = False, keep_download: bool = False, layout: str = "flat"):
     """
     This function (can) download and parse the IEXTP1 DEEP1.0 pcap files for a given date.
     
@@ -82,9 +382,31 @@ def parse_date(date_str: str, download_dir: str, parsed_folder: str, symbol: str
         download (bool): Whether to download the files. Default is True.
 
         split (bool): Whether to split the output files. One file per letter of the anphabet is generated. Default is False. Using split=True will slow down the parsing process as it will not be multi-threaded. USe this only if you have memory constraints.
+
+        output_format (str): "csv" (default) or "npy" for typed NumPy column files. See `parse_file`.
+
+        batch_size (int): Number of records buffered per column when output_format="npy". See `parse_file`.
+
+        start_ns (int): Only parse packets captured at or after this time, in nanoseconds since epoch. See `parse_file`.
+
+        end_ns (int): Only parse packets captured before this time, in nanoseconds since epoch. See `parse_file`.
+
+        stop_after_event (str): Stop reading after the packet with this DEEP system event, e.g. "M". See `parse_file`.
+
+        resume (bool): Whether to skip files whose manifest shows they were parsed completely with the same settings, and to
+        continue interrupted parses from their checkpoint (CSV output without split). Default is False.
+
+        stream (bool): Whether to pipe the download straight into the parser instead of downloading the file first, so parsing
+        starts with the first megabyte and the file never lands on disk. A file that was downloaded completely already is parsed
+        from disk. Needs download=True and is not supported with resume. Default is False.
+
+        keep_download (bool): With stream=True, whether to also write the streamed file to download_dir. If the parser stops before
+        the end of the file (end_ns or stop_after_event), the rest is downloaded after the parse. Default is False.
+
+        layout (str): "flat" (default) or "hive" to write one file per symbol into a tree partitioned by type, date and symbol. See `parse_file`.
         
     Returns:
-        None
+        list: The `ParseStats` of each file of the date (see `parse_file`), or of its earlier parse if it was skipped.
 
     Output:
         Two files are generated:
@@ -93,25 +415,113 @@ def parse_date(date_str: str, download_dir: str, parsed_folder: str, symbol: str
 
         - The file ending in `_prl.csv` contains the price level updates.
 
+        With output_format="npy", two column directories ending in `_trd` and `_prl` are generated instead.
+
+        A manifest ending in `.manifest.json` records the size, hash and record count of every output file, see `iex_cppparser.manifest`.
+
     """
     if valid_date(date_str) is None:
-        return
+        return []
+
+    if stream and (not download or resume):
+        raise ValueError("stream needs download=True and is not supported with resume")
 
     date_str_2 = date_str.replace("-","")
-    file_pattern = f"data_feeds_{date_str_2}_{date_str_2}_IEXTP1_DEEP1.0.pcap.gz"
 
-    if download:
+    if download and stream:
+        date_file = get_hist_data(date_str_2)
+        file_path = os.path.join(download_dir, f"data_feeds_{date_str_2}_{date_str_2}_IEXTP1_DEEP1.0.pcap.gz")
+        if not os.path.exists(file_path) or os.path.getsize(file_path) != int(date_file.get("size")):
+            stats = _stream_date_file(file_path, date_file, download_dir, parsed_folder, symbol, keep_download, split=split,
+                                      output_format=output_format, batch_size=batch_size, start_ns=start_ns, end_ns=end_ns,
+                                      stop_after_event=stop_after_event, layout=_layout_option(layout))
+            return [stats]
+    elif download:
         download_hist_file(date_str_2, download_dir)
 
-    matching_files = glob.glob(f"{download_dir}/{file_pattern}")
+    matching_files = _date_files(date_str, download_dir)
 
+    all_stats = []
     for file_path in matching_files:
-        parse_file(file_path, parsed_folder, symbol,split=split)
+        _, stats = _parse_with_manifest(file_path, parsed_folder, symbol, resume, split=split, output_format=output_format, batch_size=batch_size,
+                                        start_ns=start_ns, end_ns=end_ns, stop_after_event=stop_after_event, layout=_layout_option(layout))
+        all_stats.append(stats)
+    return all_stats
+
+
+def _parse_with_manifest(file_path: str, parsed_folder: str, symbol, resume: bool, threads: int = None, **parse_options) -> tuple:
+    """
+    Parses a file with `parse_file` and writes its manifest. With resume, a file whose manifest shows it was parsed completely
+    with the same settings is skipped, and other files are parsed with a checkpoint where the parser supports it.
+    Returns whether the file was parsed and the `ParseStats` of its parse.
+    """
+    options = _manifest_options(symbol, parse_options)
+    if resume and is_complete(file_path, parsed_folder, options):
+        print(f"{file_path} was parsed completely already, skipping it")
+        return False, ParseStats.load(stats_path(output_prefix(file_path, parsed_folder)))
+    checkpoint = resume and not parse_options.get("split") and parse_options.get("layout") is None and parse_options.get("output_format", "csv") == "csv"
+    stats = parse_file(file_path, parsed_folder, symbol, threads=threads, checkpoint=checkpoint, **parse_options)
+    _check_finished(file_path, stats)
+    write_manifest(file_path, parsed_folder, options)
+    return True, stats
+
+
+def _check_finished(file_path: str, stats: ParseStats):
+    """
+    Raises a RuntimeError unless the stats of a parse show that it finished. The manifest marks a file as parsed completely,
+    so it must not be written for a parse that failed, even if the parser exited without an error code.
+    """
+    state = stats.state if stats is not None else None
+    if state != "finished":
+        raise RuntimeError(f"The parse of {file_path} did not finish (state {state}), so no manifest was written")
 
 
-def parse_dates(start_date: str, end_date: str, download_dir: str, parsed_folder: str, symbol: str, download: bool = True, split: bool = False):
+def _stream_date_file(file_path: str, date_file: dict, download_dir: str, parsed_folder: str, symbol, keep_download: bool, **parse_options):
+    """
+    Parses a HIST file while it downloads (see `iter_hist_file`) and writes its manifest. With keep_download the stream is
+    written to file_path too, and what the parser did not read is downloaded afterwards. Returns the `ParseStats` of the parse.
+    """
+    source = iter_hist_file(date_file, tee_path=file_path if keep_download else None)
+    stats = parse_file(file_path, parsed_folder, symbol, source=source, **parse_options)
+    if keep_download and not os.path.exists(file_path):
+        # The parser stopped early and left a prefix of the file in its .part file, which the download resumes from
+        download_hist_file(date_file.get("date"), download_dir, date_file=date_file)
+    _check_finished(file_path, stats)
+    write_manifest(file_path, parsed_folder, _manifest_options(symbol, parse_options), input_size=int(date_file.get("size")))
+    return stats
+
+
+def _layout_option(layout: str):
+    """
+    Returns the layout to pass to `parse_file`, None for the default one, so that it is only part of the settings in the
+    manifests of other layouts and the manifests written before there was a choice still match.
+    """
+    return None if layout == "flat" else layout
+
+
+def _manifest_options(symbol, parse_options: dict) -> dict:
+    """
+    Returns the settings of a parse that its manifest records.
+    """
+    # The number of threads does not change the output, so it is not part of the settings
+    options = {name: value for name, value in parse_options.items() if value is not None}
+    options["symbol"] = sorted(symbol) if isinstance(symbol, (list, tuple, set)) else symbol
+    return options
+
+
+def _date_files(date_str: str, download_dir: str) -> list:
+    """
+    Returns the downloaded IEXTP1 DEEP1.0 pcap files for a date (YYYY-MM-DD).
+    """
+    date_str_2 = date_str.replace("-","")
+    file_pattern = f"data_feeds_{date_str_2}_{date_str_2}_IEXTP1_DEEP1.0.pcap.gz"
+    return glob.glob(f"{download_dir}/{file_pattern}")
+
+
+def parse_dates(start_date: str, end_date: str, download_dir: str, parsed_folder: str, symbol: str, download: bool = True, split: bool = False, output_format: str = "csv", batch_size: int = None, max_parallel_parses: int = 1, max_parallel_downloads: int = 1, stop_after_event: str = None, resume: bool = False, layout: str = "flat") -> dict:
     """
     This function parses a range of dates and (downloads and) parses the corresponding IEXTP1 DEEP1.0 pcap files.
+    Downloads run ahead of the parses: a date is parsed as soon as its file is downloaded, while later dates keep downloading.
     
     Parameters:
         start_date (str): The start date string in the format YYYY-MM-DD.
@@ -127,9 +537,33 @@ def parse_dates(start_date: str, end_date: str, download_dir: str, parsed_folder
         download (bool): Whether to download the files. Default is False.
         
         split (bool): Whether to split the output files. One file per letter of the anphabet is generated. Default is False. Using split=True will slow down the parsing process as it will not be multi-threaded. USe this only if you have memory constraints.
+
+        output_format (str): "csv" (default) or "npy" for typed NumPy column files. See `parse_file`.
+
+        batch_size (int): Number of records buffered per column when output_format="npy". See `parse_file`.
+
+        max_parallel_parses (int): Number of files parsed at the same time. The available cores are divided between them. Default is 1.
+
+        max_parallel_downloads (int): Number of files downloaded at the same time. Default is 1.
+
+        stop_after_event (str): Stop reading each file after the packet with this DEEP system event, e.g. "M" to parse up to the
+        end of regular market hours. See `parse_file`.
+
+        resume (bool): Whether to skip dates whose files were parsed completely with the same settings according to their manifests,
+        and to continue interrupted parses from their checkpoint. See `parse_date`. Default is False.
+
+        layout (str): "flat" (default) or "hive" to write the days into one tree partitioned by type, date and symbol. See `parse_file`.
     
     Returns:
-        None
+        dict: A summary with one entry per date (YYYY-MM-DD), each a dict with
+
+        - "status": "parsed", "skipped" (parsed completely by an earlier run, with resume), "no_data" (no file for the date) or "failed".
+
+        - "files": The parsed files.
+
+        - "stats": The `ParseStats` of each file (see `parse_file`), to compare the throughput of the dates.
+
+        - "error": The error message if the download or parse failed, otherwise None.
 
     Output:
         For each date, two files are generated:
@@ -140,18 +574,73 @@ def parse_dates(start_date: str, end_date: str, download_dir: str, parsed_folder
 
     """
     if valid_date(start_date) is None or valid_date(end_date) is None:
-        return
+        return {}
+    if max_parallel_parses < 1 or max_parallel_downloads < 1:
+        raise ValueError("max_parallel_parses and max_parallel_downloads must be at least 1")
 
     start_date = datetime.strptime(start_date, "%Y-%m-%d")
     end_date = datetime.strptime(end_date, "%Y-%m-%d")
 
+    dates = []
     current_date = start_date
     while current_date <= end_date:
+        dates.append(current_date.strftime("%Y-%m-%d"))
+        current_date += timedelta(days=1)
+
+    summary = {date_str: {"status": "no_data", "files": [], "stats": [], "error": None} for date_str in dates}
 
-        current_date_str = current_date.strftime("%Y-%m-%d")
+    # Each parser runs a reader, a writer and decoder threads, so divide the cores between the parallel parses
+    threads = None
+    if not split and max_parallel_parses > 1:
+        threads = max(1, (os.cpu_count() or 1) // max_parallel_parses - 2)
+
+    # The files of the whole range come from one load of the cached HIST index, and days without a DEEP file
+    # (weekends, holidays) are not downloaded at all
+    hist_files = None
+    if download and dates:
         try:
-            parse_date(current_date_str, download_dir, parsed_folder, symbol,download,split=split)
+            hist_files = get_hist_files(dates[0].replace("-", ""), dates[-1].replace("-", ""))
         except Exception as e:
-            print(f"Error parsing date {current_date_str}: {e}")
-
-        current_date += timedelta(days=1)
+            for date_str in dates:
+                summary[date_str].update(status="failed", error=f"Download failed: {e}")
+            return summary
+
+    def download_date(date_str):
+        if hist_files is not None and date_str.replace("-", "") in hist_files:
+            download_hist_file(date_str.replace("-",""), download_dir, date_file=hist_files[date_str.replace("-", "")])
+        return _date_files(date_str, download_dir)
+
+    def parse_date_files(date_str, files):
+        parsed = False
+        for file_path in files:
+            file_parsed, stats = _parse_with_manifest(file_path, parsed_folder, symbol, resume, threads=threads, split=split,
+                                                      output_format=output_format, batch_size=batch_size, stop_after_event=stop_after_event,
+                                                      layout=_layout_option(layout))
+            parsed = parsed or file_parsed
+            summary[date_str]["files"].append(file_path)
+            summary[date_str]["stats"].append(stats)
+        return parsed
+
+    # The parses run as separate parser processes, so threads are enough to drive both pools
+    with ThreadPoolExecutor(max_workers=max_parallel_downloads) as download_pool, ThreadPoolExecutor(max_workers=max_parallel_parses) as parse_pool:
+        downloads = {download_pool.submit(download_date, date_str): date_str for date_str in dates
+                     if hist_files is None or date_str.replace("-", "") in hist_files}
+        parses = {}
+        for future in as_completed(downloads):
+            date_str = downloads[future]
+            try:
+                files = future.result()
+            except Exception as e:
+                summary[date_str].update(status="failed", error=f"Download failed: {e}")
+                continue
+            if files:
+                parses[parse_pool.submit(parse_date_files, date_str, files)] = date_str
+
+        for future in as_completed(parses):
+            date_str = parses[future]
+            try:
+                summary[date_str]["status"] = "parsed" if future.result() else "skipped"
+            except Exception as e:
+                summary[date_str].update(status="failed", error=f"Parse failed: {e}")
+
+    return summary
@@ -0,0 +1,130 @@
+import ctypes
+import os
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed to stream record batches
+    np = None
+
+# Path to the shared library, which ships with the package and is rebuilt by compile_cpp.compile()
+LIBRARY_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), "bin", "libiexparser.so")
+
+# Message type flags, see cpp/iex_capi.h
+_TYPE_FLAGS = {"trades": 1, "price_levels": 2}
+
+# Record layouts of IexTradeRecord and IexPriceLevelRecord in cpp/iex_capi.h
+if np is not None:
+    TRADE_DTYPE = np.dtype({
+        "names": ["capture_time", "send_time", "timestamp", "price", "trade_id", "symbol", "size", "sale_condition"],
+        "formats": ["<i8", "<i8", "<i8", "<i8", "<i8", "S8", "<u4", "u1"],
+        "offsets": [0, 8, 16, 24, 32, 40, 48, 52],
+        "itemsize": 56,
+    })
+    PRICE_LEVEL_DTYPE = np.dtype({
+        "names": ["capture_time", "send_time", "timestamp", "price", "symbol", "size", "side", "event_flags"],
+        "formats": ["<i8", "<i8", "<i8", "<i8", "S8", "<u4", "u1", "u1"],
+        "offsets": [0, 8, 16, 24, 32, 40, 44, 45],
+        "itemsize": 48,
+    })
+
+_library = None
+
+
+def _load_library():
+    global _library
+    if _library is not None:
+        return _library
+    if np is None:
+        raise ImportError("Streaming record batches requires numpy. Install it with `pip install iex-cppparser[columnar]`.")
+    if not os.path.exists(LIBRARY_PATH):
+        raise FileNotFoundError(f"{LIBRARY_PATH} not found. Build it with `from iex_cppparser import compile_cpp; compile_cpp.compile()`.")
+
+    library = ctypes.CDLL(LIBRARY_PATH)
+    library.iex_reader_open.argtypes = [ctypes.c_char_p, ctypes.c_int]
+    library.iex_reader_open.restype = ctypes.c_void_p
+    library.iex_reader_add_symbol.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+    library.iex_reader_add_symbol.restype = ctypes.c_int
+    library.iex_reader_next.argtypes = [
+        ctypes.c_void_p,
+        ctypes.c_void_p, ctypes.c_size_t, ctypes.POINTER(ctypes.c_size_t),
+        ctypes.c_void_p, ctypes.c_size_t, ctypes.POINTER(ctypes.c_size_t),
+    ]
+    library.iex_reader_next.restype = ctypes.c_int
+    library.iex_reader_close.argtypes = [ctypes.c_void_p]
+    library.iex_reader_close.restype = None
+    _library = library
+    return library
+
+
+def iter_batches(file_path: str, symbols=None, types=("trades", "price_levels"), batch_size: int = 65536):
+    """
+    This function streams the trades and price level updates of a file as NumPy structured arrays, without writing any output files.
+
+    Parameters:
+        file_path (str): The path to the file to be parsed. Either the `.pcap.gz` file downloaded from IEX or an uncompressed pcap/pcap-ng file.
+
+        symbols: Symbols to return, either a list of symbols or the path to a txt file with one symbol per line. None or "ALL" returns all symbols.
+
+        types: The record types to return, any of "trades" and "price_levels". Default is both.
+
+        batch_size (int): The maximum number of records per batch. Default is 65536.
+
+    Returns:
+        generator: Yields `(record_type, array)` tuples, where record_type is "trades" or "price_levels" and array is a
+        structured array with dtype `TRADE_DTYPE` or `PRICE_LEVEL_DTYPE`. Records of each type are yielded in feed order.
+        Prices are int64 fixed point with 4 implied decimals. Closing the generator early stops the parser.
+    """
+    library = _load_library()
+
+    if isinstance(types, str):
+        types = (types,)
+    unknown_types = set(types) - set(_TYPE_FLAGS)
+    if unknown_types or not types:
+        raise ValueError(f"types must be a selection of {sorted(_TYPE_FLAGS)}, got {types}")
+    type_mask = 0
+    for record_type in types:
+        type_mask |= _TYPE_FLAGS[record_type]
+
+    if isinstance(symbols, str) and symbols != "ALL":
+        with open(symbols) as symbols_file:
+            symbols = [line.strip() for line in symbols_file if line.strip()]
+    elif symbols == "ALL":
+        symbols = None
+
+    if batch_size <= 0:
+        raise ValueError("batch_size must be positive")
+
+    reader = library.iex_reader_open(os.fsencode(file_path), type_mask)
+    if not reader:
+        raise FileNotFoundError(f"Unable to open file {file_path}")
+
+    try:
+        for symbol in symbols or []:
+            library.iex_reader_add_symbol(reader, symbol.encode())
+
+        trades = np.empty(batch_size, dtype=TRADE_DTYPE)
+        price_levels = np.empty(batch_size, dtype=PRICE_LEVEL_DTYPE)
+        num_trades = ctypes.c_size_t()
+        num_price_levels = ctypes.c_size_t()
+
+        while True:
+            status = library.iex_reader_next(
+                reader,
+                trades.ctypes.data, batch_size, ctypes.byref(num_trades),
+                price_levels.ctypes.data, batch_size, ctypes.byref(num_price_levels),
+            )
+            if status < 0:
+                raise IOError(f"Failed to read {file_path}")
+
+            # Yielded arrays are handed over to the caller, so a fresh array is only allocated for a type that was yielded
+            if num_trades.value:
+                batch, trades = trades[:num_trades.value], np.empty(batch_size, dtype=TRADE_DTYPE)
+                yield "trades", batch
+            if num_price_levels.value:
+                batch, price_levels = price_levels[:num_price_levels.value], np.empty(batch_size, dtype=PRICE_LEVEL_DTYPE)
+                yield "price_levels", batch
+
+            if status == 0:
+                break
+    finally:
+        library.iex_reader_close(reader)
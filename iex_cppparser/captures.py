@@ -0,0 +1,77 @@
+import struct
+
+# Writers of synthetic captures for the tests and benchmarks: classic microsecond pcap records of 42 bytes of Ethernet/IP/UDP headers,
+# the 40 byte IEX-TP header and the length prefixed messages, with the message lengths of the TOPS / DEEP / DEEP+ specs
+
+PCAP_GLOBAL_HEADER = struct.pack("<IHHiIII", 0xa1b2c3d4, 2, 4, 0, 0, 65535, 1)
+PCAP_RECORD_HEADER = struct.Struct("<IIII")
+NETWORK_HEADERS = b"\x00" * 42
+# Version, reserved, protocol id, channel id, session id, payload length, message count, stream offset, first sequence number, send time
+IEX_HEADER = struct.Struct("<BBHIIHHqqq")
+TOPS_PROTOCOL_ID = 0x8003
+DEEP_PROTOCOL_ID = 0x8004
+
+# Messages without their length prefix
+SYSTEM_EVENT = struct.Struct("<cBq")                  # 'S', event, timestamp
+SECURITY_DIRECTORY = struct.Struct("<cBq8sIqB")       # 'D', flags, timestamp, symbol, round lot size, adjusted POC price, LULD tier
+TRADING_STATUS = struct.Struct("<cBq8s4s")            # 'H', status, timestamp, symbol, reason
+SECURITY_EVENT = struct.Struct("<cBq8s")              # 'E', event, timestamp, symbol
+TRADE_REPORT = struct.Struct("<cBq8sIqq")             # 'T', sale condition flags, timestamp, symbol, size, price, trade id
+PRICE_LEVEL_UPDATE = struct.Struct("<cBq8sIq")        # '8' (buy) or '5' (sell), event flags, timestamp, symbol, size, price
+OFFICIAL_PRICE = struct.Struct("<cBq8sq")             # 'X', price type, timestamp, symbol, price
+ADD_ORDER = struct.Struct("<ccq8sqIq")                # 'a', side, timestamp, symbol, order id, size, price
+ORDER_MODIFY = struct.Struct("<cBq8sqIq")             # 'M', flags, timestamp, symbol, order id, size, price
+ORDER_DELETE = struct.Struct("<cBq8sq")               # 'R', reserved, timestamp, symbol, order id
+ORDER_EXECUTED = struct.Struct("<cBq8sqIqq")          # 'L', sale condition flags, timestamp, symbol, order id, size, price, trade id
+CLEAR_BOOK = struct.Struct("<cBq8s")                  # 'C', reserved, timestamp, symbol
+
+# 2023-10-02 08:00 America/New_York in nanoseconds since epoch
+DEFAULT_START_NS = 1696248000000000000
+
+
+def symbol_field(symbol: str) -> bytes:
+    """
+    Returns the 8 byte, space padded symbol field of the messages.
+    """
+    return symbol.encode().ljust(8)
+
+
+def packet(messages: list, send_time: int, capture_time: int = None, protocol_id: int = DEEP_PROTOCOL_ID, sequence: int = 1,
+           stream_offset: int = 0) -> bytes:
+    """
+    Returns the pcap record of one IEX-TP packet holding the messages.
+
+    Parameters:
+        messages (list): The messages as bytes, without their length prefix.
+
+        send_time (int): Send time of the IEX-TP header in nanoseconds since epoch.
+
+        capture_time (int): Capture time of the pcap record in nanoseconds since epoch, truncated to microseconds. Default is the send time.
+
+        protocol_id (int): Protocol id of the IEX-TP header. Default is DEEP.
+
+        sequence (int): Sequence number of the first message.
+
+        stream_offset (int): Offset of the payload in the stream of the session.
+    """
+    payload = b"".join(struct.pack("<H", len(message)) + message for message in messages)
+    header = IEX_HEADER.pack(1, 0, protocol_id, 1, 1, len(payload), len(messages), stream_offset, sequence, send_time)
+    length = len(NETWORK_HEADERS) + len(header) + len(payload)
+    if capture_time is None:
+        capture_time = send_time
+    record = PCAP_RECORD_HEADER.pack(capture_time // 1000000000, capture_time % 1000000000 // 1000, length, length)
+    return record + NETWORK_HEADERS + header + payload
+
+
+def write_capture(path: str, packets: list, protocol_id: int = DEEP_PROTOCOL_ID, start_ns: int = DEFAULT_START_NS):
+    """
+    Writes a classic pcap capture of one IEX-TP packet per list of messages, sent a millisecond apart from start_ns.
+    """
+    sequence = 1
+    stream_offset = 0
+    with open(path, "wb") as f:
+        f.write(PCAP_GLOBAL_HEADER)
+        for p, messages in enumerate(packets):
+            f.write(packet(messages, start_ns + p * 1000000, protocol_id=protocol_id, sequence=sequence, stream_offset=stream_offset))
+            sequence += len(messages)
+            stream_offset += sum(2 + len(message) for message in messages)
@@ -0,0 +1,58 @@
+import os
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed to read the columnar output
+    np = None
+
+# Fixed point scale of the price columns. IEX sends prices with 4 implied decimal places.
+PRICE_SCALE = 10000
+
+TRADE_COLUMNS = ["capture_time", "send_time", "timestamp", "symbol", "size", "price", "trade_id", "sale_condition"]
+PRICE_LEVEL_COLUMNS = ["capture_time", "send_time", "timestamp", "side", "symbol", "price", "size", "event_flags"]
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("Reading columnar output requires numpy. Install it with `pip install iex-cppparser[columnar]`.")
+
+
+def load_columns(table_dir: str, mmap: bool = True) -> dict:
+    """
+    This function loads a table written by the parser with `output_format="npy"` into NumPy arrays.
+
+    Parameters:
+        table_dir (str): The column directory, i.e. the folder ending in `_trd` (trades) or `_prl` (price level updates).
+
+        mmap (bool): Whether to memory map the column files instead of reading them into memory. Default is True.
+
+    Returns:
+        dict: A mapping from column name to array. Timestamps are int64 nanoseconds since epoch, prices are int64 fixed point
+        (divide by `PRICE_SCALE`) and symbols are uint32 codes into the array returned by `load_symbols`.
+    """
+    _require_numpy()
+
+    columns = {}
+    for file_name in sorted(os.listdir(table_dir)):
+        if file_name.endswith(".npy"):
+            columns[file_name[:-4]] = np.load(os.path.join(table_dir, file_name), mmap_mode="r" if mmap else None)
+    if not columns:
+        raise FileNotFoundError(f"No column files found in {table_dir}")
+    return columns
+
+
+def load_symbols(table_dir: str):
+    """
+    This function loads the symbol dictionary of a columnar table.
+
+    Parameters:
+        table_dir (str): The column directory, i.e. the folder ending in `_trd` or `_prl`.
+
+    Returns:
+        numpy.ndarray: Array of symbols; `load_symbols(table_dir)[columns["symbol"]]` decodes the symbol column.
+    """
+    _require_numpy()
+
+    with open(os.path.join(table_dir, "symbols.txt")) as symbols_file:
+        symbols = [line.rstrip("\n") for line in symbols_file]
+    return np.array(symbols, dtype=object)
@@ -3,32 +3,53 @@ import os
 def compile():
     """
     This function compiles the C++ code for the IEX parser.
-    
+
     Parameters:
         None
-    
+
     Returns:
         None
     """
     CPP_DIR = os.path.join(os.path.dirname(__file__), "cpp")
     BIN_DIR = os.path.join(os.path.dirname(__file__), "bin")
 
+    # Sources shared by every parser binary. pcap_reader.cpp decompresses the input with zlib on a reader thread,
+    # symbol_filter.cpp drops messages for symbols that are not of interest, column_writer.cpp writes the npy output format and
+    # pipeline.cpp runs the decoder and writer threads of the threaded parsers, which write through output_file.cpp.
+    # chunk_decoder.cpp decodes chunks of a capture on worker threads that each read their own chunks (--decode=chunks).
+    # packet_index.cpp writes and reads the sidecar index used to read only parts of a capture.
+    # price_book.cpp rebuilds the order books for the --book-depth snapshots, and order_book.cpp the order by order books of DEEP+.
+    # split_pipeline.cpp runs the shard threads of the split parser, which keep their files in a file_pool.cpp pool.
+    # block_writer.cpp compresses the members of the block compressed files written by iex_transcode.
+    # checkpoint.cpp reads and writes the checkpoints of resumable parses, and stats.cpp writes the --stats files.
+    # message_types.cpp holds the dispatch table of --types and the decoders of the DEEP messages other than trades and price levels.
+    COMMON_SOURCES = f"{CPP_DIR}/logger.cpp {CPP_DIR}/decode_messages.cpp {CPP_DIR}/pcap_reader.cpp {CPP_DIR}/symbol_filter.cpp {CPP_DIR}/column_writer.cpp {CPP_DIR}/options.cpp {CPP_DIR}/pipeline.cpp {CPP_DIR}/output_file.cpp {CPP_DIR}/file_pool.cpp {CPP_DIR}/split_pipeline.cpp {CPP_DIR}/price_book.cpp {CPP_DIR}/packet_index.cpp {CPP_DIR}/block_writer.cpp {CPP_DIR}/checkpoint.cpp {CPP_DIR}/stats.cpp {CPP_DIR}/message_types.cpp {CPP_DIR}/order_book.cpp {CPP_DIR}/chunk_decoder.cpp"
+    LIBS = "-pthread -lz"
+
     # Compile iex_parser_threaded.cpp
-    command1 = f"g++ -O2 {CPP_DIR}/logger.cpp {CPP_DIR}/decode_messages.cpp {CPP_DIR}/iex_parser_threaded.cpp -o {BIN_DIR}/iex_parser_threaded.out -pthread"
+    command1 = f"g++ -O2 {COMMON_SOURCES} {CPP_DIR}/iex_parser_threaded.cpp -o {BIN_DIR}/iex_parser_threaded.out {LIBS}"
     os.system(command1)
 
     # Compile iex_parser_all_threaded.cpp
-    command2 = f"g++ -O2 {CPP_DIR}/logger.cpp {CPP_DIR}/decode_messages.cpp {CPP_DIR}/iex_parser_all_threaded.cpp -o {BIN_DIR}/iex_parser_all_threaded.out -pthread"
+    command2 = f"g++ -O2 {COMMON_SOURCES} {CPP_DIR}/iex_parser_all_threaded.cpp -o {BIN_DIR}/iex_parser_all_threaded.out {LIBS}"
     os.system(command2)
 
     # Compile iex_parser_split.cpp
-    command3 = f"g++ -O2 {CPP_DIR}/logger.cpp {CPP_DIR}/decode_messages.cpp {CPP_DIR}/iex_parser_split.cpp -o {BIN_DIR}/iex_parser_split.out"
+    command3 = f"g++ -O2 {COMMON_SOURCES} {CPP_DIR}/iex_parser_split.cpp -o {BIN_DIR}/iex_parser_split.out {LIBS}"
     os.system(command3)
 
     # Compile iex_parser.cpp
-    command4 = f"g++ -O2 {CPP_DIR}/logger.cpp {CPP_DIR}/decode_messages.cpp {CPP_DIR}/iex_parser.cpp -o {BIN_DIR}/iex_parser.out"
+    command4 = f"g++ -O2 {COMMON_SOURCES} {CPP_DIR}/iex_parser.cpp -o {BIN_DIR}/iex_parser.out {LIBS}"
     os.system(command4)
 
+    # Compile iex_transcode.cpp
+    command6 = f"g++ -O2 {COMMON_SOURCES} {CPP_DIR}/iex_transcode.cpp -o {BIN_DIR}/iex_transcode.out {LIBS}"
+    os.system(command6)
+
+    # Compile the shared library used by iex_cppparser.batches (ctypes)
+    command5 = f"g++ -O2 -shared -fPIC {COMMON_SOURCES} {CPP_DIR}/iex_capi.cpp -o {BIN_DIR}/libiexparser.so {LIBS}"
+    os.system(command5)
+
 
 if __name__ == "__main__":
-    compile()
\ No newline at end of file
+    compile()
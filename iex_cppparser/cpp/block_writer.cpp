@@ -0,0 +1,191 @@
+#include "block_writer.h"
+#include "pcap_reader.h"
+#include <algorithm>
+#include <cstdio>
+#include <cstring>
+#include <iostream>
+#include <zlib.h>
+using namespace std;
+
+BlockWriter::BlockWriter(size_t num_threads, int level) : num_threads(num_threads), level(level) {
+    if (this->num_threads == 0) {
+        this->num_threads = max(1u, thread::hardware_concurrency());
+    }
+}
+
+BlockWriter::~BlockWriter() {
+    stop();
+}
+
+bool BlockWriter::open(const string& path) {
+    this->path = path;
+    if (!output.open(path + ".tmp")) {
+        return false;
+    }
+    error = false;
+    compressed_offset = 0;
+    offset = 0;
+    table.clear();
+    stop_requested = false;
+    for (size_t i = 0; i < num_threads; ++i) {
+        compressors.emplace_back(&BlockWriter::compressor_loop, this);
+    }
+    return true;
+}
+
+static void put_le32(unsigned char* out, uint32_t value) {
+    out[0] = value & 0xff;
+    out[1] = (value >> 8) & 0xff;
+    out[2] = (value >> 16) & 0xff;
+    out[3] = (value >> 24) & 0xff;
+}
+
+// Compress the block of a job into a gzip member with the "IX" subfield
+bool BlockWriter::compress(Job& job) {
+    z_stream zs = {};
+    // Negative window bits write raw deflate, the gzip header and trailer are added here
+    if (deflateInit2(&zs, level, Z_DEFLATED, -MAX_WBITS, 8, Z_DEFAULT_STRATEGY) != Z_OK) {
+        return false;
+    }
+    size_t bound = deflateBound(&zs, job.data.size());
+    job.member.resize(BLOCK_MEMBER_HEADER_LENGTH + bound + BLOCK_MEMBER_TRAILER_LENGTH);
+
+    zs.next_in = reinterpret_cast<unsigned char*>(job.data.data());
+    zs.avail_in = job.data.size();
+    zs.next_out = job.member.data() + BLOCK_MEMBER_HEADER_LENGTH;
+    zs.avail_out = bound;
+    int ret = deflate(&zs, Z_FINISH);
+    size_t deflated = bound - zs.avail_out;
+    deflateEnd(&zs);
+    if (ret != Z_STREAM_END) {
+        return false;
+    }
+
+    size_t member_size = BLOCK_MEMBER_HEADER_LENGTH + deflated + BLOCK_MEMBER_TRAILER_LENGTH;
+    unsigned char* header = job.member.data();
+    // Magic, deflate, FEXTRA flag, no modification time, no extra flags, unknown OS
+    const unsigned char fixed[10] = {0x1f, 0x8b, 8, 4, 0, 0, 0, 0, 0, 0xff};
+    memcpy(header, fixed, sizeof(fixed));
+    header[10] = 12;
+    header[11] = 0;
+    header[12] = 'I';
+    header[13] = 'X';
+    header[14] = 8;
+    header[15] = 0;
+    put_le32(header + 16, member_size);
+    put_le32(header + 20, job.data.size());
+
+    unsigned char* trailer = job.member.data() + BLOCK_MEMBER_HEADER_LENGTH + deflated;
+    put_le32(trailer, crc32(0, reinterpret_cast<unsigned char*>(job.data.data()), job.data.size()));
+    put_le32(trailer + 4, job.data.size());
+    job.member.resize(member_size);
+    return true;
+}
+
+// Compressor thread: take the oldest job nobody works on yet
+void BlockWriter::compressor_loop() {
+    unique_lock<mutex> lock(mtx);
+    while (true) {
+        Job* job = nullptr;
+        cv.wait(lock, [&]() {
+            for (unique_ptr<Job>& queued : jobs) {
+                if (!queued->taken) {
+                    job = queued.get();
+                    return true;
+                }
+            }
+            return stop_requested;
+        });
+        if (job == nullptr) {
+            return;
+        }
+        job->taken = true;
+        lock.unlock();
+        bool ok = compress(*job);
+        lock.lock();
+        job->failed = !ok;
+        job->done = true;
+        cv.notify_all();
+    }
+}
+
+// Wait for the oldest job and write its member. Called with the lock held, which is released while writing.
+bool BlockWriter::write_front(unique_lock<mutex>& lock) {
+    cv.wait(lock, [&]() { return jobs.front()->done; });
+    unique_ptr<Job> job = std::move(jobs.front());
+    jobs.pop_front();
+    lock.unlock();
+
+    if (job->failed) {
+        cerr << "Error: Failed to compress a block" << endl;
+        error = true;
+    } else {
+        output.write(reinterpret_cast<const char*>(job->member.data()), job->member.size());
+        table.push_back(TableRow{compressed_offset, job->member.size(), offset, job->data.size(), job->first_packet,
+                                 job->first_capture_ns});
+        compressed_offset += job->member.size();
+        offset += job->data.size();
+    }
+    lock.lock();
+    return !error;
+}
+
+bool BlockWriter::add(vector<char>&& data, uint64_t first_packet, uint64_t first_capture_ns) {
+    unique_ptr<Job> job(new Job());
+    job->data = std::move(data);
+    job->first_packet = first_packet;
+    job->first_capture_ns = first_capture_ns;
+
+    unique_lock<mutex> lock(mtx);
+    while (jobs.size() >= 2 * num_threads) {
+        if (!write_front(lock)) {
+            return false;
+        }
+    }
+    jobs.push_back(std::move(job));
+    cv.notify_all();
+    return true;
+}
+
+void BlockWriter::stop() {
+    {
+        lock_guard<mutex> lock(mtx);
+        stop_requested = true;
+    }
+    cv.notify_all();
+    for (thread& compressor : compressors) {
+        compressor.join();
+    }
+    compressors.clear();
+}
+
+bool BlockWriter::close(const string& table_path) {
+    {
+        unique_lock<mutex> lock(mtx);
+        while (!jobs.empty() && write_front(lock)) {
+        }
+    }
+    stop();
+    jobs.clear();
+    bool ok = output.close() && !error;
+
+    OutputFile table_file(1 << 20);
+    ok = ok && table_file.open(table_path);
+    if (ok) {
+        table_file.write("Compressed Offset,Compressed Size,Offset,Size,First Packet,First Capture Time\n");
+        for (const TableRow& row : table) {
+            table_file.write(to_string(row.compressed_offset) + "," + to_string(row.compressed_size) + "," +
+                             to_string(row.offset) + "," + to_string(row.size) + "," + to_string(row.first_packet) + "," +
+                             to_string(row.first_capture_ns) + "\n");
+        }
+        ok = table_file.close();
+    }
+
+    string temporary_path = path + ".tmp";
+    if (!ok || rename(temporary_path.c_str(), path.c_str()) != 0) {
+        cerr << "Error: Unable to write " << path << endl;
+        remove(temporary_path.c_str());
+        return false;
+    }
+    return true;
+}
@@ -0,0 +1,85 @@
+#ifndef BLOCK_WRITER_H
+#define BLOCK_WRITER_H
+
+#include <cstdint>
+#include <cstddef>
+#include <deque>
+#include <memory>
+#include <string>
+#include <thread>
+#include <vector>
+#include <mutex>
+#include <condition_variable>
+#include "output_file.h"
+
+using namespace std;
+
+// Writer of block compressed captures, see pcap_reader.h for the format:
+//
+//     caller --> add(block) --> compressor threads --> members written in order by the caller
+//
+// Every block handed to add is compressed into its own gzip member by one of the compressor threads. Members are
+// written in the order the blocks were added, so a block should hold whole packets for the file to be seekable at
+// member starts. At most two blocks per thread are in flight, which bounds the memory.
+//
+// close() also writes the block table, a CSV file with one row per member:
+//     Compressed Offset,Compressed Size,Offset,Size,First Packet,First Capture Time
+// The offsets are in the compressed and decompressed file, the packets are numbered from 0 and the capture time is in
+// nanoseconds since epoch.
+class BlockWriter {
+public:
+    explicit BlockWriter(size_t num_threads = 0, int level = 6);
+    ~BlockWriter();
+
+    // Create the output file and start the compressor threads. The members are written to <path>.tmp, which close
+    // renames to path once everything has been written.
+    bool open(const string& path);
+
+    // Queue a block for compression. Blocks until a slot is free. Returns false if writing failed.
+    bool add(vector<char>&& data, uint64_t first_packet, uint64_t first_capture_ns);
+
+    // Write the remaining members and the block table, and close the file. Returns false if anything failed.
+    bool close(const string& table_path);
+
+private:
+    struct Job {
+        vector<char> data;
+        vector<unsigned char> member;
+        uint64_t first_packet = 0;
+        uint64_t first_capture_ns = 0;
+        bool taken = false;
+        bool done = false;
+        bool failed = false;
+    };
+
+    struct TableRow {
+        uint64_t compressed_offset;
+        uint64_t compressed_size;
+        uint64_t offset;
+        uint64_t size;
+        uint64_t first_packet;
+        uint64_t first_capture_ns;
+    };
+
+    void compressor_loop();
+    bool compress(Job& job);
+    bool write_front(unique_lock<mutex>& lock);
+    void stop();
+
+    size_t num_threads;
+    int level;
+    OutputFile output;
+    string path;
+    bool error = false;
+    uint64_t compressed_offset = 0;
+    uint64_t offset = 0;
+    vector<TableRow> table;
+
+    deque<unique_ptr<Job>> jobs;
+    bool stop_requested = false;
+    vector<thread> compressors;
+    mutex mtx;
+    condition_variable cv;
+};
+
+#endif // BLOCK_WRITER_H
@@ -0,0 +1,125 @@
+#include "checkpoint.h"
+#include <cstdio>
+#include <cstdlib>
+#include <fstream>
+#include <iostream>
+#include <sstream>
+#include <sys/stat.h>
+#include <unistd.h>
+using namespace std;
+
+static const char CHECKPOINT_MAGIC[] = "iex_parser_checkpoint 1";
+
+int64_t file_size(const string& path) {
+    struct stat file_stat;
+    if (stat(path.c_str(), &file_stat) != 0) {
+        return -1;
+    }
+    return file_stat.st_size;
+}
+
+bool Checkpoint::write(const string& path) const {
+    ostringstream text;
+    text << CHECKPOINT_MAGIC << "\n";
+    text << "input_size " << input_size << "\n";
+    text << "signature " << signature << "\n";
+    text << "packets " << packets << "\n";
+    text << "offset " << offset << "\n";
+    for (uint64_t size : output_sizes) {
+        text << "output_size " << size << "\n";
+    }
+    text << "stop_event_seen " << (stop_event_seen ? 1 : 0) << "\n";
+    text << "complete " << (complete ? 1 : 0) << "\n";
+    if (has_access_point) {
+        static const char HEX_DIGITS[] = "0123456789abcdef";
+        string window;
+        window.reserve(access_point.window.size() * 2);
+        for (unsigned char byte : access_point.window) {
+            window += HEX_DIGITS[byte >> 4];
+            window += HEX_DIGITS[byte & 15];
+        }
+        text << "access_point " << access_point.output_offset << " " << access_point.input_offset << " "
+             << static_cast<int>(access_point.bits) << " " << (access_point.member_start ? 1 : 0) << " "
+             << (window.empty() ? "-" : window) << "\n";
+    }
+
+    string temporary_path = path + ".tmp";
+    FILE* file = fopen(temporary_path.c_str(), "wb");
+    if (file == nullptr) {
+        cerr << "Error: Unable to write checkpoint " << path << endl;
+        return false;
+    }
+    string data = text.str();
+    bool ok = fwrite(data.data(), 1, data.size(), file) == data.size();
+    ok = fflush(file) == 0 && ok;
+    ok = fsync(fileno(file)) == 0 && ok;
+    ok = fclose(file) == 0 && ok;
+    if (!ok || rename(temporary_path.c_str(), path.c_str()) != 0) {
+        cerr << "Error: Unable to write checkpoint " << path << endl;
+        remove(temporary_path.c_str());
+        return false;
+    }
+    return true;
+}
+
+bool Checkpoint::load(const string& path) {
+    ifstream file(path);
+    if (!file) {
+        return false;
+    }
+    *this = Checkpoint();
+
+    string line;
+    if (!getline(file, line) || line != CHECKPOINT_MAGIC) {
+        cerr << "Warning: " << path << " is not a parser checkpoint" << endl;
+        return false;
+    }
+    bool has_offset = false;
+    while (getline(file, line)) {
+        size_t space = line.find(' ');
+        string name = line.substr(0, space);
+        string value = space == string::npos ? "" : line.substr(space + 1);
+        if (name == "signature") {
+            signature = value;
+            continue;
+        }
+
+        istringstream fields(value);
+        if (name == "input_size") {
+            fields >> input_size;
+        } else if (name == "packets") {
+            fields >> packets;
+        } else if (name == "offset") {
+            fields >> offset;
+            has_offset = !fields.fail();
+        } else if (name == "output_size") {
+            uint64_t size = 0;
+            fields >> size;
+            output_sizes.push_back(size);
+        } else if (name == "stop_event_seen") {
+            fields >> stop_event_seen;
+        } else if (name == "complete") {
+            fields >> complete;
+        } else if (name == "access_point") {
+            int bits = 0;
+            string window;
+            fields >> access_point.output_offset >> access_point.input_offset >> bits >> access_point.member_start >> window;
+            access_point.bits = static_cast<uint8_t>(bits);
+            if (window != "-") {
+                for (size_t i = 0; i + 1 < window.size(); i += 2) {
+                    access_point.window.push_back(static_cast<unsigned char>(strtoul(window.substr(i, 2).c_str(), nullptr, 16)));
+                }
+            }
+            has_access_point = !fields.fail();
+        }
+        if (fields.fail()) {
+            cerr << "Warning: Invalid line in checkpoint " << path << ": " << name << endl;
+            return false;
+        }
+    }
+    if (!has_offset) {
+        cerr << "Warning: Incomplete checkpoint " << path << endl;
+        return false;
+    }
+    return true;
+}
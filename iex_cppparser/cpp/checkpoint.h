@@ -0,0 +1,48 @@
+#ifndef CHECKPOINT_H
+#define CHECKPOINT_H
+
+#include <cstdint>
+#include <string>
+#include <vector>
+#include "pcap_reader.h"
+
+using namespace std;
+
+// Checkpoint of a parse (--checkpoint=PATH of the threaded parsers), so a parse that dies near the end resumes where it
+// left off instead of starting over. A checkpoint is taken at a packet boundary, after everything parsed so far has been
+// written and synced to the output files. Resuming cuts the output files back to the recorded sizes and continues
+// reading at the recorded offset, from the recorded access point for gzip input. The last checkpoint of a parse that
+// read the whole capture is marked complete, and parsing again with it only reports that the output is complete.
+//
+// The file is text with one "name value" pair per line, so the Python package can read the packet count:
+//     iex_parser_checkpoint 1
+//     input_size 290597
+//     signature 3:5f1c0a2b9e8d7c6b 0 18446744073709551615 - T85
+//     packets 5000000
+//     offset 1547149
+//     output_size 23456          (one line per output file, in the order the parser opens them)
+//     stop_event_seen 0
+//     complete 0
+//     access_point 0 0 0 1 -     (output offset, input offset, bits, member start, window in hex; gzip input only)
+struct Checkpoint {
+    uint64_t input_size = 0;
+    string signature;                 // settings of the parse that must match to resume it
+    uint64_t packets = 0;             // packets read so far
+    uint64_t offset = 0;              // decompressed offset of the next packet
+    vector<uint64_t> output_sizes;
+    bool stop_event_seen = false;
+    bool complete = false;
+    bool has_access_point = false;
+    AccessPoint access_point;
+
+    // Write to a temporary file, sync it and rename it over path, so a crash never leaves a partial checkpoint
+    bool write(const string& path) const;
+
+    // Returns false if there is no checkpoint at path, or (with a warning) if it cannot be read
+    bool load(const string& path);
+};
+
+// Size of a file, or -1 if it does not exist
+int64_t file_size(const string& path);
+
+#endif // CHECKPOINT_H
@@ -0,0 +1,322 @@
+#include "chunk_decoder.h"
+#include "decode_messages.h"
+#include "pipeline.h"
+#include "logger.h"
+#include <algorithm>
+#include <chrono>
+#include <cstring>
+#include <iostream>
+using namespace std;
+
+static Log logger;
+
+// Gzip chunks are inflated by each worker, in blocks much smaller than the ones of a reader of the whole capture
+static const size_t CHUNK_BLOCK_SIZE = 4 << 20;
+
+static size_t default_worker_count() {
+    unsigned int cores = thread::hardware_concurrency();
+    return cores > 2 ? cores - 1 : 1;
+}
+
+// Nanoseconds elapsed since start
+static uint64_t nanoseconds_since(chrono::steady_clock::time_point start) {
+    return chrono::duration_cast<chrono::nanoseconds>(chrono::steady_clock::now() - start).count();
+}
+
+// Capture time of a packet in nanoseconds, computed the way the reader of the threaded parsers does, so the capture
+// times of the rows are the same to the last digit
+static uint64_t capture_time_ns(const PcapPacketHeader& header) {
+    return (header.ts_sec * 1e9) + (header.ts_usec * 1e3);
+}
+
+bool plan_chunks(PcapReader& reader, uint64_t chunk_bytes, uint64_t end_ns, vector<PacketRange>& chunks) {
+    uint64_t packet = 0;
+    PcapPacketHeader header;
+    while (reader.next_packet_header(header)) {
+        uint64_t offset = reader.packet_offset();
+        if (chunks.empty() || offset - chunks.back().offset >= chunk_bytes) {
+            chunks.push_back(PacketRange{offset, packet, 0});
+        }
+        chunks.back().packets++;
+        packet++;
+        uint64_t capture_time = capture_time_ns(header);
+        if (capture_time >= end_ns) {
+            break;
+        }
+        if (!reader.skip_packet_data()) {
+            return false;
+        }
+    }
+    return !reader.failed();
+}
+
+void ChunkOutput::clear() {
+    trade_output.clear();
+    prl_output.clear();
+    for (string& rows : other_output) {
+        rows.clear();
+    }
+    counters = ParseCounters();
+    end_offset = 0;
+    last = false;
+    failed = false;
+    error.clear();
+}
+
+ChunkDecoder::ChunkDecoder(const ChunkSettings& settings, vector<PacketRange> chunks, size_t num_workers, size_t window)
+    : settings(settings), chunks(std::move(chunks)), num_workers(num_workers == 0 ? default_worker_count() : num_workers),
+      window(window == 0 ? this->num_workers * 2 : window), done(this->window, false) {
+    other_types = settings.message_table->other_types();
+    fill(begin(other_index), end(other_index), -1);
+    for (size_t i = 0; i < other_types.size(); ++i) {
+        other_index[static_cast<uint8_t>(other_types[i]->type)] = static_cast<int>(i);
+    }
+    for (size_t i = 0; i < this->window; ++i) {
+        slots.emplace_back(new ChunkOutput());
+        slots.back()->other_output.resize(other_types.size());
+    }
+    worker_busy_ns.reset(new atomic<uint64_t>[this->num_workers]);
+    for (size_t i = 0; i < this->num_workers; ++i) {
+        worker_busy_ns[i].store(0);
+    }
+}
+
+ChunkDecoder::~ChunkDecoder() {
+    stop();
+}
+
+bool ChunkDecoder::run(const function<void(const ChunkOutput&)>& write) {
+    for (size_t i = 0; i < num_workers; ++i) {
+        workers.emplace_back(&ChunkDecoder::work, this, i);
+    }
+
+    bool ok = true;
+    for (size_t chunk = 0; chunk < chunks.size(); ++chunk) {
+        size_t slot = chunk % window;
+        {
+            unique_lock<mutex> lock(mtx);
+            chunk_done.wait(lock, [&] { return done[slot]; });
+        }
+        chrono::steady_clock::time_point start = chrono::steady_clock::now();
+        ChunkOutput& output = *slots[slot];
+        write(output);
+        if (output.failed) {
+            cerr << "Error: " << output.error << endl;
+            ok = false;
+        }
+        bool last = output.last || output.failed;
+        output.clear();
+        writer_busy_ns += nanoseconds_since(start);
+        {
+            lock_guard<mutex> lock(mtx);
+            done[slot] = false;
+            written++;
+            if (last) {
+                stopping = true;
+            }
+        }
+        room.notify_all();
+        if (last) {
+            break;
+        }
+    }
+    stop();
+    return ok;
+}
+
+void ChunkDecoder::stop() {
+    {
+        lock_guard<mutex> lock(mtx);
+        stopping = true;
+    }
+    room.notify_all();
+    for (thread& worker : workers) {
+        worker.join();
+    }
+    workers.clear();
+}
+
+StageTimes ChunkDecoder::stage_times() const {
+    StageTimes stages;
+    for (size_t i = 0; i < num_workers; ++i) {
+        stages.worker_busy_ns.push_back(worker_busy_ns[i].load(memory_order_relaxed));
+    }
+    stages.writer_busy_ns = writer_busy_ns;
+    stages.batch_capacity = window;
+    stages.batches_in_flight = min(window, min(next_chunk.load(memory_order_relaxed), chunks.size()) - min(written, chunks.size()));
+    return stages;
+}
+
+void ChunkDecoder::work(size_t worker) {
+    PcapReader reader(CHUNK_BLOCK_SIZE);
+    reader.set_mmap(settings.mmap);
+    bool opened = reader.open(settings.input_path);
+
+    while (true) {
+        // Chunks are taken in order, so every worker only ever seeks forward
+        size_t chunk = next_chunk.fetch_add(1);
+        if (chunk >= chunks.size()) {
+            break;
+        }
+        {
+            unique_lock<mutex> lock(mtx);
+            room.wait(lock, [&] { return stopping || chunk < written + window; });
+            if (stopping) {
+                break;
+            }
+        }
+
+        chrono::steady_clock::time_point start = chrono::steady_clock::now();
+        ChunkOutput& output = *slots[chunk % window];
+        if (opened) {
+            decode(reader, chunks[chunk], output);
+        } else {
+            output.failed = true;
+            output.error = "Unable to open file " + settings.input_path;
+        }
+        worker_busy_ns[worker].fetch_add(nanoseconds_since(start), memory_order_relaxed);
+
+        {
+            lock_guard<mutex> lock(mtx);
+            done[chunk % window] = true;
+        }
+        chunk_done.notify_one();
+    }
+}
+
+void ChunkDecoder::decode(PcapReader& reader, const PacketRange& chunk, ChunkOutput& output) {
+    const AccessPoint* point = settings.index != nullptr ? settings.index->access_point(chunk.offset) : nullptr;
+    if (!reader.seek(chunk.offset, point)) {
+        output.failed = true;
+        output.error = "Unable to seek to packet " + to_string(chunk.first_packet) + " of " + settings.input_path;
+        return;
+    }
+
+    for (uint64_t packet = 0; packet < chunk.packets; ++packet) {
+        PcapPacketHeader header;
+        if (!reader.next_packet_header(header)) {
+            output.last = true;
+            break;
+        }
+        output.counters.packets_read++;
+        uint64_t capture_time = capture_time_ns(header);
+
+        // Packets are captured in order, so nothing after the end of the window is needed
+        if (capture_time >= settings.end_ns) {
+            output.last = true;
+            break;
+        }
+        if (capture_time < settings.start_ns) {
+            if (!reader.skip_packet_data()) {
+                output.last = true;
+                break;
+            }
+            continue;
+        }
+        const char* packet_data = reader.packet_data();
+        if (packet_data == nullptr) {
+            output.last = true;
+            break;
+        }
+        if (!decode_packet(packet_data, header.incl_len, capture_time, output)) {
+            output.failed = true;
+            break;
+        }
+        if (output.last) {
+            // The system event of --stop-after-event ends the parse after its packet
+            break;
+        }
+    }
+    output.end_offset = reader.position();
+    if (reader.failed()) {
+        output.failed = true;
+        output.error = "Unable to read " + settings.input_path;
+    }
+}
+
+// Parse the IEX payload of a packet and format the rows of its messages, as the reader of the threaded parsers does
+bool ChunkDecoder::decode_packet(const char* packet_data, uint32_t incl_len, uint64_t capture_time, ChunkOutput& output) {
+    ParseCounters& counters = output.counters;
+    // Ethernet, IP and UDP headers and the IEX header
+    if (incl_len < 42 + 40) {
+        logger.warn(LOG_MALFORMED_PACKET, "Invalid packet length: " + to_string(incl_len));
+        counters.packets_malformed++;
+        return true;
+    }
+    counters.packets_parsed++;
+
+    const char* iex_payload = packet_data + 42;
+    size_t iex_payload_size = incl_len - 42;
+
+    uint16_t payload_len;
+    uint16_t message_count;
+    long long send_time;
+    memcpy(&send_time, iex_payload + 32, 8);
+    memcpy(&payload_len, iex_payload + 12, 2);
+    memcpy(&message_count, iex_payload + 14, 2);
+    if (iex_payload_size != payload_len + 40u) {
+        output.error = "Invalid parser state; the length of UDP packet payload should be forty plus the payload_len within IEX header";
+        return false;
+    }
+
+    const char* message_bytes = iex_payload + 40;
+    const MessageTable& table = *settings.message_table;
+    size_t cur_offset = 0;
+    for (size_t i = 0; i < message_count; ++i) {
+        // A message that runs past the payload ends the packet
+        size_t message_len = message_length_at(message_bytes, payload_len, cur_offset);
+        if (message_len == 0) {
+            logger.warn(LOG_MALFORMED_PACKET, "Invalid message length at offset " + to_string(cur_offset) + " of a " +
+                                              to_string(payload_len) + " byte payload, skipping the rest of the packet");
+            counters.packets_malformed++;
+            return true;
+        }
+        const char* message_payload = message_bytes + cur_offset + 2;
+        char message_type_byte = message_payload[0];
+        cur_offset += 2 + message_len;
+        counters.messages[static_cast<unsigned char>(message_type_byte)]++;
+
+        if (message_type_byte == 'S' && settings.stop_event != 0 && message_len >= 2 && message_payload[1] == settings.stop_event) {
+            output.last = true;
+        }
+
+        MessageAction action = table.action(message_type_byte);
+        if (action == MESSAGE_SKIP) {
+            continue;
+        }
+        if (settings.symbol_filter != nullptr && message_type_byte != 'S') {
+            counters.filter_checked++;
+            if (!settings.symbol_filter->accepts(message_payload, message_len)) {
+                continue;
+            }
+            counters.filter_accepted++;
+        }
+
+        switch (action) {
+        case MESSAGE_TRADE:
+            counters.trade_records++;
+            append_trade_row(output.trade_output, message_payload, message_len, capture_time, send_time);
+            break;
+        case MESSAGE_PRICE_LEVEL:
+            counters.price_level_records++;
+            append_price_level_row(output.prl_output, message_payload, message_len, capture_time, send_time);
+            break;
+        case MESSAGE_OTHER: {
+            int index = other_index[static_cast<uint8_t>(message_type_byte)];
+            if (!append_message_row(output.other_output[index], *other_types[index], message_payload, message_len, capture_time, send_time)) {
+                logger.warn(LOG_DECODE_FAILURE, string("Warning: Failed to decode message of type '") + message_type_byte + "', skipping");
+            }
+            break;
+        }
+        case MESSAGE_ORDER:
+        case MESSAGE_SKIP:
+            break;
+        }
+    }
+
+    if (cur_offset != payload_len) {
+        output.error = "Invalid parser state; cur_offset after parsing all messages within packet should be equal to IEX header reported payload_len";
+        return false;
+    }
+    return true;
+}
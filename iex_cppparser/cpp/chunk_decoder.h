@@ -0,0 +1,117 @@
+#ifndef CHUNK_DECODER_H
+#define CHUNK_DECODER_H
+
+#include <atomic>
+#include <condition_variable>
+#include <cstdint>
+#include <cstddef>
+#include <functional>
+#include <memory>
+#include <mutex>
+#include <string>
+#include <thread>
+#include <vector>
+#include "pcap_reader.h"
+#include "packet_index.h"
+#include "message_types.h"
+#include "symbol_filter.h"
+#include "stats.h"
+
+using namespace std;
+
+// Parallel decoding of a single capture (--decode=chunks of the threaded parsers):
+//
+//     chunk 0 --> worker 0 --+
+//     chunk 1 --> worker 1 --+--> writer (calling thread) --> output files, in capture order
+//     chunk 2 --> worker 2 --+
+//
+// DecodePipeline has a single reader that walks every packet and copies every message, which tops out at one and a
+// half cores however many decoder workers there are. Here the capture is first cut into chunks of a few MiB on packet
+// boundaries, and every worker reads its chunks itself with a PcapReader of its own, from the parsing of the packets
+// to the formatting of the rows. The writer takes the output of the chunks in order, so the files are the same as the
+// ones of the pipeline. A worker only starts a chunk while fewer than window chunks are ahead of the writer, which
+// bounds the memory held by decoded chunks.
+//
+// The chunk boundaries come from a pass over the pcap record headers of an uncompressed capture (plan_chunks), which
+// reads nothing but the headers of a mapped file, or from the index of a gzip capture (PacketIndex::split), whose
+// access points let each worker start inflating close to its chunk.
+//
+// The order dependent outputs (order book snapshots, the DEEP+ order book, checkpoints and building an index) need
+// the messages of the whole capture in one place, so they are only supported by the pipeline.
+
+// Cut a classic pcap capture into chunks of about chunk_bytes from a pass over the record headers. The reader must be
+// positioned at the first packet. Chunks end after the first packet captured at or after end_ns, where the parse stops.
+// Returns false if the capture is truncated.
+bool plan_chunks(PcapReader& reader, uint64_t chunk_bytes, uint64_t end_ns, vector<PacketRange>& chunks);
+
+struct ChunkSettings {
+    string input_path;
+    bool mmap = true;
+    const PacketIndex* index = nullptr;            // access points of a gzip capture read through its index
+    const MessageTable* message_table = nullptr;
+    const SymbolFilter* symbol_filter = nullptr;     // nullptr keeps every symbol
+    uint64_t start_ns = 0;
+    uint64_t end_ns = UINT64_MAX;
+    char stop_event = 0;
+};
+
+// Rows and counters of a decoded chunk
+struct ChunkOutput {
+    string trade_output;
+    string prl_output;
+    vector<string> other_output;                   // per type of MessageTable::other_types()
+    ParseCounters counters;
+    uint64_t end_offset = 0;                       // decompressed offset after the last packet read
+    bool last = false;                             // the parse ends with this chunk: end of the window or of the capture
+    bool failed = false;                           // the capture could not be read or is malformed, see error
+    string error;
+
+    void clear();
+};
+
+class ChunkDecoder {
+public:
+    // num_workers of 0 picks one worker per available core, leaving one for the writer.
+    // window is the number of chunks decoded ahead of the writer, 0 for twice the number of workers.
+    ChunkDecoder(const ChunkSettings& settings, vector<PacketRange> chunks, size_t num_workers = 0, size_t window = 0);
+    ~ChunkDecoder();
+
+    // Decode the chunks and call write with the output of each one in capture order, on the calling thread.
+    // Stops after the last chunk of the parse. Returns false if a chunk failed.
+    bool run(const function<void(const ChunkOutput&)>& write);
+
+    size_t worker_count() const { return num_workers; }
+    size_t chunk_count() const { return chunks.size(); }
+
+    // Busy times of the workers and the writer and the number of chunks in flight, for the stats file
+    StageTimes stage_times() const;
+
+private:
+    void work(size_t worker);
+    void decode(PcapReader& reader, const PacketRange& chunk, ChunkOutput& output);
+    bool decode_packet(const char* packet_data, uint32_t incl_len, uint64_t capture_time, ChunkOutput& output);
+    void stop();
+
+    ChunkSettings settings;
+    vector<PacketRange> chunks;
+    size_t num_workers;
+    size_t window;
+    vector<const MessageType*> other_types;
+    int other_index[256];                          // index in other_types by type byte
+
+    // Chunk k is decoded into slots[k % window] once fewer than window chunks are ahead of the writer
+    vector<unique_ptr<ChunkOutput>> slots;
+    vector<bool> done;
+    atomic<size_t> next_chunk{0};
+    size_t written = 0;
+    bool stopping = false;
+    mutex mtx;
+    condition_variable chunk_done;
+    condition_variable room;
+    vector<thread> workers;
+
+    unique_ptr<atomic<uint64_t>[]> worker_busy_ns;
+    uint64_t writer_busy_ns = 0;
+};
+
+#endif // CHUNK_DECODER_H
@@ -0,0 +1,157 @@
+#include "column_writer.h"
+#include <iostream>
+#include <fstream>
+#include <sys/stat.h>
+#include <cerrno>
+using namespace std;
+
+// The .npy header is padded to a fixed size so it can be rewritten in place once the row count is known
+const size_t NPY_HEADER_SIZE = 128;
+
+bool NpyColumn::open(const string& path, const char* column_dtype, size_t item_size, size_t batch_size) {
+    file = fopen(path.c_str(), "wb");
+    if (file == nullptr) {
+        cerr << "Error: Unable to open column file " << path << endl;
+        return false;
+    }
+    dtype = column_dtype;
+    buffer.assign(item_size * batch_size, 0);
+    used = 0;
+    rows = 0;
+    error = false;
+    return write_header();
+}
+
+bool NpyColumn::write_header() {
+    // Format version 1.0: magic string, version, little endian header length, then a Python dict literal
+    // padded with spaces and terminated by a newline
+    string header = "{'descr': '" + dtype + "', 'fortran_order': False, 'shape': (" + to_string(rows) + ",), }";
+    header.append(NPY_HEADER_SIZE - 10 - header.size() - 1, ' ');
+    header += '\n';
+
+    char preamble[10] = {'\x93', 'N', 'U', 'M', 'P', 'Y', 1, 0, 0, 0};
+    uint16_t header_length = static_cast<uint16_t>(header.size());
+    memcpy(preamble + 8, &header_length, sizeof(header_length));
+
+    return fwrite(preamble, 1, sizeof(preamble), file) == sizeof(preamble) &&
+           fwrite(header.data(), 1, header.size(), file) == header.size();
+}
+
+void NpyColumn::flush() {
+    if (used > 0 && fwrite(buffer.data(), 1, used, file) != used) {
+        cerr << "Error: Failed to write column data" << endl;
+        error = true;
+    }
+    used = 0;
+}
+
+bool NpyColumn::close() {
+    if (file == nullptr) {
+        return true;
+    }
+    flush();
+    bool ok = !error && fseek(file, 0, SEEK_SET) == 0 && write_header();
+    ok = fclose(file) == 0 && ok;
+    file = nullptr;
+    buffer = vector<char>();
+    return ok;
+}
+
+uint32_t SymbolDictionary::code(const char* symbol_field) {
+    uint64_t key;
+    memcpy(&key, symbol_field, sizeof(key));
+    auto found = codes.find(key);
+    if (found != codes.end()) {
+        return found->second;
+    }
+    uint32_t new_code = static_cast<uint32_t>(symbols.size());
+    codes.emplace(key, new_code);
+    symbols.push_back(symbol_to_string(symbol_field));
+    return new_code;
+}
+
+bool SymbolDictionary::write(const string& path) const {
+    ofstream output(path);
+    for (const string& symbol : symbols) {
+        output << symbol << "\n";
+    }
+    return output.good();
+}
+
+// Create a directory, succeeding if it already exists
+static bool make_directory(const string& path) {
+    if (mkdir(path.c_str(), 0755) == 0 || errno == EEXIST) {
+        return true;
+    }
+    cerr << "Error: Unable to create directory " << path << endl;
+    return false;
+}
+
+bool ColumnarWriter::open(const string& output_prefix, size_t batch_size) {
+    trades_directory = output_prefix + "_trd";
+    prl_directory = output_prefix + "_prl";
+    if (!make_directory(trades_directory) || !make_directory(prl_directory)) {
+        return false;
+    }
+
+    const string& t = trades_directory;
+    bool ok = trade_capture_time.open(t + "/capture_time.npy", "<i8", 8, batch_size) &&
+              trade_send_time.open(t + "/send_time.npy", "<i8", 8, batch_size) &&
+              trade_timestamp.open(t + "/timestamp.npy", "<i8", 8, batch_size) &&
+              trade_symbol.open(t + "/symbol.npy", "<u4", 4, batch_size) &&
+              trade_size.open(t + "/size.npy", "<u4", 4, batch_size) &&
+              trade_price.open(t + "/price.npy", "<i8", 8, batch_size) &&
+              trade_id.open(t + "/trade_id.npy", "<i8", 8, batch_size) &&
+              trade_sale_condition.open(t + "/sale_condition.npy", "|u1", 1, batch_size);
+
+    const string& p = prl_directory;
+    ok = ok && prl_capture_time.open(p + "/capture_time.npy", "<i8", 8, batch_size) &&
+         prl_send_time.open(p + "/send_time.npy", "<i8", 8, batch_size) &&
+         prl_timestamp.open(p + "/timestamp.npy", "<i8", 8, batch_size) &&
+         prl_side.open(p + "/side.npy", "|u1", 1, batch_size) &&
+         prl_symbol.open(p + "/symbol.npy", "<u4", 4, batch_size) &&
+         prl_price.open(p + "/price.npy", "<i8", 8, batch_size) &&
+         prl_size.open(p + "/size.npy", "<u4", 4, batch_size) &&
+         prl_event_flags.open(p + "/event_flags.npy", "|u1", 1, batch_size);
+
+    is_open = ok;
+    return ok;
+}
+
+void ColumnarWriter::write_trade(uint64_t capture_time, int64_t send_time, const TradeReport& trade) {
+    trade_capture_time.append<int64_t>(static_cast<int64_t>(capture_time));
+    trade_send_time.append<int64_t>(send_time);
+    trade_timestamp.append<int64_t>(static_cast<int64_t>(trade.timestamp));
+    trade_symbol.append<uint32_t>(trade_symbols.code(trade.symbol));
+    trade_size.append<uint32_t>(trade.size);
+    trade_price.append<int64_t>(static_cast<int64_t>(trade.price));
+    trade_id.append<int64_t>(static_cast<int64_t>(trade.trade_id));
+    trade_sale_condition.append<uint8_t>(static_cast<uint8_t>(trade.sale_condition_flags));
+}
+
+void ColumnarWriter::write_price_level(uint64_t capture_time, int64_t send_time, uint8_t side, const PriceLevelUpdate& update) {
+    prl_capture_time.append<int64_t>(static_cast<int64_t>(capture_time));
+    prl_send_time.append<int64_t>(send_time);
+    prl_timestamp.append<int64_t>(static_cast<int64_t>(update.timestamp));
+    prl_side.append<uint8_t>(side);
+    prl_symbol.append<uint32_t>(prl_symbols.code(update.symbol));
+    prl_price.append<int64_t>(static_cast<int64_t>(update.price));
+    prl_size.append<uint32_t>(update.size);
+    prl_event_flags.append<uint8_t>(static_cast<uint8_t>(update.event_flags));
+}
+
+bool ColumnarWriter::close() {
+    if (!is_open) {
+        return true;
+    }
+    bool ok = true;
+    for (NpyColumn* column : {&trade_capture_time, &trade_send_time, &trade_timestamp, &trade_symbol, &trade_size,
+                              &trade_price, &trade_id, &trade_sale_condition, &prl_capture_time, &prl_send_time,
+                              &prl_timestamp, &prl_side, &prl_symbol, &prl_price, &prl_size, &prl_event_flags}) {
+        ok = column->close() && ok;
+    }
+    ok = trade_symbols.write(trades_directory + "/symbols.txt") && ok;
+    ok = prl_symbols.write(prl_directory + "/symbols.txt") && ok;
+    is_open = false;
+    return ok;
+}
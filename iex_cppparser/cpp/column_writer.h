@@ -0,0 +1,93 @@
+#ifndef COLUMN_WRITER_H
+#define COLUMN_WRITER_H
+
+#include <cstdint>
+#include <cstddef>
+#include <cstdio>
+#include <cstring>
+#include <string>
+#include <vector>
+#include <unordered_map>
+#include "decode_messages.h"
+
+using namespace std;
+
+// Columnar output mode (--format=npy). Instead of formatting every record as text, the decoded fields are appended
+// to one NumPy .npy file per column, so they can be memory mapped straight back into arrays (see iex_cppparser/columnar.py).
+//
+// <output_prefix>_trd/  capture_time, send_time, timestamp (int64 ns), symbol (uint32 code), size (uint32),
+//                       price (int64, 4 implied decimals), trade_id (int64), sale_condition (uint8 flags)
+// <output_prefix>_prl/  capture_time, send_time, timestamp (int64 ns), side (uint8, 0 bid / 1 ask), symbol (uint32 code),
+//                       price (int64, 4 implied decimals), size (uint32), event_flags (uint8)
+//
+// Symbols are dictionary encoded: line i of symbols.txt in each directory is the symbol with code i.
+
+// A single .npy column. Values are buffered and appended batch_size rows at a time.
+// The header reserves room for the row count, which is filled in when the column is closed.
+class NpyColumn {
+public:
+    bool open(const string& path, const char* dtype, size_t item_size, size_t batch_size);
+    bool close();
+
+    template <typename T>
+    void append(T value) {
+        memcpy(buffer.data() + used, &value, sizeof(T));
+        used += sizeof(T);
+        rows++;
+        if (used == buffer.size()) {
+            flush();
+        }
+    }
+
+    uint64_t size() const { return rows; }
+
+private:
+    void flush();
+    bool write_header();
+
+    FILE* file = nullptr;
+    string dtype;
+    vector<char> buffer;
+    size_t used = 0;
+    uint64_t rows = 0;
+    bool error = false;      // a batch could not be written, so the column is incomplete
+};
+
+// Maps space padded 8 byte symbol fields to dense uint32 codes
+class SymbolDictionary {
+public:
+    uint32_t code(const char* symbol_field);
+    bool write(const string& path) const;
+
+private:
+    unordered_map<uint64_t, uint32_t> codes;
+    vector<string> symbols;
+};
+
+class ColumnarWriter {
+public:
+    // Create the _trd and _prl column directories for output_prefix
+    bool open(const string& output_prefix, size_t batch_size);
+    void write_trade(uint64_t capture_time, int64_t send_time, const TradeReport& trade);
+    void write_price_level(uint64_t capture_time, int64_t send_time, uint8_t side, const PriceLevelUpdate& update);
+    // Flush the remaining rows, finalise the headers and write the symbol dictionaries
+    bool close();
+
+    uint64_t trades_written() const { return trade_capture_time.size(); }
+    uint64_t price_levels_written() const { return prl_capture_time.size(); }
+
+private:
+    bool is_open = false;
+    string trades_directory;
+    string prl_directory;
+
+    NpyColumn trade_capture_time, trade_send_time, trade_timestamp, trade_symbol, trade_size, trade_price,
+        trade_id, trade_sale_condition;
+    SymbolDictionary trade_symbols;
+
+    NpyColumn prl_capture_time, prl_send_time, prl_timestamp, prl_side, prl_symbol, prl_price, prl_size,
+        prl_event_flags;
+    SymbolDictionary prl_symbols;
+};
+
+#endif // COLUMN_WRITER_H
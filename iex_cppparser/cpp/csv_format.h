@@ -0,0 +1,34 @@
+#ifndef CSV_FORMAT_H
+#define CSV_FORMAT_H
+
+#include <charconv>
+#include <cstdint>
+#include <string>
+
+using namespace std;
+
+// Allocation free formatting of the numeric CSV fields. Integers go through std::to_chars, and prices are formatted
+// from the fixed point integers sent by IEX instead of through a double, so the output does not depend on the locale.
+
+inline void append_uint(string& out, uint64_t value) {
+    char digits[20];
+    char* end = to_chars(digits, digits + sizeof(digits), value).ptr;
+    out.append(digits, end);
+}
+
+inline void append_int(string& out, int64_t value) {
+    char digits[21];
+    char* end = to_chars(digits, digits + sizeof(digits), value).ptr;
+    out.append(digits, end);
+}
+
+// Append a price with 4 implied decimal places the way to_string(price * 1e-4) prints it, i.e. with six decimals
+inline void append_price(string& out, uint64_t price_raw) {
+    append_uint(out, price_raw / 10000);
+    uint32_t fraction = static_cast<uint32_t>(price_raw % 10000);
+    char decimals[7] = {'.', static_cast<char>('0' + fraction / 1000), static_cast<char>('0' + fraction / 100 % 10),
+                        static_cast<char>('0' + fraction / 10 % 10), static_cast<char>('0' + fraction % 10), '0', '0'};
+    out.append(decimals, sizeof(decimals));
+}
+
+#endif // CSV_FORMAT_H
@@ -6,17 +6,29 @@
 #include <ctime>
 #include <cmath>
 #include <cstdint>
+#include <cstdio>
 #include <cstring>
+
+size_t message_length_at(const char* message_bytes, size_t payload_len, size_t offset) {
+    if (offset + 2 > payload_len) {
+        return 0;
+    }
+    uint16_t length;
+    memcpy(&length, message_bytes + offset, sizeof(length));
+    return length > 0 && offset + 2 + length <= payload_len ? length : 0;
+}
 #include <iomanip>
 #include <string>
 #include "logger.h"
+#include "csv_format.h"
 using namespace std;
 Log logger;
 
 // This file contains functions to decode messages from the binary format used by the IEX DEEP feed.
 // The functions in this file are used by the main program to decode messages and write them to the output file.
-// Currently, the program can decode trade reports and price level updates.
-// You can add additional functions to decode other message types as needed.
+// Trade reports and price level updates go to the main output files, the other DEEP messages to their own files when
+// they are selected with --types (see message_types.h). To decode a new message type, add its append_*_csv function
+// here and an entry for it in OTHER_MESSAGE_TYPES.
 
 // Function to convert trade sale condition flags to a string
 string convert_trade_sale_condition_to_string(char sale_condition_flags) {
@@ -59,158 +71,228 @@ string convert_trade_sale_condition_to_string(char sale_condition_flags) {
     return sale_condition_string;
 }
 
-// Function to parse a trade report message
-pair<string, string> parse_trade_report_message(const vector<char>& payload) {
-    // Input validation - minimum required payload size for trade report
-    if (payload.size() < 38) {
-        cout << "Error: Trade report payload too short (" << payload.size() << " bytes)" << endl;
-        logger.write("Error: Trade report payload too short");
-        return make_pair("", "");
+// Decode a trade report message into a TradeReport. Returns false if the payload is too short.
+bool decode_trade_report(const char* payload, size_t length, TradeReport& trade) {
+    if (length < TRADE_REPORT_MESSAGE_LENGTH) {
+        return false;
     }
+    trade.sale_condition_flags = payload[1];
+    memcpy(&trade.timestamp, payload + 2, sizeof(uint64_t));
+    memcpy(trade.symbol, payload + 10, 8);
+    memcpy(&trade.size, payload + 18, sizeof(uint32_t));
+    memcpy(&trade.price, payload + 22, sizeof(uint64_t));
+    memcpy(&trade.trade_id, payload + 30, sizeof(uint64_t));
+    return true;
+}
 
-    char sale_condition_flags;
-    unsigned long long timestamp_raw;
-    char symbol_raw[8];
-    unsigned int size;
-    unsigned long long price_raw;
-    unsigned long long trade_id;
-
-    // Unpack the data from the payload with bounds checking
-    memcpy(&sale_condition_flags, &payload[1], sizeof(char));
-    memcpy(&timestamp_raw, &payload[2], sizeof(unsigned long long));
-    memcpy(symbol_raw, &payload[10], 8);
-    memcpy(&size, &payload[18], sizeof(unsigned int));
-    memcpy(&price_raw, &payload[22], sizeof(unsigned long long));
-    memcpy(&trade_id, &payload[30], sizeof(unsigned long long));
-
-    // Convert symbol from raw bytes to string with proper null-termination handling
-    string symbol;
-    for (int i = 0; i < 8; i++) {
-        if (symbol_raw[i] == '\0' || symbol_raw[i] == ' ') {
-            break;
-        }
-        symbol += symbol_raw[i];
+// Decode a price level update message into a PriceLevelUpdate. Returns false if the payload is too short.
+bool decode_price_level_update(const char* payload, size_t length, PriceLevelUpdate& update) {
+    if (length < PRICE_LEVEL_UPDATE_MESSAGE_LENGTH) {
+        return false;
     }
-    
-    // Validate symbol is not empty
-    if (symbol.empty()) {
-        cout << "Error: Empty symbol in trade report" << endl;
-        logger.write("Error: Empty symbol in trade report");
-        return make_pair("", "");
+    update.event_flags = payload[1];
+    memcpy(&update.timestamp, payload + 2, sizeof(uint64_t));
+    memcpy(update.symbol, payload + 10, 8);
+    memcpy(&update.size, payload + 18, sizeof(uint32_t));
+    memcpy(&update.price, payload + 22, sizeof(uint64_t));
+    return true;
+}
+
+// Decode a system event message into a SystemEvent. Returns false if the payload is too short.
+bool decode_system_event(const char* payload, size_t length, SystemEvent& event) {
+    if (length < SYSTEM_EVENT_MESSAGE_LENGTH) {
+        return false;
     }
+    event.system_event = payload[1];
+    memcpy(&event.timestamp, payload + 2, sizeof(uint64_t));
+    return true;
+}
 
-    // Calculate price with validation
-    double price = static_cast<double>(price_raw) * 1e-4;
-    
-    // Validate trade data ranges
-    if (price <= 0 || price > 1000000) {
-        cout << "Warning: Unusual price value in trade: " << price << endl;
-        logger.write("Warning: Unusual price value in trade report");
+// Decode a DEEP+ order message into an OrderMessage. Returns false if the payload is too short for its type or the type
+// is not an order message.
+bool decode_order_message(const char* payload, size_t length, OrderMessage& order) {
+    size_t message_length;
+    switch (payload[0]) {
+        case 'a': message_length = ADD_ORDER_MESSAGE_LENGTH; break;
+        case 'M': message_length = ORDER_MODIFY_MESSAGE_LENGTH; break;
+        case 'R': message_length = ORDER_DELETE_MESSAGE_LENGTH; break;
+        case 'L': message_length = ORDER_EXECUTED_MESSAGE_LENGTH; break;
+        case 'C': message_length = CLEAR_BOOK_MESSAGE_LENGTH; break;
+        default: return false;
     }
-    
-    if (size == 0) {
-        cout << "Warning: Zero size trade detected" << endl;
-        logger.write("Warning: Zero size trade detected");
+    if (length < message_length) {
+        return false;
+    }
+    order.type = payload[0];
+    order.flags = payload[1];
+    memcpy(&order.timestamp, payload + 2, sizeof(uint64_t));
+    memcpy(order.symbol, payload + 10, 8);
+    order.order_id = 0;
+    order.size = 0;
+    order.price = 0;
+    order.trade_id = 0;
+    if (message_length >= ORDER_DELETE_MESSAGE_LENGTH) {
+        memcpy(&order.order_id, payload + 18, sizeof(uint64_t));
+    }
+    if (message_length >= ADD_ORDER_MESSAGE_LENGTH) {
+        memcpy(&order.size, payload + 26, sizeof(uint32_t));
+        memcpy(&order.price, payload + 30, sizeof(uint64_t));
     }
+    if (message_length >= ORDER_EXECUTED_MESSAGE_LENGTH) {
+        memcpy(&order.trade_id, payload + 38, sizeof(uint64_t));
+    }
+    return true;
+}
 
-    // Convert sale condition flags to string
-    string saleConditionString = convert_trade_sale_condition_to_string(sale_condition_flags);
+// Convert a space padded symbol field to a string with proper null-termination handling
+string symbol_to_string(const char* symbol_raw) {
+    size_t length = 0;
+    while (length < 8 && symbol_raw[length] != '\0' && symbol_raw[length] != ' ') {
+        length++;
+    }
+    return string(symbol_raw, length);
+}
 
-    // Create the message string
-    string parsed_string = to_string(timestamp_raw) + "," + "T," + symbol + "," + to_string(size) + ","
-                            + to_string(price) + "," + to_string(trade_id) + "," + saleConditionString ;
+// Sale condition strings for every value of the flags byte, built once from convert_trade_sale_condition_to_string
+const string& sale_condition_string(uint8_t sale_condition_flags) {
+    static const vector<string> table = []() {
+        vector<string> strings;
+        for (int flags = 0; flags < 256; ++flags) {
+            strings.push_back(convert_trade_sale_condition_to_string(static_cast<char>(flags)));
+        }
+        return strings;
+    }();
+    return table[sale_condition_flags];
+}
 
-    return make_pair(parsed_string, symbol);
+// Number of characters of a space padded symbol field
+size_t symbol_length(const char* symbol_raw) {
+    size_t length = 0;
+    while (length < 8 && symbol_raw[length] != '\0' && symbol_raw[length] != ' ') {
+        length++;
+    }
+    return length;
 }
 
-// Function to parse a price level update message
-pair<string, string> parse_price_level_update(const vector<char>& payload) {
-    // Input validation - minimum required payload size
-    if (payload.size() < 26) {
-        cout << "Error: Price level update payload too short (" << payload.size() << " bytes)" << endl;
-        logger.write("Error: Price level update payload too short");
-        return make_pair("", "");
+// Append the CSV fields of a trade report: timestamp,T,symbol,size,price,trade id,sale condition
+bool append_trade_report_csv(string& out, const char* payload, size_t length) {
+    // Input validation - minimum required payload size for trade report
+    TradeReport trade;
+    if (!decode_trade_report(payload, length, trade)) {
+        logger.warn(LOG_SHORT_PAYLOAD, "Error: Trade report payload too short (" + to_string(length) + " bytes)");
+        return false;
     }
 
-    char event_flags;
-    uint64_t timestamp_raw;
-    char symbol_raw[8];
-    uint32_t size;
-    uint32_t price_raw;  // Fixed: Changed from int32_t to uint32_t to match memcpy size
+    size_t symbol_len = symbol_length(trade.symbol);
 
-    // Unpack the data from the payload with bounds checking
-    memcpy(&event_flags, &payload[1], sizeof(char));
-    memcpy(&timestamp_raw, &payload[2], sizeof(uint64_t));
-    memcpy(symbol_raw, &payload[10], sizeof(symbol_raw));
-    memcpy(&size, &payload[18], sizeof(uint32_t));
-    memcpy(&price_raw, &payload[22], sizeof(uint32_t));  // Fixed: Now consistent with declaration
+    // Validate symbol is not empty
+    if (symbol_len == 0) {
+        logger.warn(LOG_EMPTY_SYMBOL, "Error: Empty symbol in trade report");
+        return false;
+    }
 
-    // Convert price from raw to double with validation
-    double price = static_cast<double>(price_raw) * 1e-4;
-    
-    // Validate price range (reasonable bounds for financial data)
-    if (price < 0 || price > 1000000) {
-        cout << "Warning: Unusual price value: " << price << endl;
-        logger.write("Warning: Unusual price value detected");
+    // Validate trade data ranges (prices have 4 implied decimals, so 1000000 dollars is 10^10)
+    if (trade.price == 0 || trade.price > 10000000000ULL) {
+        string message = "Warning: Unusual price value in trade: ";
+        append_price(message, trade.price);
+        logger.warn(LOG_UNUSUAL_PRICE, message);
     }
 
-    // Convert symbol from raw bytes to string with proper null-termination handling
-    string symbol;
-    for (int i = 0; i < 8; i++) {
-        if (symbol_raw[i] == '\0' || symbol_raw[i] == ' ') {
-            break;
-        }
-        symbol += symbol_raw[i];
+    if (trade.size == 0) {
+        logger.warn(LOG_ZERO_SIZE_TRADE, "Warning: Zero size trade detected");
     }
-    
-    // Validate symbol is not empty
-    if (symbol.empty()) {
-        cout << "Error: Empty symbol in price level update" << endl;
-        logger.write("Error: Empty symbol in price level update");
-        return make_pair("", "");
+
+    append_uint(out, trade.timestamp);
+    out += ",T,";
+    out.append(trade.symbol, symbol_len);
+    out += ',';
+    append_uint(out, trade.size);
+    out += ',';
+    append_price(out, trade.price);
+    out += ',';
+    append_uint(out, trade.trade_id);
+    out += ',';
+    out += sale_condition_string(static_cast<uint8_t>(trade.sale_condition_flags));
+    return true;
+}
+
+// Append the CSV fields of a price level update: timestamp,PRL,symbol,price,size,record type,event flag
+bool append_price_level_update_csv(string& out, const char* payload, size_t length) {
+    // Input validation - minimum required payload size
+    PriceLevelUpdate update;
+    if (!decode_price_level_update(payload, length, update)) {
+        logger.warn(LOG_SHORT_PAYLOAD, "Error: Price level update payload too short (" + to_string(length) + " bytes)");
+        return false;
     }
 
-    // Determine record type based on size
-    string record_type;
-    if (size == 0) {
-        record_type = "Z";
-    } else {
-        record_type = "R";
+    // Validate price range (reasonable bounds for financial data)
+    if (update.price > 10000000000ULL) {
+        string message = "Warning: Unusual price value: ";
+        append_price(message, update.price);
+        logger.warn(LOG_UNUSUAL_PRICE, message);
     }
 
-    // Check event flags and construct event output string with better error handling
-    string flag;
-    if (event_flags == '\x01') {
-        flag = "1";
-    } else if (event_flags == '\x00') {
-        flag = "0";
-    } else {
+    size_t symbol_len = symbol_length(update.symbol);
+
+    // Validate symbol is not empty
+    if (symbol_len == 0) {
+        logger.warn(LOG_EMPTY_SYMBOL, "Error: Empty symbol in price level update");
+        return false;
+    }
+
+    // Check event flags with better error handling
+    char flag = '0';
+    if (update.event_flags == '\x01') {
+        flag = '1';
+    } else if (update.event_flags != '\x00') {
         // Handle unexpected event flags more gracefully
-        cout << "Warning: Unexpected event flag (0x" << hex << static_cast<int>(event_flags) << ") in price level update, treating as flag 0" << dec << endl;
-        logger.write("Warning: Unexpected event flag in price level update message");
-        flag = "0";  // Default to flag 0 instead of failing
+        char flag_hex[8];
+        snprintf(flag_hex, sizeof(flag_hex), "0x%x", static_cast<unsigned char>(update.event_flags));
+        logger.warn(LOG_UNEXPECTED_EVENT_FLAG, string("Warning: Unexpected event flag (") + flag_hex + ") in price level update, treating as flag 0");
     }
-    
-    string event_output_string = to_string(timestamp_raw) + "," + "PRL," + symbol + "," + to_string(price) + ","
-                                  + to_string(size) + "," + record_type + "," + flag;
-    return make_pair(event_output_string, symbol);
+
+    append_uint(out, update.timestamp);
+    out += ",PRL,";
+    out.append(update.symbol, symbol_len);
+    out += ',';
+    append_price(out, update.price);
+    out += ',';
+    append_uint(out, update.size);
+    // Record type: Z when the price level is removed (size 0), R otherwise
+    out += update.size == 0 ? ",Z," : ",R,";
+    out += flag;
+    return true;
+}
+
+// Function to parse a trade report message
+pair<string, string> parse_trade_report_message(const char* payload, size_t length) {
+    string parsed_string;
+    if (!append_trade_report_csv(parsed_string, payload, length)) {
+        return make_pair("", "");
+    }
+    return make_pair(parsed_string, symbol_to_string(payload + 10));
+}
+
+// Function to parse a price level update message
+pair<string, string> parse_price_level_update(const char* payload, size_t length) {
+    string parsed_string;
+    if (!append_price_level_update_csv(parsed_string, payload, length)) {
+        return make_pair("", "");
+    }
+    return make_pair(parsed_string, symbol_to_string(payload + 10));
 }
 
 // Function to parse a system event message
-char parse_system_event_message(const vector<char>& payload) {
+char parse_system_event_message(const char* payload, size_t length) {
     // Input validation - minimum required payload size for system event
-    if (payload.size() < 10) {
-        cout << "Error: System event payload too short (" << payload.size() << " bytes)" << endl;
-        logger.write("Error: System event payload too short");
+    SystemEvent event;
+    if (!decode_system_event(payload, length, event)) {
+        logger.warn(LOG_SHORT_PAYLOAD, "Error: System event payload too short (" + to_string(length) + " bytes)");
         return '\0';
     }
 
-    char system_event;
-    uint64_t timestamp_raw;
-
-    // Unpack the data from the payload with bounds checking
-    memcpy(&system_event, &payload[1], sizeof(char));
-    memcpy(&timestamp_raw, &payload[2], sizeof(uint64_t));
+    char system_event = event.system_event;
+    uint64_t timestamp_raw = event.timestamp;
 
     // Log the system event for debugging
     cout << "System Event: '" << system_event << "' (0x" << hex << static_cast<int>(system_event) << ") at timestamp " << dec << timestamp_raw << endl;
@@ -243,4 +325,235 @@ char parse_system_event_message(const vector<char>& payload) {
     return system_event;
 }
 
-// If you want to parse a different message type, you can add a new function here
+// Append the timestamp, message type and symbol fields that start the rows of the other DEEP messages.
+// Returns false, and appends nothing, if the payload is shorter than the message.
+static bool append_message_start(string& out, const char* payload, size_t length, size_t message_length, const char* name, bool has_symbol) {
+    if (length < message_length) {
+        logger.warn(LOG_SHORT_PAYLOAD, string("Error: ") + name + " payload too short (" + to_string(length) + " bytes)");
+        return false;
+    }
+    uint64_t timestamp;
+    memcpy(&timestamp, payload + 2, sizeof(uint64_t));
+    append_uint(out, timestamp);
+    out += ',';
+    out += payload[0];
+    if (has_symbol) {
+        out += ',';
+        out.append(payload + 10, symbol_length(payload + 10));
+    }
+    return true;
+}
+
+// Append a one character code field, or nothing for a space or NUL
+static void append_code(string& out, char code) {
+    out += ',';
+    if (code != ' ' && code != '\0') {
+        out += code;
+    }
+}
+
+static void append_uint32_at(string& out, const char* field) {
+    uint32_t value;
+    memcpy(&value, field, sizeof(uint32_t));
+    out += ',';
+    append_uint(out, value);
+}
+
+static void append_price_at(string& out, const char* field) {
+    uint64_t price;
+    memcpy(&price, field, sizeof(uint64_t));
+    out += ',';
+    append_price(out, price);
+}
+
+// System event: timestamp,S,system event
+bool append_system_event_csv(string& out, const char* payload, size_t length) {
+    if (!append_message_start(out, payload, length, SYSTEM_EVENT_MESSAGE_LENGTH, "System event", false)) {
+        return false;
+    }
+    append_code(out, payload[1]);
+    return true;
+}
+
+// Security directory: timestamp,D,symbol,round lot size,adjusted POC price,LULD tier,flags
+bool append_security_directory_csv(string& out, const char* payload, size_t length) {
+    if (!append_message_start(out, payload, length, SECURITY_DIRECTORY_MESSAGE_LENGTH, "Security directory", true)) {
+        return false;
+    }
+    append_uint32_at(out, payload + 18);
+    append_price_at(out, payload + 22);
+    out += ',';
+    append_uint(out, static_cast<uint8_t>(payload[30]));
+    // Flags: test security, when issued security and ETP, separated by '|'
+    uint8_t flags = static_cast<uint8_t>(payload[1]);
+    out += ',';
+    const char* separator = "";
+    if (flags & 0x80) {
+        out += "TEST";
+        separator = "|";
+    }
+    if (flags & 0x40) {
+        out += separator;
+        out += "WHEN_ISSUED";
+        separator = "|";
+    }
+    if (flags & 0x20) {
+        out += separator;
+        out += "ETP";
+    }
+    return true;
+}
+
+// Trading status: timestamp,H,symbol,status,reason
+bool append_trading_status_csv(string& out, const char* payload, size_t length) {
+    if (!append_message_start(out, payload, length, TRADING_STATUS_MESSAGE_LENGTH, "Trading status", true)) {
+        return false;
+    }
+    append_code(out, payload[1]);
+    // The reason is a space padded 4 character code, e.g. "T1" for a news pending halt
+    out += ',';
+    size_t reason_length = 0;
+    while (reason_length < 4 && payload[18 + reason_length] != ' ' && payload[18 + reason_length] != '\0') {
+        reason_length++;
+    }
+    out.append(payload + 18, reason_length);
+    return true;
+}
+
+// Operational halt status: timestamp,O,symbol,status
+bool append_operational_halt_status_csv(string& out, const char* payload, size_t length) {
+    if (!append_message_start(out, payload, length, OPERATIONAL_HALT_STATUS_MESSAGE_LENGTH, "Operational halt status", true)) {
+        return false;
+    }
+    append_code(out, payload[1]);
+    return true;
+}
+
+// Short sale price test status: timestamp,P,symbol,in effect (0 or 1),detail
+bool append_short_sale_price_test_status_csv(string& out, const char* payload, size_t length) {
+    if (!append_message_start(out, payload, length, SHORT_SALE_PRICE_TEST_STATUS_MESSAGE_LENGTH, "Short sale price test status", true)) {
+        return false;
+    }
+    out += payload[1] != '\0' ? ",1" : ",0";
+    append_code(out, payload[18]);
+    return true;
+}
+
+// Security event: timestamp,E,symbol,security event
+bool append_security_event_csv(string& out, const char* payload, size_t length) {
+    if (!append_message_start(out, payload, length, SECURITY_EVENT_MESSAGE_LENGTH, "Security event", true)) {
+        return false;
+    }
+    append_code(out, payload[1]);
+    return true;
+}
+
+// Retail liquidity indicator: timestamp,I,symbol,indicator (empty when there is no retail interest)
+bool append_retail_liquidity_indicator_csv(string& out, const char* payload, size_t length) {
+    if (!append_message_start(out, payload, length, RETAIL_LIQUIDITY_INDICATOR_MESSAGE_LENGTH, "Retail liquidity indicator", true)) {
+        return false;
+    }
+    append_code(out, payload[1]);
+    return true;
+}
+
+// Official price: timestamp,X,symbol,price type,price
+bool append_official_price_csv(string& out, const char* payload, size_t length) {
+    if (!append_message_start(out, payload, length, OFFICIAL_PRICE_MESSAGE_LENGTH, "Official price", true)) {
+        return false;
+    }
+    append_code(out, payload[1]);
+    append_price_at(out, payload + 18);
+    return true;
+}
+
+// Trade break, which has the layout of a trade report: timestamp,B,symbol,size,price,trade id,sale condition
+bool append_trade_break_csv(string& out, const char* payload, size_t length) {
+    if (!append_message_start(out, payload, length, TRADE_BREAK_MESSAGE_LENGTH, "Trade break", true)) {
+        return false;
+    }
+    append_uint32_at(out, payload + 18);
+    append_price_at(out, payload + 22);
+    uint64_t trade_id;
+    memcpy(&trade_id, payload + 30, sizeof(uint64_t));
+    out += ',';
+    append_uint(out, trade_id);
+    out += ',';
+    out += sale_condition_string(static_cast<uint8_t>(payload[1]));
+    return true;
+}
+
+// Auction information: timestamp,A,symbol,auction type,paired shares,reference price,indicative clearing price,
+// imbalance shares,imbalance side,extension number,scheduled auction time,auction book clearing price,
+// collar reference price,lower auction collar,upper auction collar
+bool append_auction_information_csv(string& out, const char* payload, size_t length) {
+    if (!append_message_start(out, payload, length, AUCTION_INFORMATION_MESSAGE_LENGTH, "Auction information", true)) {
+        return false;
+    }
+    append_code(out, payload[1]);
+    append_uint32_at(out, payload + 18);
+    append_price_at(out, payload + 22);
+    append_price_at(out, payload + 30);
+    append_uint32_at(out, payload + 38);
+    append_code(out, payload[42]);
+    out += ',';
+    append_uint(out, static_cast<uint8_t>(payload[43]));
+    // Seconds since epoch
+    append_uint32_at(out, payload + 44);
+    append_price_at(out, payload + 48);
+    append_price_at(out, payload + 56);
+    append_price_at(out, payload + 64);
+    append_price_at(out, payload + 72);
+    return true;
+}
+
+// DEEP+ order event: timestamp,type,symbol,side,order id,size,price,trade id,flags. Empty fields for the fields a
+// message type does not have, e.g. everything after the symbol of a clear book.
+bool append_order_event_csv(string& out, const char* payload, size_t length) {
+    OrderMessage order;
+    if (!decode_order_message(payload, length, order)) {
+        logger.warn(LOG_SHORT_PAYLOAD, string("Error: Order message '") + payload[0] + "' payload too short (" + to_string(length) + " bytes)");
+        return false;
+    }
+    size_t symbol_len = symbol_length(order.symbol);
+    if (symbol_len == 0) {
+        logger.warn(LOG_EMPTY_SYMBOL, "Error: Empty symbol in order message");
+        return false;
+    }
+
+    append_uint(out, order.timestamp);
+    out += ',';
+    out += order.type;
+    out += ',';
+    out.append(order.symbol, symbol_len);
+    if (order.type == 'C') {
+        out += ",,,,,,";
+        return true;
+    }
+    // Side: 0 for bids ('8'), 1 for asks ('5'), as the Buy_Ask flag of the price level updates
+    if (order.type == 'a') {
+        out += order.flags == '5' ? ",1," : ",0,";
+    } else {
+        out += ",,";
+    }
+    append_uint(out, order.order_id);
+    out += ',';
+    if (order.type != 'R') {
+        append_uint(out, order.size);
+        out += ',';
+        append_price(out, order.price);
+    } else {
+        out += ',';
+    }
+    out += ',';
+    if (order.type == 'L') {
+        append_uint(out, order.trade_id);
+        out += ',';
+        out += sale_condition_string(static_cast<uint8_t>(order.flags));
+    } else if (order.type == 'M') {
+        out += (order.flags & MODIFY_MAINTAIN_PRIORITY) ? ",MAINTAIN_PRIORITY" : ",RESET_PRIORITY";
+    } else {
+        out += ',';
+    }
+    return true;
+}
@@ -3,12 +3,110 @@
 
 #include <vector>
 #include <string>
+#include <cstdint>
+#include <cstddef>
 #include <utility> // For std::pair
 
 using namespace std;
 
-pair<string, string> parse_trade_report_message(const vector<char>& payload);
+// Decoded messages. The decode_* functions fill these straight from the message bytes, without any allocation.
+// Prices are kept as the fixed point integers sent by IEX (4 implied decimal places).
+
+struct TradeReport {
+    char sale_condition_flags;
+    uint64_t timestamp;
+    char symbol[8];          // space padded, not null terminated
+    uint32_t size;
+    uint64_t price;
+    uint64_t trade_id;
+};
+
+struct PriceLevelUpdate {
+    char event_flags;
+    uint64_t timestamp;
+    char symbol[8];          // space padded, not null terminated
+    uint32_t size;
+    uint64_t price;
+};
+
+struct SystemEvent {
+    char system_event;
+    uint64_t timestamp;
+};
+
+// DEEP+ order message ('a', 'M', 'R', 'L' or 'C'). Fields a message type does not have are 0.
+struct OrderMessage {
+    char type;
+    char flags;              // side of an add ('8' or '5'), modify flags, or sale condition flags of an execution
+    uint64_t timestamp;
+    char symbol[8];          // space padded, not null terminated
+    uint64_t order_id;
+    uint32_t size;           // size of an add, new size of a modify, executed size
+    uint64_t price;          // booked price, or executed price of an execution
+    uint64_t trade_id;
+};
+
+// Message sizes as defined by the DEEP specification
+const size_t TRADE_REPORT_MESSAGE_LENGTH = 38;
+const size_t PRICE_LEVEL_UPDATE_MESSAGE_LENGTH = 30;
+const size_t SYSTEM_EVENT_MESSAGE_LENGTH = 10;
+const size_t SECURITY_DIRECTORY_MESSAGE_LENGTH = 31;
+const size_t TRADING_STATUS_MESSAGE_LENGTH = 22;
+const size_t OPERATIONAL_HALT_STATUS_MESSAGE_LENGTH = 18;
+const size_t SHORT_SALE_PRICE_TEST_STATUS_MESSAGE_LENGTH = 19;
+const size_t SECURITY_EVENT_MESSAGE_LENGTH = 18;
+const size_t RETAIL_LIQUIDITY_INDICATOR_MESSAGE_LENGTH = 18;
+const size_t OFFICIAL_PRICE_MESSAGE_LENGTH = 26;
+const size_t TRADE_BREAK_MESSAGE_LENGTH = 38;
+const size_t AUCTION_INFORMATION_MESSAGE_LENGTH = 80;
+
+// DEEP+ order messages
+const size_t ADD_ORDER_MESSAGE_LENGTH = 38;
+const size_t ORDER_MODIFY_MESSAGE_LENGTH = 38;
+const size_t ORDER_DELETE_MESSAGE_LENGTH = 26;
+const size_t ORDER_EXECUTED_MESSAGE_LENGTH = 46;
+const size_t CLEAR_BOOK_MESSAGE_LENGTH = 18;
+
+// Bit 0 of the modify flags of an Order Modify message: the order keeps its time priority
+const uint8_t MODIFY_MAINTAIN_PRIORITY = 0x01;
+
+// Length of the message whose length prefix is at offset into the messages of an IEX-TP packet with payload_len bytes
+// of messages. Returns 0 for an empty message or one that runs past the payload, which leaves the rest of the packet
+// unreadable.
+size_t message_length_at(const char* message_bytes, size_t payload_len, size_t offset);
+
+bool decode_trade_report(const char* payload, size_t length, TradeReport& trade);
+bool decode_price_level_update(const char* payload, size_t length, PriceLevelUpdate& update);
+bool decode_system_event(const char* payload, size_t length, SystemEvent& event);
+bool decode_order_message(const char* payload, size_t length, OrderMessage& order);
+string symbol_to_string(const char* symbol_raw);
+size_t symbol_length(const char* symbol_raw);
+
+pair<string, string> parse_trade_report_message(const char* payload, size_t length);
 string convert_trade_sale_condition_to_string(char sale_condition_flags);
-pair<string, string> parse_price_level_update(const vector<char>& payload);
-char parse_system_event_message(const vector<char>& payload);
+const string& sale_condition_string(uint8_t sale_condition_flags);
+
+// Append the CSV fields of a message to out. Nothing is appended and false is returned if the message is invalid.
+bool append_trade_report_csv(string& out, const char* payload, size_t length);
+bool append_price_level_update_csv(string& out, const char* payload, size_t length);
+pair<string, string> parse_price_level_update(const char* payload, size_t length);
+
+// Append the CSV fields of the other DEEP messages: timestamp, message type, symbol (except for system events) and the
+// fields of the message, see OTHER_MESSAGE_TYPES in message_types.cpp for the columns.
+bool append_system_event_csv(string& out, const char* payload, size_t length);
+bool append_security_directory_csv(string& out, const char* payload, size_t length);
+bool append_trading_status_csv(string& out, const char* payload, size_t length);
+bool append_operational_halt_status_csv(string& out, const char* payload, size_t length);
+bool append_short_sale_price_test_status_csv(string& out, const char* payload, size_t length);
+bool append_security_event_csv(string& out, const char* payload, size_t length);
+bool append_retail_liquidity_indicator_csv(string& out, const char* payload, size_t length);
+bool append_official_price_csv(string& out, const char* payload, size_t length);
+bool append_trade_break_csv(string& out, const char* payload, size_t length);
+bool append_auction_information_csv(string& out, const char* payload, size_t length);
+
+// Append the CSV fields of a DEEP+ order message: timestamp,message type,symbol,side,order id,size,price,trade id,flags.
+// Side (0 for bids, 1 for asks) is only known for adds, and the flags are the priority of a modify or the sale condition
+// of an execution.
+bool append_order_event_csv(string& out, const char* payload, size_t length);
+char parse_system_event_message(const char* payload, size_t length);
 #endif // PARSER_H
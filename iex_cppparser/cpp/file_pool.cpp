@@ -0,0 +1,49 @@
+#include "file_pool.h"
+using namespace std;
+
+OutputFile* FileHandlePool::create(uint64_t key, const string& path, const string& header) {
+    Entry& entry = entries[key];
+    entry.path = path;
+    OutputFile* file = open_entry(key, entry, false);
+    if (file == nullptr) {
+        entries.erase(key);
+        return nullptr;
+    }
+    created_paths.push_back(path);
+    file->write(header);
+    return file;
+}
+
+OutputFile* FileHandlePool::open_entry(uint64_t key, Entry& entry, bool append) {
+    // Make room by closing the least recently used file
+    if (open_files >= max_open_files) {
+        uint64_t evicted_key = lru.back();
+        lru.pop_back();
+        Entry& evicted = entries[evicted_key];
+        error = !evicted.file->close() || error;
+        evicted.file.reset();
+        open_files--;
+    }
+
+    unique_ptr<OutputFile> file(new OutputFile(buffer_size));
+    if (!file->open(entry.path, append)) {
+        error = true;
+        return nullptr;
+    }
+    entry.file = std::move(file);
+    lru.push_front(key);
+    entry.lru_position = lru.begin();
+    open_files++;
+    return entry.file.get();
+}
+
+bool FileHandlePool::close_all() {
+    for (uint64_t key : lru) {
+        Entry& entry = entries[key];
+        error = !entry.file->close() || error;
+        entry.file.reset();
+    }
+    lru.clear();
+    open_files = 0;
+    return !error;
+}
@@ -0,0 +1,67 @@
+#ifndef FILE_POOL_H
+#define FILE_POOL_H
+
+#include <cstdint>
+#include <cstddef>
+#include <list>
+#include <memory>
+#include <string>
+#include <unordered_map>
+#include <vector>
+#include "output_file.h"
+
+using namespace std;
+
+// Bounded pool of output files for modes that write many files (one per symbol, one per shard).
+// Files are identified by a 64 bit key, usually the raw 8 byte symbol field. At most max_open_files are open at a time:
+// opening another one flushes and closes the least recently used file, which is reopened in append mode when it is
+// written to again. This keeps both the file descriptors and the output buffers (one per open file) bounded.
+class FileHandlePool {
+public:
+    explicit FileHandlePool(size_t max_open_files = 256, size_t buffer_size = 64 << 10)
+        : max_open_files(max_open_files < 1 ? 1 : max_open_files), buffer_size(buffer_size) {}
+    ~FileHandlePool() { close_all(); }
+
+    // Return the file for key, reopening it if it was closed. Returns nullptr if the key has no file yet.
+    OutputFile* get(uint64_t key) {
+        auto found = entries.find(key);
+        if (found == entries.end()) {
+            return nullptr;
+        }
+        Entry& entry = found->second;
+        if (entry.file) {
+            // Move to the front of the LRU list
+            lru.splice(lru.begin(), lru, entry.lru_position);
+            return entry.file.get();
+        }
+        return open_entry(key, entry, true);
+    }
+
+    // Create the file for key at path and write the header. Returns nullptr if the file cannot be created.
+    OutputFile* create(uint64_t key, const string& path, const string& header);
+
+    // Flush and close every open file. Returns false if any write failed.
+    bool close_all();
+
+    // Paths of all files created, in creation order
+    const vector<string>& paths() const { return created_paths; }
+
+private:
+    struct Entry {
+        string path;
+        unique_ptr<OutputFile> file;   // null while closed
+        list<uint64_t>::iterator lru_position;
+    };
+
+    OutputFile* open_entry(uint64_t key, Entry& entry, bool append);
+
+    size_t max_open_files;
+    size_t buffer_size;
+    size_t open_files = 0;
+    bool error = false;
+    unordered_map<uint64_t, Entry> entries;
+    list<uint64_t> lru;              // keys of open files, most recently used first
+    vector<string> created_paths;
+};
+
+#endif // FILE_POOL_H
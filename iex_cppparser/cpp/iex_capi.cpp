@@ -0,0 +1,178 @@
+#include "iex_capi.h"
+#include <cstring>
+#include <string>
+#include "decode_messages.h"
+#include "pcap_reader.h"
+#include "symbol_filter.h"
+using namespace std;
+
+// Record reader behind the C interface. It walks the same packet layout as BasicPcapParser in the parser binaries
+// (42 bytes of Ethernet, IP and UDP headers, the 40 byte IEX header, then length prefixed messages), but keeps its
+// position inside the current packet so it can stop as soon as an output array is full and resume on the next call.
+struct IexReader {
+    PcapReader pcap_reader;
+    SymbolFilter symbol_filter;
+    bool filter_symbols = false;
+    int types = 0;
+
+    // Current packet
+    const char* message_bytes = nullptr;
+    size_t payload_len = 0;
+    size_t cur_offset = 0;
+    size_t messages_left = 0;
+    int64_t capture_time = 0;
+    int64_t send_time = 0;
+    bool finished = false;
+
+    // Load the next packet that carries IEX messages. Returns false at the end of the capture.
+    bool next_packet() {
+        PcapPacketHeader header;
+        const char* packet_data;
+        while ((packet_data = pcap_reader.next_packet(header)) != nullptr) {
+            if (header.incl_len < 42 + 40) {
+                continue;
+            }
+            const char* iex_payload = packet_data + 42;
+            uint16_t header_payload_len;
+            uint16_t message_count;
+            memcpy(&header_payload_len, iex_payload + 12, 2);
+            memcpy(&message_count, iex_payload + 14, 2);
+            memcpy(&send_time, iex_payload + 32, 8);
+            if (header.incl_len - 42 != static_cast<size_t>(header_payload_len) + 40 || message_count == 0) {
+                continue;
+            }
+            // Same capture time arithmetic as the parser binaries, so both outputs agree
+            capture_time = static_cast<uint64_t>((header.ts_sec * 1e9) + (header.ts_usec * 1e3));
+            message_bytes = iex_payload + 40;
+            payload_len = header_payload_len;
+            cur_offset = 0;
+            messages_left = message_count;
+            return true;
+        }
+        return false;
+    }
+};
+
+// Copy a space padded symbol field, null padding it so NumPy strips it
+static void copy_symbol(char* dst, const char* symbol_field) {
+    for (size_t i = 0; i < 8; ++i) {
+        dst[i] = symbol_field[i] == ' ' ? '\0' : symbol_field[i];
+    }
+}
+
+extern "C" {
+
+void* iex_reader_open(const char* path, int types) {
+    IexReader* reader = new IexReader();
+    if (!reader->pcap_reader.open(path)) {
+        delete reader;
+        return nullptr;
+    }
+    reader->types = types;
+    return reader;
+}
+
+int iex_reader_add_symbol(void* handle, const char* symbol) {
+    IexReader* reader = static_cast<IexReader*>(handle);
+    reader->filter_symbols = true;
+    return reader->symbol_filter.add(symbol) ? 1 : 0;
+}
+
+int iex_reader_next(void* handle, IexTradeRecord* trades, size_t trade_capacity, size_t* num_trades,
+                    IexPriceLevelRecord* price_levels, size_t price_level_capacity, size_t* num_price_levels) {
+    IexReader* reader = static_cast<IexReader*>(handle);
+    size_t trade_count = 0;
+    size_t price_level_count = 0;
+    bool want_trades = (reader->types & IEX_TYPE_TRADES) != 0 && trade_capacity > 0;
+    bool want_price_levels = (reader->types & IEX_TYPE_PRICE_LEVELS) != 0 && price_level_capacity > 0;
+    // Stop as soon as the array of any requested type is full
+    auto full = [&]() {
+        return (want_trades && trade_count == trade_capacity) || (want_price_levels && price_level_count == price_level_capacity);
+    };
+    if (!want_trades && !want_price_levels) {
+        reader->finished = true;
+    }
+
+    while (!reader->finished && !full()) {
+        if (reader->messages_left == 0 && !reader->next_packet()) {
+            reader->finished = true;
+            break;
+        }
+
+        // Decode the remaining messages of the packet until an output array is full
+        while (reader->messages_left > 0 && !full()) {
+            if (reader->cur_offset + 2 > reader->payload_len) {
+                reader->messages_left = 0;
+                break;
+            }
+            uint16_t message_len;
+            memcpy(&message_len, reader->message_bytes + reader->cur_offset, 2);
+            const char* message_payload = reader->message_bytes + reader->cur_offset + 2;
+            reader->cur_offset += 2 + message_len;
+            reader->messages_left--;
+            if (message_len == 0 || reader->cur_offset > reader->payload_len) {
+                reader->messages_left = 0;
+                break;
+            }
+
+            char message_type_byte = message_payload[0];
+            bool is_trade = message_type_byte == 'T' && want_trades;
+            bool is_price_level = (message_type_byte == '8' || message_type_byte == '5') && want_price_levels;
+            if (!is_trade && !is_price_level) {
+                continue;
+            }
+            if (reader->filter_symbols && !reader->symbol_filter.accepts(message_payload, message_len)) {
+                continue;
+            }
+
+            if (is_trade) {
+                TradeReport trade;
+                if (!decode_trade_report(message_payload, message_len, trade)) {
+                    continue;
+                }
+                IexTradeRecord& record = trades[trade_count++];
+                record.capture_time = reader->capture_time;
+                record.send_time = reader->send_time;
+                record.timestamp = static_cast<int64_t>(trade.timestamp);
+                record.price = static_cast<int64_t>(trade.price);
+                record.trade_id = static_cast<int64_t>(trade.trade_id);
+                copy_symbol(record.symbol, trade.symbol);
+                record.size = trade.size;
+                record.sale_condition = static_cast<uint8_t>(trade.sale_condition_flags);
+                memset(record.padding, 0, sizeof(record.padding));
+            } else {
+                PriceLevelUpdate update;
+                if (!decode_price_level_update(message_payload, message_len, update)) {
+                    continue;
+                }
+                IexPriceLevelRecord& record = price_levels[price_level_count++];
+                record.capture_time = reader->capture_time;
+                record.send_time = reader->send_time;
+                record.timestamp = static_cast<int64_t>(update.timestamp);
+                record.price = static_cast<int64_t>(update.price);
+                copy_symbol(record.symbol, update.symbol);
+                record.size = update.size;
+                record.side = message_type_byte == '5' ? 1 : 0;
+                record.event_flags = static_cast<uint8_t>(update.event_flags);
+                memset(record.padding, 0, sizeof(record.padding));
+            }
+        }
+    }
+
+    *num_trades = trade_count;
+    *num_price_levels = price_level_count;
+    if (reader->pcap_reader.failed()) {
+        return -1;
+    }
+    return reader->finished ? 0 : 1;
+}
+
+void iex_reader_close(void* handle) {
+    IexReader* reader = static_cast<IexReader*>(handle);
+    if (reader != nullptr) {
+        reader->pcap_reader.close();
+        delete reader;
+    }
+}
+
+}
@@ -0,0 +1,60 @@
+#ifndef IEX_CAPI_H
+#define IEX_CAPI_H
+
+#include <cstdint>
+#include <cstddef>
+
+// C interface of libiexparser.so, used from Python through ctypes (see iex_cppparser/batches.py).
+// A reader decodes trade reports and price level updates into caller provided arrays of fixed size records,
+// so records can be streamed into NumPy structured arrays without writing or formatting any text.
+// The record layouts below are mirrored by the NumPy dtypes in batches.py and must be kept in sync.
+
+extern "C" {
+
+// Message type selection for iex_reader_open
+const int IEX_TYPE_TRADES = 1;
+const int IEX_TYPE_PRICE_LEVELS = 2;
+
+struct IexTradeRecord {
+    int64_t capture_time;     // packet capture time in nanoseconds since epoch
+    int64_t send_time;        // IEX send time in nanoseconds since epoch
+    int64_t timestamp;        // exchange timestamp in nanoseconds since epoch
+    int64_t price;            // fixed point, 4 implied decimals
+    int64_t trade_id;
+    char symbol[8];           // null padded
+    uint32_t size;
+    uint8_t sale_condition;   // raw sale condition flags
+    uint8_t padding[3];
+};
+
+struct IexPriceLevelRecord {
+    int64_t capture_time;
+    int64_t send_time;
+    int64_t timestamp;
+    int64_t price;            // fixed point, 4 implied decimals
+    char symbol[8];           // null padded
+    uint32_t size;
+    uint8_t side;             // 0 for bid, 1 for ask
+    uint8_t event_flags;
+    uint8_t padding[2];
+};
+
+// Open a capture (.pcap.gz, .pcap or pcap-ng). types is a combination of IEX_TYPE_* flags.
+// Returns nullptr if the file cannot be opened.
+void* iex_reader_open(const char* path, int types);
+
+// Restrict the reader to a symbol. Without any symbols all symbols are returned.
+int iex_reader_add_symbol(void* reader, const char* symbol);
+
+// Decode records until one of the arrays is full or the capture ends. The number of records written to each
+// array is stored in num_trades and num_price_levels. Returns 1 while more records may follow, 0 at the end of the
+// capture and -1 on a read or decompression error.
+int iex_reader_next(void* reader, IexTradeRecord* trades, size_t trade_capacity, size_t* num_trades,
+                    IexPriceLevelRecord* price_levels, size_t price_level_capacity, size_t* num_price_levels);
+
+// Stop the reader thread and release the reader. Safe to call before the end of the capture.
+void iex_reader_close(void* reader);
+
+}
+
+#endif // IEX_CAPI_H
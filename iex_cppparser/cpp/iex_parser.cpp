@@ -11,6 +11,8 @@
 #include <algorithm>
 #include "logger.h"
 #include "decode_messages.h"
+#include "pcap_reader.h"
+#include "symbol_filter.h"
 #include <typeinfo>
 using namespace std;
 
@@ -20,7 +22,7 @@ using namespace std;
 // The program also writes the packet capture time and send time for each message to the output files.  
 // There are two main things that need parsing: the PCAP header and the IEX payload.
 // The PCAP header is 16 bytes long and contains the timestamp and the length of the packet.
-// The parsing of the PCAP header is implemented in the unpackPcapPacketHeader function.
+// Reading the (gzip compressed) PCAP file and unpacking the PCAP headers is implemented by PcapReader in pcap_reader.h.
 // The IEX payload contains the IEX header and the messages. The IEX header contains the payload length, send time of the packet and the number of messages.
 // The main ]-parsing logic is implemented in the parse_iex_payload and parse_iex_message functions.
 // The parse_iex_message function uses the decode_messages.h functions to parse the trade reports and price level updates.
@@ -33,29 +35,21 @@ private:
     string output_filename;
     string symbols_of_interest_file;
     int cur_packet_message_count;
+    int num_packets = 0;
     // int total_num_messages_processed;
-    std::fstream symbols_file;
     string trade_messages = "";
     string prl_messages = "";
     ofstream output_filenames;
     time_t start_parse_time;
     time_t stop_parse_time;
     string message_buffer = "";
-    ifstream input_file;
+    PcapReader pcap_reader;
     Log logger;
-    std::vector<std::string> symbols_list;
-    vector<int> symbols_of_interest_indices;
+    SymbolFilter symbol_filter;
     ofstream trades_output_file;
     ofstream prl_output_file;
     bool end_of_session_received = false;  // Track if we've received 'C' (End of Messages)
     
-    struct PcapPacketHeader {
-        uint32_t ts_sec;
-        uint32_t ts_usec;
-        uint32_t incl_len;
-        uint32_t orig_len;
-    };
-    
 public:
     BasicPcapParser(std::string filename, std::string output_filename, std::string symbols_of_interest_file) : filename(filename), output_filename(output_filename),symbols_of_interest_file(symbols_of_interest_file) {
     // Initialization of variables
@@ -63,64 +57,36 @@ public:
         // total_num_messages_processed = 0;
     }
 
-    // Function to unpack the pcap packet header
-    void unpackPcapPacketHeader(const std::vector<uint8_t>& buffer, PcapPacketHeader& header) {
-        if (buffer.size() < sizeof(PcapPacketHeader)) {
-            cerr << "Error: Insufficient data in buffer for unpacking." << endl;
-            return;
-        }
-
-        memcpy(&header, buffer.data(), sizeof(PcapPacketHeader));
-    }
 
 
     // Function to parse the pcap file  
 
     int parse(int max_packets_to_parse) {
-        // Open the input file
-        input_file.open(filename, ios::binary);
-
+        // Open the input file. PcapReader decompresses gzip files itself and reads the pcap global header.
         // Check if the file is opened successfully
-        if (!input_file.is_open()) {
+        if (!pcap_reader.open(filename)) {
             cerr << "Error: Unable to open file " << filename << endl;
             return -1;
         }
 
         
-        symbols_file.open(symbols_of_interest_file, std::ios::in); // open file in read mode
-        if (symbols_of_interest_file=="ALL")
-        {
-            cout << "Parsing all symbols" << endl;
-            symbols_list = {};
-        }
-        else if (symbols_file.is_open()) {
-            
-            std::string line;
-
-            while (std::getline(symbols_file, line)) { // read each line from the file
-                symbols_list.push_back(line.substr(0, line.size())); // add the line to the vector without the newline character
-            }
-
-            std::cout << "Read " << symbols_list.size() << " symbols from the file.\n";
-
-            symbols_file.close(); // don't forget to close the file when you're done
-        } else {
+        // Load the symbols of interest into a hash set keyed by the raw 8 byte symbol field
+        if (!symbol_filter.load(symbols_of_interest_file)) {
             std::cout << "Error opening symbols of interest file";
             return -1;
         }
-
-        symbols_of_interest_indices = get_symbol_first_letter_indices(symbols_list);
+        if (symbol_filter.accepts_all()) {
+            cout << "Parsing all symbols" << endl;
+        } else {
+            std::cout << "Read " << symbol_filter.size() << " symbols from the file.\n";
+        }
 
         // Get the current time as the start time for parsing
         start_parse_time = time(nullptr);
         cout << "Starting parsing @ " << put_time(std::localtime(&start_parse_time), "%c") << endl;
         logger.write("Started parsing");
 
-        // Skip the pcap global header which is 24 bytes long
-        int pcap_global_header_len = 24;
-        input_file.ignore(pcap_global_header_len);
-
-        int num_packets = 0;
+        num_packets = 0;
 
         // Open a file to store output filenames
         output_filenames.open(output_filename + ".txt");
@@ -159,7 +125,7 @@ public:
                 double parsing_time = difftime(stop_parse_time, start_parse_time);
                 cout << "Parsed in " << parsing_time << " seconds" << endl;
                 cout << "Closing all output files" << endl;
-                input_file.close();
+                pcap_reader.close();
                 return 0; // Successful completion
             }
 
@@ -184,7 +150,7 @@ public:
                     cout << "Closing all output files" << endl;
                     //close_all_files();
                 }
-                input_file.close();
+                pcap_reader.close();
                 return 0; // Successful completion
             }
 
@@ -208,28 +174,28 @@ public:
         prl_output_file << prl_messages;
         trades_output_file.close();
         prl_output_file.close();
-        input_file.close();
+        pcap_reader.close();
         return 0; // Successful completion
     }
 
 
     // Read a packet from the input file
     double read_packet() {
-        // Length of the packet header in bytes
-        int packet_header_len = 4 + 4 + 4 + 4;
-        
         // Check if the input file is open
-        if (!input_file.is_open()) {
+        if (!pcap_reader.is_open()) {
             cerr << "Error: Unable to open file " << filename << endl;
             return 1;
         }
 
-        char packet_header[16];
-        // Read the packet header from the input file
-        input_file.read(packet_header, packet_header_len);
+        // Read the next packet and its header from the input file
+        PcapPacketHeader pcap_packet_header;
+        const char* packet_data = pcap_reader.next_packet(pcap_packet_header);
 
-        // Check if we've truly reached end of file (no more data to read)
-        if (input_file.eof() && input_file.gcount() == 0) {
+        // Check if we've reached end of file (no more complete packets to read)
+        if (packet_data == nullptr) {
+            if (pcap_reader.failed()) {
+                logger.write("Error: Failed to read input file, treating as end of file");
+            }
             cout << "End of file reached... terminating!" << endl;
             stop_parse_time = time(nullptr);
             cout << "Stopped parsing @ " << put_time(localtime(&stop_parse_time), "%c") << endl;
@@ -237,25 +203,6 @@ public:
             cout << "Parsed in " << parsing_time << " seconds" << endl;
             return -1;
         }
-        
-        // Handle incomplete packet header (skip and continue)
-        if (input_file.gcount() != 16) {
-            cout << "DEBUG: Incomplete packet header (" << input_file.gcount() << " bytes), EOF flag: " << input_file.eof() << ", fail flag: " << input_file.fail() << endl;
-            logger.write("Warning: Incomplete packet header, skipping packet");
-            
-            // If we're at EOF with some data, this might be the real end
-            if (input_file.eof()) {
-                cout << "DEBUG: EOF detected with partial header, treating as end of file" << endl;
-                return -1; // Signal end of file
-            }
-            
-            // Try to recover by seeking to next potential packet boundary
-            return 0.0; // Return dummy timestamp to continue parsing
-        }
-
-        // Unpack the pcap packet header
-        PcapPacketHeader pcap_packet_header;
-        unpackPcapPacketHeader(std::vector<uint8_t>(packet_header, packet_header + 16), pcap_packet_header);
 
         // Extract timestamp and packet length from the pcap packet header
         auto ts_sec = pcap_packet_header.ts_sec;
@@ -268,12 +215,10 @@ public:
 
         // Skip the Ethernet, IP, and UDP headers to get to the IEX payload. The total length of these headers is 42 bytes.
         int offset_into_iex_payload = 14 + 20 + 8;
-        input_file.ignore(offset_into_iex_payload);
         
         // Check if the packet length is less than 42 bytes
         if (incl_len < 42) {
-            cout << "DEBUG: Invalid packet length: " << incl_len << ", skipping packet" << endl;
-            logger.write("Warning: Invalid packet length, skipping");
+            logger.warn(LOG_MALFORMED_PACKET, "DEBUG: Invalid packet length: " + to_string(incl_len) + ", skipping packet");
             return time_float;
         }
         
@@ -282,26 +227,15 @@ public:
             cout << "DEBUG: Processing packet " << num_packets << ", timestamp: " << time_float << ", length: " << incl_len << endl;
         }
         
-        vector<char> iex_payload(incl_len - 42);
-        input_file.read(iex_payload.data(), incl_len - 42);
-        
-        // Check if we read the expected amount of data
-        if (input_file.gcount() != static_cast<streamsize>(incl_len - 42)) {
-            cout << "DEBUG: Incomplete payload read. Expected: " << (incl_len - 42) << ", got: " << input_file.gcount() << ", EOF: " << input_file.eof() << endl;
-            if (input_file.eof()) {
-                cout << "DEBUG: EOF during payload read, terminating" << endl;
-                return -1;
-            }
-            // Skip this packet and continue
-            return time_float;
-        }
+        // The IEX payload is parsed in place, straight from the packet bytes handed out by pcap_reader
+        const char* iex_payload = packet_data + offset_into_iex_payload;
+        size_t iex_payload_size = incl_len - offset_into_iex_payload;
 
         // Parse the IEX payload with error handling
         try {
-            parse_iex_payload(iex_payload, packet_capture_time_in_nanoseconds);
+            parse_iex_payload(iex_payload, iex_payload_size, packet_capture_time_in_nanoseconds);
         } catch (const exception& e) {
-            cout << "DEBUG: Exception in parse_iex_payload: " << e.what() << ", continuing" << endl;
-            logger.write("Exception in parse_iex_payload: " + string(e.what()));
+            logger.warn(LOG_DECODE_FAILURE, string("DEBUG: Exception in parse_iex_payload: ") + e.what() + ", continuing");
             // Continue processing despite the error
         }
 
@@ -309,43 +243,36 @@ public:
     }
 
     // Parse the IEX payload to extract individual messages
-    void parse_iex_payload(const std::vector<char>& payload, uint64_t packet_capture_time_in_nanoseconds) {
+    void parse_iex_payload(const char* payload, size_t payload_size, uint64_t packet_capture_time_in_nanoseconds) {
         // Validate minimum payload size
-        if (payload.size() < 40) {
-            cout << "Warning: IEX payload too short (" << payload.size() << " bytes), skipping packet" << endl;
-            logger.write("Warning: IEX payload too short, skipping packet");
+        if (payload_size < 40) {
+            logger.warn(LOG_MALFORMED_PACKET, "Warning: IEX payload too short (" + to_string(payload_size) + " bytes), skipping packet");
             return;
         }
         
-        // Extract the first 40 bytes of the payload
-        auto start = payload.begin();
-        auto end = payload.begin() + 40;
-        vector<char> sliced_payload(start, end);
-
         uint16_t payload_len;
         uint16_t message_count;
         long long send_time;
-        // Extract the fields from the IEX header
-        memcpy(&send_time, &sliced_payload[32], 8);
-        memcpy(&payload_len, &sliced_payload[12], 2);
-        memcpy(&message_count, &sliced_payload[14], 2);
+        // Extract the fields from the 40 byte IEX header
+        memcpy(&send_time, payload + 32, 8);
+        memcpy(&payload_len, payload + 12, 2);
+        memcpy(&message_count, payload + 14, 2);
 
         // Check if the size of the payload matches the reported length in the header
-        if (payload.size() != payload_len + 40) {
-            cout << "Warning: Payload size mismatch (expected " << (payload_len + 40) << ", got " << payload.size() << "), skipping packet" << endl;
-            logger.write("Warning: Payload size mismatch, skipping packet");
+        if (payload_size != payload_len + 40) {
+            logger.warn(LOG_MALFORMED_PACKET, "Warning: Payload size mismatch (expected " + to_string(payload_len + 40) + ", got " + to_string(payload_size) + "), skipping packet");
             return;
         }
         
         // Validate message count is reasonable
         if (message_count > 1000) {
-            cout << "Warning: Unusually high message count (" << message_count << "), skipping packet" << endl;
-            logger.write("Warning: Unusually high message count, skipping packet");
+            logger.warn(LOG_MALFORMED_PACKET, "Warning: Unusually high message count (" + to_string(message_count) + "), skipping packet");
             return;
         }
 
-        // Extract message bytes from the payload
-        const vector<char> message_bytes(payload.begin() + 40, payload.end());
+        // Messages follow the IEX header
+        const char* message_bytes = payload + 40;
+        size_t message_bytes_size = payload_size - 40;
 
         size_t cur_offset = 0;
         cur_packet_message_count = message_count;
@@ -356,41 +283,37 @@ public:
             // size_t message_id = total_num_messages_processed;
 
             // Check if we have enough bytes for message length
-            if (cur_offset + 2 > message_bytes.size()) {
-                cout << "Warning: Not enough bytes for message length at offset " << cur_offset << ", skipping remaining messages" << endl;
-                logger.write("Warning: Insufficient bytes for message length, skipping remaining messages");
+            if (cur_offset + 2 > message_bytes_size) {
+                logger.warn(LOG_MALFORMED_PACKET, "Warning: Not enough bytes for message length at offset " + to_string(cur_offset) + ", skipping remaining messages");
                 break;
             }
 
             // Extract the length of the current message
             uint16_t tuple_message_len;
-            memcpy(&tuple_message_len, &message_bytes[cur_offset], sizeof(uint16_t));
+            memcpy(&tuple_message_len, message_bytes + cur_offset, sizeof(uint16_t));
             size_t message_len = tuple_message_len;
             
             // Validate message length is reasonable
             if (message_len > 1000 || message_len == 0) {
-                cout << "Warning: Invalid message length (" << message_len << ") at offset " << cur_offset << ", skipping message" << endl;
-                logger.write("Warning: Invalid message length, skipping message");
+                logger.warn(LOG_MALFORMED_PACKET, "Warning: Invalid message length (" + to_string(message_len) + ") at offset " + to_string(cur_offset) + ", skipping message");
                 cur_offset += 2; // Skip just the length field and continue
                 continue;
             }
 
             // Check if we have enough bytes for the full message
-            if (cur_offset + 2 + message_len > message_bytes.size()) {
-                cout << "Warning: Not enough bytes for message data (need " << message_len << ", have " << (message_bytes.size() - cur_offset - 2) << "), skipping remaining messages" << endl;
-                logger.write("Warning: Insufficient bytes for message data, skipping remaining messages");
+            if (cur_offset + 2 + message_len > message_bytes_size) {
+                logger.warn(LOG_MALFORMED_PACKET, "Warning: Not enough bytes for message data (need " + to_string(message_len) + ", have " + to_string(message_bytes_size - cur_offset - 2) + "), skipping remaining messages");
                 break;
             }
 
-            // Extract the bytes of the current message
-            vector<char> message_bytes_sliced(message_bytes.begin() + cur_offset + 2, message_bytes.begin() + cur_offset + 2 + message_len);
+            // View of the bytes of the current message
+            const char* message_payload = message_bytes + cur_offset + 2;
             
             // Parse the current message with error handling
             try {
-                parse_iex_message(message_bytes_sliced, packet_capture_time_in_nanoseconds, send_time);
+                parse_iex_message(message_payload, message_len, packet_capture_time_in_nanoseconds, send_time);
             } catch (const exception& e) {
-                cout << "Warning: Error parsing message " << i << ": " << e.what() << ", skipping message" << endl;
-                logger.write("Warning: Error parsing message, skipping");
+                logger.warn(LOG_DECODE_FAILURE, "Warning: Error parsing message " + to_string(i) + ": " + e.what() + ", skipping message");
             }
 
             // Move the offset to the next message
@@ -399,91 +322,81 @@ public:
 
         // Check if the offset matches the payload length (with some tolerance for malformed packets)
         if (cur_offset != payload_len) {
-            cout << "Warning: Offset mismatch after parsing messages (expected " << payload_len << ", got " << cur_offset << "), continuing anyway" << endl;
-            logger.write("Warning: Offset mismatch after parsing messages, continuing");
+            logger.warn(LOG_MALFORMED_PACKET, "Warning: Offset mismatch after parsing messages (expected " + to_string(payload_len) + ", got " + to_string(cur_offset) + "), continuing anyway");
             // Don't throw an exception - just log and continue
         }
     }
 
 
     // Parse an IEX message from its payload
-    void parse_iex_message(const std::vector<char>& message_payload, long long packet_capture_time_in_nanoseconds, long long send_time) {
+    void parse_iex_message(const char* message_payload, size_t message_len, long long packet_capture_time_in_nanoseconds, long long send_time) {
         // Input validation - check minimum message size
-        if (message_payload.empty()) {
-            cout << "Warning: Empty message payload received" << endl;
-            logger.write("Warning: Empty message payload received");
+        if (message_len == 0) {
+            logger.warn(LOG_MALFORMED_PACKET, "Warning: Empty message payload received");
             return;
         }
         
         // Extract the message type byte
         char message_type_byte = message_payload[0];
-        // Convert the message type byte to a string
-        string message_type(1, message_type_byte);
+
+        // Drop trades and price level updates for symbols that are not of interest before decoding them
+        if ((message_type_byte == 'T' || message_type_byte == '8' || message_type_byte == '5') &&
+            !symbol_filter.accepts(message_payload, message_len)) {
+            return;
+        }
         // Get the message ID
         // int message_id = total_num_messages_processed;
 
         // Process different message types with error recovery
-        if (message_type == "T") {
+        if (message_type_byte == 'T') {
             // Parse the trade report message
-            pair<string, string> parsed_message = parse_trade_report_message(message_payload);
+            pair<string, string> parsed_message = parse_trade_report_message(message_payload, message_len);
             
             // Check if parsing was successful (non-empty result)
             if (!parsed_message.first.empty() && !parsed_message.second.empty()) {
                 // Append the message string to the appropriate messages array entry
-                if (symbols_of_interest_file=="ALL" || std::find(symbols_list.begin(), symbols_list.end(), parsed_message.second) != symbols_list.end())
-                {
-                    // Construct the message string
-                    string message_string = to_string(packet_capture_time_in_nanoseconds) + "," + to_string(send_time) + "," + parsed_message.first + "\n";
-                    trade_messages += message_string;
-                }
+                // Construct the message string
+                string message_string = to_string(packet_capture_time_in_nanoseconds) + "," + to_string(send_time) + "," + parsed_message.first + "\n";
+                trade_messages += message_string;
             } else {
-                cout << "Warning: Failed to parse trade report message, skipping" << endl;
-                logger.write("Warning: Failed to parse trade report message");
+                logger.warn(LOG_DECODE_FAILURE, "Warning: Failed to parse trade report message, skipping");
             }
 
         } 
-        else if (message_type == "8") {
+        else if (message_type_byte == '8') {
             // For bid messages, set the bid flag to 0
             const string bid = "0";
             // Parse the price level update message
-            pair<string, string> parsed_message = parse_price_level_update(message_payload);
+            pair<string, string> parsed_message = parse_price_level_update(message_payload, message_len);
             
             // Check if parsing was successful (non-empty result)
             if (!parsed_message.first.empty() && !parsed_message.second.empty()) {
-                if (symbols_of_interest_file=="ALL" || std::find(symbols_list.begin(), symbols_list.end(), parsed_message.second) != symbols_list.end())
-                {
-                    // Construct the message string
-                    string message_string = to_string(packet_capture_time_in_nanoseconds) + "," + to_string(send_time)    + "," + parsed_message.first + "," + bid + "\n";
-                    prl_messages += message_string;
-                }
+                // Construct the message string
+                string message_string = to_string(packet_capture_time_in_nanoseconds) + "," + to_string(send_time)    + "," + parsed_message.first + "," + bid + "\n";
+                prl_messages += message_string;
             } else {
-                cout << "Warning: Failed to parse bid price level update, skipping" << endl;
-                logger.write("Warning: Failed to parse bid price level update");
+                logger.warn(LOG_DECODE_FAILURE, "Warning: Failed to parse bid price level update, skipping");
             }
         } 
-        else if (message_type == "5") {
+        else if (message_type_byte == '5') {
             // For ask messages, set the ask flag to 1
             const string ask = "1";
             // Parse the price level update message
-            pair<string, string> parsed_message = parse_price_level_update(message_payload);
+            pair<string, string> parsed_message = parse_price_level_update(message_payload, message_len);
 
             // Check if parsing was successful (non-empty result)
             if (!parsed_message.first.empty() && !parsed_message.second.empty()) {
-                if (symbols_of_interest_file=="ALL" || std::find(symbols_list.begin(), symbols_list.end(), parsed_message.second) != symbols_list.end())
-                {
-                    // Construct the message string
-                    string message_string = to_string(packet_capture_time_in_nanoseconds) + "," + to_string(send_time)  + "," + parsed_message.first + "," + ask + "\n";
+                // Construct the message string
+                string message_string = to_string(packet_capture_time_in_nanoseconds) + "," + to_string(send_time)  + "," + parsed_message.first + "," + ask + "\n";
 
-                    prl_messages += message_string;
-                }
+                prl_messages += message_string;
             } else {
-                cout << "Warning: Failed to parse ask price level update, skipping" << endl;
-                logger.write("Warning: Failed to parse ask price level update");
+                logger.warn(LOG_DECODE_FAILURE, "Warning: Failed to parse ask price level update, skipping");
             }
         } 
-        else if (message_type == "S") {
+        else if (message_type_byte == 'S') {
             // Parse system event message
-            char system_event = parse_system_event_message(message_payload);
+            char system_event = parse_system_event_message(message_payload, message_len);
             
             // Check if this is the end-of-session message
             if (system_event == 'C') {
@@ -493,7 +406,7 @@ public:
             }
         } else {
             // Handle unknown message types gracefully
-            cout << "Info: Skipping unknown message type '" << message_type << "' (0x" << hex << static_cast<int>(message_type_byte) << ")" << dec << endl;
+            cout << "Info: Skipping unknown message type '" << message_type_byte << "' (0x" << hex << static_cast<int>(message_type_byte) << ")" << dec << endl;
             // Note: Not logging this as it's expected behavior for unsupported message types
         }
     }
@@ -559,12 +472,15 @@ int main(int argc, char* argv[]) {
     string symbols_of_interest_file = argv[3];
 
     
-    int max_packets_to_parse = 1000000000;
-    //int max_packets_to_parse = 10000000;
+    // The whole capture is parsed, parse() only takes a packet limit for testing (-1 for none)
+    int max_packets_to_parse = -1;
 
     BasicPcapParser parser(iex_pcap_file_to_parse, trades_output_file_name,symbols_of_interest_file);
     
-    parser.parse(max_packets_to_parse);
+    if (parser.parse(max_packets_to_parse) < 0) {
+        cerr << "Failed to parse " << iex_pcap_file_to_parse << endl;
+        return 1;
+    }
 
     cout << "Finished parsing " << iex_pcap_file_to_parse << "; closing all output files" << endl;
     
@@ -11,111 +11,106 @@
 #include <algorithm>
 #include <thread>
 #include <mutex>
+#include <sys/stat.h>
+#include <unistd.h>
 #include "logger.h"
 #include "decode_messages.h"
+#include "pcap_reader.h"
+#include "column_writer.h"
+#include "options.h"
+#include "pipeline.h"
+#include "chunk_decoder.h"
+#include "price_book.h"
+#include "output_file.h"
+#include "packet_index.h"
+#include "checkpoint.h"
+#include "stats.h"
+#include "message_types.h"
+#include "symbol_filter.h"
 using namespace std;
 
 
 // This is a threaded version of the iex_parser.cpp file if we want to parse all symbols.
 // In particular, this file does NOT read the symbols of interest or use it to filter the symbols.
-// The main difference is that the parsing of price level updates and writing to output file is done in separate threads.
+// The main difference is that decoding the messages and writing the output files is done by a pipeline of worker threads (pipeline.h).
 // This C++ program reads a pcap file containing IEX DEEP feed messages and parses the messages to extract trade reports and price level updates.
 // The program writes the extracted messages to separate output files for trade reports and price level updates.
 // The program also writes the packet capture time and send time for each message to the output files.  
 // There are two main things that need parsing: the PCAP header and the IEX payload.
 // The PCAP header is 16 bytes long and contains the timestamp and the length of the packet.
-// The parsing of the PCAP header is implemented in the unpackPcapPacketHeader function.
+// Reading the (gzip compressed) PCAP file and unpacking the PCAP headers is implemented by PcapReader in pcap_reader.h.
 // The IEX payload contains the IEX header and the messages. The IEX header contains the payload length, send time of the packet and the number of messages.
 // The main ]-parsing logic is implemented in the parse_iex_payload and parse_iex_message functions.
 // The parse_iex_message function uses the decode_messages.h functions to parse the trade reports and price level updates.
 // To add support for additional message types, you can add new functions to decode_messages.h and call them in this file.
-// If you add additional functions we suggest not using a separate thread for writing to the output file as this will not give significant boost to performance.
+// New message types can be queued with pipeline->add and formatted in DecodePipeline::decode_batch.
 
 class BasicPcapParser {
 private:
     string filename; 
     string output_filename;
-    bool write_flag;
     string symbols_of_interest_file;
     int cur_packet_message_count;
     int total_num_messages_processed;
     std::fstream symbols_file;
-    string trade_messages = "";
-    std::thread writerThread;
-    vector<char> unparsedprl_messages;
-    vector<string> timestamps;
     char raw_symbol[8];
     ofstream output_filenames;
     time_t start_parse_time;
     time_t stop_parse_time;
     string message_buffer = "";
-    ifstream input_file;
+    PcapReader pcap_reader;
     Log logger;
     mutex mtx;
     std::vector<std::string> symbols_list;
     vector<int> symbols_of_interest_indices;
-    ofstream trades_output_file;
-    ofstream prl_output_file;
-    
-    struct PcapPacketHeader {
-        uint32_t ts_sec;
-        uint32_t ts_usec;
-        uint32_t incl_len;
-        uint32_t orig_len;
-    };
+    OutputFile trades_output_file;
+    OutputFile prl_output_file;
+    ParserOptions options;
+    bool columnar;
+    ColumnarWriter columnar_writer;
+    unique_ptr<DecodePipeline> pipeline;
+    unique_ptr<ChunkDecoder> chunk_decoder;
+    unique_ptr<BookEngine> book_engine;
+    unique_ptr<OrderBookEngine> order_book;
+    OutputFile order_output_file;
+    PacketIndex packet_index;
+    bool building_index = false;
+    bool reading_ranges = false;
+    vector<PacketRange> packet_ranges;   // packets to read when reading through the index
+    size_t next_range = 0;
+    uint64_t range_packets_left = 0;
+    uint64_t input_size = 0;
+    bool read_failed = false;
+    bool write_failed = false;
+    bool stop_event_seen = false;
+    bool checkpointing = false;
+    string checkpoint_signature;
+    ParseStats stats;
+    MessageTable message_table;
+    MessageFiles message_files;
     
 public:
-    BasicPcapParser(std::string filename, std::string output_filename, std::string symbols_of_interest_file) : filename(filename), output_filename(output_filename),symbols_of_interest_file(symbols_of_interest_file) {
+    BasicPcapParser(std::string filename, std::string output_filename, std::string symbols_of_interest_file, const ParserOptions& options) : filename(filename), output_filename(output_filename),symbols_of_interest_file(symbols_of_interest_file), options(options) {
     // Initialization of variables
+        columnar = options.format == "npy";
+        message_table.select(options.types);
         cur_packet_message_count = 0;
         total_num_messages_processed = 0;
     }
 
-    // Function to unpack the pcap packet header
-    void unpackPcapPacketHeader(const std::vector<uint8_t>& buffer, PcapPacketHeader& header) {
-        if (buffer.size() < sizeof(PcapPacketHeader)) {
-            cerr << "Error: Insufficient data in buffer for unpacking." << endl;
-            return;
-        }
-
-        memcpy(&header, buffer.data(), sizeof(PcapPacketHeader));
-    }
     
 
-    // Function to parse and write price level updates to an output file
-    void prlwrite(const vector<char>& messages, ofstream& output_file, const vector<string>& timestamps) {
-        string output = "";  // Initialize the output string
-        std::size_t chunk_size = 30;  // Define the size of each chunk
-        std::size_t data_size = messages.size();  // Get the total size of the messages
-        
-
-        // Process messages in chunks
-        for (std::size_t i = 0; i < data_size; i += chunk_size) {
-            // Determine the end of the current chunk
-            std::size_t end = std::min(i + chunk_size, data_size);
-            
-            // Extract the current chunk from messages
-            std::vector<char> chunk(messages.begin() + i, messages.begin() + end);
-            
-            // Parse the current chunk and append the result to the output string
-            output += timestamps[i / chunk_size] + "," + parse_price_level_update(chunk).first + "\n";
-        }
-
-        // Write the output string to the output file
-        output_file << output;
-        
-
-        // Reset the write flag
-        write_flag = false;
-    }
-
     // Function to parse the pcap file  
 int parse(int max_packets_to_parse) {
-    // Open the input file
-    input_file.open(filename, ios::binary);
+    // Building an index or taking checkpoints records gzip access points while reading
+    if (!options.write_index_path.empty() || !options.checkpoint_path.empty()) {
+        pcap_reader.record_access_points(INDEX_ACCESS_POINT_SPACING);
+    }
 
-    // Check if the file is opened successfully
-    if (!input_file.is_open()) {
+    // Open the input file. PcapReader decompresses gzip files itself and reads the pcap global header.
+    // Uncompressed files are mapped into memory unless --input-mode=stream.
+    pcap_reader.set_mmap(options.input_mode == "mmap");
+    if (!pcap_reader.open(filename)) {
         cerr << "Error: Unable to open file " << filename << endl;
         return -1;
     }
@@ -127,20 +122,103 @@ int parse(int max_packets_to_parse) {
     start_parse_time = time(nullptr);
     cout << "Starting parsing @ " << put_time(std::localtime(&start_parse_time), "%c") << endl;
     logger.write("Started parsing");
-
-    // Skip the pcap global header which is 24 bytes long
-    int pcap_global_header_len = 24;
-    input_file.ignore(pcap_global_header_len);
+    stats.start(options.stats_path, filename, options.stats_interval);
 
     int num_packets = 0;
 
-    // Open output files for each message type
-    trades_output_file.open(output_filename + "_trd.csv");
-    prl_output_file.open(output_filename + "_prl.csv");
+    if (!prepare_index()) {
+        return -1;
+    }
+
+    // Resume from the checkpoint of an earlier run of the same parse, see checkpoint.h
+    Checkpoint resume_from;
+    bool resuming = false;
+    if (!prepare_checkpoint(resume_from, resuming)) {
+        return -1;
+    }
+    if (resuming && resume_from.complete) {
+        cout << "The checkpoint shows that " << filename << " was parsed completely already" << endl;
+        return 0;
+    }
+
+    // Workers that each read and decode chunks of the capture, see chunk_decoder.h
+    if (options.decode == "chunks" && chunks_supported()) {
+        return parse_chunks();
+    }
+
+    // Order book snapshots alongside the price level updates, see price_book.h
+    if (options.book_depth > 0 && !message_table.selected('8') && !message_table.selected('5')) {
+        cerr << "Error: --book-depth needs the price level updates, add 8 and 5 to --types" << endl;
+        return -1;
+    }
+    if (options.book_depth > 0) {
+        book_engine.reset(new BookEngine());
+        if (!book_engine->open(output_filename, options.book_depth)) {
+            return -1;
+        }
+    }
+
+    // Order by order book of the DEEP+ order messages, see order_book.h
+    if (message_table.has_order_types()) {
+        if (columnar) {
+            cerr << "Error: The DEEP+ order messages are only written as CSV, remove a, M, R, L and C from --types for --format=npy" << endl;
+            return -1;
+        }
+        order_book.reset(new OrderBookEngine());
+        if (!order_book->open(output_filename) || !order_output_file.open(output_filename + "_ord.csv")) {
+            return -1;
+        }
+        order_output_file << "Packet Capture Time,Send Time,Exchange Timestamp,Tick Type,Symbol,Side,Order ID,Size,Price,Trade ID,Flags\n";
+    }
+
+    if (columnar) {
+        // Typed column files instead of CSV, see column_writer.h
+        if (!columnar_writer.open(output_filename, options.batch_size)) {
+            return -1;
+        }
+    } else {
+        // Open output files for each message type. When resuming, whatever was written after the checkpoint is cut off.
+        if (resuming) {
+            bool truncated = truncate((output_filename + "_trd.csv").c_str(), resume_from.output_sizes[0]) == 0 &&
+                             truncate((output_filename + "_prl.csv").c_str(), resume_from.output_sizes[1]) == 0;
+            vector<const MessageType*> other_types = message_table.other_types();
+            for (size_t i = 0; i < other_types.size(); ++i) {
+                truncated = truncated && truncate(message_file_path(output_filename, *other_types[i]).c_str(), resume_from.output_sizes[2 + i]) == 0;
+            }
+            if (!truncated || !trades_output_file.open(output_filename + "_trd.csv", true) || !prl_output_file.open(output_filename + "_prl.csv", true)) {
+                cerr << "Error: Unable to reopen the output files to resume" << endl;
+                return -1;
+            }
+        } else {
+            if (!trades_output_file.open(output_filename + "_trd.csv") || !prl_output_file.open(output_filename + "_prl.csv")) {
+                return -1;
+            }
+
+            // Write headers to the output files
+            trades_output_file << "Packet Capture Time,Send Time,Exchange Timestamp,Tick Type,Symbol,Size,Price,Trade ID,Sale Condition\n";
+            prl_output_file << "Packet Capture Time,Send Time, Buy_Ask Flag,Exchange Timestamp,Tick Type,Symbol,Price,Size,Record Type,Event Flag\n";
+        }
+
+        // Decoder workers format the CSV rows and a writer thread appends them to the output files, see pipeline.h
+        pipeline.reset(new DecodePipeline(trades_output_file, prl_output_file, options.threads, 8192, 4, book_engine.get(),
+                                          &order_output_file, order_book.get()));
+        cout << "Decoding with " << pipeline->worker_count() << " worker threads" << endl;
+    }
+
+    // Files of the other message types selected with --types, see message_types.h
+    if (!message_files.open(output_filename, message_table, resuming)) {
+        return -1;
+    }
 
-    // Write headers to the output files
-    trades_output_file << "Packet Capture Time,Send Time,Exchange Timestamp,Tick Type,Symbol,Size,Price,Trade ID,Sale Condition\n";
-    prl_output_file << "Packet Capture Time,Send Time, Buy_Ask Flag,Exchange Timestamp,Tick Type,Symbol,Price,Size,Record Type,Event Flag\n";
+    if (resuming) {
+        if (!pcap_reader.seek(resume_from.offset, resume_from.has_access_point ? &resume_from.access_point : nullptr)) {
+            cerr << "Error: Unable to resume " << filename << " from the checkpoint" << endl;
+            return -1;
+        }
+        num_packets = resume_from.packets;
+        stop_event_seen = resume_from.stop_event_seen;
+        cout << "Resuming after packet " << num_packets << " from checkpoint " << options.checkpoint_path << endl;
+    }
 
     // Main loop to read and process packets
     while (true) {
@@ -150,92 +228,118 @@ int parse(int max_packets_to_parse) {
 
         // Check if the maximum number of packets to parse is reached or end of file is reached
         if ((max_packets_to_parse != -1 && num_packets > max_packets_to_parse) || time_float == -1) {
-            // Write remaining messages to output files and close them
-            write_flag = true;
-            std::thread writerThread([this]() {
-                prlwrite(unparsedprl_messages, prl_output_file, timestamps);
-            });
-
-            trades_output_file << trade_messages;
-
-            while (write_flag) {
-                // Wait for the writer thread to complete
-                cout << "Waiting for writer thread to complete" << endl;
-                std::this_thread::sleep_for(std::chrono::seconds(5));
+            if (columnar) {
+                // Flush the remaining rows and fill in the column file headers
+                if (!columnar_writer.close()) {
+                    cerr << "Error: Failed to write column files for " << output_filename << endl;
+                    write_failed = true;
+                }
+            } else {
+                // Decode and write the remaining messages, then close the output files
+                pipeline->finish();
+                if (checkpointing && time_float == -1 && !read_failed && !pcap_reader.failed()) {
+                    write_checkpoint(num_packets - 1, true);
+                }
+                bool closed = trades_output_file.close();
+                closed = prl_output_file.close() && closed;
+                if (!closed) {
+                    cerr << "Error: Failed to write the output files for " << output_filename << endl;
+                    write_failed = true;
+                }
+            }
+            if (!message_files.close()) {
+                cerr << "Error: Failed to write the message files for " << output_filename << endl;
+                write_failed = true;
+            }
+            if (book_engine && !book_engine->close()) {
+                cerr << "Error: Failed to write the order book snapshots for " << output_filename << endl;
+                write_failed = true;
+            }
+            if (order_book && (!order_output_file.close() || !order_book->close())) {
+                cerr << "Error: Failed to write the order events and price levels for " << output_filename << endl;
+                write_failed = true;
+            }
+            if (building_index) {
+                // The index is only valid for a complete pass over the capture
+                if (time_float == -1 && !read_failed && !pcap_reader.failed()) {
+                    packet_index.set_access_points(pcap_reader.access_points());
+                    if (packet_index.write(options.write_index_path, input_size)) {
+                        cout << "Wrote index of " << packet_index.packet_count() << " packets to " << options.write_index_path << endl;
+                    }
+                } else {
+                    cerr << "Warning: The capture was not read completely, so no index was written" << endl;
+                }
             }
-
-            writerThread.join();
-            trades_output_file.close();
-            prl_output_file.close();
 
             // Get the current time as the stop time for parsing
             stop_parse_time = time(nullptr);
             cout << "Stopped parsing @ " << put_time(localtime(&stop_parse_time), "%c") << endl;
             double parsing_time = difftime(stop_parse_time, start_parse_time);
             cout << "Parsed in " << parsing_time << " seconds" << endl;
+            bool failed = read_failed || pcap_reader.failed() || write_failed;
+            stats.write(failed ? "failed" : "finished", pcap_reader.position(), stage_times());
+
+            exit(failed ? 1 : 0); // Exit the program
+        }
 
-            exit(0); // Exit the program
+        // Record where to resume from if the parse dies
+        if (checkpointing && num_packets % options.checkpoint_interval == 0) {
+            write_checkpoint(num_packets, false);
         }
 
         // Output progress every 5 million packets
         if (num_packets % 5000000 == 0) {
-            if (num_packets > 5000000) {
-                while (write_flag) {
-                    // Wait for the writer thread to complete
-                    cout << "Waiting for writer thread to complete" << endl;
-                    std::this_thread::sleep_for(std::chrono::seconds(1));
-                }
-            }
-
-            vector<char> write_prl_messages = unparsedprl_messages;
-            string write_trade_messages = trade_messages;
-            vector<string> write_timestamps = timestamps;
-
-            write_flag = true;
-            std::thread writerThread([this, write_prl_messages, write_timestamps]() {
-                prlwrite(write_prl_messages, prl_output_file, write_timestamps);
-            });
-            writerThread.detach();
-
-            trades_output_file << trade_messages;
-
-            trade_messages = "";
-            unparsedprl_messages.clear();
-            timestamps.clear();
-
             // Output progress
             cout << "Parsed " << num_packets << " packets " << endl;
         }
     }
 
-    input_file.close(); // Close the file
+    pcap_reader.close(); // Close the file
 }
 
 
     // Read a packet from the input file
 double read_packet() {
-    // Length of the packet header in bytes
-    int packet_header_len = 16; // 4 + 4 + 4 + 4
-
     // Check if the input file is open
-    if (!input_file.is_open()) {
+    if (!pcap_reader.is_open()) {
         cerr << "Error: Unable to open file " << filename << endl;
         return 1;
     }
 
-    char packet_header[16];
-    // Read the packet header from the input file
-    input_file.read(packet_header, packet_header_len);
-
-    // Check if the end of file is reached or if the packet header is incomplete
-    if (input_file.eof() || input_file.gcount() != 16) {
-        cout << "End of file reached... stopping reading!" << endl;
+    // Everything after the system event of --stop-after-event is outside the window. Only an index of the whole capture reads on.
+    if (stop_event_seen && !building_index) {
+        cout << "Reached system event '" << options.stop_event << "'... stopping reading!" << endl;
         return -1;
     }
 
-    // Unpack the pcap packet header
+    // Reading through the index: move on to the next packet range once the current one is done
+    if (reading_ranges) {
+        if (range_packets_left == 0) {
+            if (next_range == packet_ranges.size()) {
+                cout << "Read all indexed packet ranges... stopping reading!" << endl;
+                return -1;
+            }
+            const PacketRange& range = packet_ranges[next_range++];
+            if (!pcap_reader.seek(range.offset, packet_index.access_point(range.offset))) {
+                cerr << "Error: Unable to seek to packet " << range.first_packet << " of " << filename << endl;
+                read_failed = true;
+                return -1;
+            }
+            range_packets_left = range.packets;
+        }
+        range_packets_left--;
+    }
+
+    // Read the header of the next packet. The packet data is only read if the packet is needed.
     PcapPacketHeader pcap_packet_header;
-    unpackPcapPacketHeader(std::vector<uint8_t>(packet_header, packet_header + 16), pcap_packet_header);
+    if (!pcap_reader.next_packet_header(pcap_packet_header)) {
+        cout << "End of file reached... stopping reading!" << endl;
+        return -1;
+    }
+    stats.packets_read++;
+    if (stats.due()) {
+        stats.sample(pcap_reader.position(), stage_times());
+    }
 
     // Extract timestamp and packet length from the pcap packet header
     auto ts_sec = pcap_packet_header.ts_sec;
@@ -246,41 +350,68 @@ double read_packet() {
     double time_float = ts_sec + (ts_usec * 1e-6);
     uint64_t packet_capture_time_in_nanoseconds = (ts_sec * 1e9) + (ts_usec * 1e3);
 
+    if (building_index) {
+        packet_index.add_packet(pcap_reader.packet_offset(), packet_capture_time_in_nanoseconds);
+    }
+
+    // Packets are captured in order, so nothing after the end of the window is needed
+    if (packet_capture_time_in_nanoseconds >= options.end_ns && !building_index) {
+        cout << "Reached the end of the time window... stopping reading!" << endl;
+        return -1;
+    }
+
+    // Packets before the window are passed over on their pcap header alone, without reading the payload.
+    // Their symbols are still indexed when building an index.
+    bool in_window = !stop_event_seen && packet_capture_time_in_nanoseconds >= options.start_ns && packet_capture_time_in_nanoseconds < options.end_ns;
+    if (!in_window && !building_index) {
+        if (!pcap_reader.skip_packet_data()) {
+            cout << "End of file reached... stopping reading!" << endl;
+            return -1;
+        }
+        return time_float;
+    }
+
+    // Check if the end of file is reached or if the packet is incomplete
+    const char* packet_data = pcap_reader.packet_data();
+    if (packet_data == nullptr) {
+        cout << "End of file reached... stopping reading!" << endl;
+        return -1;
+    }
+
     // Skip the Ethernet, IP, and UDP headers to get to the IEX payload. The total length of these headers is 42 bytes.
     int offset_into_iex_payload = 42; // 14 + 20 + 8
-    input_file.ignore(offset_into_iex_payload);
 
-    // Check if the packet length is less than 42 bytes
-    if (incl_len < 42) {
-        cout << "Invalid packet length: " << incl_len << endl;
+    // Check that the packet holds the 42 bytes of headers and the 40 byte IEX header
+    if (incl_len < 42 + 40) {
+        logger.warn(LOG_MALFORMED_PACKET, "Invalid packet length: " + to_string(incl_len));
+        stats.packets_malformed++;
         return time_float;
     }
 
-    // Read the IEX payload
-    vector<char> iex_payload(incl_len - 42);
-    input_file.read(iex_payload.data(), incl_len - 42);
+    if (in_window) {
+        stats.packets_parsed++;
+    }
 
-    // Parse the IEX payload
-    auto start = iex_payload.begin();
-    auto end = iex_payload.begin() + 40;
-    vector<char> sliced_payload(start, end);
+    // The IEX payload is parsed in place, straight from the packet bytes handed out by pcap_reader
+    const char* iex_payload = packet_data + offset_into_iex_payload;
+    size_t iex_payload_size = incl_len - offset_into_iex_payload;
 
     uint16_t payload_len;
     uint16_t message_count;
     long long send_time;
 
-    // Extract the fields from the IEX header
-    memcpy(&send_time, &sliced_payload[32], 8);
-    memcpy(&payload_len, &sliced_payload[12], 2);
-    memcpy(&message_count, &sliced_payload[14], 2);
+    // Extract the fields from the 40 byte IEX header
+    memcpy(&send_time, iex_payload + 32, 8);
+    memcpy(&payload_len, iex_payload + 12, 2);
+    memcpy(&message_count, iex_payload + 14, 2);
 
     // Check if the size of the payload matches the reported length in the header
-    if (iex_payload.size() != payload_len + 40) {
+    if (iex_payload_size != payload_len + 40) {
         throw runtime_error("Invalid parser state; the length of UDP packet payload should be forty plus the payload_len within IEX header");
     }
 
-    // Extract message bytes from the payload
-    const vector<char> message_bytes(iex_payload.begin() + 40, iex_payload.end());
+    // Messages follow the IEX header
+    const char* message_bytes = iex_payload + 40;
 
     size_t cur_offset = 0;
     cur_packet_message_count = message_count;
@@ -289,45 +420,59 @@ double read_packet() {
     for (size_t i = 0; i < message_count; ++i) {
         total_num_messages_processed++;
 
-        // Extract the length of the current message
-        uint16_t tuple_message_len;
-        memcpy(&tuple_message_len, &message_bytes[cur_offset], sizeof(uint16_t));
-        size_t message_len = tuple_message_len;
-
-        // Extract the bytes of the current message
-        vector<char> message_bytes_sliced(message_bytes.begin() + cur_offset + 2, message_bytes.begin() + cur_offset + 2 + message_len);
-        char message_type_byte = message_bytes_sliced[0];
-        string message_type(1, message_type_byte);
-
-        // Process different message types
-        if (message_type == "T") {
-            // Parse the trade report message
-            pair<string, string> parsed_message = parse_trade_report_message(message_bytes_sliced);
-
-            // Append the message string to the appropriate messages array entry
-            
-            string message_string = to_string(packet_capture_time_in_nanoseconds) + "," + to_string(send_time) + "," + parsed_message.first + "\n";
-            trade_messages += message_string;
-            
-
-        } else if (message_type == "8") {
-            // For bid messages, set the bid flag to 0
-            const string bid = "0";
-
-            // Parse the price level update message
-            
-            string timestamps_string = to_string(packet_capture_time_in_nanoseconds) + "," + to_string(send_time) + "," + bid;
-            timestamps.push_back(timestamps_string);
-            unparsedprl_messages.insert(unparsedprl_messages.end(), message_bytes_sliced.begin(), message_bytes_sliced.end());
-            
-        } else if (message_type == "5") {
-            // For ask messages, set the ask flag to 1
-            const string ask = "1";
-
-            string timestamps_string = to_string(packet_capture_time_in_nanoseconds) + "," + to_string(send_time) + "," + ask;
-            timestamps.push_back(timestamps_string);
-            unparsedprl_messages.insert(unparsedprl_messages.end(), message_bytes_sliced.begin(), message_bytes_sliced.end());
-            
+        // Extract the length of the current message. A message that runs past the payload ends the packet.
+        size_t message_len = message_length_at(message_bytes, payload_len, cur_offset);
+        if (message_len == 0) {
+            logger.warn(LOG_MALFORMED_PACKET, "Invalid message length at offset " + to_string(cur_offset) + " of a " +
+                                              to_string(payload_len) + " byte payload, skipping the rest of the packet");
+            stats.packets_malformed++;
+            return time_float;
+        }
+
+        // View of the bytes of the current message
+        const char* message_payload = message_bytes + cur_offset + 2;
+        char message_type_byte = message_payload[0];
+
+        // Every message type except system events carries a symbol
+        if (building_index && message_type_byte != 'S' && message_len >= SYMBOL_FIELD_OFFSET + 8) {
+            packet_index.add_symbol(message_payload + SYMBOL_FIELD_OFFSET);
+        }
+        if (!in_window) {
+            cur_offset += 2 + message_len;
+            continue;
+        }
+        stats.messages[static_cast<unsigned char>(message_type_byte)]++;
+
+        // The rest of this packet is still parsed after the system event that ends the parse
+        if (message_type_byte == 'S' && options.stop_event != 0 && message_len >= 2 && message_payload[1] == options.stop_event) {
+            stop_event_seen = true;
+        }
+
+        // Dispatch on the type byte, see message_types.h. Types that were not selected with --types are passed over here.
+        // There is no symbol filter, so every selected message is written.
+        MessageAction action = message_table.action(message_type_byte);
+        switch (action) {
+        case MESSAGE_TRADE:
+        case MESSAGE_PRICE_LEVEL:
+            (action == MESSAGE_TRADE ? stats.trade_records : stats.price_level_records)++;
+            if (columnar) {
+                // Columnar output decodes straight into the column buffers, without formatting text or using the writer thread
+                write_columnar(message_payload, message_len, packet_capture_time_in_nanoseconds, send_time);
+            } else {
+                // Queue trade reports and price level updates for the decoder workers
+                pipeline->add(message_payload, message_len, packet_capture_time_in_nanoseconds, send_time);
+            }
+            break;
+        case MESSAGE_ORDER:
+            // Order events are formatted by the decoder workers and applied to the order book by the writer, in feed order
+            stats.order_records++;
+            pipeline->add(message_payload, message_len, packet_capture_time_in_nanoseconds, send_time);
+            break;
+        case MESSAGE_OTHER:
+            message_files.write(message_payload, message_len, packet_capture_time_in_nanoseconds, send_time);
+            break;
+        case MESSAGE_SKIP:
+            break;
         }
 
         // Move the offset to the next message
@@ -347,6 +492,216 @@ double read_packet() {
 
 
 
+    // Busy times of the pipeline stages for the stats file. Columnar output has no pipeline.
+    StageTimes stage_times() const {
+        if (chunk_decoder) {
+            return chunk_decoder->stage_times();
+        }
+        return pipeline ? pipeline->stage_times() : StageTimes();
+    }
+
+    // Whether the capture can be cut into chunks and the output needs nothing but the rows of each chunk. Otherwise
+    // the pipeline decodes the capture, which gives the same output.
+    bool chunks_supported() {
+        struct stat input_stat;
+        bool plain = stat(filename.c_str(), &input_stat) == 0 && S_ISREG(input_stat.st_mode) && !pcap_reader.is_pcapng() &&
+                     (!pcap_reader.is_gzip() || reading_ranges);
+        if (!plain || columnar || options.book_depth > 0 || message_table.has_order_types() || checkpointing || building_index) {
+            cerr << "Warning: --decode=chunks needs the CSV output of an uncompressed classic pcap capture, or of a gzip capture "
+                    "read through its --index, without --book-depth, --checkpoint, --write-index or DEEP+ order messages. "
+                    "Decoding with the pipeline instead" << endl;
+            return false;
+        }
+        return true;
+    }
+
+    // Cut the capture into chunks on packet boundaries, decode them on the workers and write their rows in capture order
+    int parse_chunks() {
+        vector<PacketRange> chunks;
+        if (reading_ranges) {
+            chunks = packet_index.split(packet_ranges, options.chunk_size);
+        } else if (!plan_chunks(pcap_reader, options.chunk_size, options.end_ns, chunks)) {
+            cerr << "Error: Unable to read the packet headers of " << filename << endl;
+            return -1;
+        }
+        // The workers read the capture with readers of their own
+        pcap_reader.close();
+
+        if (!trades_output_file.open(output_filename + "_trd.csv") || !prl_output_file.open(output_filename + "_prl.csv") ||
+            !message_files.open(output_filename, message_table)) {
+            return -1;
+        }
+        trades_output_file << "Packet Capture Time,Send Time,Exchange Timestamp,Tick Type,Symbol,Size,Price,Trade ID,Sale Condition\n";
+        prl_output_file << "Packet Capture Time,Send Time, Buy_Ask Flag,Exchange Timestamp,Tick Type,Symbol,Price,Size,Record Type,Event Flag\n";
+
+        ChunkSettings settings;
+        settings.input_path = filename;
+        settings.mmap = options.input_mode == "mmap";
+        settings.index = reading_ranges ? &packet_index : nullptr;
+        settings.message_table = &message_table;
+        settings.start_ns = options.start_ns;
+        settings.end_ns = options.end_ns;
+        settings.stop_event = options.stop_event;
+        chunk_decoder.reset(new ChunkDecoder(settings, chunks, options.threads));
+        cout << "Decoding " << chunks.size() << " chunks with " << chunk_decoder->worker_count() << " worker threads" << endl;
+
+        vector<const MessageType*> other_types = message_table.other_types();
+        uint64_t bytes_read = 0;
+        bool decoded = chunk_decoder->run([&](const ChunkOutput& output) {
+            trades_output_file.write(output.trade_output);
+            prl_output_file.write(output.prl_output);
+            for (size_t i = 0; i < other_types.size(); ++i) {
+                message_files.write_rows(other_types[i]->type, output.other_output[i]);
+            }
+            stats.add(output.counters);
+            bytes_read = max(bytes_read, output.end_offset);
+            stats.sample(bytes_read, stage_times());
+        });
+
+        bool closed = trades_output_file.close();
+        closed = prl_output_file.close() && closed;
+        if (!closed) {
+            cerr << "Error: Failed to write the output files for " << output_filename << endl;
+            write_failed = true;
+        }
+        if (!message_files.close()) {
+            cerr << "Error: Failed to write the message files for " << output_filename << endl;
+            write_failed = true;
+        }
+        decoded = decoded && !write_failed;
+
+        stop_parse_time = time(nullptr);
+        cout << "Stopped parsing @ " << put_time(localtime(&stop_parse_time), "%c") << endl;
+        cout << "Parsed in " << difftime(stop_parse_time, start_parse_time) << " seconds" << endl;
+        stats.write(decoded ? "finished" : "failed", bytes_read, stage_times());
+
+        exit(decoded ? 0 : 1); // Exit the program
+    }
+
+    // Start building the index, or load it and work out which packets to read
+    // Check that checkpoints can be taken and load the checkpoint of an earlier run of the same parse.
+    // Sets resuming if the parse continues from it.
+    bool prepare_checkpoint(Checkpoint& checkpoint, bool& resuming) {
+        if (options.checkpoint_path.empty()) {
+            return true;
+        }
+        struct stat input_stat;
+        if (columnar || options.book_depth > 0 || message_table.has_order_types() || building_index || reading_ranges ||
+            stat(filename.c_str(), &input_stat) != 0 || !S_ISREG(input_stat.st_mode) || pcap_reader.is_pcapng()) {
+            cerr << "Error: Checkpoints are only supported for the CSV output of classic pcap capture files, without --book-depth, "
+                    "DEEP+ order messages or an index" << endl;
+            return false;
+        }
+        input_size = input_stat.st_size;
+        checkpointing = true;
+        // A checkpoint is only resumed by a parse with the same settings
+        checkpoint_signature = symbols_of_interest_file + " " + to_string(options.start_ns) + " " + to_string(options.end_ns) +
+                               " " + (options.stop_event != 0 ? string(1, options.stop_event) : string("-")) + " " + message_table.types();
+
+        if (!checkpoint.load(options.checkpoint_path)) {
+            return true;
+        }
+        // The output files are the trades, the price level updates and the other message types, in the order they are opened
+        vector<string> output_paths = {output_filename + "_trd.csv", output_filename + "_prl.csv"};
+        for (const MessageType* type : message_table.other_types()) {
+            output_paths.push_back(message_file_path(output_filename, *type));
+        }
+        bool outputs_match = checkpoint.output_sizes.size() == output_paths.size();
+        for (size_t i = 0; outputs_match && i < output_paths.size(); ++i) {
+            outputs_match = file_size(output_paths[i]) >= static_cast<int64_t>(checkpoint.output_sizes[i]);
+        }
+        if (checkpoint.input_size != input_size || checkpoint.signature != checkpoint_signature || !outputs_match) {
+            cerr << "Warning: Ignoring checkpoint " << options.checkpoint_path << ", which belongs to another input, settings or output" << endl;
+            return true;
+        }
+        resuming = true;
+        return true;
+    }
+
+    // Write everything parsed so far to the output files and record the position in the checkpoint file
+    void write_checkpoint(uint64_t packets, bool complete) {
+        Checkpoint checkpoint;
+        checkpoint.input_size = input_size;
+        checkpoint.signature = checkpoint_signature;
+        checkpoint.packets = packets;
+        checkpoint.offset = pcap_reader.position();
+        checkpoint.stop_event_seen = stop_event_seen;
+        checkpoint.complete = complete;
+        if (!complete) {
+            pipeline->drain();
+        }
+        if (!trades_output_file.sync() || !prl_output_file.sync() || !message_files.sync()) {
+            cerr << "Warning: Failed to sync the output files, no checkpoint was written" << endl;
+            return;
+        }
+        checkpoint.output_sizes = {trades_output_file.size(), prl_output_file.size()};
+        for (uint64_t size : message_files.sizes()) {
+            checkpoint.output_sizes.push_back(size);
+        }
+        checkpoint.has_access_point = pcap_reader.is_gzip() && pcap_reader.access_point_before(checkpoint.offset, checkpoint.access_point);
+        checkpoint.write(options.checkpoint_path);
+    }
+
+    bool prepare_index() {
+        if (options.index_path.empty() && options.write_index_path.empty()) {
+            return true;
+        }
+        struct stat input_stat;
+        if (stat(filename.c_str(), &input_stat) != 0 || !S_ISREG(input_stat.st_mode) || pcap_reader.is_pcapng()) {
+            cerr << "Error: Indexes are only supported for classic pcap capture files" << endl;
+            return false;
+        }
+        input_size = input_stat.st_size;
+
+        if (!options.write_index_path.empty()) {
+            packet_index.start(options.index_interval);
+            building_index = true;
+            return true;
+        }
+
+        // Without a usable index the whole capture is read, which gives the same output
+        if (!packet_index.load(options.index_path, input_size)) {
+            cerr << "Warning: Reading the whole capture instead" << endl;
+            return true;
+        }
+        // This parser keeps every symbol
+        SymbolFilter all_symbols;
+        all_symbols.load("ALL");
+        packet_ranges = packet_index.ranges(options.start_ns, options.end_ns, all_symbols);
+        reading_ranges = true;
+        uint64_t packets_to_read = 0;
+        for (const PacketRange& range : packet_ranges) {
+            packets_to_read += range.packets;
+        }
+        cout << "Reading " << packets_to_read << " of " << packet_index.packet_count() << " packets in "
+             << packet_ranges.size() << " ranges using the index" << endl;
+        return true;
+    }
+
+    // Decode a trade report or price level update and append it to the column files
+    void write_columnar(const char* message_payload, size_t message_len, uint64_t packet_capture_time_in_nanoseconds, long long send_time) {
+        char message_type_byte = message_payload[0];
+        if (message_type_byte == 'T') {
+            TradeReport trade;
+            if (decode_trade_report(message_payload, message_len, trade)) {
+                columnar_writer.write_trade(packet_capture_time_in_nanoseconds, send_time, trade);
+            } else {
+                logger.warn(LOG_DECODE_FAILURE, "Warning: Failed to decode trade report message, skipping");
+            }
+        } else if (message_type_byte == '8' || message_type_byte == '5') {
+            PriceLevelUpdate update;
+            if (decode_price_level_update(message_payload, message_len, update)) {
+                // Side flag as in the CSV output: 0 for bids ('8'), 1 for asks ('5')
+                columnar_writer.write_price_level(packet_capture_time_in_nanoseconds, send_time, message_type_byte == '5' ? 1 : 0, update);
+                if (book_engine) {
+                    book_engine->apply(message_payload, message_len, packet_capture_time_in_nanoseconds, send_time);
+                }
+            } else {
+                logger.warn(LOG_DECODE_FAILURE, "Warning: Failed to decode price level update, skipping");
+            }
+        }
+    }
+
     // Get the first part of a string before a delimiter
     string getFirstPart(const string& str, const string& delimiter) {
         size_t pos = str.find(delimiter);
@@ -399,7 +754,12 @@ double read_packet() {
 
 int main(int argc, char* argv[]) {
     if (argc < 4) {
-        std::cerr << "Usage: " << argv[0] << " <input_pcap_file> <output.csv_file> <symbols_of_interest.txt_file>" << std::endl;
+        std::cerr << "Usage: " << argv[0] << " <input_pcap_file> <output.csv_file> <symbols_of_interest.txt_file> [--format=csv|npy] [--batch-size=N] [--threads=N] [--book-depth=N] [--start-ns=N] [--end-ns=N] [--stop-after-event=C] [--index=PATH|--write-index=PATH] [--checkpoint=PATH] [--types=T85] [--input-mode=mmap|stream] [--decode=pipeline|chunks] [--chunk-size=BYTES] [--stats=PATH]" << std::endl;
+        return 1;
+    }
+
+    ParserOptions options;
+    if (!parse_options(argc, argv, 4, options)) {
         return 1;
     }
 
@@ -408,12 +768,15 @@ int main(int argc, char* argv[]) {
     string symbols_of_interest_file = argv[3];
 
     
-    int max_packets_to_parse = 150000000;
-    //int max_packets_to_parse = 10000000;
+    // The whole capture is parsed, parse() only takes a packet limit for testing (-1 for none)
+    int max_packets_to_parse = -1;
 
-    BasicPcapParser parser(iex_pcap_file_to_parse, trades_output_file_name,symbols_of_interest_file);
+    BasicPcapParser parser(iex_pcap_file_to_parse, trades_output_file_name,symbols_of_interest_file, options);
     
-    parser.parse(max_packets_to_parse);
+    if (parser.parse(max_packets_to_parse) < 0) {
+        cerr << "Failed to parse " << iex_pcap_file_to_parse << endl;
+        return 1;
+    }
 
     cout << "Finished parsing " << iex_pcap_file_to_parse << "; closing all output files" << endl;
     
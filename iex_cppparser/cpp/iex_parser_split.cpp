@@ -10,7 +10,13 @@
 #include <string>
 #include <algorithm>
 #include "logger.h"
+#include "stats.h"
+#include "message_types.h"
 #include "decode_messages.h"
+#include "pcap_reader.h"
+#include "symbol_filter.h"
+#include "options.h"
+#include "split_pipeline.h"
 using namespace std;
 
 // This file is a version of iex_parser.cpp that splits the output into separate files for each symbol based on the first letter of the symbol.
@@ -19,11 +25,14 @@ using namespace std;
 // The program also writes the packet capture time and send time for each message to the output files.  
 // There are two main things that need parsing: the PCAP header and the IEX payload.
 // The PCAP header is 16 bytes long and contains the timestamp and the length of the packet.
-// The parsing of the PCAP header is implemented in the unpackPcapPacketHeader function.
+// Reading the (gzip compressed) PCAP file and unpacking the PCAP headers is implemented by PcapReader in pcap_reader.h.
 // The IEX payload contains the IEX header and the messages. The IEX header contains the payload length, send time of the packet and the number of messages.
 // The main ]-parsing logic is implemented in the parse_iex_payload and parse_iex_message functions.
 // The parse_iex_message function uses the decode_messages.h functions to parse the trade reports and price level updates.
 // To add support for additional message types, you can add new functions to decode_messages.h and call them in this file.
+// With --shards=N or --shards=symbol the output is split by a hash of the symbol (or per symbol) instead, and decoding
+// and writing run on one thread per shard, see split_pipeline.h. --layout=hive writes the files of --shards=symbol into
+// a hive partitioned tree (type=trd/date=2023-10-30/symbol=AAPL/part-0.csv) next to the output prefix instead.
 
 class BasicPcapParser {
 private:
@@ -32,93 +41,79 @@ private:
     string symbols_of_interest_file;
     int cur_packet_message_count;
     // int total_num_messages_processed;
-    std::fstream symbols_file;
     string trade_messages[26];
     string prl_messages[26];
     ofstream output_filenames;
     time_t start_parse_time;
     time_t stop_parse_time;
     string message_buffer = "";
-    ifstream input_file;
+    PcapReader pcap_reader;
     Log logger;
-    std::vector<std::string> symbols_list;
-    vector<int> symbols_of_interest_indices;
+    SymbolFilter symbol_filter;
     vector<ofstream> trades_output_file;
     vector<ofstream> prl_output_file;
-    
-    struct PcapPacketHeader {
-        uint32_t ts_sec;
-        uint32_t ts_usec;
-        uint32_t incl_len;
-        uint32_t orig_len;
-    };
+    ParserOptions options;
+    unique_ptr<SplitPipeline> split_pipeline;
+    MessageTable message_table;
+    bool stop_event_seen = false;
+    ParseStats stats;
     
 public:
-    BasicPcapParser(std::string filename, std::string output_filename, std::string symbols_of_interest_file) : filename(filename), output_filename(output_filename),symbols_of_interest_file(symbols_of_interest_file) {
+    BasicPcapParser(std::string filename, std::string output_filename, std::string symbols_of_interest_file, const ParserOptions& options) : filename(filename), output_filename(output_filename),symbols_of_interest_file(symbols_of_interest_file), options(options) {
     // Initialization of variables
+        message_table.select(options.types);
         cur_packet_message_count = 0;
         // total_num_messages_processed = 0;
     }
 
-    // Function to unpack the pcap packet header
-    void unpackPcapPacketHeader(const std::vector<uint8_t>& buffer, PcapPacketHeader& header) {
-        if (buffer.size() < sizeof(PcapPacketHeader)) {
-            cerr << "Error: Insufficient data in buffer for unpacking." << endl;
-            return;
-        }
-
-        memcpy(&header, buffer.data(), sizeof(PcapPacketHeader));
-    }
 
 
     // Function to parse the pcap file  
 
     int parse(int max_packets_to_parse) {
-        // Open the input file
-        input_file.open(filename, ios::binary);
-
-        // Check if the file is opened successfully
-        if (!input_file.is_open()) {
+        // Open the input file. PcapReader decompresses gzip files itself and reads the pcap global header.
+        // Uncompressed files are mapped into memory unless --input-mode=stream.
+        pcap_reader.set_mmap(options.input_mode == "mmap");
+        if (!pcap_reader.open(filename)) {
             cerr << "Error: Unable to open file " << filename << endl;
             return -1;
         }
 
         
-        symbols_file.open(symbols_of_interest_file, std::ios::in); // open file in read mode
-        if (symbols_of_interest_file=="ALL")
-        {
-            cout << "Parsing all symbols" << endl;
-            symbols_list = {};
-        }
-        else if (symbols_file.is_open()) {
-            
-            std::string line;
-
-            while (std::getline(symbols_file, line)) { // read each line from the file
-                symbols_list.push_back(line.substr(0, line.size())); // add the line to the vector without the newline character
-            }
-
-            std::cout << "Read " << symbols_list.size() << " symbols from the file.\n";
-
-            symbols_file.close(); // don't forget to close the file when you're done
-        } else {
+        // Load the symbols of interest into a hash set keyed by the raw 8 byte symbol field
+        if (!symbol_filter.load(symbols_of_interest_file)) {
             std::cout << "Error opening symbols of interest file";
             return -1;
         }
-
-        symbols_of_interest_indices = get_symbol_first_letter_indices(symbols_list);
+        if (symbol_filter.accepts_all()) {
+            cout << "Parsing all symbols" << endl;
+        } else {
+            std::cout << "Read " << symbol_filter.size() << " symbols from the file.\n";
+        }
 
         // Get the current time as the start time for parsing
         start_parse_time = time(nullptr);
         cout << "Starting parsing @ " << put_time(std::localtime(&start_parse_time), "%c") << endl;
         logger.write("Started parsing");
-
-        // Skip the pcap global header which is 24 bytes long
-        int pcap_global_header_len = 24;
-        input_file.ignore(pcap_global_header_len);
+        stats.start(options.stats_path, filename, options.stats_interval);
 
         int num_packets = 0;
 
+        if (options.shards > 0 || options.shard_by_symbol) {
+            split_pipeline.reset(new SplitPipeline(output_filename, options.shards, options.threads, options.max_open_files));
+            if (options.layout == "hive") {
+                // The partitions go into the directory of the output prefix
+                size_t slash = output_filename.rfind('/');
+                split_pipeline->use_hive_layout(slash == string::npos ? "." : output_filename.substr(0, slash), options.partition_date);
+            }
+            if (options.shards > 0) {
+                cout << "Splitting into " << options.shards << " shards" << endl;
+            } else {
+                cout << "Splitting by symbol with " << split_pipeline->thread_count() << " writer threads" << endl;
+            }
+            return parse_sharded(max_packets_to_parse);
+        }
+
         // Open a file to store output filenames
         output_filenames.open(output_filename + ".txt");
 
@@ -141,6 +136,8 @@ public:
         }
 
         output_filenames.close();
+        // A stream keeps its fail bit, so checking the streams once they are closed catches every failed open and write
+        bool write_failed = output_filenames.fail();
 
         // Main loop to read and process packets
         while (true) {
@@ -157,6 +154,10 @@ public:
                     prl_output_file[i] << prl_messages[i];
                     trades_output_file[i].close();
                     prl_output_file[i].close();
+                    write_failed = trades_output_file[i].fail() || prl_output_file[i].fail() || write_failed;
+                }
+                if (write_failed) {
+                    cerr << "Error: Failed to write the output files" << endl;
                 }
 
                 // Check if end of file is reached
@@ -171,7 +172,9 @@ public:
                     cout << "Closing all output files" << endl;
                     //close_all_files();
                 }
-                exit(0); // Exit the program
+                bool failed = pcap_reader.failed() || write_failed;
+                stats.write(failed ? "failed" : "finished", pcap_reader.position(), StageTimes());
+                exit(failed ? 1 : 0); // Exit the program
             }
 
             // Output progress every 10 million packets
@@ -189,39 +192,66 @@ public:
                 cout << "Parsed " << num_packets << " packets: " << put_time(localtime(&packet_time), "%c") << endl;
             }
         }
-        input_file.close(); // Close the file
+        pcap_reader.close(); // Close the file
+    }
+
+    // Main loop of the sharded split. The shard threads create the files as rows arrive, so the list of output
+    // files is written once they are done.
+    int parse_sharded(int max_packets_to_parse) {
+        int num_packets = 0;
+        while (true) {
+            double time_float = read_packet();
+            num_packets++;
+
+            if ((max_packets_to_parse != -1 && num_packets > max_packets_to_parse) || time_float == -1) {
+                break;
+            }
+
+            if (num_packets % 10000000 == 0) {
+                time_t packet_time = static_cast<time_t>(time_float);
+                cout << "Parsed " << num_packets << " packets: " << put_time(localtime(&packet_time), "%c") << endl;
+            }
+        }
+        pcap_reader.close();
+
+        bool written = split_pipeline->finish();
+        stats.write(written && !pcap_reader.failed() ? "finished" : "failed", pcap_reader.position(), split_pipeline->stage_times());
+        if (!written) {
+            cerr << "Error: Failed to write the output files" << endl;
+            return -1;
+        }
+        output_filenames.open(output_filename + ".txt");
+        for (const string& output_file : split_pipeline->output_files()) {
+            output_filenames << output_file << endl;
+        }
+        output_filenames.close();
+        // The files hold what was read before the input failed, so the parse is not complete
+        return pcap_reader.failed() ? -1 : 0;
     }
 
 
     // Read a packet from the input file
     double read_packet() {
-        // Length of the packet header in bytes
-        int packet_header_len = 4 + 4 + 4 + 4;
-        
         // Check if the input file is open
-        if (!input_file.is_open()) {
+        if (!pcap_reader.is_open()) {
             cerr << "Error: Unable to open file " << filename << endl;
             return 1;
         }
 
-        char packet_header[16];
-        // Read the packet header from the input file
-        input_file.read(packet_header, packet_header_len);
-
-        // Check if the end of file is reached or if the packet header is incomplete
-        if (input_file.eof() || input_file.gcount() != 16) {
-            cout << "End of file reached... terminating!" << endl;
-            stop_parse_time = time(nullptr);
-            cout << "Stopped parsing @ " << put_time(localtime(&stop_parse_time), "%c") << endl;
-            double parsing_time = difftime(stop_parse_time, start_parse_time);
-            cout << "Parsed in " << parsing_time << " seconds" << endl;
-            //close_all_files();
-            return -1;
+        // Everything after the system event of --stop-after-event is outside the window
+        if (stop_event_seen) {
+            return stop_reading("Reached system event '" + string(1, options.stop_event) + "'");
         }
 
-        // Unpack the pcap packet header
+        // Read the header of the next packet. The packet data is only read if the packet is needed.
         PcapPacketHeader pcap_packet_header;
-        unpackPcapPacketHeader(std::vector<uint8_t>(packet_header, packet_header + 16), pcap_packet_header);
+        if (!pcap_reader.next_packet_header(pcap_packet_header)) {
+            return stop_reading("End of file reached");
+        }
+        stats.packets_read++;
+        if (stats.due()) {
+            stats.sample(pcap_reader.position(), split_pipeline ? split_pipeline->stage_times() : StageTimes());
+        }
 
         // Extract timestamp and packet length from the pcap packet header
         auto ts_sec = pcap_packet_header.ts_sec;
@@ -232,47 +262,69 @@ public:
         double time_float = ts_sec + (ts_usec * 1e-6);
         uint64_t packet_capture_time_in_nanoseconds = (ts_sec * 1e9) + (ts_usec * 1e3);
 
+        // Packets are captured in order, so nothing after the end of the window is needed
+        if (packet_capture_time_in_nanoseconds >= options.end_ns) {
+            return stop_reading("Reached the end of the time window");
+        }
+        // Packets before the window are passed over on their pcap header alone, without reading the payload
+        if (packet_capture_time_in_nanoseconds < options.start_ns) {
+            return pcap_reader.skip_packet_data() ? time_float : stop_reading("End of file reached");
+        }
+
+        // Check if the end of file is reached or if the packet is incomplete
+        const char* packet_data = pcap_reader.packet_data();
+        if (packet_data == nullptr) {
+            return stop_reading("End of file reached");
+        }
+
         // Skip the Ethernet, IP, and UDP headers to get to the IEX payload. The total length of these headers is 42 bytes.
         int offset_into_iex_payload = 14 + 20 + 8;
-        input_file.ignore(offset_into_iex_payload);
         
-        // Check if the packet length is less than 42 bytes
-        if (incl_len < 42) {
-            cout << "Invalid packet length: " << incl_len << endl;
+        // Check that the packet holds the 42 bytes of headers and the 40 byte IEX header
+        if (incl_len < 42 + 40) {
+            logger.warn(LOG_MALFORMED_PACKET, "Invalid packet length: " + to_string(incl_len));
+            stats.packets_malformed++;
             return time_float;
         }
         
-        vector<char> iex_payload(incl_len - 42);
-        input_file.read(iex_payload.data(), incl_len - 42);
+        // The IEX payload is parsed in place, straight from the packet bytes handed out by pcap_reader
+        const char* iex_payload = packet_data + offset_into_iex_payload;
+        size_t iex_payload_size = incl_len - offset_into_iex_payload;
 
         // Parse the IEX payload
-        parse_iex_payload(iex_payload, packet_capture_time_in_nanoseconds);
+        stats.packets_parsed++;
+        parse_iex_payload(iex_payload, iex_payload_size, packet_capture_time_in_nanoseconds);
 
         return time_float;
     }
 
-    // Parse the IEX payload to extract individual messages
-    void parse_iex_payload(const std::vector<char>& payload, uint64_t packet_capture_time_in_nanoseconds) {
-        // Extract the first 40 bytes of the payload
-        auto start = payload.begin();
-        auto end = payload.begin() + 40;
-        vector<char> sliced_payload(start, end);
+    // Report why reading stopped and how long parsing took. Returns -1, which ends the parse loops.
+    double stop_reading(const string& reason) {
+        cout << reason << "... terminating!" << endl;
+        stop_parse_time = time(nullptr);
+        cout << "Stopped parsing @ " << put_time(localtime(&stop_parse_time), "%c") << endl;
+        double parsing_time = difftime(stop_parse_time, start_parse_time);
+        cout << "Parsed in " << parsing_time << " seconds" << endl;
+        return -1;
+    }
 
+    // Parse the IEX payload to extract individual messages
+    void parse_iex_payload(const char* payload, size_t payload_size, uint64_t packet_capture_time_in_nanoseconds) {
         uint16_t payload_len;
         uint16_t message_count;
         long long send_time;
-        // Extract the fields from the IEX header
-        memcpy(&send_time, &sliced_payload[32], 8);
-        memcpy(&payload_len, &sliced_payload[12], 2);
-        memcpy(&message_count, &sliced_payload[14], 2);
+        // Extract the fields from the 40 byte IEX header
+        memcpy(&send_time, payload + 32, 8);
+        memcpy(&payload_len, payload + 12, 2);
+        memcpy(&message_count, payload + 14, 2);
 
         // Check if the size of the payload matches the reported length in the header
-        if (payload.size() != payload_len + 40) {
+        if (payload_size != payload_len + 40) {
             throw runtime_error("Invalid parser state; the length of UDP packet payload should be forty plus the payload_len within IEX header");
         }
 
-        // Extract message bytes from the payload
-        const vector<char> message_bytes(payload.begin() + 40, payload.end());
+        // Messages follow the IEX header
+        const char* message_bytes = payload + 40;
 
         size_t cur_offset = 0;
         cur_packet_message_count = message_count;
@@ -282,15 +334,19 @@ public:
             // total_num_messages_processed++;
             // size_t message_id = total_num_messages_processed;
 
-            // Extract the length of the current message
-            uint16_t tuple_message_len;
-            memcpy(&tuple_message_len, &message_bytes[cur_offset], sizeof(uint16_t));
-            size_t message_len = tuple_message_len;
+            // Extract the length of the current message. A message that runs past the payload ends the packet.
+            size_t message_len = message_length_at(message_bytes, payload_len, cur_offset);
+            if (message_len == 0) {
+                logger.warn(LOG_MALFORMED_PACKET, "Invalid message length at offset " + to_string(cur_offset) + " of a " +
+                                                  to_string(payload_len) + " byte payload, skipping the rest of the packet");
+                stats.packets_malformed++;
+                return;
+            }
 
-            // Extract the bytes of the current message
-            vector<char> message_bytes_sliced(message_bytes.begin() + cur_offset + 2, message_bytes.begin() + cur_offset + 2 + message_len);
+            // View of the bytes of the current message
+            const char* message_payload = message_bytes + cur_offset + 2;
             // Parse the current message
-            parse_iex_message(message_bytes_sliced, packet_capture_time_in_nanoseconds, send_time);
+            parse_iex_message(message_payload, message_len, packet_capture_time_in_nanoseconds, send_time);
 
             // Move the offset to the next message
             cur_offset += 2 + message_len;
@@ -304,55 +360,67 @@ public:
 
 
     // Parse an IEX message from its payload
-    void parse_iex_message(const std::vector<char>& message_payload, long long packet_capture_time_in_nanoseconds, long long send_time) {
+    void parse_iex_message(const char* message_payload, size_t message_len, long long packet_capture_time_in_nanoseconds, long long send_time) {
         // Extract the message type byte
         char message_type_byte = message_payload[0];
-        // Convert the message type byte to a string
-        string message_type(1, message_type_byte);
+        stats.messages[static_cast<unsigned char>(message_type_byte)]++;
+
+        // The rest of this packet is still parsed after the system event that ends the parse
+        if (message_type_byte == 'S' && options.stop_event != 0 && message_len >= 2 && message_payload[1] == options.stop_event) {
+            stop_event_seen = true;
+        }
+
+        // Only trades and price level updates of the types selected with --types are split, see message_types.h
+        MessageAction action = message_table.action(message_type_byte);
+        if (action == MESSAGE_SKIP) {
+            return;
+        }
+
+        // Drop messages for symbols that are not of interest before decoding them
+        stats.filter_checked++;
+        if (!symbol_filter.accepts(message_payload, message_len)) {
+            return;
+        }
+        stats.filter_accepted++;
+        (action == MESSAGE_TRADE ? stats.trade_records : stats.price_level_records)++;
+        if (split_pipeline) {
+            split_pipeline->add(message_payload, message_len, packet_capture_time_in_nanoseconds, send_time);
+            return;
+        }
         // Get the message ID
         // int message_id = total_num_messages_processed;
 
         // Process different message types
-        if (message_type == "T") {
+        if (action == MESSAGE_TRADE) {
             // Parse the trade report message
-            pair<string, string> parsed_message = parse_trade_report_message(message_payload);
+            pair<string, string> parsed_message = parse_trade_report_message(message_payload, message_len);
 
             // Append the message string to the appropriate messages array entry
-            if (symbols_of_interest_file=="ALL" || std::find(symbols_list.begin(), symbols_list.end(), parsed_message.second) != symbols_list.end())
-            {
-
-                // Construct the message string
-                string message_string = to_string(packet_capture_time_in_nanoseconds) + "," + to_string(send_time) + ","  + parsed_message.first + "\n";
-                trade_messages[getAlphabetOrderIndex(parsed_message.second)] += message_string;
-            }
+            // Construct the message string
+            string message_string = to_string(packet_capture_time_in_nanoseconds) + "," + to_string(send_time) + ","  + parsed_message.first + "\n";
+            trade_messages[getAlphabetOrderIndex(parsed_message.second)] += message_string;
 
         } 
-        else if (message_type == "8") {
+        else if (message_type_byte == '8') {
             // For bid messages, set the bid flag to 0
             const string bid = "0";
             // Parse the price level update message
-            pair<string, string> parsed_message = parse_price_level_update(message_payload);
+            pair<string, string> parsed_message = parse_price_level_update(message_payload, message_len);
             
-            if (symbols_of_interest_file=="ALL" || std::find(symbols_list.begin(), symbols_list.end(), parsed_message.second) != symbols_list.end())
-            {
-                // Construct the message string
-                string message_string = to_string(packet_capture_time_in_nanoseconds) + "," + to_string(send_time) + "," + parsed_message.first + "," + bid + "\n";
-                prl_messages[getAlphabetOrderIndex(parsed_message.second)] += message_string;
-            }
+            // Construct the message string
+            string message_string = to_string(packet_capture_time_in_nanoseconds) + "," + to_string(send_time) + "," + parsed_message.first + "," + bid + "\n";
+            prl_messages[getAlphabetOrderIndex(parsed_message.second)] += message_string;
         } 
-        else if (message_type == "5") {
+        else if (message_type_byte == '5') {
             // For ask messages, set the ask flag to 1
             const string ask = "1";
             // Parse the price level update message
-            pair<string, string> parsed_message = parse_price_level_update(message_payload);
+            pair<string, string> parsed_message = parse_price_level_update(message_payload, message_len);
 
-            if (symbols_of_interest_file=="ALL" || std::find(symbols_list.begin(), symbols_list.end(), parsed_message.second) != symbols_list.end())
-            {
-                // Construct the message string
-                string message_string = to_string(packet_capture_time_in_nanoseconds) + "," + to_string(send_time) + "," + parsed_message.first + "," + ask + "\n";
+            // Construct the message string
+            string message_string = to_string(packet_capture_time_in_nanoseconds) + "," + to_string(send_time) + "," + parsed_message.first + "," + ask + "\n";
 
-                prl_messages[getAlphabetOrderIndex(parsed_message.second)] += message_string;
-            }
+            prl_messages[getAlphabetOrderIndex(parsed_message.second)] += message_string;
         } 
     }
 
@@ -408,7 +476,24 @@ public:
 
 int main(int argc, char* argv[]) {
     if (argc < 4) {
-        std::cerr << "Usage: " << argv[0] << " <input_pcap_file> <output.csv_file> <symbols_of_interest.txt_file>" << std::endl;
+        std::cerr << "Usage: " << argv[0] << " <input_pcap_file> <output.csv_file> <symbols_of_interest.txt_file> [--shards=N|symbol] [--layout=flat|hive] [--date=YYYY-MM-DD] [--threads=N] [--max-open-files=N] [--start-ns=N] [--end-ns=N] [--stop-after-event=C] [--types=T85] [--input-mode=mmap|stream] [--stats=PATH]" << std::endl;
+        return 1;
+    }
+
+    ParserOptions options;
+    if (!parse_options(argc, argv, 4, options)) {
+        return 1;
+    }
+    if (options.format != "csv") {
+        cerr << "Error: The split parser only writes csv" << endl;
+        return 1;
+    }
+    if (options.layout == "hive" && !options.shard_by_symbol) {
+        cerr << "Error: --layout=hive writes one file per symbol and needs --shards=symbol" << endl;
+        return 1;
+    }
+    if (options.types.find_first_not_of(DEFAULT_MESSAGE_TYPES) != string::npos) {
+        cerr << "Error: The split parser only writes trades and price level updates, --types must be a subset of " << DEFAULT_MESSAGE_TYPES << endl;
         return 1;
     }
 
@@ -417,12 +502,15 @@ int main(int argc, char* argv[]) {
     string symbols_of_interest_file = argv[3];
 
     
-    int max_packets_to_parse = 1000000000;
-    //int max_packets_to_parse = 10000000;
+    // The whole capture is parsed, parse() only takes a packet limit for testing (-1 for none)
+    int max_packets_to_parse = -1;
 
-    BasicPcapParser parser(iex_pcap_file_to_parse, trades_output_file_name,symbols_of_interest_file);
+    BasicPcapParser parser(iex_pcap_file_to_parse, trades_output_file_name,symbols_of_interest_file, options);
     
-    parser.parse(max_packets_to_parse);
+    if (parser.parse(max_packets_to_parse) < 0) {
+        cerr << "Failed to parse " << iex_pcap_file_to_parse << endl;
+        return 1;
+    }
 
     cout << "Finished parsing " << iex_pcap_file_to_parse << "; closing all output files" << endl;
 
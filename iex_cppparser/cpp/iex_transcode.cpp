@@ -0,0 +1,139 @@
+#include <iostream>
+#include <cstdint>
+#include <cstring>
+#include <string>
+#include <vector>
+#include "pcap_reader.h"
+#include "block_writer.h"
+#include "options.h"
+using namespace std;
+
+// This program rewrites a pcap capture (usually the single gzip member .pcap.gz downloaded from IEX) into a block
+// compressed capture: a series of gzip members that each hold whole packets, see pcap_reader.h.
+// The result is still a valid .pcap.gz file, but the parser binaries inflate its members on all cores at once and
+// can seek to any member start, and a block table (<output_file>.blocks.csv) lists where each member starts.
+// Only classic pcap captures are supported, as those are what IEX publishes.
+
+// Blocks must fit in a block of InflateStream, whose default size is 64 MiB
+static const size_t MAX_BLOCK_SIZE = 16 << 20;
+
+static const uint32_t PCAP_MAGIC_MICROSECONDS = 0xa1b2c3d4;
+static const uint32_t PCAP_MAGIC_NANOSECONDS = 0xa1b23c4d;
+static const size_t PCAP_GLOBAL_HEADER_LENGTH = 24;
+static const size_t PCAP_RECORD_HEADER_LENGTH = 16;
+
+int transcode(const string& input_file, const string& output_file, const ParserOptions& options) {
+    InflateStream stream;
+    stream.set_mmap(options.input_mode == "mmap");
+    if (!stream.open(input_file)) {
+        return 1;
+    }
+
+    const char* global_header = stream.view(PCAP_GLOBAL_HEADER_LENGTH);
+    if (global_header == nullptr) {
+        cerr << "Error: " << input_file << " is too short to be a capture file" << endl;
+        return 1;
+    }
+    uint32_t magic;
+    memcpy(&magic, global_header, 4);
+    bool swapped = magic == __builtin_bswap32(PCAP_MAGIC_MICROSECONDS) || magic == __builtin_bswap32(PCAP_MAGIC_NANOSECONDS);
+    if (swapped) {
+        magic = __builtin_bswap32(magic);
+    }
+    if (magic != PCAP_MAGIC_MICROSECONDS && magic != PCAP_MAGIC_NANOSECONDS) {
+        cerr << "Error: " << input_file << " is not a classic pcap capture, which is the only format that can be transcoded" << endl;
+        return 1;
+    }
+    uint64_t fraction_ns = magic == PCAP_MAGIC_NANOSECONDS ? 1 : 1000;
+
+    BlockWriter writer(options.threads, static_cast<int>(options.compression_level));
+    if (!writer.open(output_file)) {
+        return 1;
+    }
+
+    // The global header goes into the first block, so the first member starts the capture like in the original file
+    vector<char> block;
+    block.reserve(options.block_size + PCAP_RECORD_HEADER_LENGTH);
+    block.insert(block.end(), global_header, global_header + PCAP_GLOBAL_HEADER_LENGTH);
+    uint64_t packets = 0;
+    uint64_t block_first_packet = 0;
+    uint64_t block_first_capture_ns = 0;
+    bool ok = true;
+
+    while (ok) {
+        const char* record_header = stream.view(PCAP_RECORD_HEADER_LENGTH);
+        if (record_header == nullptr) {
+            break;
+        }
+        uint32_t fields[4];
+        memcpy(fields, record_header, sizeof(fields));
+        if (swapped) {
+            for (uint32_t& field : fields) {
+                field = __builtin_bswap32(field);
+            }
+        }
+        uint32_t incl_len = fields[2];
+        if (incl_len > MAX_BLOCK_SIZE - PCAP_RECORD_HEADER_LENGTH) {
+            cerr << "Error: Invalid packet length " << incl_len << ", the capture is corrupted" << endl;
+            ok = false;
+            break;
+        }
+
+        // Start a new block if the packet does not fit, so blocks always end at a packet boundary
+        if (block.size() + PCAP_RECORD_HEADER_LENGTH + incl_len > options.block_size && packets > block_first_packet) {
+            ok = writer.add(std::move(block), block_first_packet, block_first_capture_ns);
+            block = vector<char>();
+            block.reserve(options.block_size + PCAP_RECORD_HEADER_LENGTH);
+            block_first_packet = packets;
+        }
+        if (packets == block_first_packet) {
+            block_first_capture_ns = static_cast<uint64_t>(fields[0]) * 1000000000 + static_cast<uint64_t>(fields[1]) * fraction_ns;
+        }
+
+        block.insert(block.end(), record_header, record_header + PCAP_RECORD_HEADER_LENGTH);
+        const char* data = stream.view(incl_len);
+        if (data == nullptr) {
+            cerr << "Warning: Truncated packet at end of capture, dropping it" << endl;
+            block.resize(block.size() - PCAP_RECORD_HEADER_LENGTH);
+            break;
+        }
+        block.insert(block.end(), data, data + incl_len);
+        packets++;
+    }
+    if (ok && !block.empty()) {
+        ok = writer.add(std::move(block), block_first_packet, block_first_capture_ns);
+    }
+    if (stream.failed()) {
+        ok = false;
+    }
+    if (!writer.close(output_file + ".blocks.csv") || !ok) {
+        cerr << "Failed to transcode " << input_file << endl;
+        return 1;
+    }
+    cout << "Transcoded " << packets << " packets of " << input_file << " into " << output_file << endl;
+    return 0;
+}
+
+int main(int argc, char* argv[]) {
+    if (argc < 3) {
+        std::cerr << "Usage: " << argv[0] << " <input_pcap_file> <output_pcap_gz_file> [--block-size=N] [--level=N] [--threads=N] [--input-mode=mmap|stream]" << std::endl;
+        return 1;
+    }
+
+    ParserOptions options;
+    if (!parse_options(argc, argv, 3, options)) {
+        return 1;
+    }
+    if (options.block_size > MAX_BLOCK_SIZE) {
+        cerr << "Error: --block-size must be at most " << MAX_BLOCK_SIZE << " bytes" << endl;
+        return 1;
+    }
+
+    string input_file = argv[1];
+    string output_file = argv[2];
+    if (input_file == output_file) {
+        cerr << "Error: The output file must not be the input file" << endl;
+        return 1;
+    }
+    return transcode(input_file, output_file, options);
+}
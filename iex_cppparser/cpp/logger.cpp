@@ -1,15 +1,251 @@
 #include "logger.h"
-#include <fstream>
-#include <iostream>
+#include <algorithm>
+#include <atomic>
+#include <chrono>
+#include <cstdint>
+#include <cstdio>
+#include <cstdlib>
 #include <ctime>
+#include <iostream>
+#include <memory>
+#include <thread>
+using namespace std;
+
+// Names of the warning categories, in the order of LogCategory, used in the counts of suppressed warnings
+static const char* const CATEGORY_NAMES[LOG_CATEGORY_COUNT] = {
+    "payload too short",
+    "empty symbol",
+    "unusual price",
+    "zero size trade",
+    "unexpected event flag",
+    "failed to decode message",
+    "malformed packet",
+    "unknown order",
+};
+
+// Number of queued messages. When the writer thread falls this far behind, further messages are dropped and counted.
+static const size_t QUEUE_CAPACITY = 8192;
+
+struct LogRecord {
+    time_t time = 0;
+    bool console = false;
+    string text;
+};
+
+// Bounded multi producer queue (Dmitry Vyukov's design): producers claim a cell with a compare and swap on the enqueue
+// position, and the sequence number of each cell tells whether it holds a record or is free, so no lock is taken
+class LogQueue {
+public:
+    LogQueue() : cells(new Cell[QUEUE_CAPACITY]) {
+        for (size_t i = 0; i < QUEUE_CAPACITY; ++i) {
+            cells[i].sequence.store(i, memory_order_relaxed);
+        }
+    }
+
+    // Returns false if the queue is full
+    bool push(LogRecord&& record) {
+        size_t position = enqueue_position.load(memory_order_relaxed);
+        while (true) {
+            Cell& cell = cells[position & (QUEUE_CAPACITY - 1)];
+            size_t sequence = cell.sequence.load(memory_order_acquire);
+            intptr_t difference = static_cast<intptr_t>(sequence) - static_cast<intptr_t>(position);
+            if (difference == 0) {
+                if (enqueue_position.compare_exchange_weak(position, position + 1, memory_order_relaxed)) {
+                    cell.record = std::move(record);
+                    cell.sequence.store(position + 1, memory_order_release);
+                    return true;
+                }
+            } else if (difference < 0) {
+                return false;
+            } else {
+                position = enqueue_position.load(memory_order_relaxed);
+            }
+        }
+    }
+
+    // Only called by the writer thread. Returns false if the queue is empty.
+    bool pop(LogRecord& record) {
+        Cell& cell = cells[dequeue_position & (QUEUE_CAPACITY - 1)];
+        if (cell.sequence.load(memory_order_acquire) != dequeue_position + 1) {
+            return false;
+        }
+        record = std::move(cell.record);
+        cell.sequence.store(dequeue_position + QUEUE_CAPACITY, memory_order_release);
+        dequeue_position++;
+        return true;
+    }
+
+private:
+    struct Cell {
+        atomic<size_t> sequence;
+        LogRecord record;
+    };
+    unique_ptr<Cell[]> cells;
+    atomic<size_t> enqueue_position{0};
+    size_t dequeue_position = 0;
+};
+
+// Process wide log backend shared by all Log objects. It starts its writer thread when the first message is logged
+// and writes the remaining messages and the final counts when the program exits.
+class LogSink {
+public:
+    LogSink() {
+        const char* path_variable = getenv("LOG_FILE_PATH");
+        if (path_variable != nullptr) {
+            path = path_variable;
+        } else {
+            const char* temporary_dir = getenv("TMPDIR");
+            path = string(temporary_dir != nullptr && *temporary_dir != '\0' ? temporary_dir : "/tmp") + "/iex_parser.log";
+        }
+        first_n = environment_number("LOG_FIRST_N", 10);
+        summary_interval = chrono::seconds(environment_number("LOG_SUMMARY_INTERVAL", 10));
+        for (size_t i = 0; i < LOG_CATEGORY_COUNT; ++i) {
+            counts[i].store(0, memory_order_relaxed);
+            summarized[i] = 0;
+        }
+        writer = thread(&LogSink::writer_loop, this);
+    }
+
+    ~LogSink() {
+        stopping.store(true, memory_order_release);
+        writer.join();
+        drain();
+        summarize();
+        if (file != nullptr) {
+            fclose(file);
+        }
+    }
+
+    void enqueue(bool console, const string& text) {
+        LogRecord record;
+        record.time = time(nullptr);
+        record.console = console;
+        record.text = text;
+        if (!queue.push(std::move(record))) {
+            dropped.fetch_add(1, memory_order_relaxed);
+        }
+    }
+
+    void warn(LogCategory category, const string& message) {
+        uint64_t count = counts[category].fetch_add(1, memory_order_relaxed) + 1;
+        if (count < first_n) {
+            enqueue(true, message);
+        } else if (count == first_n) {
+            enqueue(true, message + " (further warnings like this are counted)");
+        }
+    }
+
+private:
+    static uint64_t environment_number(const char* name, uint64_t default_value) {
+        const char* value = getenv(name);
+        if (value == nullptr || *value == '\0') {
+            return default_value;
+        }
+        char* end = nullptr;
+        unsigned long long number = strtoull(value, &end, 10);
+        return *end == '\0' ? number : default_value;
+    }
+
+    void writer_loop() {
+        chrono::steady_clock::time_point next_summary = chrono::steady_clock::now() + summary_interval;
+        while (!stopping.load(memory_order_acquire)) {
+            if (!drain()) {
+                this_thread::sleep_for(chrono::milliseconds(10));
+            }
+            if (chrono::steady_clock::now() >= next_summary) {
+                summarize();
+                next_summary = chrono::steady_clock::now() + summary_interval;
+            }
+        }
+    }
+
+    // Write all queued records. Returns false if there were none.
+    bool drain() {
+        LogRecord record;
+        bool wrote = false;
+        while (queue.pop(record)) {
+            output(record);
+            wrote = true;
+        }
+        uint64_t lost = dropped.exchange(0, memory_order_relaxed);
+        if (lost > 0) {
+            record.time = time(nullptr);
+            record.console = false;
+            record.text = "Warning: " + to_string(lost) + " log messages were dropped because the log queue was full";
+            output(record);
+            wrote = true;
+        }
+        if (wrote && file != nullptr) {
+            fflush(file);
+        }
+        return wrote;
+    }
 
-void Log::write(const std::string& message) {
-    std::ofstream file("/vagrant/logfile.log", std::ios_base::app);
-    if (file.is_open()) {
-        std::time_t now = std::time(nullptr);
-        file << std::ctime(&now) << " - " << message << "\n";
-        file.close();
-    } else {
-        std::cerr << "Unable to open file\n";
+    // Log the number of warnings of each category that were not logged in full since the last summary
+    void summarize() {
+        LogRecord record;
+        for (size_t i = 0; i < LOG_CATEGORY_COUNT; ++i) {
+            uint64_t count = counts[i].load(memory_order_relaxed);
+            if (count <= first_n || count == summarized[i]) {
+                continue;
+            }
+            uint64_t suppressed = count - max(summarized[i], first_n);
+            summarized[i] = count;
+            record.time = time(nullptr);
+            record.console = true;
+            record.text = string("Warning: ") + to_string(suppressed) + " more warnings of type '" + CATEGORY_NAMES[i] + "' (" +
+                          to_string(count) + " in total)";
+            output(record);
+        }
+        if (file != nullptr) {
+            fflush(file);
+        }
     }
+
+    void output(const LogRecord& record) {
+        if (record.console) {
+            cout << record.text << "\n";
+        }
+        if (path.empty() || file_failed) {
+            return;
+        }
+        if (file == nullptr) {
+            file = fopen(path.c_str(), "a");
+            if (file == nullptr) {
+                file_failed = true;
+                cerr << "Warning: Unable to open log file " << path << ", set LOG_FILE_PATH to change it" << endl;
+                return;
+            }
+        }
+        struct tm local_time;
+        localtime_r(&record.time, &local_time);
+        char timestamp[32];
+        strftime(timestamp, sizeof(timestamp), "%Y-%m-%d %H:%M:%S", &local_time);
+        fprintf(file, "%s - %s\n", timestamp, record.text.c_str());
+    }
+
+    LogQueue queue;
+    atomic<uint64_t> counts[LOG_CATEGORY_COUNT];
+    uint64_t summarized[LOG_CATEGORY_COUNT];   // counts at the last summary, only used by the writer thread
+    atomic<uint64_t> dropped{0};
+    atomic<bool> stopping{false};
+    string path;
+    uint64_t first_n = 10;
+    chrono::seconds summary_interval{10};
+    FILE* file = nullptr;
+    bool file_failed = false;
+    thread writer;
+};
+
+static LogSink& sink() {
+    static LogSink instance;
+    return instance;
+}
+
+void Log::write(const string& message) {
+    sink().enqueue(false, message);
+}
+
+void Log::warn(LogCategory category, const string& message) {
+    sink().warn(category, message);
 }
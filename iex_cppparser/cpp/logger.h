@@ -3,9 +3,33 @@
 
 #include <string>
 
+// Messages are written to a log file by a background thread, so logging never blocks the decoder threads on file I/O.
+// The log is configured with the same environment variables as the Python package (iex_cppparser/logger.py):
+//     LOG_FILE_PATH           path of the log file, default iex_parser.log in $TMPDIR or /tmp; empty to only log to the console
+//     LOG_FIRST_N             number of warnings of each category that are logged in full, default 10
+//     LOG_SUMMARY_INTERVAL    seconds between the counts of further warnings of each category, default 10
+
+// Categories of warnings that can repeat for every message of a capture. Only the first LOG_FIRST_N warnings of each
+// category are logged, after that the number of further warnings is logged periodically and when the program exits.
+enum LogCategory {
+    LOG_SHORT_PAYLOAD,
+    LOG_EMPTY_SYMBOL,
+    LOG_UNUSUAL_PRICE,
+    LOG_ZERO_SIZE_TRADE,
+    LOG_UNEXPECTED_EVENT_FLAG,
+    LOG_DECODE_FAILURE,
+    LOG_MALFORMED_PACKET,
+    LOG_UNKNOWN_ORDER,
+    LOG_CATEGORY_COUNT
+};
+
 class Log {
 public:
+    // Append a message to the log file
     void write(const std::string& message);
+
+    // Print a warning to the console and append it to the log file, rate limited per category
+    void warn(LogCategory category, const std::string& message);
 };
 
 #endif
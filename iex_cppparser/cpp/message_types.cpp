@@ -0,0 +1,167 @@
+#include "message_types.h"
+#include "csv_format.h"
+#include "decode_messages.h"
+#include "logger.h"
+#include <algorithm>
+#include <iterator>
+using namespace std;
+
+static Log logger;
+
+const vector<MessageType> OTHER_MESSAGE_TYPES = {
+    {'S', "sys", "Exchange Timestamp,Tick Type,System Event", append_system_event_csv},
+    {'D', "dir", "Exchange Timestamp,Tick Type,Symbol,Round Lot Size,Adjusted POC Price,LULD Tier,Flags", append_security_directory_csv},
+    {'H', "sts", "Exchange Timestamp,Tick Type,Symbol,Trading Status,Reason", append_trading_status_csv},
+    {'O', "hlt", "Exchange Timestamp,Tick Type,Symbol,Operational Halt Status", append_operational_halt_status_csv},
+    {'P', "ssp", "Exchange Timestamp,Tick Type,Symbol,Short Sale Price Test,Detail", append_short_sale_price_test_status_csv},
+    {'E', "sev", "Exchange Timestamp,Tick Type,Symbol,Security Event", append_security_event_csv},
+    {'I', "rli", "Exchange Timestamp,Tick Type,Symbol,Retail Liquidity Indicator", append_retail_liquidity_indicator_csv},
+    {'X', "ofp", "Exchange Timestamp,Tick Type,Symbol,Price Type,Price", append_official_price_csv},
+    {'B', "brk", "Exchange Timestamp,Tick Type,Symbol,Size,Price,Trade ID,Sale Condition", append_trade_break_csv},
+    {'A', "auc", "Exchange Timestamp,Tick Type,Symbol,Auction Type,Paired Shares,Reference Price,Indicative Clearing Price,"
+                 "Imbalance Shares,Imbalance Side,Extension Number,Scheduled Auction Time,Auction Book Clearing Price,"
+                 "Collar Reference Price,Lower Auction Collar,Upper Auction Collar", append_auction_information_csv},
+};
+
+bool MessageTable::select(const string& types) {
+    MessageAction selected[256] = {};
+    for (char type : types) {
+        MessageAction action = MESSAGE_SKIP;
+        if (type == 'T') {
+            action = MESSAGE_TRADE;
+        } else if (type == '8' || type == '5') {
+            action = MESSAGE_PRICE_LEVEL;
+        } else if (ORDER_MESSAGE_TYPES.find(type) != string::npos) {
+            action = MESSAGE_ORDER;
+        } else {
+            for (const MessageType& other : OTHER_MESSAGE_TYPES) {
+                if (other.type == type) {
+                    action = MESSAGE_OTHER;
+                }
+            }
+        }
+        if (action == MESSAGE_SKIP) {
+            return false;
+        }
+        selected[static_cast<uint8_t>(type)] = action;
+    }
+
+    selected_types.clear();
+    for (char type : DEFAULT_MESSAGE_TYPES) {
+        if (selected[static_cast<uint8_t>(type)] != MESSAGE_SKIP) {
+            selected_types += type;
+        }
+    }
+    for (char type : ORDER_MESSAGE_TYPES) {
+        if (selected[static_cast<uint8_t>(type)] != MESSAGE_SKIP) {
+            selected_types += type;
+        }
+    }
+    for (const MessageType& other : OTHER_MESSAGE_TYPES) {
+        if (selected[static_cast<uint8_t>(other.type)] != MESSAGE_SKIP) {
+            selected_types += other.type;
+        }
+    }
+    copy(begin(selected), end(selected), begin(actions));
+    return true;
+}
+
+bool MessageTable::has_order_types() const {
+    for (char type : ORDER_MESSAGE_TYPES) {
+        if (selected(type)) {
+            return true;
+        }
+    }
+    return false;
+}
+
+vector<const MessageType*> MessageTable::other_types() const {
+    vector<const MessageType*> types;
+    for (const MessageType& other : OTHER_MESSAGE_TYPES) {
+        if (selected(other.type)) {
+            types.push_back(&other);
+        }
+    }
+    return types;
+}
+
+string message_file_path(const string& prefix, const MessageType& type) {
+    return prefix + "_" + type.suffix + ".csv";
+}
+
+bool append_message_row(string& out, const MessageType& type, const char* message_payload, size_t message_len,
+                        uint64_t capture_time, long long send_time) {
+    size_t row_start = out.size();
+    append_uint(out, capture_time);
+    out += ',';
+    append_int(out, send_time);
+    out += ',';
+    if (!type.append_csv(out, message_payload, message_len)) {
+        out.resize(row_start);
+        return false;
+    }
+    out += '\n';
+    return true;
+}
+
+bool MessageFiles::open(const string& prefix, const MessageTable& table, bool append) {
+    for (const MessageType* type : table.other_types()) {
+        string path = message_file_path(prefix, *type);
+        // The files only see a few messages per symbol, so they get smaller buffers than the main output files
+        unique_ptr<OutputFile> file(new OutputFile(1 << 20));
+        if (!file->open(path, append)) {
+            return false;
+        }
+        if (!append) {
+            *file << string("Packet Capture Time,Send Time,") + type->columns + "\n";
+        }
+        file_by_type[static_cast<uint8_t>(type->type)] = file.get();
+        type_by_byte[static_cast<uint8_t>(type->type)] = type;
+        files.push_back(move(file));
+    }
+    return true;
+}
+
+void MessageFiles::write(const char* message_payload, size_t message_len, uint64_t capture_time, long long send_time) {
+    uint8_t type = static_cast<uint8_t>(message_payload[0]);
+    if (file_by_type[type] == nullptr) {
+        return;
+    }
+    row.clear();
+    if (append_message_row(row, *type_by_byte[type], message_payload, message_len, capture_time, send_time)) {
+        file_by_type[type]->write(row);
+    } else {
+        logger.warn(LOG_DECODE_FAILURE, string("Warning: Failed to decode message of type '") + message_payload[0] + "', skipping");
+    }
+}
+
+void MessageFiles::write_rows(char type, const string& rows) {
+    OutputFile* file = file_by_type[static_cast<uint8_t>(type)];
+    if (file != nullptr) {
+        file->write(rows);
+    }
+}
+
+bool MessageFiles::sync() {
+    bool ok = true;
+    for (auto& file : files) {
+        ok = file->sync() && ok;
+    }
+    return ok;
+}
+
+vector<uint64_t> MessageFiles::sizes() {
+    vector<uint64_t> file_sizes;
+    for (auto& file : files) {
+        file_sizes.push_back(file->size());
+    }
+    return file_sizes;
+}
+
+bool MessageFiles::close() {
+    bool ok = true;
+    for (auto& file : files) {
+        ok = file->close() && ok;
+    }
+    return ok;
+}
@@ -0,0 +1,104 @@
+#ifndef MESSAGE_TYPES_H
+#define MESSAGE_TYPES_H
+
+#include <cstddef>
+#include <cstdint>
+#include <memory>
+#include <string>
+#include <vector>
+#include "output_file.h"
+
+using namespace std;
+
+// Table driven dispatch of DEEP messages on their type byte (--types of the parser binaries).
+//
+// The readers look up the type byte of every message in a MessageTable, a 256 entry array filled once from --types, and
+// switch on the action it holds. Message types that were not selected map to MESSAGE_SKIP, so they cost the same single
+// lookup however many decoders exist: a trades only parse (--types=T) never copies a price level update. Trades and price
+// level updates go through the decode pipeline to the _trd and _prl files as before. The DEEP+ order messages go through
+// the pipeline as well, to the _ord file and the order book of order_book.h. Every other DEEP message type has a
+// decoder in OTHER_MESSAGE_TYPES and, when selected, is written by a MessageFiles to a file of its own.
+
+enum MessageAction : uint8_t {
+    MESSAGE_SKIP = 0,        // not selected, or not a DEEP message type
+    MESSAGE_TRADE,           // 'T', <prefix>_trd.csv
+    MESSAGE_PRICE_LEVEL,     // '8' (buy side) and '5' (sell side), <prefix>_prl.csv
+    MESSAGE_ORDER,           // DEEP+ order messages 'a', 'M', 'R', 'L' and 'C', <prefix>_ord.csv and <prefix>_lvl.csv
+    MESSAGE_OTHER,           // any other DEEP message, <prefix>_<suffix>.csv
+};
+
+// Decoder and output file of a DEEP message type other than trades and price level updates
+struct MessageType {
+    char type;
+    const char* suffix;      // the messages are written to <prefix>_<suffix>.csv
+    const char* columns;     // CSV header after the Packet Capture Time and Send Time columns
+    bool (*append_csv)(string& out, const char* payload, size_t length);
+};
+
+// Every DEEP message type other than trades and price level updates, in the order of their output files
+extern const vector<MessageType> OTHER_MESSAGE_TYPES;
+
+// Types parsed without --types: trade reports and price level updates
+const string DEFAULT_MESSAGE_TYPES = "T85";
+
+// DEEP+ order messages: add order, order modify, order delete, order executed and clear book
+const string ORDER_MESSAGE_TYPES = "aMRLC";
+
+class MessageTable {
+public:
+    MessageTable() { select(DEFAULT_MESSAGE_TYPES); }
+
+    // Select the message types to parse, one character per type, e.g. "T" for trades only, "T85DH" to add the security
+    // directory and trading status, or "TaMRLC" for the trades and orders of DEEP+. Returns false and leaves the table
+    // unchanged if a character is not a DEEP or DEEP+ message type.
+    bool select(const string& types);
+
+    MessageAction action(char type) const { return actions[static_cast<uint8_t>(type)]; }
+    bool selected(char type) const { return action(type) != MESSAGE_SKIP; }
+
+    // The selected types in a fixed order, e.g. for the signature of a checkpoint
+    const string& types() const { return selected_types; }
+
+    bool has_order_types() const;
+
+    // The selected types other than trades and price level updates, in the order of OTHER_MESSAGE_TYPES
+    vector<const MessageType*> other_types() const;
+
+private:
+    MessageAction actions[256] = {};
+    string selected_types;
+};
+
+// Path of the output file of a message type, <prefix>_<suffix>.csv
+string message_file_path(const string& prefix, const MessageType& type);
+
+// Append the row of a message of another type to out. Returns false, leaving out unchanged, if it cannot be decoded.
+bool append_message_row(string& out, const MessageType& type, const char* message_payload, size_t message_len,
+                        uint64_t capture_time, long long send_time);
+
+// Output files of the selected message types other than trades and price level updates. These messages are rare next to
+// price level updates (a few per symbol and day), so the reader thread formats and writes them itself.
+class MessageFiles {
+public:
+    // Create a file with a header for every selected other message type, or reopen the files to append when resuming
+    bool open(const string& prefix, const MessageTable& table, bool append = false);
+
+    void write(const char* message_payload, size_t message_len, uint64_t capture_time, long long send_time);
+
+    // Append rows formatted with append_message_row to the file of a type
+    void write_rows(char type, const string& rows);
+
+    // Sync the files and return their sizes, for a checkpoint
+    bool sync();
+    vector<uint64_t> sizes();
+
+    bool close();
+
+private:
+    vector<unique_ptr<OutputFile>> files;
+    OutputFile* file_by_type[256] = {};
+    const MessageType* type_by_byte[256] = {};
+    string row;
+};
+
+#endif // MESSAGE_TYPES_H
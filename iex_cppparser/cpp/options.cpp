@@ -0,0 +1,180 @@
+#include "options.h"
+#include <iostream>
+#include <cstdlib>
+using namespace std;
+
+// Parse a positive integer option value. Returns false if the value is not a positive integer.
+static bool parse_positive(const string& value, size_t& result) {
+    char* end = nullptr;
+    unsigned long long parsed = strtoull(value.c_str(), &end, 10);
+    if (value.empty() || *end != '\0' || parsed == 0) {
+        return false;
+    }
+    result = static_cast<size_t>(parsed);
+    return true;
+}
+
+// Parse a non-negative integer option value. Returns false if the value is not a non-negative integer.
+static bool parse_non_negative(const string& value, uint64_t& result) {
+    char* end = nullptr;
+    if (value.empty() || value[0] == '-') {
+        return false;
+    }
+    unsigned long long parsed = strtoull(value.c_str(), &end, 10);
+    if (*end != '\0') {
+        return false;
+    }
+    result = static_cast<uint64_t>(parsed);
+    return true;
+}
+
+bool parse_options(int argc, char* argv[], int first_option, ParserOptions& options) {
+    for (int i = first_option; i < argc; ++i) {
+        string argument = argv[i];
+        size_t equals = argument.find('=');
+        if (argument.compare(0, 2, "--") != 0 || equals == string::npos) {
+            cerr << "Error: Expected an option of the form --name=value, got " << argument << endl;
+            return false;
+        }
+        string name = argument.substr(2, equals - 2);
+        string value = argument.substr(equals + 1);
+
+        if (name == "types") {
+            MessageTable table;
+            if (value.empty() || !table.select(value)) {
+                cerr << "Error: --types must list DEEP or DEEP+ message types, e.g. T85 for trades and price level updates, got " << value << endl;
+                return false;
+            }
+            options.types = value;
+        } else if (name == "input-mode") {
+            if (value != "mmap" && value != "stream") {
+                cerr << "Error: Unsupported input mode " << value << " (expected mmap or stream)" << endl;
+                return false;
+            }
+            options.input_mode = value;
+        } else if (name == "decode") {
+            if (value != "pipeline" && value != "chunks") {
+                cerr << "Error: Unsupported decode mode " << value << " (expected pipeline or chunks)" << endl;
+                return false;
+            }
+            options.decode = value;
+        } else if (name == "chunk-size") {
+            if (!parse_positive(value, options.chunk_size)) {
+                cerr << "Error: --chunk-size must be a positive integer, got " << value << endl;
+                return false;
+            }
+        } else if (name == "format") {
+            if (value != "csv" && value != "npy") {
+                cerr << "Error: Unsupported output format " << value << " (expected csv or npy)" << endl;
+                return false;
+            }
+            options.format = value;
+        } else if (name == "batch-size") {
+            if (!parse_positive(value, options.batch_size)) {
+                cerr << "Error: --batch-size must be a positive integer, got " << value << endl;
+                return false;
+            }
+        } else if (name == "threads") {
+            if (!parse_positive(value, options.threads)) {
+                cerr << "Error: --threads must be a positive integer, got " << value << endl;
+                return false;
+            }
+        } else if (name == "shards") {
+            if (value == "symbol") {
+                options.shard_by_symbol = true;
+            } else if (!parse_positive(value, options.shards)) {
+                cerr << "Error: --shards must be a positive integer or 'symbol', got " << value << endl;
+                return false;
+            }
+        } else if (name == "layout") {
+            if (value != "flat" && value != "hive") {
+                cerr << "Error: Unsupported layout " << value << " (expected flat or hive)" << endl;
+                return false;
+            }
+            options.layout = value;
+        } else if (name == "date") {
+            // YYYY-MM-DD, the date=... partition of the hive layout
+            if (value.size() != 10 || value[4] != '-' || value[7] != '-' ||
+                value.find_first_not_of("0123456789-") != string::npos) {
+                cerr << "Error: --date must be a date in the format YYYY-MM-DD, got " << value << endl;
+                return false;
+            }
+            options.partition_date = value;
+        } else if (name == "book-depth") {
+            if (!parse_positive(value, options.book_depth)) {
+                cerr << "Error: --book-depth must be a positive integer, got " << value << endl;
+                return false;
+            }
+        } else if (name == "start-ns" || name == "end-ns") {
+            uint64_t time_ns;
+            if (!parse_non_negative(value, time_ns)) {
+                cerr << "Error: --" << name << " must be a non-negative integer (nanoseconds since epoch), got " << value << endl;
+                return false;
+            }
+            (name == "start-ns" ? options.start_ns : options.end_ns) = time_ns;
+        } else if (name == "stop-after-event") {
+            // System event codes of the DEEP specification
+            if (value.size() != 1 || string("OSRMEC").find(value[0]) == string::npos) {
+                cerr << "Error: --stop-after-event must be one of the system events O, S, R, M, E or C, got " << value << endl;
+                return false;
+            }
+            options.stop_event = value[0];
+        } else if (name == "index" || name == "write-index") {
+            if (value.empty()) {
+                cerr << "Error: --" << name << " needs the path of the index file" << endl;
+                return false;
+            }
+            (name == "index" ? options.index_path : options.write_index_path) = value;
+        } else if (name == "checkpoint") {
+            if (value.empty()) {
+                cerr << "Error: --checkpoint needs the path of the checkpoint file" << endl;
+                return false;
+            }
+            options.checkpoint_path = value;
+        } else if (name == "stats") {
+            if (value.empty()) {
+                cerr << "Error: --stats needs the path of the stats file" << endl;
+                return false;
+            }
+            options.stats_path = value;
+        } else if (name == "stats-interval") {
+            if (!parse_positive(value, options.stats_interval)) {
+                cerr << "Error: --stats-interval must be a positive integer, got " << value << endl;
+                return false;
+            }
+        } else if (name == "checkpoint-interval") {
+            if (!parse_positive(value, options.checkpoint_interval)) {
+                cerr << "Error: --checkpoint-interval must be a positive integer, got " << value << endl;
+                return false;
+            }
+        } else if (name == "index-interval") {
+            if (!parse_positive(value, options.index_interval)) {
+                cerr << "Error: --index-interval must be a positive integer, got " << value << endl;
+                return false;
+            }
+        } else if (name == "max-open-files") {
+            if (!parse_positive(value, options.max_open_files)) {
+                cerr << "Error: --max-open-files must be a positive integer, got " << value << endl;
+                return false;
+            }
+        } else if (name == "block-size") {
+            if (!parse_positive(value, options.block_size)) {
+                cerr << "Error: --block-size must be a positive integer, got " << value << endl;
+                return false;
+            }
+        } else if (name == "level") {
+            if (!parse_positive(value, options.compression_level) || options.compression_level > 9) {
+                cerr << "Error: --level must be an integer from 1 to 9, got " << value << endl;
+                return false;
+            }
+        } else {
+            cerr << "Error: Unknown option --" << name << endl;
+            return false;
+        }
+    }
+    if (!options.index_path.empty() && !options.write_index_path.empty()) {
+        cerr << "Error: --index and --write-index cannot be combined" << endl;
+        return false;
+    }
+    return true;
+}
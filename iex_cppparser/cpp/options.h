@@ -0,0 +1,87 @@
+#ifndef OPTIONS_H
+#define OPTIONS_H
+
+#include <cstddef>
+#include <cstdint>
+#include <string>
+#include "message_types.h"
+
+using namespace std;
+
+// Optional command line settings shared by the parser binaries.
+// They follow the three positional arguments as --name=value pairs, e.g.
+//     iex_parser_threaded.out input.pcap.gz output_prefix symbols.txt --format=npy --batch-size=65536 --threads=4
+
+struct ParserOptions {
+    // Message types to parse, one character per DEEP message type, see message_types.h
+    string types = DEFAULT_MESSAGE_TYPES;
+
+    // Output format: "csv" (default) or "npy" for typed column files, see column_writer.h
+    string format = "csv";
+
+    // Number of records buffered per column before they are appended to the column files
+    size_t batch_size = 1 << 16;
+
+    // Number of decoder worker threads of the CSV pipeline. 0 picks one per available core.
+    // For the split parser with one file per symbol, the number of writer threads.
+    size_t threads = 0;
+
+    // Split parser output, see split_pipeline.h. With neither set, the output is split by first letter.
+    // --shards=N writes N hash sharded file pairs, --shards=symbol one file pair per symbol.
+    size_t shards = 0;
+    bool shard_by_symbol = false;
+
+    // Number of levels per side in the order book snapshots (<prefix>_book.csv, see price_book.h). 0 writes no snapshots.
+    size_t book_depth = 0;
+
+    // Only packets captured in [start_ns, end_ns) are parsed (nanoseconds since epoch)
+    uint64_t start_ns = 0;
+    uint64_t end_ns = UINT64_MAX;
+
+    // Stop reading after the packet with this system event, e.g. 'M' (end of regular market hours). 0 reads on.
+    char stop_event = 0;
+
+    // Sidecar index, see packet_index.h. --write-index builds one while parsing, --index reads only the packets
+    // of the time window and the symbols of interest.
+    string index_path;
+    string write_index_path;
+    size_t index_interval = 65536;
+
+    // Decompressed size of the blocks that iex_transcode compresses into separate gzip members, and their compression
+    // level (1 to 9), see block_writer.h
+    size_t block_size = 1 << 20;
+    size_t compression_level = 6;
+
+    // Checkpoint file of the threaded parsers, see checkpoint.h. A parse resumes from it if it exists.
+    // A checkpoint is taken every checkpoint_interval packets.
+    string checkpoint_path;
+    size_t checkpoint_interval = 10000000;
+
+    // Stats file with the throughput counters of the parse, see stats.h, rewritten every stats_interval seconds
+    string stats_path;
+    size_t stats_interval = 10;
+
+    // Maximum number of output files the split parser keeps open at once with --shards=symbol
+    size_t max_open_files = 512;
+
+    // Layout of the files of the split parser with --shards=symbol: "flat" (default) writes <prefix>_trd_AAPL.csv,
+    // "hive" writes <root>/type=trd/date=2023-10-30/symbol=AAPL/part-0.csv, where root is the directory of the output
+    // prefix and the date is partition_date (--date) or, if not set, the UTC date of the first packet parsed
+    string layout = "flat";
+    string partition_date;
+
+    // How uncompressed captures are read: "mmap" (default) maps regular files into memory and parses the packets in the
+    // mapped pages, "stream" reads them into blocks on a reader thread like gzip input, see pcap_reader.h
+    string input_mode = "mmap";
+
+    // How the threaded parsers decode: "pipeline" (default) with one reader feeding the decoder workers, see pipeline.h,
+    // or "chunks" with --threads workers that each read and decode chunks of about chunk_size bytes of the capture,
+    // see chunk_decoder.h
+    string decode = "pipeline";
+    size_t chunk_size = 8 << 20;
+};
+
+// Parse argv[first_option..argc) into options. Prints a message and returns false on an unknown or invalid option.
+bool parse_options(int argc, char* argv[], int first_option, ParserOptions& options);
+
+#endif // OPTIONS_H
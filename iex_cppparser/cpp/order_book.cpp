@@ -0,0 +1,155 @@
+#include "order_book.h"
+#include "decode_messages.h"
+#include "csv_format.h"
+#include "logger.h"
+#include <cstring>
+using namespace std;
+
+static Log logger;
+
+// Side index of a removed order, so a scan of the store for the orders of a symbol passes over the free slots
+static const uint32_t NO_SIDE = UINT32_MAX;
+
+bool OrderBookEngine::open(const string& output_prefix) {
+    if (!output_file.open(output_prefix + "_lvl.csv")) {
+        return false;
+    }
+    output_file << string("Packet Capture Time,Send Time,Exchange Timestamp,Symbol,Side,Price,Size,Orders\n");
+    return true;
+}
+
+uint32_t OrderBookEngine::book_of(const char* symbol_field) {
+    uint64_t key;
+    memcpy(&key, symbol_field, sizeof(key));
+    auto found = book_index.find(key);
+    if (found == book_index.end()) {
+        found = book_index.emplace(key, static_cast<uint32_t>(books.size())).first;
+        books.emplace_back();
+        memcpy(books.back().symbol, symbol_field, sizeof(books.back().symbol));
+    }
+    return found->second;
+}
+
+void OrderBookEngine::apply(const char* message_payload, size_t message_len, uint64_t capture_time, long long send_time) {
+    // Short messages were already reported by the decoder workers
+    OrderMessage message;
+    if (!decode_order_message(message_payload, message_len, message)) {
+        return;
+    }
+    this->capture_time = capture_time;
+    this->send_time = send_time;
+    timestamp = message.timestamp;
+
+    if (message.type == 'C') {
+        uint64_t key;
+        memcpy(&key, message.symbol, sizeof(key));
+        auto found = book_index.find(key);
+        if (found == book_index.end()) {
+            return;
+        }
+        // Clear Book is sent for a few symbols a day, so a scan of the store is cheaper than a list of orders per symbol
+        uint32_t book = found->second;
+        for (uint32_t index = 0; index < store.slots(); ++index) {
+            Order& order = store[index];
+            if (order.side != NO_SIDE && order.side / 2 == book) {
+                order_map.erase(order.id, index);
+                order.side = NO_SIDE;
+                store.remove(index);
+            }
+        }
+        SymbolBook& symbol_book = books[book];
+        for (uint32_t side = book * 2; side < book * 2 + 2; ++side) {
+            OrderLadder& ladder = side & 1 ? symbol_book.asks : symbol_book.bids;
+            for (const OrderLevel& level : ladder.all()) {
+                write_level(side, OrderLevel{level.price, 0, 0});
+            }
+            ladder.clear();
+        }
+        return;
+    }
+
+    if (message.type == 'a') {
+        // An order ID is only reused after its order was deleted, but a capture can start in the middle of the day
+        uint32_t existing = order_map.find(message.order_id, store);
+        if (existing != OrderMap::NOT_FOUND) {
+            remove_order(existing);
+        }
+        uint32_t side = book_of(message.symbol) * 2 + (message.flags == '5' ? 1 : 0);
+        uint32_t index = store.add(Order{message.order_id, message.price, message.size, side});
+        order_map.insert(message.order_id, index);
+        adjust_level(side, message.price, message.size, 1);
+        return;
+    }
+
+    uint32_t index = order_map.find(message.order_id, store);
+    if (index == OrderMap::NOT_FOUND) {
+        // Orders added before the start of the capture
+        logger.warn(LOG_UNKNOWN_ORDER, string("Warning: Order message '") + message.type + "' for unknown order ID " +
+                                       to_string(message.order_id) + ", skipping");
+        return;
+    }
+    Order& order = store[index];
+
+    if (message.type == 'R') {
+        remove_order(index);
+    } else if (message.type == 'L') {
+        // The order keeps its place at its booked price, whatever the executed price
+        uint32_t executed = min(message.size, order.size);
+        if (executed == order.size) {
+            remove_order(index);
+        } else {
+            order.size -= executed;
+            adjust_level(order.side, order.price, -static_cast<int64_t>(executed), 0);
+        }
+    } else if (message.type == 'M') {
+        if (message.size == 0) {
+            remove_order(index);
+        } else if (message.price != order.price) {
+            adjust_level(order.side, order.price, -static_cast<int64_t>(order.size), -1);
+            order.price = message.price;
+            order.size = message.size;
+            adjust_level(order.side, order.price, order.size, 1);
+        } else if (message.size != order.size) {
+            adjust_level(order.side, order.price, static_cast<int64_t>(message.size) - order.size, 0);
+            order.size = message.size;
+        }
+    }
+}
+
+void OrderBookEngine::remove_order(uint32_t index) {
+    Order& order = store[index];
+    adjust_level(order.side, order.price, -static_cast<int64_t>(order.size), -1);
+    order_map.erase(order.id, index);
+    order.side = NO_SIDE;
+    store.remove(index);
+}
+
+void OrderBookEngine::adjust_level(uint32_t side, uint64_t price, int64_t size, int32_t orders) {
+    SymbolBook& book = books[side / 2];
+    OrderLadder& ladder = side & 1 ? book.asks : book.bids;
+    write_level(side, ladder.adjust(price, size, orders));
+}
+
+void OrderBookEngine::write_level(uint32_t side, const OrderLevel& level) {
+    const SymbolBook& book = books[side / 2];
+    row.clear();
+    append_uint(row, capture_time);
+    row += ',';
+    append_int(row, send_time);
+    row += ',';
+    append_uint(row, timestamp);
+    row += ',';
+    row.append(book.symbol, symbol_length(book.symbol));
+    row += side & 1 ? ",1," : ",0,";
+    append_price(row, level.price);
+    row += ',';
+    append_uint(row, level.size);
+    row += ',';
+    append_uint(row, level.orders);
+    row += '\n';
+    output_file.write(row);
+}
+
+bool OrderBookEngine::close() {
+    return output_file.close();
+}
@@ -0,0 +1,238 @@
+#ifndef ORDER_BOOK_H
+#define ORDER_BOOK_H
+
+#include <algorithm>
+#include <cstdint>
+#include <cstddef>
+#include <string>
+#include <unordered_map>
+#include <vector>
+#include "output_file.h"
+
+using namespace std;
+
+// Order by order book of DEEP+ captures (--types with a, M, R, L and C).
+//
+// DEEP+ sends every displayed order instead of the aggregated price levels of DEEP: Add Order ('a'), Order Modify ('M'),
+// Order Delete ('R'), Order Executed ('L') and Clear Book ('C'). The decoder workers write every order event to
+// <prefix>_ord.csv, and the writer thread applies the events in feed order to an OrderBookEngine, which keeps every live
+// order and the aggregated size and order count of every price level, and writes the new state of a level whenever an
+// event changes it:
+//
+// <output_prefix>_lvl.csv  Packet Capture Time,Send Time,Exchange Timestamp,Symbol,Side,Price,Size,Orders
+//
+// Side is 0 for bids and 1 for asks, as the Buy_Ask flag of the price level updates. A level with size 0 was removed.
+//
+// A busy day has hundreds of millions of orders, so the memory per live order and the cache misses per event are what
+// matter. Orders are kept in one array (OrderStore, 24 bytes per order) whose free slots are reused, instead of a heap
+// node per order, and found by order ID through an open addressing table of 8 byte slots (OrderMap). A lookup usually
+// touches one table slot and the order itself.
+
+struct Order {
+    uint64_t id;
+    uint64_t price;      // 4 implied decimal places
+    uint32_t size;       // remaining displayed size
+    uint32_t side;       // index of the book side: symbol book * 2, plus 1 for asks
+};
+
+// Array of orders with a free list of the slots of removed orders
+class OrderStore {
+public:
+    uint32_t add(const Order& order) {
+        if (!free_slots.empty()) {
+            uint32_t index = free_slots.back();
+            free_slots.pop_back();
+            orders[index] = order;
+            return index;
+        }
+        orders.push_back(order);
+        return static_cast<uint32_t>(orders.size() - 1);
+    }
+
+    void remove(uint32_t index) { free_slots.push_back(index); }
+
+    Order& operator[](uint32_t index) { return orders[index]; }
+    const Order& operator[](uint32_t index) const { return orders[index]; }
+
+    // Number of slots, removed orders included, e.g. to scan for the orders of a symbol
+    size_t slots() const { return orders.size(); }
+    size_t live() const { return orders.size() - free_slots.size(); }
+
+private:
+    vector<Order> orders;
+    vector<uint32_t> free_slots;
+};
+
+// Order ID -> OrderStore index. Open addressing with linear probing over slots of the store index and a 32 bit tag of
+// the hash of the order ID. The tag picks the home slot and tells most other orders apart without reading the store.
+// The table is kept at most half full, and removed entries are filled by shifting the following entries back instead of
+// leaving tombstones, so probe sequences stay short however many orders come and go.
+class OrderMap {
+public:
+    static const uint32_t NOT_FOUND = UINT32_MAX;
+
+    OrderMap() : slots(1 << 16), mask((1 << 16) - 1) {}
+
+    uint32_t find(uint64_t id, const OrderStore& store) const {
+        uint32_t tag = tag_of(id);
+        for (size_t slot = tag & mask; slots[slot].index != 0; slot = (slot + 1) & mask) {
+            if (slots[slot].tag == tag && store[slots[slot].index - 1].id == id) {
+                return slots[slot].index - 1;
+            }
+        }
+        return NOT_FOUND;
+    }
+
+    // Add an order ID that is not in the table
+    void insert(uint64_t id, uint32_t index) {
+        if ((count + 1) * 2 > slots.size()) {
+            grow();
+        }
+        place(Slot{index + 1, tag_of(id)});
+        count++;
+    }
+
+    // Remove the entry of the order at a store index
+    void erase(uint64_t id, uint32_t index) {
+        uint32_t tag = tag_of(id);
+        size_t slot = tag & mask;
+        while (slots[slot].index != index + 1) {
+            slot = (slot + 1) & mask;
+        }
+        // Shift back the entries after it whose home slot is at or before the hole
+        size_t next = slot;
+        while (true) {
+            next = (next + 1) & mask;
+            if (slots[next].index == 0) {
+                break;
+            }
+            size_t home = slots[next].tag & mask;
+            bool between = slot <= next ? (slot < home && home <= next) : (slot < home || home <= next);
+            if (!between) {
+                slots[slot] = slots[next];
+                slot = next;
+            }
+        }
+        slots[slot] = Slot{0, 0};
+        count--;
+    }
+
+    size_t size() const { return count; }
+    size_t capacity() const { return slots.size(); }
+
+private:
+    struct Slot {
+        uint32_t index;      // store index + 1, 0 for an empty slot
+        uint32_t tag;
+    };
+
+    static uint32_t tag_of(uint64_t id) {
+        // Fibonacci hashing, the high bits mix all bits of the ID
+        return static_cast<uint32_t>((id * 0x9E3779B97F4A7C15ULL) >> 32);
+    }
+
+    void place(const Slot& entry) {
+        size_t slot = entry.tag & mask;
+        while (slots[slot].index != 0) {
+            slot = (slot + 1) & mask;
+        }
+        slots[slot] = entry;
+    }
+
+    void grow() {
+        vector<Slot> old;
+        old.swap(slots);
+        slots.assign(old.size() * 2, Slot{0, 0});
+        mask = slots.size() - 1;
+        for (const Slot& entry : old) {
+            if (entry.index != 0) {
+                place(entry);
+            }
+        }
+    }
+
+    vector<Slot> slots;
+    size_t mask;
+    size_t count = 0;
+};
+
+// Aggregated price level of an order book
+struct OrderLevel {
+    uint64_t price;
+    uint64_t size;
+    uint32_t orders;
+};
+
+// One side of an order book in a sorted array with the best price at the back, as PriceLadder in price_book.h
+class OrderLadder {
+public:
+    explicit OrderLadder(bool is_bid = true) : is_bid(is_bid) {}
+
+    // Add size and orders (either may be negative) to a level, creating or removing it as needed. Returns the new state.
+    OrderLevel adjust(uint64_t price, int64_t size, int32_t orders) {
+        auto position = is_bid ? lower_bound(levels.begin(), levels.end(), price,
+                                             [](const OrderLevel& level, uint64_t p) { return level.price < p; })
+                               : lower_bound(levels.begin(), levels.end(), price,
+                                             [](const OrderLevel& level, uint64_t p) { return level.price > p; });
+        if (position == levels.end() || position->price != price) {
+            position = levels.insert(position, OrderLevel{price, 0, 0});
+        }
+        position->size += size;
+        position->orders += orders;
+        OrderLevel level = *position;
+        if (level.orders == 0) {
+            levels.erase(position);
+        }
+        return level;
+    }
+
+    const vector<OrderLevel>& all() const { return levels; }
+    void clear() { levels.clear(); }
+
+private:
+    bool is_bid;
+    vector<OrderLevel> levels;   // bids ascending, asks descending
+};
+
+class OrderBookEngine {
+public:
+    // Create <output_prefix>_lvl.csv for the changes of the aggregated price levels
+    bool open(const string& output_prefix);
+
+    // Apply a DEEP+ order message ('a', 'M', 'R', 'L' or 'C')
+    void apply(const char* message_payload, size_t message_len, uint64_t capture_time, long long send_time);
+
+    bool close();
+
+    size_t live_orders() const { return order_map.size(); }
+    size_t symbol_count() const { return books.size(); }
+
+private:
+    struct SymbolBook {
+        SymbolBook() : bids(true), asks(false) {}
+
+        char symbol[8];
+        OrderLadder bids;
+        OrderLadder asks;
+    };
+
+    uint32_t book_of(const char* symbol_field);
+    void remove_order(uint32_t index);
+    void adjust_level(uint32_t side, uint64_t price, int64_t size, int32_t orders);
+    void write_level(uint32_t side, const OrderLevel& level);
+
+    OrderStore store;
+    OrderMap order_map;
+    unordered_map<uint64_t, uint32_t> book_index;   // raw 8 byte symbol field -> books
+    vector<SymbolBook> books;
+
+    // The event being applied, for the rows it writes
+    uint64_t capture_time = 0;
+    long long send_time = 0;
+    uint64_t timestamp = 0;
+
+    string row;
+    OutputFile output_file;
+};
+
+#endif // ORDER_BOOK_H
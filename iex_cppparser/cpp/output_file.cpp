@@ -0,0 +1,98 @@
+#include "output_file.h"
+#include <cerrno>
+#include <cstring>
+#include <iostream>
+#include <fcntl.h>
+#include <unistd.h>
+using namespace std;
+
+bool OutputFile::open(const string& path, bool append) {
+    close();
+    fd = ::open(path.c_str(), O_WRONLY | O_CREAT | (append ? O_APPEND : O_TRUNC), 0644);
+    if (fd < 0) {
+        cerr << "Error: Unable to open output file " << path << endl;
+        return false;
+    }
+    buffer.resize(buffer_size);
+    used = 0;
+    error = false;
+    return true;
+}
+
+void OutputFile::write(const char* data, size_t size) {
+    if (fd < 0) {
+        return;
+    }
+    if (used + size > buffer.size()) {
+        flush();
+        // Data larger than the buffer is written straight through
+        if (size >= buffer.size()) {
+            write_all(data, size);
+            return;
+        }
+    }
+    memcpy(buffer.data() + used, data, size);
+    used += size;
+}
+
+bool OutputFile::write_all(const char* data, size_t size) {
+    while (size > 0) {
+        ssize_t written = ::write(fd, data, size);
+        if (written < 0) {
+            if (errno == EINTR) {
+                continue;
+            }
+            if (!error) {
+                cerr << "Error: Failed to write output file: " << strerror(errno) << endl;
+            }
+            error = true;
+            return false;
+        }
+        data += written;
+        size -= static_cast<size_t>(written);
+    }
+    return true;
+}
+
+bool OutputFile::flush() {
+    if (fd < 0) {
+        return !error;
+    }
+    if (used > 0) {
+        write_all(buffer.data(), used);
+        used = 0;
+    }
+    return !error;
+}
+
+bool OutputFile::sync() {
+    if (!flush()) {
+        return false;
+    }
+    if (fd >= 0 && fdatasync(fd) != 0) {
+        cerr << "Error: Failed to sync output file: " << strerror(errno) << endl;
+        error = true;
+        return false;
+    }
+    return true;
+}
+
+uint64_t OutputFile::size() {
+    if (fd < 0) {
+        return 0;
+    }
+    flush();
+    off_t end = lseek(fd, 0, SEEK_END);
+    return end < 0 ? 0 : static_cast<uint64_t>(end);
+}
+
+bool OutputFile::close() {
+    if (fd < 0) {
+        return !error;
+    }
+    bool ok = flush();
+    ok = ::close(fd) == 0 && ok;
+    fd = -1;
+    buffer = vector<char>();
+    return ok;
+}
@@ -0,0 +1,49 @@
+#ifndef OUTPUT_FILE_H
+#define OUTPUT_FILE_H
+
+#include <cstddef>
+#include <cstdint>
+#include <string>
+#include <vector>
+
+using namespace std;
+
+// Output file with a large reusable buffer. Rows are appended to the buffer, which goes to the file with a single
+// write() call whenever it fills up, instead of passing every row through the ofstream machinery.
+class OutputFile {
+public:
+    explicit OutputFile(size_t buffer_size = 8 << 20) : buffer_size(buffer_size) {}
+    ~OutputFile() { close(); }
+
+    // Create (or truncate) the file, or append to it if append is set
+    bool open(const string& path, bool append = false);
+    bool is_open() const { return fd >= 0; }
+
+    void write(const char* data, size_t size);
+    void write(const string& data) { write(data.data(), data.size()); }
+    OutputFile& operator<<(const string& data) {
+        write(data);
+        return *this;
+    }
+
+    // Write the buffered data to the file. Returns false if a write failed.
+    bool flush();
+
+    // Flush and wait until the data is on disk, e.g. before recording the size in a checkpoint
+    bool sync();
+
+    // Size of the file, buffered data included
+    uint64_t size();
+    bool close();
+
+private:
+    bool write_all(const char* data, size_t size);
+
+    size_t buffer_size;
+    vector<char> buffer;
+    size_t used = 0;
+    int fd = -1;
+    bool error = false;
+};
+
+#endif // OUTPUT_FILE_H
@@ -0,0 +1,231 @@
+#include "packet_index.h"
+#include <algorithm>
+#include <cstdio>
+#include <iostream>
+using namespace std;
+
+// File layout, all integers little endian:
+//   "IEXIDX01", input size, interval packets, packets, interval count, access point count, symbol count (u64 each)
+//   intervals:     first packet, offset, min capture time, max capture time (u64 each)
+//   access points: output offset, input offset (u64), bits, member start (u8), window length (u32), window
+//   symbols:       symbol field (8 bytes), interval count (u32), encoding (u8), then either the interval numbers (u32
+//                  each, encoding 0) or a bitmap with one bit per interval (encoding 1), whichever is smaller
+static const char INDEX_MAGIC[8] = {'I', 'E', 'X', 'I', 'D', 'X', '0', '1'};
+
+void PacketIndex::start(uint64_t interval_packets) {
+    this->interval_packets = interval_packets;
+    packets = 0;
+    last_symbol_key = 0;
+    intervals.clear();
+    access_points.clear();
+    symbol_intervals.clear();
+}
+
+void PacketIndex::add_packet(uint64_t offset, uint64_t capture_time) {
+    if (packets % interval_packets == 0) {
+        intervals.push_back(Interval{packets, offset, capture_time, capture_time});
+        last_symbol_key = 0;
+    } else {
+        Interval& interval = intervals.back();
+        interval.min_capture_time = min(interval.min_capture_time, capture_time);
+        interval.max_capture_time = max(interval.max_capture_time, capture_time);
+    }
+    packets++;
+}
+
+template <typename T>
+static void write_value(FILE* file, T value) {
+    fwrite(&value, sizeof(T), 1, file);
+}
+
+template <typename T>
+static bool read_value(FILE* file, T& value) {
+    return fread(&value, sizeof(T), 1, file) == 1;
+}
+
+bool PacketIndex::write(const string& path, uint64_t input_size) const {
+    // Write to a temporary file first, so an interrupted parse never leaves a truncated index behind
+    string temporary_path = path + ".tmp";
+    FILE* file = fopen(temporary_path.c_str(), "wb");
+    if (file == nullptr) {
+        cerr << "Error: Unable to create index file " << path << endl;
+        return false;
+    }
+
+    fwrite(INDEX_MAGIC, 1, sizeof(INDEX_MAGIC), file);
+    write_value<uint64_t>(file, input_size);
+    write_value<uint64_t>(file, interval_packets);
+    write_value<uint64_t>(file, packets);
+    write_value<uint64_t>(file, intervals.size());
+    write_value<uint64_t>(file, access_points.size());
+    write_value<uint64_t>(file, symbol_intervals.size());
+
+    for (const Interval& interval : intervals) {
+        write_value(file, interval.first_packet);
+        write_value(file, interval.offset);
+        write_value(file, interval.min_capture_time);
+        write_value(file, interval.max_capture_time);
+    }
+
+    for (const AccessPoint& point : access_points) {
+        write_value(file, point.output_offset);
+        write_value(file, point.input_offset);
+        write_value<uint8_t>(file, point.bits);
+        write_value<uint8_t>(file, point.member_start ? 1 : 0);
+        write_value<uint32_t>(file, static_cast<uint32_t>(point.window.size()));
+        fwrite(point.window.data(), 1, point.window.size(), file);
+    }
+
+    size_t bitmap_size = (intervals.size() + 7) / 8;
+    vector<unsigned char> bitmap;
+    for (const auto& entry : symbol_intervals) {
+        const vector<uint32_t>& intervals_of_symbol = entry.second;
+        write_value(file, entry.first);
+        write_value<uint32_t>(file, static_cast<uint32_t>(intervals_of_symbol.size()));
+        if (intervals_of_symbol.size() * sizeof(uint32_t) <= bitmap_size) {
+            write_value<uint8_t>(file, 0);
+            fwrite(intervals_of_symbol.data(), sizeof(uint32_t), intervals_of_symbol.size(), file);
+        } else {
+            write_value<uint8_t>(file, 1);
+            bitmap.assign(bitmap_size, 0);
+            for (uint32_t interval : intervals_of_symbol) {
+                bitmap[interval / 8] |= 1 << (interval % 8);
+            }
+            fwrite(bitmap.data(), 1, bitmap.size(), file);
+        }
+    }
+
+    bool ok = !ferror(file);
+    ok = fclose(file) == 0 && ok;
+    if (!ok || rename(temporary_path.c_str(), path.c_str()) != 0) {
+        cerr << "Error: Failed to write index file " << path << endl;
+        remove(temporary_path.c_str());
+        return false;
+    }
+    return true;
+}
+
+bool PacketIndex::load(const string& path, uint64_t input_size) {
+    FILE* file = fopen(path.c_str(), "rb");
+    if (file == nullptr) {
+        cerr << "Error: Unable to open index file " << path << endl;
+        return false;
+    }
+
+    char magic[8];
+    uint64_t indexed_input_size, interval_count, access_point_count, symbol_count;
+    bool ok = fread(magic, 1, sizeof(magic), file) == sizeof(magic) && memcmp(magic, INDEX_MAGIC, sizeof(magic)) == 0 &&
+              read_value(file, indexed_input_size) && read_value(file, interval_packets) && read_value(file, packets) &&
+              read_value(file, interval_count) && read_value(file, access_point_count) && read_value(file, symbol_count);
+    if (ok && indexed_input_size != input_size) {
+        cerr << "Error: Index file " << path << " was built for a different version of the capture" << endl;
+        fclose(file);
+        return false;
+    }
+
+    intervals.resize(ok ? interval_count : 0);
+    for (Interval& interval : intervals) {
+        ok = ok && read_value(file, interval.first_packet) && read_value(file, interval.offset) &&
+             read_value(file, interval.min_capture_time) && read_value(file, interval.max_capture_time);
+    }
+
+    access_points.resize(ok ? access_point_count : 0);
+    for (AccessPoint& point : access_points) {
+        uint8_t member_start = 0;
+        uint32_t window_length = 0;
+        ok = ok && read_value(file, point.output_offset) && read_value(file, point.input_offset) &&
+             read_value(file, point.bits) && read_value(file, member_start) && read_value(file, window_length) &&
+             window_length <= 32768;
+        point.member_start = member_start != 0;
+        point.window.resize(ok ? window_length : 0);
+        ok = ok && fread(point.window.data(), 1, point.window.size(), file) == point.window.size();
+    }
+
+    symbol_intervals.clear();
+    vector<unsigned char> bitmap((interval_count + 7) / 8);
+    for (uint64_t i = 0; ok && i < symbol_count; ++i) {
+        uint64_t key;
+        uint32_t count;
+        uint8_t encoding;
+        ok = read_value(file, key) && read_value(file, count) && read_value(file, encoding) && count <= interval_count;
+        if (!ok) {
+            break;
+        }
+        vector<uint32_t>& intervals_of_symbol = symbol_intervals[key];
+        if (encoding == 0) {
+            intervals_of_symbol.resize(count);
+            ok = fread(intervals_of_symbol.data(), sizeof(uint32_t), count, file) == count;
+        } else {
+            ok = fread(bitmap.data(), 1, bitmap.size(), file) == bitmap.size();
+            for (uint32_t interval = 0; ok && interval < interval_count; ++interval) {
+                if (bitmap[interval / 8] & (1 << (interval % 8))) {
+                    intervals_of_symbol.push_back(interval);
+                }
+            }
+        }
+    }
+    fclose(file);
+
+    if (!ok) {
+        cerr << "Error: Index file " << path << " is corrupted" << endl;
+        start(1);
+        return false;
+    }
+    return true;
+}
+
+vector<PacketRange> PacketIndex::ranges(uint64_t start_ns, uint64_t end_ns, const SymbolFilter& filter) const {
+    // Intervals with messages of the symbols of interest
+    vector<bool> selected(intervals.size(), filter.accepts_all());
+    if (!filter.accepts_all()) {
+        for (const auto& entry : symbol_intervals) {
+            if (filter.contains_key(entry.first)) {
+                for (uint32_t interval : entry.second) {
+                    selected[interval] = true;
+                }
+            }
+        }
+    }
+
+    // Of those, the ones captured in the window, merged into runs of consecutive intervals
+    vector<PacketRange> result;
+    for (size_t i = 0; i < intervals.size(); ++i) {
+        const Interval& interval = intervals[i];
+        if (!selected[i] || interval.max_capture_time < start_ns || interval.min_capture_time >= end_ns) {
+            continue;
+        }
+        uint64_t end_packet = i + 1 < intervals.size() ? intervals[i + 1].first_packet : packets;
+        if (!result.empty() && result.back().first_packet + result.back().packets == interval.first_packet) {
+            result.back().packets = end_packet - result.back().first_packet;
+        } else {
+            result.push_back(PacketRange{interval.offset, interval.first_packet, end_packet - interval.first_packet});
+        }
+    }
+    return result;
+}
+
+vector<PacketRange> PacketIndex::split(const vector<PacketRange>& ranges, uint64_t chunk_bytes) const {
+    vector<PacketRange> chunks;
+    for (const PacketRange& range : ranges) {
+        chunks.push_back(range);
+        uint64_t end_packet = range.first_packet + range.packets;
+        auto interval = upper_bound(intervals.begin(), intervals.end(), range.first_packet,
+                                    [](uint64_t packet, const Interval& i) { return packet < i.first_packet; });
+        for (; interval != intervals.end() && interval->first_packet < end_packet; ++interval) {
+            PacketRange& chunk = chunks.back();
+            if (interval->offset - chunk.offset < chunk_bytes ||
+                (!access_points.empty() && access_point(interval->offset) == access_point((interval - 1)->offset))) {
+                continue;
+            }
+            chunk.packets = interval->first_packet - chunk.first_packet;
+            chunks.push_back(PacketRange{interval->offset, interval->first_packet, end_packet - interval->first_packet});
+        }
+    }
+    return chunks;
+}
+
+const AccessPoint* PacketIndex::access_point(uint64_t offset) const {
+    auto after = upper_bound(access_points.begin(), access_points.end(), offset,
+                             [](uint64_t value, const AccessPoint& point) { return value < point.output_offset; });
+    return after == access_points.begin() ? nullptr : &*(after - 1);
+}
@@ -0,0 +1,87 @@
+#ifndef PACKET_INDEX_H
+#define PACKET_INDEX_H
+
+#include <cstdint>
+#include <cstddef>
+#include <cstring>
+#include <string>
+#include <unordered_map>
+#include <vector>
+#include "pcap_reader.h"
+#include "symbol_filter.h"
+
+using namespace std;
+
+// Sidecar index of a capture file (--write-index, --index). The packets are divided into intervals of a fixed number
+// of packets. For each interval the index records where its first packet starts in the decompressed capture and the
+// range of capture times, and for each symbol the intervals that hold messages of that symbol. Gzip captures also
+// get access points (see pcap_reader.h), so reading can start at any interval without inflating what comes before.
+//
+// A query for a time window and a set of symbols then only reads the intervals that can hold matching packets.
+
+// Decompressed bytes between the access points of an index of a gzip capture. Each access point holds a 32 KiB window.
+const uint64_t INDEX_ACCESS_POINT_SPACING = 32 << 20;
+
+// A run of consecutive packets to read
+struct PacketRange {
+    uint64_t offset;          // decompressed offset of the record header of the first packet
+    uint64_t first_packet;
+    uint64_t packets;
+};
+
+class PacketIndex {
+public:
+    // Building, in one pass over the capture. add_packet is called for every packet in order, followed by
+    // add_symbol for each message of the packet that carries a symbol.
+    void start(uint64_t interval_packets);
+    void add_packet(uint64_t offset, uint64_t capture_time);
+    void add_symbol(const char* symbol_field) {
+        uint64_t key;
+        memcpy(&key, symbol_field, sizeof(key));
+        // Consecutive messages are often of the same symbol
+        if (key == last_symbol_key) {
+            return;
+        }
+        last_symbol_key = key;
+        vector<uint32_t>& intervals = symbol_intervals[key];
+        uint32_t interval = static_cast<uint32_t>(this->intervals.size() - 1);
+        if (intervals.empty() || intervals.back() != interval) {
+            intervals.push_back(interval);
+        }
+    }
+    void set_access_points(vector<AccessPoint> points) { access_points = std::move(points); }
+
+    // input_size is the size of the capture file, which load compares to detect a stale index
+    bool write(const string& path, uint64_t input_size) const;
+    bool load(const string& path, uint64_t input_size);
+
+    // The packet ranges that can hold packets captured in [start_ns, end_ns) with messages of symbols accepted by the filter
+    vector<PacketRange> ranges(uint64_t start_ns, uint64_t end_ns, const SymbolFilter& filter) const;
+
+    // Cut ranges into chunks of at least chunk_bytes of the capture, at interval boundaries, for chunk_decoder.h.
+    // Chunks of a gzip capture start at the first interval after an access point, so little is inflated twice.
+    vector<PacketRange> split(const vector<PacketRange>& ranges, uint64_t chunk_bytes) const;
+
+    // The last access point at or before a decompressed offset, nullptr if there is none
+    const AccessPoint* access_point(uint64_t offset) const;
+
+    uint64_t packet_count() const { return packets; }
+    size_t symbol_count() const { return symbol_intervals.size(); }
+
+private:
+    struct Interval {
+        uint64_t first_packet;
+        uint64_t offset;
+        uint64_t min_capture_time;
+        uint64_t max_capture_time;
+    };
+
+    uint64_t interval_packets = 0;
+    uint64_t packets = 0;
+    uint64_t last_symbol_key = 0;
+    vector<Interval> intervals;
+    vector<AccessPoint> access_points;
+    unordered_map<uint64_t, vector<uint32_t>> symbol_intervals;
+};
+
+#endif // PACKET_INDEX_H
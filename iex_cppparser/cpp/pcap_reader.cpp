@@ -0,0 +1,1010 @@
+#include "pcap_reader.h"
+#include <iostream>
+#include <cstring>
+#include <cerrno>
+#include <algorithm>
+#include <atomic>
+#include <fcntl.h>
+#include <unistd.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <zlib.h>
+using namespace std;
+
+// Size of each read from the compressed input file
+static const size_t COMPRESSED_CHUNK_SIZE = 4 << 20;
+
+// How far ahead of the consumer the pages of mapped input are requested. Half of it is requested at a time.
+static const uint64_t MAPPED_READAHEAD = 64 << 20;
+
+// Largest packet we accept. Anything bigger means the capture is corrupted.
+static const uint32_t MAX_PACKET_LENGTH = 256 * 1024;
+
+// pcap and pcap-ng magic numbers as read on a little-endian host
+static const uint32_t PCAP_MAGIC_MICROSECONDS = 0xa1b2c3d4;
+static const uint32_t PCAP_MAGIC_MICROSECONDS_SWAPPED = 0xd4c3b2a1;
+static const uint32_t PCAP_MAGIC_NANOSECONDS = 0xa1b23c4d;
+static const uint32_t PCAP_MAGIC_NANOSECONDS_SWAPPED = 0x4d3cb2a1;
+static const uint32_t PCAPNG_SECTION_HEADER_BLOCK = 0x0a0d0d0a;
+static const uint32_t PCAPNG_BYTE_ORDER_MAGIC = 0x1a2b3c4d;
+static const uint32_t PCAPNG_INTERFACE_DESCRIPTION_BLOCK = 1;
+static const uint32_t PCAPNG_SIMPLE_PACKET_BLOCK = 3;
+static const uint32_t PCAPNG_ENHANCED_PACKET_BLOCK = 6;
+
+
+InflateStream::InflateStream(size_t block_size)
+    : block_size(block_size), inflate_threads(max(1u, thread::hardware_concurrency())) {}
+
+// Check whether a gzip member header carries the "IX" subfield of block compressed captures
+static bool is_block_member_header(const unsigned char* header, size_t length) {
+    return length >= 16 && header[0] == 0x1f && header[1] == 0x8b && header[2] == 8 && (header[3] & 4) &&
+           header[12] == 'I' && header[13] == 'X';
+}
+
+InflateStream::~InflateStream() {
+    close();
+}
+
+bool InflateStream::open(const string& filename) {
+    close();
+
+    if (filename == "-") {
+        fd = dup(STDIN_FILENO);
+    } else {
+        fd = ::open(filename.c_str(), O_RDONLY);
+    }
+    if (fd < 0) {
+        cerr << "Error: Unable to open file " << filename << ": " << strerror(errno) << endl;
+        return false;
+    }
+    posix_fadvise(fd, 0, 0, POSIX_FADV_SEQUENTIAL);
+
+    if (mmap_enabled && filename != "-" && open_mapped()) {
+        return true;
+    }
+
+    // Read the first chunk to detect the gzip magic bytes. The chunk is handed to zlib, or to the first block
+    // for plain input, so nothing has to be read twice and pipes work as well as regular files.
+    compressed.resize(COMPRESSED_CHUNK_SIZE);
+    size_t got = 0;
+    while (got < BLOCK_MEMBER_HEADER_LENGTH) {
+        ssize_t n = ::read(fd, compressed.data() + got, compressed.size() - got);
+        if (n < 0 && errno == EINTR) continue;
+        if (n <= 0) break;
+        got += n;
+    }
+    gzip = got >= 2 && compressed[0] == 0x1f && compressed[1] == 0x8b;
+    blocked = is_block_member_header(compressed.data(), got);
+
+    if (blocked) {
+        // The members are read whole and inflated by fill_members, starting with the bytes read so far
+        compressed.resize(got);
+        pending_offset = 0;
+        member_pending = false;
+    } else if (gzip) {
+        z_stream* zs = new z_stream();
+        // 16 + MAX_WBITS tells zlib to expect a gzip wrapper
+        if (inflateInit2(zs, 16 + MAX_WBITS) != Z_OK) {
+            cerr << "Error: Unable to initialise zlib for " << filename << endl;
+            delete zs;
+            ::close(fd);
+            fd = -1;
+            return false;
+        }
+        zs->next_in = compressed.data();
+        zs->avail_in = got;
+        zstream = zs;
+        member_ended = false;
+        raw_deflate = false;
+        trailer_remaining = 0;
+    } else {
+        // Remember how many leading bytes still have to be delivered
+        compressed.resize(got);
+        pending_offset = 0;
+    }
+
+    input_position = blocked ? 0 : got;
+    produced = 0;
+    consumed = 0;
+    points.clear();
+    if (gzip && access_point_spacing > 0) {
+        // The start of the file is the first access point
+        add_access_point(true);
+    }
+
+    for (Block& block : blocks) {
+        block.data.resize(block_size);
+    }
+    start_reader();
+    return true;
+}
+
+// Map an uncompressed regular file. Returns false, leaving the file unread, if it cannot or should not be mapped.
+bool InflateStream::open_mapped() {
+    struct stat input_stat;
+    if (fstat(fd, &input_stat) != 0 || !S_ISREG(input_stat.st_mode) || input_stat.st_size < 2) {
+        return false;
+    }
+    void* data = mmap(nullptr, input_stat.st_size, PROT_READ, MAP_PRIVATE, fd, 0);
+    if (data == MAP_FAILED) {
+        return false;
+    }
+    const unsigned char* bytes = static_cast<const unsigned char*>(data);
+    if (bytes[0] == 0x1f && bytes[1] == 0x8b) {
+        // Gzip input is inflated by the reader thread
+        munmap(data, input_stat.st_size);
+        return false;
+    }
+    // Sequential access lets the kernel read ahead further and drop the pages behind the consumer first
+    madvise(data, input_stat.st_size, MADV_SEQUENTIAL);
+    mapped = static_cast<const char*>(data);
+    mapped_size = input_stat.st_size;
+    gzip = false;
+    blocked = false;
+    error = false;
+    consumed = 0;
+    advised_until = 0;
+    points.clear();
+    advise_mapped();
+    return true;
+}
+
+// Request the pages ahead of the consumer, so they are read while the packets before them are parsed
+void InflateStream::advise_mapped() {
+    if (advised_until >= mapped_size || consumed + MAPPED_READAHEAD / 2 < advised_until) {
+        return;
+    }
+    static const uint64_t page_size = sysconf(_SC_PAGESIZE);
+    uint64_t start = max(advised_until, consumed) / page_size * page_size;
+    uint64_t end = min<uint64_t>(consumed + MAPPED_READAHEAD, mapped_size);
+    madvise(const_cast<char*>(mapped) + start, end - start, MADV_WILLNEED);
+    advised_until = end;
+}
+
+// Reset the blocks and start the reader thread
+void InflateStream::start_reader() {
+    for (Block& block : blocks) {
+        block.size = 0;
+        block.ready = false;
+        block.last = false;
+    }
+    current = -1;
+    next_block = 0;
+    offset = 0;
+    finished = false;
+    error = false;
+    stop_requested = false;
+
+    reader = thread(&InflateStream::reader_loop, this);
+}
+
+void InflateStream::stop_reader() {
+    if (reader.joinable()) {
+        {
+            lock_guard<mutex> lock(mtx);
+            stop_requested = true;
+        }
+        cv.notify_all();
+        reader.join();
+    }
+}
+
+void InflateStream::close() {
+    stop_reader();
+    if (mapped != nullptr) {
+        munmap(const_cast<char*>(mapped), mapped_size);
+        mapped = nullptr;
+        mapped_size = 0;
+    }
+    if (zstream != nullptr) {
+        z_stream* zs = static_cast<z_stream*>(zstream);
+        inflateEnd(zs);
+        delete zs;
+        zstream = nullptr;
+    }
+    if (fd >= 0) {
+        ::close(fd);
+        fd = -1;
+    }
+}
+
+// Reader thread: fill the two blocks in turn, waiting while the consumer still holds the next one
+void InflateStream::reader_loop() {
+    int index = 0;
+    while (true) {
+        Block& block = blocks[index];
+        {
+            unique_lock<mutex> lock(mtx);
+            cv.wait(lock, [&]() { return !block.ready || stop_requested; });
+            if (stop_requested) {
+                return;
+            }
+        }
+
+        block.size = 0;
+        bool more = blocked ? fill_members(block) : gzip ? fill_gzip(block) : fill_plain(block);
+
+        {
+            lock_guard<mutex> lock(mtx);
+            block.last = !more;
+            block.ready = true;
+        }
+        cv.notify_all();
+
+        if (!more) {
+            return;
+        }
+        index ^= 1;
+    }
+}
+
+// Fill a block straight from an uncompressed file. Returns false once the end of the file is reached.
+bool InflateStream::fill_plain(Block& block) {
+    // Deliver the bytes read while detecting the file type first
+    if (pending_offset < compressed.size()) {
+        size_t take = min(block_size, compressed.size() - pending_offset);
+        memcpy(block.data.data(), compressed.data() + pending_offset, take);
+        block.size = take;
+        pending_offset += take;
+    }
+
+    while (block.size < block_size) {
+        ssize_t n = ::read(fd, block.data.data() + block.size, block_size - block.size);
+        if (n < 0 && errno == EINTR) continue;
+        if (n < 0) {
+            cerr << "Error: Failed to read input: " << strerror(errno) << endl;
+            error = true;
+            return false;
+        }
+        if (n == 0) {
+            return false;
+        }
+        block.size += n;
+    }
+    return true;
+}
+
+// Check whether the pending compressed input starts a new gzip member
+static bool starts_gzip_member(const z_stream* zs) {
+    return zs->avail_in >= 2 && zs->next_in[0] == 0x1f && zs->next_in[1] == 0x8b;
+}
+
+// Read the next chunk of compressed input after the input that is still pending. Returns the number of bytes read,
+// 0 at end of file or -1 on error.
+ssize_t InflateStream::read_input() {
+    z_stream* zs = static_cast<z_stream*>(zstream);
+    size_t pending = zs->avail_in;
+    memmove(compressed.data(), zs->next_in, pending);
+    ssize_t n;
+    do {
+        n = ::read(fd, compressed.data() + pending, compressed.size() - pending);
+    } while (n < 0 && errno == EINTR);
+
+    if (n < 0) {
+        cerr << "Error: Failed to read input: " << strerror(errno) << endl;
+        error = true;
+        return -1;
+    }
+    zs->next_in = compressed.data();
+    zs->avail_in = pending + n;
+    input_position += n;
+    return n;
+}
+
+// Record an access point at the current position of the reader thread
+void InflateStream::add_access_point(bool member_start) {
+    z_stream* zs = static_cast<z_stream*>(zstream);
+    AccessPoint point;
+    point.output_offset = produced;
+    // Block compressed input is read a whole member at a time, so nothing read is pending
+    point.input_offset = blocked ? input_position : input_position - zs->avail_in;
+    point.member_start = member_start;
+    if (!member_start) {
+        // Bits of the last byte that have not been consumed yet belong to the next block
+        point.bits = zs->data_type & 7;
+        point.window.resize(32768);
+        uInt window_length = 0;
+        inflateGetDictionary(zs, point.window.data(), &window_length);
+        point.window.resize(window_length);
+    }
+    lock_guard<mutex> lock(mtx);
+    points.push_back(std::move(point));
+}
+
+vector<AccessPoint> InflateStream::access_points() {
+    lock_guard<mutex> lock(mtx);
+    return points;
+}
+
+bool InflateStream::access_point_before(uint64_t offset, AccessPoint& point) {
+    lock_guard<mutex> lock(mtx);
+    // The reader thread runs ahead of the consumer, so the last points may be past offset
+    for (size_t i = points.size(); i > 0; --i) {
+        if (points[i - 1].output_offset <= offset) {
+            point = points[i - 1];
+            return true;
+        }
+    }
+    return false;
+}
+
+// Inflate into a block. Concatenated gzip members are decoded one after the other, like gunzip does.
+// Returns false once the end of the compressed file is reached.
+bool InflateStream::fill_gzip(Block& block) {
+    z_stream* zs = static_cast<z_stream*>(zstream);
+    // Step through the deflate blocks only when recording access points, as that is slower
+    int flush = access_point_spacing > 0 ? Z_BLOCK : Z_NO_FLUSH;
+
+    while (block.size < block_size) {
+        if (zs->avail_in == 0) {
+            ssize_t n = read_input();
+            if (n < 0) {
+                return false;
+            }
+            if (n == 0) {
+                if (!member_ended || trailer_remaining > 0) {
+                    cerr << "Error: Unexpected end of gzip stream, the input file is truncated" << endl;
+                    error = true;
+                }
+                return false;
+            }
+        }
+
+        if (member_ended) {
+            // A member resumed from an access point was inflated as raw deflate, so its trailer is still ahead
+            size_t skip = min<size_t>(trailer_remaining, zs->avail_in);
+            zs->next_in += skip;
+            zs->avail_in -= skip;
+            trailer_remaining -= skip;
+            if (zs->avail_in == 0) {
+                continue;
+            }
+
+            // Another gzip member follows the one that just ended. Anything else is trailing padding, which gunzip ignores too.
+            // The magic bytes of the next member may straddle the end of the read, so one pending byte needs another read.
+            if (zs->avail_in < 2 && read_input() < 0) {
+                return false;
+            }
+            if (!starts_gzip_member(zs)) {
+                return false;
+            }
+            inflateReset2(zs, 16 + MAX_WBITS);
+            member_ended = false;
+            raw_deflate = false;
+            if (access_point_spacing > 0 && produced - points.back().output_offset >= access_point_spacing) {
+                add_access_point(true);
+            }
+        }
+
+        zs->next_out = reinterpret_cast<unsigned char*>(block.data.data() + block.size);
+        zs->avail_out = block_size - block.size;
+        int ret = inflate(zs, flush);
+        size_t new_size = block_size - zs->avail_out;
+        produced += new_size - block.size;
+        block.size = new_size;
+
+        if (ret == Z_STREAM_END) {
+            member_ended = true;
+            trailer_remaining = raw_deflate ? 8 : 0;
+        } else if (ret != Z_OK && ret != Z_BUF_ERROR) {
+            cerr << "Error: Failed to decompress input (zlib error " << ret << (zs->msg ? string(": ") + zs->msg : string()) << ")" << endl;
+            error = true;
+            return false;
+        } else if (flush == Z_BLOCK && (zs->data_type & 128) && !(zs->data_type & 64) &&
+                   produced - points.back().output_offset >= access_point_spacing) {
+            // At a deflate block boundary that is not the end of the member
+            add_access_point(false);
+        }
+    }
+    return true;
+}
+
+// Copy n bytes of input into dst, starting with what is left of the first read. Returns the number of bytes copied,
+// which is smaller than n at the end of the file or on a read error.
+size_t InflateStream::read_exact(unsigned char* dst, size_t n) {
+    size_t total = min(n, compressed.size() - pending_offset);
+    memcpy(dst, compressed.data() + pending_offset, total);
+    pending_offset += total;
+
+    while (total < n) {
+        ssize_t got = ::read(fd, dst + total, n - total);
+        if (got < 0 && errno == EINTR) continue;
+        if (got < 0) {
+            cerr << "Error: Failed to read input: " << strerror(errno) << endl;
+            error = true;
+            break;
+        }
+        if (got == 0) {
+            break;
+        }
+        total += got;
+    }
+    return total;
+}
+
+// Read the header of the next member of block compressed input. Returns false at the end of the file or on error.
+bool InflateStream::read_member_header() {
+    member_header.resize(12);
+    size_t got = read_exact(member_header.data(), 12);
+    if (got < 2 || member_header[0] != 0x1f || member_header[1] != 0x8b) {
+        // End of the file, or trailing padding like gunzip ignores
+        return false;
+    }
+    size_t extra_length = got == 12 ? member_header[10] | (member_header[11] << 8) : 0;
+    member_header.resize(12 + extra_length);
+    if (got < 12 || read_exact(member_header.data() + 12, extra_length) != extra_length ||
+        !is_block_member_header(member_header.data(), member_header.size()) || member_header[14] != 8 || member_header[15] != 0) {
+        if (!error) {
+            cerr << "Error: Invalid gzip member header in block compressed input, the file is truncated or corrupted" << endl;
+            error = true;
+        }
+        return false;
+    }
+    memcpy(&member_size, member_header.data() + 16, 4);
+    memcpy(&member_output_size, member_header.data() + 20, 4);
+    if (member_size < member_header.size() + BLOCK_MEMBER_TRAILER_LENGTH || member_output_size > block_size) {
+        cerr << "Error: Invalid member sizes in block compressed input (" << member_size << ", " << member_output_size << ")" << endl;
+        error = true;
+        return false;
+    }
+    member_pending = true;
+    return true;
+}
+
+// Fill a block from block compressed input. Whole members are collected until the next one does not fit, then
+// they are inflated by inflate_threads threads straight into their place in the block.
+// Returns false once the end of the compressed file is reached.
+bool InflateStream::fill_members(Block& block) {
+    struct Member {
+        size_t input;         // offset in staging
+        size_t size;
+        size_t output;        // offset in the block
+        size_t output_size;
+    };
+    vector<Member> members;
+    size_t staged = 0;
+    bool more = true;
+
+    while (true) {
+        if (!member_pending && !read_member_header()) {
+            more = false;
+            break;
+        }
+        if (block.size + member_output_size > block_size) {
+            // The member starts the next block
+            break;
+        }
+        if (staging.size() < staged + member_size) {
+            staging.resize(staged + member_size);
+        }
+        size_t header_length = member_header.size();
+        memcpy(staging.data() + staged, member_header.data(), header_length);
+        size_t body_length = member_size - header_length;
+        if (read_exact(staging.data() + staged + header_length, body_length) != body_length) {
+            if (!error) {
+                cerr << "Error: Unexpected end of block compressed input, the input file is truncated" << endl;
+                error = true;
+            }
+            return false;
+        }
+        if (access_point_spacing > 0 && produced - points.back().output_offset >= access_point_spacing) {
+            add_access_point(true);
+        }
+
+        members.push_back({staged, member_size, block.size, member_output_size});
+        staged += member_size;
+        block.size += member_output_size;
+        produced += member_output_size;
+        input_position += member_size;
+        member_pending = false;
+    }
+    if (error) {
+        return false;
+    }
+
+    size_t workers = min(inflate_threads, members.size());
+    atomic<bool> inflate_failed(false);
+    auto inflate_members = [&](size_t first) {
+        z_stream zs = {};
+        if (inflateInit2(&zs, 16 + MAX_WBITS) != Z_OK) {
+            inflate_failed = true;
+            return;
+        }
+        for (size_t i = first; i < members.size() && !inflate_failed; i += workers) {
+            const Member& member = members[i];
+            inflateReset(&zs);
+            zs.next_in = staging.data() + member.input;
+            zs.avail_in = member.size;
+            zs.next_out = reinterpret_cast<unsigned char*>(block.data.data() + member.output);
+            zs.avail_out = member.output_size;
+            // Reaching the end of the member also checks its CRC
+            if (inflate(&zs, Z_FINISH) != Z_STREAM_END || zs.avail_out != 0 || zs.avail_in != 0) {
+                inflate_failed = true;
+            }
+        }
+        inflateEnd(&zs);
+    };
+    vector<thread> threads;
+    for (size_t t = 1; t < workers; ++t) {
+        threads.emplace_back(inflate_members, t);
+    }
+    if (workers > 0) {
+        inflate_members(0);
+    }
+    for (thread& t : threads) {
+        t.join();
+    }
+    if (inflate_failed) {
+        cerr << "Error: Failed to decompress a member of the block compressed input" << endl;
+        error = true;
+        return false;
+    }
+    return more;
+}
+
+bool InflateStream::seek(uint64_t target, const AccessPoint* point) {
+    if (fd < 0) {
+        return false;
+    }
+    if (mapped != nullptr) {
+        if (target > mapped_size) {
+            cerr << "Error: Unable to seek to offset " << target << " of a file of " << mapped_size << " bytes" << endl;
+            return false;
+        }
+        consumed = target;
+        advised_until = 0;
+        advise_mapped();
+        return true;
+    }
+    // Reading on is cheaper than restarting from an access point (or a read) that is not past the current position
+    if (target >= consumed && (gzip ? point == nullptr || point->output_offset <= consumed : target - consumed <= block_size)) {
+        uint64_t distance = target - consumed;
+        return skip(distance) == distance;
+    }
+
+    stop_reader();
+    // Access points have to be recorded in one pass over the whole stream
+    access_point_spacing = 0;
+
+    uint64_t start = target;
+    if (blocked) {
+        if (point == nullptr || !point->member_start || point->output_offset > target) {
+            cerr << "Error: No member start to seek to offset " << target << endl;
+            return false;
+        }
+        if (lseek(fd, point->input_offset, SEEK_SET) < 0) {
+            cerr << "Error: Unable to seek in input: " << strerror(errno) << endl;
+            return false;
+        }
+        input_position = point->input_offset;
+        compressed.clear();
+        pending_offset = 0;
+        member_pending = false;
+        produced = point->output_offset;
+        start = point->output_offset;
+    } else if (gzip) {
+        if (point == nullptr || point->output_offset > target) {
+            cerr << "Error: No access point to seek to offset " << target << endl;
+            return false;
+        }
+        z_stream* zs = static_cast<z_stream*>(zstream);
+        uint64_t input_offset = point->input_offset - (point->bits ? 1 : 0);
+        if (lseek(fd, input_offset, SEEK_SET) < 0) {
+            cerr << "Error: Unable to seek in input: " << strerror(errno) << endl;
+            return false;
+        }
+        input_position = input_offset;
+        zs->avail_in = 0;
+        raw_deflate = !point->member_start;
+        inflateReset2(zs, raw_deflate ? -MAX_WBITS : 16 + MAX_WBITS);
+        if (point->bits) {
+            if (read_input() <= 0) {
+                return false;
+            }
+            int byte = *zs->next_in;
+            zs->next_in++;
+            zs->avail_in--;
+            inflatePrime(zs, point->bits, byte >> (8 - point->bits));
+        }
+        if (raw_deflate) {
+            inflateSetDictionary(zs, point->window.data(), point->window.size());
+        }
+        member_ended = false;
+        trailer_remaining = 0;
+        produced = point->output_offset;
+        start = point->output_offset;
+    } else {
+        if (lseek(fd, target, SEEK_SET) < 0) {
+            cerr << "Error: Unable to seek in input: " << strerror(errno) << endl;
+            return false;
+        }
+        // The bytes read while detecting the file type are behind us now
+        compressed.clear();
+        pending_offset = 0;
+    }
+
+    consumed = start;
+    start_reader();
+    return skip(target - start) == target - start;
+}
+
+// Wait for the next block from the reader thread. Returns false at end of stream.
+bool InflateStream::acquire_block() {
+    if (finished || fd < 0) {
+        return false;
+    }
+    unique_lock<mutex> lock(mtx);
+    cv.wait(lock, [&]() { return blocks[next_block].ready; });
+    current = next_block;
+    offset = 0;
+    return true;
+}
+
+// Hand the current block back to the reader thread
+void InflateStream::release_block() {
+    {
+        lock_guard<mutex> lock(mtx);
+        if (blocks[current].last) {
+            finished = true;
+        }
+        blocks[current].ready = false;
+        next_block = current ^ 1;
+        current = -1;
+    }
+    cv.notify_all();
+}
+
+size_t InflateStream::read(char* dst, size_t n) {
+    if (mapped != nullptr) {
+        size_t take = min<uint64_t>(n, mapped_size - consumed);
+        memcpy(dst, mapped + consumed, take);
+        consumed += take;
+        advise_mapped();
+        return take;
+    }
+    size_t total = 0;
+    while (total < n) {
+        if (current < 0 && !acquire_block()) {
+            break;
+        }
+        Block& block = blocks[current];
+        size_t available = block.size - offset;
+        if (available == 0) {
+            release_block();
+            continue;
+        }
+        size_t take = min(available, n - total);
+        memcpy(dst + total, block.data.data() + offset, take);
+        offset += take;
+        total += take;
+    }
+    consumed += total;
+    return total;
+}
+
+const char* InflateStream::view(size_t n) {
+    if (mapped != nullptr) {
+        if (mapped_size - consumed < n) {
+            consumed = mapped_size;
+            return nullptr;
+        }
+        const char* data = mapped + consumed;
+        consumed += n;
+        advise_mapped();
+        return data;
+    }
+    // Drop exhausted blocks so the fast path below sees the block holding the next byte
+    while (current < 0 || offset == blocks[current].size) {
+        if (current >= 0) {
+            release_block();
+        }
+        if (!acquire_block()) {
+            return nullptr;
+        }
+    }
+
+    Block& block = blocks[current];
+    if (block.size - offset >= n) {
+        const char* data = block.data.data() + offset;
+        offset += n;
+        consumed += n;
+        return data;
+    }
+
+    // The bytes straddle two blocks, so copy them out
+    scratch.resize(n);
+    if (read(scratch.data(), n) != n) {
+        return nullptr;
+    }
+    return scratch.data();
+}
+
+size_t InflateStream::skip(size_t n) {
+    if (mapped != nullptr) {
+        size_t take = min<uint64_t>(n, mapped_size - consumed);
+        consumed += take;
+        advise_mapped();
+        return take;
+    }
+    size_t total = 0;
+    while (total < n) {
+        if (current < 0 && !acquire_block()) {
+            break;
+        }
+        Block& block = blocks[current];
+        size_t available = block.size - offset;
+        if (available == 0) {
+            release_block();
+            continue;
+        }
+        size_t take = min(available, n - total);
+        offset += take;
+        total += take;
+    }
+    consumed += total;
+    return total;
+}
+
+
+uint32_t PcapReader::to_host(uint32_t value) const {
+    return swapped ? __builtin_bswap32(value) : value;
+}
+
+uint16_t PcapReader::to_host(uint16_t value) const {
+    return swapped ? __builtin_bswap16(value) : value;
+}
+
+bool PcapReader::open(const string& filename) {
+    if (!stream.open(filename)) {
+        return false;
+    }
+    data_pending = false;
+
+    const char* magic_bytes = stream.view(4);
+    if (magic_bytes == nullptr) {
+        cerr << "Error: " << filename << " is too short to be a capture file" << endl;
+        return false;
+    }
+    uint32_t magic;
+    memcpy(&magic, magic_bytes, 4);
+
+    pcapng = false;
+    swapped = false;
+    nanosecond = false;
+    interface_units.clear();
+
+    if (magic == PCAP_MAGIC_MICROSECONDS || magic == PCAP_MAGIC_MICROSECONDS_SWAPPED) {
+        swapped = magic == PCAP_MAGIC_MICROSECONDS_SWAPPED;
+    } else if (magic == PCAP_MAGIC_NANOSECONDS || magic == PCAP_MAGIC_NANOSECONDS_SWAPPED) {
+        swapped = magic == PCAP_MAGIC_NANOSECONDS_SWAPPED;
+        nanosecond = true;
+    } else if (magic == PCAPNG_SECTION_HEADER_BLOCK) {
+        pcapng = true;
+        return read_section_header();
+    } else {
+        cerr << "Error: " << filename << " is not a pcap or pcap-ng capture (magic 0x" << hex << magic << dec << ")" << endl;
+        return false;
+    }
+
+    // Skip the rest of the 24 byte pcap global header
+    if (stream.skip(20) != 20) {
+        cerr << "Error: Incomplete pcap global header in " << filename << endl;
+        return false;
+    }
+    return true;
+}
+
+// Read a pcap-ng section header block whose type field has already been consumed
+bool PcapReader::read_section_header() {
+    const char* fields = stream.view(8);
+    if (fields == nullptr) {
+        cerr << "Error: Incomplete pcap-ng section header" << endl;
+        return false;
+    }
+    uint32_t total_length;
+    uint32_t byte_order_magic;
+    memcpy(&total_length, fields, 4);
+    memcpy(&byte_order_magic, fields + 4, 4);
+
+    if (byte_order_magic == PCAPNG_BYTE_ORDER_MAGIC) {
+        swapped = false;
+    } else if (byte_order_magic == __builtin_bswap32(PCAPNG_BYTE_ORDER_MAGIC)) {
+        swapped = true;
+    } else {
+        cerr << "Error: Invalid pcap-ng byte order magic" << endl;
+        return false;
+    }
+    total_length = to_host(total_length);
+
+    // Interfaces are numbered per section
+    interface_units.clear();
+
+    if (total_length < 12 || stream.skip(total_length - 12) != total_length - 12) {
+        cerr << "Error: Invalid pcap-ng section header length" << endl;
+        return false;
+    }
+    return true;
+}
+
+const char* PcapReader::next_packet(PcapPacketHeader& header) {
+    if (!next_packet_header(header)) {
+        return nullptr;
+    }
+    return packet_data();
+}
+
+bool PcapReader::next_packet_header(PcapPacketHeader& header) {
+    if (!stream.is_open() || (data_pending && !skip_packet_data())) {
+        return false;
+    }
+    if (pcapng) {
+        // pcap-ng packet headers sit inside the block, so the whole block is read anyway
+        pending_data = next_pcapng_packet(header);
+        data_pending = pending_data != nullptr;
+        return data_pending;
+    }
+    data_pending = next_classic_header(header);
+    pending_length = header.incl_len;
+    return data_pending;
+}
+
+const char* PcapReader::packet_data() {
+    if (!data_pending) {
+        return nullptr;
+    }
+    data_pending = false;
+    if (pcapng) {
+        return pending_data;
+    }
+    const char* data = stream.view(pending_length);
+    if (data == nullptr) {
+        cerr << "Warning: Truncated packet at end of capture" << endl;
+    }
+    return data;
+}
+
+bool PcapReader::skip_packet_data() {
+    if (!data_pending) {
+        return false;
+    }
+    data_pending = false;
+    if (pcapng) {
+        return true;
+    }
+    if (stream.skip(pending_length) != pending_length) {
+        cerr << "Warning: Truncated packet at end of capture" << endl;
+        return false;
+    }
+    return true;
+}
+
+bool PcapReader::seek(uint64_t offset, const AccessPoint* point) {
+    if (pcapng) {
+        cerr << "Error: Seeking is only supported in classic pcap captures" << endl;
+        return false;
+    }
+    data_pending = false;
+    return stream.seek(offset, point);
+}
+
+bool PcapReader::next_classic_header(PcapPacketHeader& header) {
+    last_packet_offset = stream.position();
+    const char* raw_header = stream.view(sizeof(PcapPacketHeader));
+    if (raw_header == nullptr) {
+        return false;
+    }
+    memcpy(&header, raw_header, sizeof(PcapPacketHeader));
+    header.ts_sec = to_host(header.ts_sec);
+    header.ts_usec = to_host(header.ts_usec);
+    header.incl_len = to_host(header.incl_len);
+    header.orig_len = to_host(header.orig_len);
+    if (nanosecond) {
+        header.ts_usec /= 1000;
+    }
+
+    if (header.incl_len > MAX_PACKET_LENGTH) {
+        cerr << "Error: Invalid packet length " << header.incl_len << ", the capture is corrupted" << endl;
+        return false;
+    }
+    return true;
+}
+
+const char* PcapReader::next_pcapng_packet(PcapPacketHeader& header) {
+    while (true) {
+        const char* block_header = stream.view(8);
+        if (block_header == nullptr) {
+            return nullptr;
+        }
+        uint32_t block_type;
+        uint32_t total_length;
+        memcpy(&block_type, block_header, 4);
+        memcpy(&total_length, block_header + 4, 4);
+
+        if (block_type == PCAPNG_SECTION_HEADER_BLOCK) {
+            // A new section may use a different byte order, so the length is decoded by read_section_header
+            if (!read_section_header()) {
+                return nullptr;
+            }
+            continue;
+        }
+
+        block_type = to_host(block_type);
+        total_length = to_host(total_length);
+        if (total_length < 12 || total_length % 4 != 0 || total_length > MAX_PACKET_LENGTH + 64) {
+            cerr << "Error: Invalid pcap-ng block length " << total_length << ", the capture is corrupted" << endl;
+            return nullptr;
+        }
+
+        // Block body followed by the trailing copy of the block length
+        const char* body = stream.view(total_length - 8);
+        if (body == nullptr) {
+            cerr << "Warning: Truncated pcap-ng block at end of capture" << endl;
+            return nullptr;
+        }
+        size_t body_length = total_length - 12;
+
+        if (block_type == PCAPNG_INTERFACE_DESCRIPTION_BLOCK) {
+            // Default resolution is microseconds unless an if_tsresol option says otherwise
+            uint64_t units = 1000000;
+            size_t option_offset = 8;
+            while (option_offset + 4 <= body_length) {
+                uint16_t code;
+                uint16_t length;
+                memcpy(&code, body + option_offset, 2);
+                memcpy(&length, body + option_offset + 2, 2);
+                code = to_host(code);
+                length = to_host(length);
+                if (code == 0) {
+                    break;
+                }
+                if (code == 9 && length >= 1 && option_offset + 5 <= body_length) {
+                    uint8_t resolution = static_cast<uint8_t>(body[option_offset + 4]);
+                    if (resolution & 0x80) {
+                        units = 1ULL << (resolution & 0x7f);
+                    } else {
+                        units = 1;
+                        for (int i = 0; i < resolution; i++) {
+                            units *= 10;
+                        }
+                    }
+                }
+                option_offset += 4 + ((length + 3) & ~3u);
+            }
+            interface_units.push_back(units);
+        } else if (block_type == PCAPNG_ENHANCED_PACKET_BLOCK) {
+            if (body_length < 20) {
+                cerr << "Warning: Enhanced packet block too short, skipping" << endl;
+                continue;
+            }
+            uint32_t fields[5];
+            memcpy(fields, body, sizeof(fields));
+            uint32_t interface_id = to_host(fields[0]);
+            uint64_t timestamp = (static_cast<uint64_t>(to_host(fields[1])) << 32) | to_host(fields[2]);
+            uint32_t captured_length = to_host(fields[3]);
+            if (captured_length > body_length - 20) {
+                cerr << "Warning: Enhanced packet block captured length exceeds block, skipping" << endl;
+                continue;
+            }
+
+            uint64_t units = interface_id < interface_units.size() ? interface_units[interface_id] : 1000000;
+            header.ts_sec = static_cast<uint32_t>(timestamp / units);
+            header.ts_usec = static_cast<uint32_t>(static_cast<unsigned __int128>(timestamp % units) * 1000000 / units);
+            header.incl_len = captured_length;
+            header.orig_len = to_host(fields[4]);
+            return body + 20;
+        } else if (block_type == PCAPNG_SIMPLE_PACKET_BLOCK) {
+            if (body_length < 4) {
+                continue;
+            }
+            uint32_t original_length;
+            memcpy(&original_length, body, 4);
+            original_length = to_host(original_length);
+            header.ts_sec = 0;
+            header.ts_usec = 0;
+            header.incl_len = min<uint32_t>(original_length, body_length - 4);
+            header.orig_len = original_length;
+            return body + 4;
+        }
+        // Any other block type (statistics, name resolution, ...) carries no packet data
+    }
+}
@@ -0,0 +1,234 @@
+#ifndef PCAP_READER_H
+#define PCAP_READER_H
+
+#include <cstdint>
+#include <cstddef>
+#include <string>
+#include <vector>
+#include <thread>
+#include <mutex>
+#include <condition_variable>
+#include <sys/types.h>
+
+using namespace std;
+
+// This file contains the input layer shared by all parser binaries.
+// InflateStream reads a file (gzip compressed or not) on a dedicated reader thread that fills two large blocks in turn,
+// so decompression overlaps with parsing. PcapReader sits on top of it and hands out one packet at a time.
+// Both classic pcap (micro and nanosecond) and pcap-ng captures are supported, so the files downloaded from IEX
+// can be parsed directly without piping them through gunzip and tcpdump.
+// Uncompressed regular files are mapped into memory instead (see set_mmap): the packets are then handed out as pointers
+// into the mapped pages, without a reader thread or a copy into the blocks.
+
+// Classic pcap record header. Timestamps handed out by PcapReader are always normalised to microseconds,
+// which is what tcpdump writes and what the parsers expect.
+struct PcapPacketHeader {
+    uint32_t ts_sec;
+    uint32_t ts_usec;
+    uint32_t incl_len;
+    uint32_t orig_len;
+};
+
+// Point from which a gzip file can be decompressed without inflating everything before it (as in zlib's zran.c).
+// Deflate streams can only be entered at a block boundary, with the 32 KiB of output that precede it as dictionary.
+// The start of a gzip member needs no dictionary.
+struct AccessPoint {
+    uint64_t output_offset = 0;     // decompressed offset
+    uint64_t input_offset = 0;      // offset in the compressed file of the first byte that is entirely past the point
+    uint8_t bits = 0;               // number of bits of the preceding byte that belong to the point, 0 to 7
+    bool member_start = false;      // the point is the start of a gzip member
+    vector<unsigned char> window;   // the preceding output, unless member_start
+};
+
+// Block compressed captures (written by iex_transcode, see block_writer.h) are a series of gzip members that each hold
+// whole packets. The header of every member carries an extra subfield "IX" with the compressed size of the member and
+// the size of its contents, so the reader can collect many members and inflate them on all cores at once.
+// Any gzip tool still reads such a file as a single capture.
+const size_t BLOCK_MEMBER_HEADER_LENGTH = 24;  // gzip header (10), extra field length (2), "IX" subfield (4 + 8)
+const size_t BLOCK_MEMBER_TRAILER_LENGTH = 8;  // CRC32 and size of the contents
+
+// Streaming reader that inflates gzip input (or copies plain input) on a background thread into double-buffered blocks
+class InflateStream {
+public:
+    explicit InflateStream(size_t block_size = 64 << 20);
+    ~InflateStream();
+
+    // Open the file and start the reader thread. Use "-" or "/dev/stdin" to read from standard input.
+    bool open(const string& filename);
+    void close();
+    bool is_open() const { return fd >= 0; }
+    bool is_gzip() const { return gzip; }
+    bool is_block_compressed() const { return blocked; }
+
+    // Number of threads that inflate the members of block compressed input. Defaults to one per core.
+    void set_inflate_threads(size_t threads) { inflate_threads = threads > 0 ? threads : 1; }
+
+    // Whether to map uncompressed regular files into memory (the default) instead of reading them into the blocks.
+    // Gzip input and standard input are always read by the reader thread. Must be called before open.
+    void set_mmap(bool enabled) { mmap_enabled = enabled; }
+    bool is_mapped() const { return mapped != nullptr; }
+
+    // Copy up to n bytes into dst. Returns the number of bytes copied, which is smaller than n only at end of stream.
+    size_t read(char* dst, size_t n);
+
+    // Return a pointer to the next n bytes and advance past them. Points straight into the current block when the
+    // bytes do not straddle a block boundary, otherwise into a scratch buffer. Valid until the next call.
+    // Returns nullptr if fewer than n bytes are left.
+    const char* view(size_t n);
+
+    // Skip n bytes. Returns the number of bytes skipped.
+    size_t skip(size_t n);
+
+    // Number of decompressed bytes handed to the caller so far
+    uint64_t position() const { return consumed; }
+
+    // Set if the reader thread stopped because of a read or decompression error
+    bool failed() const { return error; }
+
+    // Record access points about every spacing decompressed bytes of gzip input, to be written to an index.
+    // Must be called before open. Recording steps through the deflate blocks, which costs a little throughput.
+    void record_access_points(uint64_t spacing) { access_point_spacing = spacing; }
+
+    // The access points recorded so far. Complete once the whole stream has been read.
+    vector<AccessPoint> access_points();
+
+    // Copy the last access point recorded at or before offset into point. Returns false if there is none.
+    bool access_point_before(uint64_t offset, AccessPoint& point);
+
+    // Continue reading at the decompressed offset. Gzip input needs an access point at or before offset (block compressed
+    // input one at the start of a member), plain input is positioned directly. Does not work on standard input. Returns false if the offset cannot be reached.
+    bool seek(uint64_t offset, const AccessPoint* point);
+
+private:
+    struct Block {
+        vector<char> data;
+        size_t size = 0;
+        bool ready = false;  // filled by the reader thread, not yet consumed
+        bool last = false;   // no more blocks follow this one
+    };
+
+    bool open_mapped();
+    void advise_mapped();
+    void start_reader();
+    void stop_reader();
+    void reader_loop();
+    bool fill_plain(Block& block);
+    bool fill_gzip(Block& block);
+    bool fill_members(Block& block);
+    bool read_member_header();
+    size_t read_exact(unsigned char* dst, size_t n);
+    ssize_t read_input();
+    void add_access_point(bool member_start);
+    bool acquire_block();
+    void release_block();
+
+    size_t block_size;
+    int fd = -1;
+    bool gzip = false;
+    bool blocked = false;
+    bool error = false;
+    bool stop_requested = false;
+
+    Block blocks[2];
+    int current = -1;        // block being consumed, -1 if none
+    int next_block = 0;      // block the consumer takes next
+    size_t offset = 0;       // offset into the current block
+    bool finished = false;   // consumer has seen the last block
+    uint64_t consumed = 0;
+
+    // Mapped input: the whole file, and the offset up to which the pages were requested ahead of the consumer
+    bool mmap_enabled = true;
+    const char* mapped = nullptr;
+    size_t mapped_size = 0;
+    uint64_t advised_until = 0;
+
+    vector<char> scratch;
+    vector<unsigned char> compressed;
+    size_t pending_offset = 0;  // plain and block compressed input: bytes of the first read already delivered
+    void* zstream = nullptr;
+
+    // State of the reader thread while inflating
+    uint64_t input_position = 0;     // compressed bytes read from the file
+    uint64_t produced = 0;           // decompressed bytes produced
+    bool member_ended = false;       // the current gzip member ended, another one may follow
+    bool raw_deflate = false;        // resumed from an access point inside a member, so the gzip trailer is not checked
+    size_t trailer_remaining = 0;    // bytes of the gzip trailer still to skip after a raw deflate stream
+    uint64_t access_point_spacing = 0;
+    vector<AccessPoint> points;
+
+    // State of the reader thread for block compressed input
+    size_t inflate_threads;
+    vector<unsigned char> staging;          // compressed members of the block being filled
+    vector<unsigned char> member_header;    // header of the next member, read before it is known whether it fits
+    bool member_pending = false;
+    uint32_t member_size = 0;               // compressed size of the pending member, header and trailer included
+    uint32_t member_output_size = 0;
+
+    thread reader;
+    mutex mtx;
+    condition_variable cv;
+};
+
+// Packet level reader for classic pcap and pcap-ng captures
+class PcapReader {
+public:
+    explicit PcapReader(size_t block_size = 64 << 20) : stream(block_size) {}
+
+    // Open the capture and read the file header
+    bool open(const string& filename);
+    void close() { stream.close(); }
+    bool is_open() const { return stream.is_open(); }
+
+    // Read the next packet. Fills the (microsecond) header and returns a pointer to incl_len captured bytes,
+    // valid until the next call. Returns nullptr at end of file or if the capture is truncated.
+    const char* next_packet(PcapPacketHeader& header);
+
+    // Read only the header of the next packet. Its data is then either fetched with packet_data or passed over with
+    // skip_packet_data, which does not touch the bytes of classic pcap packets; if neither is called, the next call skips it.
+    // Returns false at end of file.
+    bool next_packet_header(PcapPacketHeader& header);
+    // Returns nullptr if the capture is truncated
+    const char* packet_data();
+    // Returns false if the capture is truncated
+    bool skip_packet_data();
+
+    // See InflateStream::set_mmap. Must be called before open.
+    void set_mmap(bool enabled) { stream.set_mmap(enabled); }
+    bool is_mapped() const { return stream.is_mapped(); }
+
+    // Number of decompressed bytes consumed so far
+    uint64_t position() const { return stream.position(); }
+    bool failed() const { return stream.failed(); }
+    bool is_gzip() const { return stream.is_gzip(); }
+    bool is_pcapng() const { return pcapng; }
+
+    // Decompressed offset of the record header of the packet last returned by next_packet
+    uint64_t packet_offset() const { return last_packet_offset; }
+
+    // See InflateStream. seek must point at a packet record header and only works for classic pcap captures.
+    void record_access_points(uint64_t spacing) { stream.record_access_points(spacing); }
+    vector<AccessPoint> access_points() { return stream.access_points(); }
+    bool access_point_before(uint64_t offset, AccessPoint& point) { return stream.access_point_before(offset, point); }
+    bool seek(uint64_t offset, const AccessPoint* point);
+
+private:
+    bool next_classic_header(PcapPacketHeader& header);
+    const char* next_pcapng_packet(PcapPacketHeader& header);
+    bool read_section_header();
+    uint32_t to_host(uint32_t value) const;
+    uint16_t to_host(uint16_t value) const;
+
+    InflateStream stream;
+    bool pcapng = false;
+    bool swapped = false;
+    bool nanosecond = false;
+    uint64_t last_packet_offset = 0;
+    // Data of the packet whose header was read last: its length for classic pcap, the data itself for pcap-ng
+    bool data_pending = false;
+    uint32_t pending_length = 0;
+    const char* pending_data = nullptr;
+    // pcap-ng timestamp resolution of each interface in units per second
+    vector<uint64_t> interface_units;
+};
+
+#endif // PCAP_READER_H
@@ -0,0 +1,202 @@
+#include "pipeline.h"
+#include "decode_messages.h"
+#include "csv_format.h"
+#include <algorithm>
+#include <chrono>
+using namespace std;
+
+static size_t default_worker_count() {
+    unsigned int cores = thread::hardware_concurrency();
+    return cores > 3 ? cores - 2 : 1;
+}
+
+DecodePipeline::DecodePipeline(OutputFile& trades_output_file, OutputFile& prl_output_file, size_t num_workers,
+                               size_t batch_messages, size_t queue_depth, BookEngine* book_engine,
+                               OutputFile* order_output_file, OrderBookEngine* order_book)
+    : trades_output_file(trades_output_file), prl_output_file(prl_output_file), book_engine(book_engine),
+      order_output_file(order_output_file), order_book(order_book),
+      batch_messages(batch_messages),
+      free_batches((num_workers == 0 ? default_worker_count() : num_workers) * queue_depth * 2 + 2) {
+    if (num_workers == 0) {
+        num_workers = default_worker_count();
+    }
+
+    // Every batch is either being filled, queued, decoded, written or on the free list
+    size_t pool_size = num_workers * queue_depth * 2 + 2;
+    for (size_t i = 0; i < pool_size; ++i) {
+        pool.emplace_back(new MessageBatch());
+        pool.back()->bytes.reserve(batch_messages * 32);
+        pool.back()->messages.reserve(batch_messages);
+        free_batches.push(pool.back().get());
+    }
+
+    for (size_t i = 0; i < num_workers; ++i) {
+        to_decoders.emplace_back(new RingBuffer<MessageBatch*>(queue_depth));
+        to_writer.emplace_back(new RingBuffer<MessageBatch*>(queue_depth));
+    }
+    worker_busy_ns.reset(new atomic<uint64_t>[num_workers]);
+    for (size_t i = 0; i < num_workers; ++i) {
+        worker_busy_ns[i].store(0);
+    }
+    for (size_t i = 0; i < num_workers; ++i) {
+        workers.emplace_back(&DecodePipeline::decode_loop, this, i);
+    }
+    writer = thread(&DecodePipeline::write_loop, this);
+}
+
+DecodePipeline::~DecodePipeline() {
+    finish();
+}
+
+// Nanoseconds elapsed since start
+static uint64_t nanoseconds_since(chrono::steady_clock::time_point start) {
+    return chrono::duration_cast<chrono::nanoseconds>(chrono::steady_clock::now() - start).count();
+}
+
+void DecodePipeline::wait_for_batch() {
+    chrono::steady_clock::time_point start = chrono::steady_clock::now();
+    free_batches.pop(current);
+    reader_blocked_ns += nanoseconds_since(start);
+}
+
+StageTimes DecodePipeline::stage_times() const {
+    StageTimes stages;
+    stages.reader_blocked_ns = reader_blocked_ns;
+    for (size_t i = 0; i < workers.size(); ++i) {
+        stages.worker_busy_ns.push_back(worker_busy_ns[i].load(memory_order_relaxed));
+    }
+    stages.writer_busy_ns = writer_busy_ns.load(memory_order_relaxed);
+    stages.batch_capacity = pool.size();
+    stages.batches_in_flight = pool.size() - min(pool.size(), free_batches.size() + (current != nullptr ? 1 : 0));
+    return stages;
+}
+
+void DecodePipeline::dispatch() {
+    to_decoders[next_worker]->push(current);
+    next_worker = (next_worker + 1) % to_decoders.size();
+    current = nullptr;
+}
+
+void DecodePipeline::drain() {
+    if (current != nullptr && !current->messages.empty()) {
+        dispatch();
+    }
+    // Once every batch of the pool is back on the free list, all of them have been written
+    vector<MessageBatch*> batches;
+    if (current != nullptr) {
+        batches.push_back(current);
+        current = nullptr;
+    }
+    while (batches.size() < pool.size()) {
+        MessageBatch* batch;
+        free_batches.pop(batch);
+        batches.push_back(batch);
+    }
+    for (MessageBatch* batch : batches) {
+        free_batches.push(batch);
+    }
+}
+
+void DecodePipeline::finish() {
+    if (finished) {
+        return;
+    }
+    finished = true;
+    if (current != nullptr && !current->messages.empty()) {
+        dispatch();
+    }
+    for (auto& ring : to_decoders) {
+        ring->close();
+    }
+    for (thread& worker : workers) {
+        worker.join();
+    }
+    writer.join();
+}
+
+void DecodePipeline::decode_loop(size_t worker) {
+    MessageBatch* batch;
+    while (to_decoders[worker]->pop(batch)) {
+        chrono::steady_clock::time_point start = chrono::steady_clock::now();
+        decode_batch(*batch);
+        worker_busy_ns[worker].fetch_add(nanoseconds_since(start), memory_order_relaxed);
+        to_writer[worker]->push(batch);
+    }
+    to_writer[worker]->close();
+}
+
+void DecodePipeline::write_loop() {
+    // Batches were dispatched round robin, so collecting them round robin restores the feed order
+    size_t worker = 0;
+    MessageBatch* batch;
+    while (to_writer[worker]->pop(batch)) {
+        chrono::steady_clock::time_point start = chrono::steady_clock::now();
+        trades_output_file.write(batch->trade_output);
+        prl_output_file.write(batch->prl_output);
+        if (order_output_file != nullptr) {
+            order_output_file->write(batch->order_output);
+        }
+        if (book_engine != nullptr || order_book != nullptr) {
+            for (const MessageBatch::Message& message : batch->messages) {
+                const char* message_payload = batch->bytes.data() + message.offset;
+                if (message_payload[0] == '8' || message_payload[0] == '5') {
+                    if (book_engine != nullptr) {
+                        book_engine->apply(message_payload, message.length, message.capture_time, message.send_time);
+                    }
+                } else if (message_payload[0] != 'T' && order_book != nullptr) {
+                    order_book->apply(message_payload, message.length, message.capture_time, message.send_time);
+                }
+            }
+        }
+        batch->clear();
+        writer_busy_ns.fetch_add(nanoseconds_since(start), memory_order_relaxed);
+        free_batches.push(batch);
+        worker = (worker + 1) % to_writer.size();
+    }
+}
+
+void append_trade_row(string& out, const char* message_payload, size_t message_len, uint64_t capture_time, long long send_time) {
+    append_uint(out, capture_time);
+    out += ',';
+    append_int(out, send_time);
+    out += ',';
+    append_trade_report_csv(out, message_payload, message_len);
+    out += '\n';
+}
+
+void append_price_level_row(string& out, const char* message_payload, size_t message_len, uint64_t capture_time, long long send_time) {
+    append_uint(out, capture_time);
+    out += ',';
+    append_int(out, send_time);
+    // Buy_Ask flag: 0 for bids ('8'), 1 for asks ('5')
+    out += message_payload[0] == '5' ? ",1," : ",0,";
+    append_price_level_update_csv(out, message_payload, message_len);
+    out += '\n';
+}
+
+// Format the CSV rows of a batch. The rows are the same as the ones the parser binaries wrote before the pipeline.
+void DecodePipeline::decode_batch(MessageBatch& batch) {
+    for (const MessageBatch::Message& message : batch.messages) {
+        const char* message_payload = batch.bytes.data() + message.offset;
+        char message_type_byte = message_payload[0];
+
+        if (message_type_byte == 'T') {
+            append_trade_row(batch.trade_output, message_payload, message.length, message.capture_time, message.send_time);
+        } else if (message_type_byte == '8' || message_type_byte == '5') {
+            append_price_level_row(batch.prl_output, message_payload, message.length, message.capture_time, message.send_time);
+        } else {
+            // DEEP+ order message. Invalid messages leave no partial row behind.
+            string& out = batch.order_output;
+            size_t row_start = out.size();
+            append_uint(out, message.capture_time);
+            out += ',';
+            append_int(out, message.send_time);
+            out += ',';
+            if (append_order_event_csv(out, message_payload, message.length)) {
+                out += '\n';
+            } else {
+                out.resize(row_start);
+            }
+        }
+    }
+}
@@ -0,0 +1,124 @@
+#ifndef PIPELINE_H
+#define PIPELINE_H
+
+#include <cstdint>
+#include <cstddef>
+#include <atomic>
+#include <cstring>
+#include <memory>
+#include <string>
+#include <thread>
+#include <vector>
+#include "ring_buffer.h"
+#include "output_file.h"
+#include "price_book.h"
+#include "order_book.h"
+#include "stats.h"
+
+using namespace std;
+
+// Staged CSV pipeline used by the threaded parser binaries:
+//
+//     reader (calling thread) --> N decoder workers --> writer
+//
+// The reader copies the raw bytes of each trade and price level message into a MessageBatch. Full batches are handed
+// to the decoder workers round robin, each through its own bounded ring. The workers format the CSV rows, and the writer
+// collects the batches from the workers in the same round robin order, so rows are written in feed order.
+// Written batches go back to the reader through a free list, so the number of batches (and the memory used) is
+// fixed: when the writer or the decoders fall behind, the reader blocks instead of buffering more.
+// The writer sees the messages in feed order, so it also applies the price level updates to the optional BookEngine,
+// and the DEEP+ order messages to the optional OrderBookEngine.
+
+struct MessageBatch {
+    struct Message {
+        uint64_t capture_time;
+        long long send_time;
+        uint32_t offset;     // offset of the message in bytes
+        uint16_t length;
+    };
+
+    vector<char> bytes;
+    vector<Message> messages;
+    string trade_output;
+    string prl_output;
+    string order_output;
+
+    void clear() {
+        bytes.clear();
+        messages.clear();
+        trade_output.clear();
+        prl_output.clear();
+        order_output.clear();
+    }
+};
+
+// Append the row of a trade report to the _trd file or of a price level update to the _prl file
+void append_trade_row(string& out, const char* message_payload, size_t message_len, uint64_t capture_time, long long send_time);
+void append_price_level_row(string& out, const char* message_payload, size_t message_len, uint64_t capture_time, long long send_time);
+
+class DecodePipeline {
+public:
+    // num_workers of 0 picks one worker per available core, leaving one each for the reader and the writer.
+    // order_output_file receives the DEEP+ order events and is only needed when order messages are queued.
+    DecodePipeline(OutputFile& trades_output_file, OutputFile& prl_output_file, size_t num_workers = 0,
+                   size_t batch_messages = 8192, size_t queue_depth = 4, BookEngine* book_engine = nullptr,
+                   OutputFile* order_output_file = nullptr, OrderBookEngine* order_book = nullptr);
+    ~DecodePipeline();
+
+    // Queue a trade report ('T'), price level update ('8' or '5') or DEEP+ order message
+    void add(const char* message_payload, size_t message_len, uint64_t capture_time, long long send_time) {
+        if (current == nullptr && !free_batches.try_pop(current)) {
+            wait_for_batch();
+        }
+        MessageBatch::Message message = {capture_time, send_time, static_cast<uint32_t>(current->bytes.size()),
+                                         static_cast<uint16_t>(message_len)};
+        current->messages.push_back(message);
+        current->bytes.insert(current->bytes.end(), message_payload, message_payload + message_len);
+        if (current->messages.size() >= batch_messages) {
+            dispatch();
+        }
+    }
+
+    // Wait until everything queued so far has been decoded and handed to the output files. The writer thread is idle
+    // afterwards, so the calling thread can flush the files until it queues the next message.
+    void drain();
+
+    // Decode and write everything queued so far and stop the worker threads
+    void finish();
+
+    size_t worker_count() const { return workers.size(); }
+
+    // Busy times of the stages and the number of batches in flight, for the stats file
+    StageTimes stage_times() const;
+
+private:
+    void wait_for_batch();
+    void dispatch();
+    void decode_loop(size_t worker);
+    void write_loop();
+    static void decode_batch(MessageBatch& batch);
+
+    OutputFile& trades_output_file;
+    OutputFile& prl_output_file;
+    BookEngine* book_engine;
+    OutputFile* order_output_file;
+    OrderBookEngine* order_book;
+    size_t batch_messages;
+    bool finished = false;
+
+    MessageBatch* current = nullptr;
+    size_t next_worker = 0;
+
+    vector<unique_ptr<MessageBatch>> pool;
+    RingBuffer<MessageBatch*> free_batches;
+    vector<unique_ptr<RingBuffer<MessageBatch*>>> to_decoders;
+    vector<unique_ptr<RingBuffer<MessageBatch*>>> to_writer;
+    vector<thread> workers;
+    thread writer;
+
+    uint64_t reader_blocked_ns = 0;
+    unique_ptr<atomic<uint64_t>[]> worker_busy_ns;
+    atomic<uint64_t> writer_busy_ns{0};
+};
+
+#endif // PIPELINE_H
@@ -0,0 +1,90 @@
+#include "price_book.h"
+#include "decode_messages.h"
+#include "csv_format.h"
+#include "logger.h"
+#include <iostream>
+#include <cstring>
+using namespace std;
+
+bool BookEngine::open(const string& output_prefix, size_t depth) {
+    this->depth = depth;
+    snapshot.resize(depth * 2);
+    if (!output_file.open(output_prefix + "_book.csv")) {
+        return false;
+    }
+
+    string header = "Packet Capture Time,Send Time,Exchange Timestamp,Symbol";
+    for (size_t i = 1; i <= depth; ++i) {
+        string level = to_string(i);
+        header += ",Bid Price " + level + ",Bid Size " + level + ",Ask Price " + level + ",Ask Size " + level;
+    }
+    output_file << header + "\n";
+    return true;
+}
+
+void BookEngine::apply(const char* message_payload, size_t message_len, uint64_t capture_time, long long send_time) {
+    PriceLevelUpdate update;
+    if (!decode_price_level_update(message_payload, message_len, update)) {
+        return;
+    }
+
+    uint64_t key;
+    memcpy(&key, update.symbol, sizeof(key));
+    auto found = book_index.find(key);
+    if (found == book_index.end()) {
+        found = book_index.emplace(key, static_cast<uint32_t>(books.size())).first;
+        books.emplace_back();
+        memcpy(books.back().symbol, update.symbol, sizeof(update.symbol));
+        books.back().last_snapshot.assign(depth * 2, PriceLevel{0, 0});
+    }
+    SymbolBook& book = books[found->second];
+
+    PriceLadder& side = message_payload[0] == '8' ? book.bids : book.asks;
+    side.update(update.price, update.size);
+
+    // Event flag 1 marks the end of a transaction
+    if (update.event_flags == '\x01') {
+        write_snapshot(book, capture_time, send_time, update.timestamp);
+    }
+}
+
+void BookEngine::write_snapshot(SymbolBook& book, uint64_t capture_time, long long send_time, uint64_t timestamp) {
+    for (size_t i = 0; i < depth; ++i) {
+        const PriceLevel* bid = book.bids.level(i);
+        const PriceLevel* ask = book.asks.level(i);
+        snapshot[i * 2] = bid ? *bid : PriceLevel{0, 0};
+        snapshot[i * 2 + 1] = ask ? *ask : PriceLevel{0, 0};
+    }
+    // Transactions below the top levels do not change the snapshot
+    if (snapshot == book.last_snapshot) {
+        return;
+    }
+    book.last_snapshot = snapshot;
+
+    row.clear();
+    append_uint(row, capture_time);
+    row += ',';
+    append_int(row, send_time);
+    row += ',';
+    append_uint(row, timestamp);
+    row += ',';
+    row.append(book.symbol, symbol_length(book.symbol));
+    for (const PriceLevel& level : snapshot) {
+        row += ',';
+        // Empty fields for missing levels
+        if (level.size != 0) {
+            append_price(row, level.price);
+            row += ',';
+            append_uint(row, level.size);
+        } else {
+            row += ',';
+        }
+    }
+    row += '\n';
+    output_file.write(row);
+    snapshots++;
+}
+
+bool BookEngine::close() {
+    return output_file.close();
+}
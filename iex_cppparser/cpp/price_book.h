@@ -0,0 +1,98 @@
+#ifndef PRICE_BOOK_H
+#define PRICE_BOOK_H
+
+#include <algorithm>
+#include <cstdint>
+#include <cstddef>
+#include <string>
+#include <unordered_map>
+#include <vector>
+#include "output_file.h"
+
+using namespace std;
+
+// Price level book reconstruction (--book-depth=N). DEEP sends the aggregated size at each price level ('8' for bids,
+// '5' for asks). An update with event flag 0 is part of a transaction that is still in progress; the book of a symbol
+// is consistent again at the update with event flag 1. BookEngine applies every update as it arrives and, at each of
+// these transaction boundaries, writes a snapshot of the top N levels of the symbol if they changed:
+//
+// <output_prefix>_book.csv  Packet Capture Time,Send Time,Exchange Timestamp,Symbol,
+//                           Bid Price 1,Bid Size 1,Ask Price 1,Ask Size 1,...,Bid Price N,Bid Size N,Ask Price N,Ask Size N
+//
+// Levels that do not exist are left empty.
+
+struct PriceLevel {
+    uint64_t price;    // 4 implied decimal places
+    uint32_t size;
+
+    bool operator==(const PriceLevel& other) const { return price == other.price && size == other.size; }
+};
+
+// One side of a book in a sorted array with the best price at the back. Most updates are at or near the top of the
+// book, so inserting or removing a level only moves the few levels behind it.
+class PriceLadder {
+public:
+    explicit PriceLadder(bool is_bid = true) : is_bid(is_bid) {}
+
+    // Set the size at a price level. A size of 0 removes the level.
+    void update(uint64_t price, uint32_t size) {
+        auto position = is_bid ? lower_bound(levels.begin(), levels.end(), price,
+                                             [](const PriceLevel& level, uint64_t p) { return level.price < p; })
+                               : lower_bound(levels.begin(), levels.end(), price,
+                                             [](const PriceLevel& level, uint64_t p) { return level.price > p; });
+        bool found = position != levels.end() && position->price == price;
+        if (size == 0) {
+            if (found) {
+                levels.erase(position);
+            }
+        } else if (found) {
+            position->size = size;
+        } else {
+            levels.insert(position, PriceLevel{price, size});
+        }
+    }
+
+    // The i-th best level, 0 being the best. Returns nullptr if the side has fewer levels.
+    const PriceLevel* level(size_t i) const { return i < levels.size() ? &levels[levels.size() - 1 - i] : nullptr; }
+    size_t size() const { return levels.size(); }
+
+private:
+    bool is_bid;
+    vector<PriceLevel> levels;   // bids ascending, asks descending
+};
+
+class BookEngine {
+public:
+    // Create <output_prefix>_book.csv with snapshots of the top depth levels
+    bool open(const string& output_prefix, size_t depth);
+
+    // Apply a price level update ('8' or '5'). Writes a snapshot if it completes a transaction that changed the top levels.
+    void apply(const char* message_payload, size_t message_len, uint64_t capture_time, long long send_time);
+
+    bool close();
+
+    size_t symbol_count() const { return books.size(); }
+    uint64_t snapshots_written() const { return snapshots; }
+
+private:
+    struct SymbolBook {
+        SymbolBook() : bids(true), asks(false) {}
+
+        char symbol[8];
+        PriceLadder bids;
+        PriceLadder asks;
+        vector<PriceLevel> last_snapshot;   // bid and ask levels of the last snapshot, interleaved
+    };
+
+    void write_snapshot(SymbolBook& book, uint64_t capture_time, long long send_time, uint64_t timestamp);
+
+    size_t depth = 0;
+    uint64_t snapshots = 0;
+    unordered_map<uint64_t, uint32_t> book_index;   // raw 8 byte symbol field -> books
+    vector<SymbolBook> books;
+    vector<PriceLevel> snapshot;
+    string row;
+    OutputFile output_file;
+};
+
+#endif // PRICE_BOOK_H
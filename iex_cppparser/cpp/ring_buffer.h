@@ -0,0 +1,115 @@
+#ifndef RING_BUFFER_H
+#define RING_BUFFER_H
+
+#include <atomic>
+#include <chrono>
+#include <condition_variable>
+#include <cstddef>
+#include <mutex>
+#include <thread>
+#include <vector>
+
+using namespace std;
+
+// Bounded single producer / single consumer ring buffer used to connect the pipeline stages in pipeline.h.
+// push and pop are lock free while there is room (or data). When the ring is full the producer blocks, which is
+// what bounds the memory of the pipeline: a fast reader waits for the decoders instead of buffering the whole file.
+// Blocked threads spin briefly and then sleep on a condition variable until the other side makes progress.
+template <typename T>
+class RingBuffer {
+public:
+    // capacity is rounded up to a power of two
+    explicit RingBuffer(size_t capacity) {
+        size_t size = 2;
+        while (size < capacity) {
+            size <<= 1;
+        }
+        slots.resize(size);
+        mask = size - 1;
+    }
+
+    bool try_push(const T& value) {
+        size_t tail = tail_index.load(memory_order_relaxed);
+        if (tail - head_index.load(memory_order_acquire) == slots.size()) {
+            return false;
+        }
+        slots[tail & mask] = value;
+        tail_index.store(tail + 1, memory_order_release);
+        wake();
+        return true;
+    }
+
+    bool try_pop(T& value) {
+        size_t head = head_index.load(memory_order_relaxed);
+        if (head == tail_index.load(memory_order_acquire)) {
+            return false;
+        }
+        value = slots[head & mask];
+        head_index.store(head + 1, memory_order_release);
+        wake();
+        return true;
+    }
+
+    // Block until there is room for the value
+    void push(const T& value) {
+        for (int attempt = 0; !try_push(value); ++attempt) {
+            wait(attempt, [this]() { return tail_index.load() - head_index.load() < slots.size(); });
+        }
+    }
+
+    // Block until a value is available. Returns false once the ring is closed and drained.
+    bool pop(T& value) {
+        for (int attempt = 0; !try_pop(value); ++attempt) {
+            if (closed.load(memory_order_acquire)) {
+                // Values pushed before close are still delivered
+                return try_pop(value);
+            }
+            wait(attempt, [this]() { return head_index.load() != tail_index.load() || closed.load(); });
+        }
+        return true;
+    }
+
+    // Number of values in the ring. Only a snapshot when the other side is running.
+    size_t size() const {
+        return tail_index.load(memory_order_acquire) - head_index.load(memory_order_acquire);
+    }
+
+    // Called by the producer after its last push
+    void close() {
+        closed.store(true, memory_order_release);
+        lock_guard<mutex> lock(wait_mutex);
+        wait_cv.notify_all();
+    }
+
+private:
+    template <typename Predicate>
+    void wait(int attempt, Predicate ready) {
+        if (attempt < 64) {
+            this_thread::yield();
+            return;
+        }
+        unique_lock<mutex> lock(wait_mutex);
+        waiters.fetch_add(1);
+        // The timeout only guards against a missed notification, progress is normally signalled by wake()
+        wait_cv.wait_for(lock, chrono::milliseconds(1), ready);
+        waiters.fetch_sub(1);
+    }
+
+    void wake() {
+        if (waiters.load() > 0) {
+            lock_guard<mutex> lock(wait_mutex);
+            wait_cv.notify_all();
+        }
+    }
+
+    vector<T> slots;
+    size_t mask;
+    alignas(64) atomic<size_t> head_index{0};
+    alignas(64) atomic<size_t> tail_index{0};
+    atomic<bool> closed{false};
+    atomic<int> waiters{0};
+    mutex wait_mutex;
+    condition_variable wait_cv;
+};
+
+#endif // RING_BUFFER_H
@@ -0,0 +1,252 @@
+#include "split_pipeline.h"
+#include "decode_messages.h"
+#include "csv_format.h"
+#include "symbol_filter.h"
+#include <cctype>
+#include <cerrno>
+#include <chrono>
+#include <cstdio>
+#include <cstring>
+#include <ctime>
+#include <iostream>
+#include <sys/stat.h>
+using namespace std;
+
+static const string TRADES_HEADER = "Packet Capture Time,Send Time,Raw Timestamp,Tick Type,Symbol,Size,Price,Trade ID,Sale Condition\n";
+static const string PRL_HEADER = "Packet Capture Time,Send Time,Raw Timestamp,Tick Type,Symbol,Price,Size,Record Type,Flag,ASK\n";
+
+SplitPipeline::SplitPipeline(const string& output_prefix, size_t shards, size_t num_threads, size_t max_open_files,
+                             size_t batch_messages, size_t queue_depth)
+    : output_prefix(output_prefix), num_shards(shards), batch_messages(batch_messages) {
+    // One thread per shard, or the requested number of threads (default one per core) for one file per symbol
+    if (num_shards > 0) {
+        num_threads = num_shards;
+    } else if (num_threads == 0) {
+        num_threads = thread::hardware_concurrency() > 1 ? thread::hardware_concurrency() - 1 : 1;
+    }
+    // The trades and price level files of a thread share its part of the open file budget
+    size_t files_per_pool = max<size_t>(1, max_open_files / num_threads / 2);
+
+    for (size_t i = 0; i < num_threads; ++i) {
+        Shard* shard = new Shard(queue_depth, files_per_pool);
+        this->shards.emplace_back(shard);
+        for (size_t j = 0; j < queue_depth * 2 + 1; ++j) {
+            shard->pool.emplace_back(new MessageBatch());
+            shard->pool.back()->bytes.reserve(batch_messages * 32);
+            shard->pool.back()->messages.reserve(batch_messages);
+            shard->free_batches.push(shard->pool.back().get());
+        }
+    }
+    // Shard files are created up front, so every shard has a file pair even if none of its symbols trade
+    for (size_t i = 0; i < num_shards; ++i) {
+        Shard& shard = *this->shards[i];
+        shard.ok = shard.trades_files.create(i, output_path("trd", i), TRADES_HEADER) != nullptr && shard.ok;
+        shard.ok = shard.prl_files.create(i, output_path("prl", i), PRL_HEADER) != nullptr && shard.ok;
+    }
+    for (auto& shard : this->shards) {
+        shard->writer = thread(&SplitPipeline::write_loop, this, ref(*shard));
+    }
+}
+
+SplitPipeline::~SplitPipeline() {
+    finish();
+}
+
+void SplitPipeline::use_hive_layout(const string& root, const string& date) {
+    hive = true;
+    hive_root = root;
+    hive_date = date;
+}
+
+// Create the directory of a file and its parents, succeeding if they exist already
+static bool make_parent_directories(const string& path) {
+    for (size_t slash = path.find('/', 1); slash != string::npos; slash = path.find('/', slash + 1)) {
+        string directory = path.substr(0, slash);
+        if (mkdir(directory.c_str(), 0755) != 0 && errno != EEXIST) {
+            cerr << "Error: Unable to create directory " << directory << endl;
+            return false;
+        }
+    }
+    return true;
+}
+
+void SplitPipeline::add(const char* message_payload, size_t message_len, uint64_t capture_time, long long send_time) {
+    // Messages too short to hold a symbol cannot be routed
+    if (message_len < SYMBOL_FIELD_OFFSET + 8) {
+        return;
+    }
+    uint64_t key;
+    memcpy(&key, message_payload + SYMBOL_FIELD_OFFSET, sizeof(key));
+    Shard& shard = *shards[SymbolFilter::hash(key) % shards.size()];
+
+    if (hive && hive_date.empty()) {
+        // The shard threads only read the date after the batch with this message reaches them
+        time_t capture_seconds = static_cast<time_t>(capture_time / 1000000000);
+        tm capture_date;
+        gmtime_r(&capture_seconds, &capture_date);
+        char date[16];
+        strftime(date, sizeof(date), "%Y-%m-%d", &capture_date);
+        hive_date = date;
+    }
+
+    if (shard.current == nullptr && !shard.free_batches.try_pop(shard.current)) {
+        chrono::steady_clock::time_point start = chrono::steady_clock::now();
+        shard.free_batches.pop(shard.current);
+        reader_blocked_ns += chrono::duration_cast<chrono::nanoseconds>(chrono::steady_clock::now() - start).count();
+    }
+    MessageBatch* batch = shard.current;
+    MessageBatch::Message message = {capture_time, send_time, static_cast<uint32_t>(batch->bytes.size()),
+                                     static_cast<uint16_t>(message_len)};
+    batch->messages.push_back(message);
+    batch->bytes.insert(batch->bytes.end(), message_payload, message_payload + message_len);
+    if (batch->messages.size() >= batch_messages) {
+        dispatch(shard);
+    }
+}
+
+void SplitPipeline::dispatch(Shard& shard) {
+    shard.to_writer.push(shard.current);
+    shard.current = nullptr;
+}
+
+bool SplitPipeline::finish() {
+    if (finished) {
+        return ok;
+    }
+    finished = true;
+    for (auto& shard : shards) {
+        if (shard->current != nullptr && !shard->current->messages.empty()) {
+            dispatch(*shard);
+        }
+        shard->to_writer.close();
+    }
+    for (auto& shard : shards) {
+        shard->writer.join();
+        ok = shard->ok && ok;
+    }
+    return ok;
+}
+
+StageTimes SplitPipeline::stage_times() const {
+    StageTimes stages;
+    stages.reader_blocked_ns = reader_blocked_ns;
+    for (auto& shard : shards) {
+        stages.worker_busy_ns.push_back(shard->busy_ns.load(memory_order_relaxed));
+        size_t idle = shard->free_batches.size() + (shard->current != nullptr ? 1 : 0);
+        stages.batch_capacity += shard->pool.size();
+        stages.batches_in_flight += shard->pool.size() - min(shard->pool.size(), idle);
+    }
+    return stages;
+}
+
+vector<string> SplitPipeline::output_files() const {
+    vector<string> files;
+    for (auto& shard : shards) {
+        files.insert(files.end(), shard->trades_files.paths().begin(), shard->trades_files.paths().end());
+    }
+    for (auto& shard : shards) {
+        files.insert(files.end(), shard->prl_files.paths().begin(), shard->prl_files.paths().end());
+    }
+    return files;
+}
+
+void SplitPipeline::write_loop(Shard& shard) {
+    MessageBatch* batch;
+    while (shard.to_writer.pop(batch)) {
+        chrono::steady_clock::time_point start = chrono::steady_clock::now();
+        write_batch(shard, *batch);
+        batch->clear();
+        shard.busy_ns.fetch_add(chrono::duration_cast<chrono::nanoseconds>(chrono::steady_clock::now() - start).count(),
+                                memory_order_relaxed);
+        shard.free_batches.push(batch);
+    }
+    shard.ok = shard.trades_files.close_all() && shard.ok;
+    shard.ok = shard.prl_files.close_all() && shard.ok;
+}
+
+// Format the rows of a batch and append each to the file of its shard or symbol. The rows are the same as the ones
+// of the alphabet split.
+void SplitPipeline::write_batch(Shard& shard, MessageBatch& batch) {
+    string& row = shard.row;
+    for (const MessageBatch::Message& message : batch.messages) {
+        const char* message_payload = batch.bytes.data() + message.offset;
+        char message_type_byte = message_payload[0];
+        bool is_trade = message_type_byte == 'T';
+        if (!is_trade && message_type_byte != '8' && message_type_byte != '5') {
+            continue;
+        }
+
+        row.clear();
+        append_uint(row, message.capture_time);
+        row += ',';
+        append_int(row, message.send_time);
+        row += ',';
+        if (is_trade) {
+            if (!append_trade_report_csv(row, message_payload, message.length)) {
+                continue;
+            }
+        } else {
+            if (!append_price_level_update_csv(row, message_payload, message.length)) {
+                continue;
+            }
+            // ASK flag: 0 for bids ('8'), 1 for asks ('5')
+            row += message_type_byte == '5' ? ",1" : ",0";
+        }
+        row += '\n';
+
+        // Files are keyed by shard number, or by the raw symbol field for one file per symbol
+        uint64_t file_key;
+        memcpy(&file_key, message_payload + SYMBOL_FIELD_OFFSET, sizeof(file_key));
+        if (num_shards > 0) {
+            file_key = SymbolFilter::hash(file_key) % num_shards;
+        }
+
+        FileHandlePool& files = is_trade ? shard.trades_files : shard.prl_files;
+        OutputFile* file = files.get(file_key);
+        if (file == nullptr) {
+            string path = output_path(is_trade ? "trd" : "prl", file_key);
+            if (hive && !make_parent_directories(path)) {
+                shard.ok = false;
+                continue;
+            }
+            file = files.create(file_key, path, is_trade ? TRADES_HEADER : PRL_HEADER);
+            if (file == nullptr) {
+                shard.ok = false;
+                continue;
+            }
+        }
+        file->write(row);
+    }
+}
+
+// Name of the files of a symbol. Symbols can hold characters such as '/' that do not belong in a file name or a
+// partition value, which are escaped the way Hive does, e.g. '/' as %2F. '%' is escaped as well, so two symbols
+// never share a file.
+static string symbol_file_name(uint64_t file_key) {
+    string name;
+    for (unsigned char c : symbol_to_string(reinterpret_cast<const char*>(&file_key))) {
+        if (isalnum(c) || c == '.' || c == '-' || c == '+' || c == '_') {
+            name += static_cast<char>(c);
+        } else {
+            char escaped[4];
+            snprintf(escaped, sizeof(escaped), "%%%02X", c);
+            name += escaped;
+        }
+    }
+    return name;
+}
+
+string SplitPipeline::output_path(const string& type, uint64_t file_key) const {
+    if (hive) {
+        return hive_root + "/type=" + type + "/date=" + hive_date + "/symbol=" + symbol_file_name(file_key) + "/part-0.csv";
+    }
+    string name;
+    if (num_shards > 0) {
+        char shard_name[32];
+        snprintf(shard_name, sizeof(shard_name), "shard%03zu", static_cast<size_t>(file_key));
+        name = shard_name;
+    } else {
+        name = symbol_file_name(file_key);
+    }
+    return output_prefix + "_" + type + "_" + name + ".csv";
+}
@@ -0,0 +1,98 @@
+#ifndef SPLIT_PIPELINE_H
+#define SPLIT_PIPELINE_H
+
+#include <atomic>
+#include <cstdint>
+#include <cstddef>
+#include <memory>
+#include <string>
+#include <thread>
+#include <vector>
+#include "ring_buffer.h"
+#include "pipeline.h"
+#include "file_pool.h"
+#include "stats.h"
+
+using namespace std;
+
+// Sharded output of the split parser:
+//
+//     reader (calling thread) --> shard thread 0 --> files of shard 0
+//                             --> shard thread 1 --> files of shard 1
+//                             ...
+//
+// Messages are routed by a hash of their 8 byte symbol field, so all rows of a symbol end up in the same shard, in feed
+// order. Each shard thread decodes its own MessageBatches and writes its own files, so shards never share a file or a
+// lock. Batches return to the reader through a per shard free list, which bounds the memory like in DecodePipeline.
+//
+// With shards > 0 there is one thread and one trades / price level file pair per shard (<prefix>_trd_shard007.csv).
+// With shards == 0 every symbol gets its own file pair (<prefix>_trd_AAPL.csv, with characters other than letters,
+// digits and ".-+_" escaped as %XX, e.g. <prefix>_trd_BRK%2FA.csv); the symbols are spread over num_threads
+// threads and each thread keeps at most max_open_files / num_threads files open, see FileHandlePool.
+//
+// With the hive layout the per symbol files are partitioned by type, date and symbol instead, so query engines can
+// prune on them and parsing one symbol again only replaces its own files:
+//
+//     <root>/type=trd/date=2023-10-30/symbol=AAPL/part-0.csv
+//     <root>/type=prl/date=2023-10-30/symbol=AAPL/part-0.csv
+class SplitPipeline {
+public:
+    SplitPipeline(const string& output_prefix, size_t shards, size_t num_threads = 0, size_t max_open_files = 512,
+                  size_t batch_messages = 8192, size_t queue_depth = 4);
+    ~SplitPipeline();
+
+    // Write the per symbol files into a hive partitioned tree under root. The date partition is date (YYYY-MM-DD) or,
+    // if empty, the UTC date of the first message queued. Call before the first add.
+    void use_hive_layout(const string& root, const string& date);
+
+    // Queue a trade report ('T') or price level update ('8' or '5') message
+    void add(const char* message_payload, size_t message_len, uint64_t capture_time, long long send_time);
+
+    // Decode and write everything queued so far, stop the shard threads and close the files.
+    // Returns false if writing any of the files failed.
+    bool finish();
+
+    // Paths of the files written, trades files first. Complete after finish().
+    vector<string> output_files() const;
+
+    size_t thread_count() const { return shards.size(); }
+
+    // Busy times of the shard threads and the number of batches in flight, for the stats file
+    StageTimes stage_times() const;
+
+private:
+    struct Shard {
+        Shard(size_t queue_depth, size_t max_open_files)
+            : to_writer(queue_depth), free_batches(queue_depth * 2 + 1),
+              trades_files(max_open_files), prl_files(max_open_files) {}
+
+        RingBuffer<MessageBatch*> to_writer;
+        RingBuffer<MessageBatch*> free_batches;
+        vector<unique_ptr<MessageBatch>> pool;
+        MessageBatch* current = nullptr;
+        FileHandlePool trades_files;
+        FileHandlePool prl_files;
+        string row;
+        bool ok = true;
+        atomic<uint64_t> busy_ns{0};
+        thread writer;
+    };
+
+    void dispatch(Shard& shard);
+    void write_loop(Shard& shard);
+    void write_batch(Shard& shard, MessageBatch& batch);
+    string output_path(const string& type, uint64_t file_key) const;
+
+    string output_prefix;
+    bool hive = false;
+    string hive_root;
+    string hive_date;
+    size_t num_shards;       // 0 for one file per symbol
+    size_t batch_messages;
+    bool finished = false;
+    bool ok = true;
+    vector<unique_ptr<Shard>> shards;
+    uint64_t reader_blocked_ns = 0;
+};
+
+#endif // SPLIT_PIPELINE_H
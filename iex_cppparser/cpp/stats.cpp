@@ -0,0 +1,135 @@
+#include "stats.h"
+#include <algorithm>
+#include <cctype>
+#include <cstdio>
+#include <iostream>
+#include <sstream>
+using namespace std;
+
+// Quote a string for JSON
+static string json_string(const string& value) {
+    string quoted = "\"";
+    for (unsigned char c : value) {
+        if (c == '"' || c == '\\') {
+            quoted += '\\';
+            quoted += c;
+        } else if (c < 0x20) {
+            char escaped[8];
+            snprintf(escaped, sizeof(escaped), "\\u%04x", c);
+            quoted += escaped;
+        } else {
+            quoted += c;
+        }
+    }
+    return quoted + "\"";
+}
+
+static double seconds(uint64_t nanoseconds) {
+    return nanoseconds * 1e-9;
+}
+
+void ParseCounters::add(const ParseCounters& other) {
+    packets_read += other.packets_read;
+    packets_parsed += other.packets_parsed;
+    packets_malformed += other.packets_malformed;
+    for (size_t type = 0; type < 256; ++type) {
+        messages[type] += other.messages[type];
+    }
+    filter_checked += other.filter_checked;
+    filter_accepted += other.filter_accepted;
+    trade_records += other.trade_records;
+    price_level_records += other.price_level_records;
+    order_records += other.order_records;
+}
+
+void ParseStats::start(const string& path, const string& input, uint64_t interval_seconds) {
+    this->path = path;
+    this->input = input;
+    interval = chrono::seconds(interval_seconds);
+    start_time = chrono::steady_clock::now();
+    next_write = start_time + interval;
+}
+
+void ParseStats::sample(uint64_t bytes_read, const StageTimes& stages) {
+    queue_depth_max = max(queue_depth_max, stages.batches_in_flight);
+    queue_depth_total += stages.batches_in_flight;
+    queue_depth_samples++;
+    chrono::steady_clock::time_point now = chrono::steady_clock::now();
+    if (now >= next_write) {
+        write("running", bytes_read, stages);
+        next_write = now + interval;
+    }
+}
+
+bool ParseStats::write(const string& state, uint64_t bytes_read, const StageTimes& stages) {
+    if (path.empty()) {
+        return true;
+    }
+    double elapsed = chrono::duration<double>(chrono::steady_clock::now() - start_time).count();
+    uint64_t total_messages = 0;
+    for (uint64_t count : messages) {
+        total_messages += count;
+    }
+
+    ostringstream json;
+    json.precision(6);
+    json << fixed;
+    json << "{\n";
+    json << "  \"input\": " << json_string(input) << ",\n";
+    json << "  \"state\": " << json_string(state) << ",\n";
+    json << "  \"elapsed_seconds\": " << elapsed << ",\n";
+    json << "  \"packets_read\": " << packets_read << ",\n";
+    json << "  \"packets_parsed\": " << packets_parsed << ",\n";
+    json << "  \"packets_malformed\": " << packets_malformed << ",\n";
+    json << "  \"bytes_read\": " << bytes_read << ",\n";
+    json << "  \"messages\": {";
+    const char* separator = "";
+    for (int type = 0; type < 256; ++type) {
+        if (messages[type] == 0) {
+            continue;
+        }
+        // Message types are printable letters and digits, anything else is a corrupted message
+        char key[8];
+        snprintf(key, sizeof(key), isalnum(type) ? "%c" : "0x%02x", type);
+        json << separator << json_string(key) << ": " << messages[type];
+        separator = ", ";
+    }
+    json << "},\n";
+    json << "  \"filter_checked\": " << filter_checked << ",\n";
+    json << "  \"filter_accepted\": " << filter_accepted << ",\n";
+    json << "  \"filter_hit_rate\": " << (filter_checked > 0 ? static_cast<double>(filter_accepted) / filter_checked : 1.0) << ",\n";
+    json << "  \"trade_records\": " << trade_records << ",\n";
+    json << "  \"price_level_records\": " << price_level_records << ",\n";
+    json << "  \"order_records\": " << order_records << ",\n";
+    json << "  \"packets_per_second\": " << (elapsed > 0 ? packets_read / elapsed : 0.0) << ",\n";
+    json << "  \"messages_per_second\": " << (elapsed > 0 ? total_messages / elapsed : 0.0) << ",\n";
+    json << "  \"megabytes_per_second\": " << (elapsed > 0 ? bytes_read / elapsed / 1e6 : 0.0) << ",\n";
+    json << "  \"queue_depth_max\": " << queue_depth_max << ",\n";
+    json << "  \"queue_depth_mean\": " << (queue_depth_samples > 0 ? static_cast<double>(queue_depth_total) / queue_depth_samples : 0.0) << ",\n";
+    json << "  \"queue_capacity\": " << stages.batch_capacity << ",\n";
+    json << "  \"reader_blocked_seconds\": " << seconds(stages.reader_blocked_ns) << ",\n";
+    json << "  \"worker_busy_seconds\": [";
+    separator = "";
+    for (uint64_t busy_ns : stages.worker_busy_ns) {
+        json << separator << seconds(busy_ns);
+        separator = ", ";
+    }
+    json << "],\n";
+    json << "  \"writer_busy_seconds\": " << seconds(stages.writer_busy_ns) << "\n";
+    json << "}\n";
+
+    // Write to a temporary file and rename it, so readers never see a partial file
+    string temporary_path = path + ".tmp";
+    FILE* file = fopen(temporary_path.c_str(), "w");
+    string data = json.str();
+    bool ok = file != nullptr && fwrite(data.data(), 1, data.size(), file) == data.size();
+    if (file != nullptr) {
+        ok = fclose(file) == 0 && ok;
+    }
+    if (!ok || rename(temporary_path.c_str(), path.c_str()) != 0) {
+        cerr << "Warning: Unable to write the stats file " << path << endl;
+        remove(temporary_path.c_str());
+        return false;
+    }
+    return true;
+}
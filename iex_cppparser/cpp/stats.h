@@ -0,0 +1,69 @@
+#ifndef STATS_H
+#define STATS_H
+
+#include <chrono>
+#include <cstdint>
+#include <string>
+#include <vector>
+
+using namespace std;
+
+// Time spent by the stages of a pipeline (DecodePipeline, SplitPipeline or ChunkDecoder) and how full it is
+struct StageTimes {
+    uint64_t reader_blocked_ns = 0;        // reader waiting for a free batch because the workers fell behind
+    vector<uint64_t> worker_busy_ns;       // per decoder worker (DecodePipeline) or shard thread (SplitPipeline)
+    uint64_t writer_busy_ns = 0;           // writer thread of DecodePipeline writing files and updating order books
+    size_t batches_in_flight = 0;          // batches queued for or held by the workers and the writer
+    size_t batch_capacity = 0;             // number of batches of the pipeline
+};
+
+// Counters of the packets and messages of a parse
+struct ParseCounters {
+    uint64_t packets_read = 0;             // packet headers read, including packets outside the time window
+    uint64_t packets_parsed = 0;           // packets whose messages were parsed
+    uint64_t packets_malformed = 0;        // packets too short for the IEX header, or with a message running past the payload
+    uint64_t messages[256] = {};           // messages of the parsed packets by message type byte
+    uint64_t filter_checked = 0;           // messages of the selected types checked against the symbols of interest (hit rate 1 if none)
+    uint64_t filter_accepted = 0;
+    uint64_t trade_records = 0;            // records handed to the output
+    uint64_t price_level_records = 0;
+    uint64_t order_records = 0;            // DEEP+ order messages
+
+    // Add the counters of a part of the capture, e.g. a chunk decoded by a worker of chunk_decoder.h
+    void add(const ParseCounters& other);
+};
+
+// Throughput counters of a parse (--stats=PATH). The reader thread counts packets and messages, the pipelines time
+// their stages, and the counters are written as a JSON object to PATH every --stats-interval seconds while parsing
+// and once more when the parse ends, with "state" set to "running", "finished" or "failed":
+//     {"input": "...", "state": "finished", "elapsed_seconds": 12.3, "packets_read": 5000000, "packets_parsed": 5000000,
+//      "packets_malformed": 0, "bytes_read": 1234567890, "messages": {"T": 1200, "8": 30000, ...}, "filter_checked": 31200, "filter_accepted": 31200,
+//      "filter_hit_rate": 1.0, "trade_records": 1200, "price_level_records": 30000, "order_records": 0,
+//      "packets_per_second": ..., "messages_per_second": ..., "megabytes_per_second": ..., "queue_depth_max": 8,
+//      "queue_depth_mean": 3.2, "queue_capacity": 34, "reader_blocked_seconds": 0.1, "worker_busy_seconds": [4.2, 4.1], "writer_busy_seconds": 2.0}
+class ParseStats : public ParseCounters {
+public:
+    // Start the clock. Nothing is written if path is empty.
+    void start(const string& path, const string& input, uint64_t interval_seconds);
+
+    // Whether the reader should call sample(), which it does every few thousand packets
+    bool due() const { return !path.empty() && (packets_read & 4095) == 0; }
+
+    // Record the pipeline queue depth, and rewrite the stats file if the interval has passed
+    void sample(uint64_t bytes_read, const StageTimes& stages);
+
+    // Write the stats file. Returns false if it cannot be written.
+    bool write(const string& state, uint64_t bytes_read, const StageTimes& stages);
+
+private:
+    string path;
+    string input;
+    chrono::steady_clock::duration interval{};
+    chrono::steady_clock::time_point start_time;
+    chrono::steady_clock::time_point next_write;
+    size_t queue_depth_max = 0;
+    uint64_t queue_depth_total = 0;
+    uint64_t queue_depth_samples = 0;
+};
+
+#endif // STATS_H
@@ -0,0 +1,97 @@
+#include "symbol_filter.h"
+#include <algorithm>
+#include <cstdio>
+#include <iostream>
+#include <fstream>
+using namespace std;
+
+bool SymbolFilter::load(const string& symbols_of_interest_file) {
+    if (symbols_of_interest_file == "ALL") {
+        all = true;
+        return true;
+    }
+
+    ifstream symbols_file(symbols_of_interest_file);
+    if (!symbols_file.is_open()) {
+        return false;
+    }
+
+    string line;
+    while (getline(symbols_file, line)) {
+        // Ignore surrounding whitespace, including the carriage return of files written on Windows
+        size_t first = line.find_first_not_of(" \t\r");
+        if (first == string::npos) {
+            continue;
+        }
+        size_t last = line.find_last_not_of(" \t\r");
+        add(line.substr(first, last - first + 1));
+    }
+    return true;
+}
+
+bool SymbolFilter::add(const string& symbol) {
+    if (symbol.empty() || symbol.size() > 8) {
+        cerr << "Warning: Ignoring invalid symbol '" << symbol << "' (IEX symbols are 1 to 8 characters)" << endl;
+        return false;
+    }
+    uint64_t key = pack_symbol(symbol);
+    if (contains_key(key)) {
+        return true;
+    }
+
+    // Keep the table at most half full so probe sequences stay short
+    if ((count + 1) * 2 > slots.size()) {
+        vector<uint64_t> old_slots;
+        old_slots.swap(slots);
+        slots.assign(old_slots.empty() ? 16 : old_slots.size() * 2, 0);
+        mask = slots.size() - 1;
+        count = 0;
+        for (uint64_t old_key : old_slots) {
+            if (old_key != 0) {
+                insert(old_key);
+            }
+        }
+    }
+    insert(key);
+    return true;
+}
+
+void SymbolFilter::insert(uint64_t key) {
+    size_t slot = hash(key) & mask;
+    while (slots[slot] != 0) {
+        slot = (slot + 1) & mask;
+    }
+    slots[slot] = key;
+    count++;
+}
+
+uint64_t SymbolFilter::pack_symbol(const string& symbol) {
+    char field[8];
+    memset(field, ' ', sizeof(field));
+    memcpy(field, symbol.data(), min<size_t>(symbol.size(), sizeof(field)));
+    uint64_t key;
+    memcpy(&key, field, sizeof(key));
+    return key;
+}
+
+string SymbolFilter::signature() const {
+    if (all) {
+        return "ALL";
+    }
+    vector<uint64_t> keys;
+    for (uint64_t key : slots) {
+        if (key != 0) {
+            keys.push_back(key);
+        }
+    }
+    sort(keys.begin(), keys.end());
+    uint64_t digest = 14695981039346656037ULL;
+    for (uint64_t key : keys) {
+        for (int i = 0; i < 8; i++) {
+            digest = (digest ^ ((key >> (8 * i)) & 0xff)) * 1099511628211ULL;
+        }
+    }
+    char text[40];
+    snprintf(text, sizeof(text), "%zu:%016llx", count, static_cast<unsigned long long>(digest));
+    return text;
+}
@@ -0,0 +1,87 @@
+#ifndef SYMBOL_FILTER_H
+#define SYMBOL_FILTER_H
+
+#include <cstdint>
+#include <cstddef>
+#include <cstring>
+#include <string>
+#include <vector>
+
+using namespace std;
+
+// Symbol filter used by the parser binaries to drop messages for symbols that are not of interest.
+// IEX sends symbols as an 8 byte, space padded field at bytes 10..17 of every trade and price level message.
+// The symbols file is compiled at startup into a set of those 8 byte fields read as uint64_t keys, so a message
+// can be checked with one load and a hash lookup before any decoding or string construction.
+
+// Byte offset of the symbol field in trade, price level and most other DEEP messages
+const size_t SYMBOL_FIELD_OFFSET = 10;
+
+class SymbolFilter {
+public:
+    // Read symbols from a file with one symbol per line. "ALL" accepts every symbol.
+    // Returns false if the file cannot be opened.
+    bool load(const string& symbols_of_interest_file);
+
+    // Add a single symbol (at most 8 characters)
+    bool add(const string& symbol);
+
+    bool accepts_all() const { return all; }
+    size_t size() const { return count; }
+
+    // Identifies the accepted symbols independently of the file they were read from and the order of its lines,
+    // e.g. "ALL" or "3:5f1c0a2b9e8d7c6b" (count and FNV-1a hash of the sorted keys)
+    string signature() const;
+
+    // Check the 8 byte symbol field of a message
+    bool contains(const char* symbol_field) const {
+        if (all) {
+            return true;
+        }
+        uint64_t key;
+        memcpy(&key, symbol_field, sizeof(key));
+        return contains_key(key);
+    }
+
+    // Check the symbol of a whole message. Messages too short to carry a symbol only pass when accepting everything.
+    bool accepts(const char* message_payload, size_t message_len) const {
+        if (all) {
+            return true;
+        }
+        return message_len >= SYMBOL_FIELD_OFFSET + 8 && contains(message_payload + SYMBOL_FIELD_OFFSET);
+    }
+
+    bool contains_key(uint64_t key) const {
+        if (count == 0) {
+            return false;
+        }
+        size_t slot = hash(key) & mask;
+        // Open addressing with linear probing. Keys are never 0 since symbols are space padded.
+        while (slots[slot] != 0) {
+            if (slots[slot] == key) {
+                return true;
+            }
+            slot = (slot + 1) & mask;
+        }
+        return false;
+    }
+
+    // Pack a symbol into the space padded 8 byte key IEX uses on the wire
+    static uint64_t pack_symbol(const string& symbol);
+
+    static size_t hash(uint64_t key) {
+        // Fibonacci hashing spreads the ASCII bytes over the whole word
+        key *= 0x9E3779B97F4A7C15ULL;
+        return static_cast<size_t>(key ^ (key >> 32));
+    }
+
+private:
+    void insert(uint64_t key);
+
+    bool all = false;
+    size_t count = 0;
+    size_t mask = 0;
+    vector<uint64_t> slots;
+};
+
+#endif // SYMBOL_FILTER_H
@@ -1,27 +1,133 @@
 import requests
 import os
+import json
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
 from datetime import datetime
 
+# Bytes read from the response per write when streaming a download
+STREAM_BLOCK_SIZE = 1 << 20
+
+# Listing of the historical data files of IEX, by date
+HIST_URL = "https://iextrading.com/api/1.0/hist"
+
+_hist_index_lock = threading.Lock()
+_hist_index_memo = {}
+
+
+def hist_cache_dir() -> str:
+    """
+    Returns the directory of the cached HIST index: IEX_CACHE_DIR, by default `~/.cache/iex_cppparser`.
+    """
+    return os.getenv("IEX_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "iex_cppparser"))
+
+
+def get_hist_index(ttl: float = 3600, session: requests.Session = None) -> dict:
+    """
+    Returns the HIST index of IEX (HIST_URL), the list of historical data files by date (YYYYMMDD).
+
+    The index is several MB and only changes once a day, so it is cached in `hist_cache_dir()` as `hist.json`, with its ETag,
+    Last-Modified date and download time in `hist.meta.json`. A cached index younger than ttl seconds is used as is. An older one
+    is revalidated with a conditional request, which costs a 304 response without a body if the index has not changed. If IEX
+    cannot be reached, a stale cached index is used.
+
+    Parameters:
+        ttl (float): Seconds for which the cached index is used without asking IEX. Default is 3600.
+
+        session (requests.Session): Session to request the index with. Default is a plain request.
+
+    Returns:
+        dict: The index, {date: [file, ...]}, where each file is a dict with the "link", "date", "feed", "version", "protocol"
+        and "size" of a file.
+
+    Raises:
+        Exception: If the index cannot be retrieved and there is no cached index.
+    """
+    cache_dir = hist_cache_dir()
+    index_path = os.path.join(cache_dir, "hist.json")
+    meta_path = os.path.join(cache_dir, "hist.meta.json")
+    with _hist_index_lock:
+        meta = {}
+        if os.path.exists(index_path) and os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+        if meta and time.time() - meta.get("fetched_at", 0) < ttl:
+            return _load_hist_index(index_path)
+
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        try:
+            response = (session or requests).get(HIST_URL, headers=headers, timeout=60)
+        except requests.RequestException as e:
+            if meta:
+                print(f"Unable to revalidate the cached HIST index ({e}), using it anyway")
+                return _load_hist_index(index_path)
+            raise Exception(f"Error retrieving data: {e}") from e
+
+        if response.status_code == 304 and meta:
+            data = _load_hist_index(index_path)
+        elif response.status_code == 200:
+            data = response.json()
+            os.makedirs(cache_dir, exist_ok=True)
+            _write_json(index_path, data)
+            _hist_index_memo.clear()
+        elif meta:
+            print(f"Unable to revalidate the cached HIST index ({response.status_code}), using it anyway")
+            return _load_hist_index(index_path)
+        else:
+            raise Exception(f"Error retrieving data: {response.status_code} - {response.text}")
+        _write_json(meta_path, {"etag": response.headers.get("ETag", meta.get("etag")),
+                                "last_modified": response.headers.get("Last-Modified", meta.get("last_modified")),
+                                "fetched_at": time.time()})
+        return data
+
+
+def _load_hist_index(index_path: str) -> dict:
+    """
+    Reads the cached index, once per version of the file
+    """
+    mtime = os.path.getmtime(index_path)
+    if _hist_index_memo.get("mtime") != mtime:
+        with open(index_path) as f:
+            _hist_index_memo.update(mtime=mtime, data=json.load(f))
+    return _hist_index_memo["data"]
+
+
+def _write_json(path: str, data):
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(temp_path, path)
+
+
+def _deep_file(date_data: list, date: str):
+    """
+    Returns the IEXTP1 DEEP 1.0 file among the files of a date, None if there is none
+    """
+    for file in date_data or []:
+        if file.get("feed") == "DEEP" and file.get("date") == date and file.get("version") == "1.0" and file.get("protocol") == "IEXTP1":
+            return file
+    return None
+
+
 def get_hist_data(date: str):
     """
-    Retrieves the historical data available on IEX (https://iextrading.com/api/1.0/hist) and parses it as JSON.
+    Retrieves the historical data available on IEX (https://iextrading.com/api/1.0/hist) for a date, from the cached index (see `get_hist_index`).
     
     Parameters:
         date (str): The date in the format YYYYMMDD.
 
     Returns:
-        dict: The parsed JSON data for the required date.
+        dict: The IEXTP1 DEEP 1.0 file of the date in the index.
     """
-    url = "https://iextrading.com/api/1.0/hist"
-    response = requests.get(url)
-    
-    if response.status_code == 200:
-        data = response.json()
-    else:
-        raise Exception(f"Error retrieving data: {response.status_code} - {response.text}")
-    
-
+    data = get_hist_index()
     date_data = data.get(date)
 
     # Check if data for the date is available
@@ -29,23 +135,299 @@ def get_hist_data(date: str):
         raise Exception(f"Data for date {date} not found on IEX website")
     
     # Check if the required file is available
-    for file in date_data:
-        if file.get("feed") == "DEEP" and file.get("date") == date and file.get("version") == "1.0" and file.get("protocol") == "IEXTP1":
-            return file
-    
-    raise Exception(f"IEXTP1 1.0 DEEP file for date {date} not found on IEX website")
+    file = _deep_file(date_data, date)
+    if file is None:
+        raise Exception(f"IEXTP1 1.0 DEEP file for date {date} not found on IEX website")
+    return file
 
 
-    
-def download_hist_file(date: str, download_dir: str) -> bool:
+def get_hist_files(start_date: str, end_date: str) -> dict:
+    """
+    Resolves the IEXTP1 DEEP 1.0 files of a range of dates from one load of the cached HIST index (see `get_hist_index`).
+
+    Parameters:
+        start_date (str): The first date in the format YYYYMMDD.
+
+        end_date (str): The last date in the format YYYYMMDD.
+
+    Returns:
+        dict: {date (YYYYMMDD): file} for the dates in the range that have a DEEP file, in date order. Weekends, holidays and
+        other days without a DEEP file are left out.
+    """
+    start = datetime.strptime(start_date, "%Y%m%d")
+    end = datetime.strptime(end_date, "%Y%m%d")
+    data = get_hist_index()
+    files = {}
+    for date in sorted(data):
+        try:
+            day = datetime.strptime(date, "%Y%m%d")
+        except ValueError:
+            continue
+        file = _deep_file(data[date], date) if start <= day <= end else None
+        if file is not None:
+            files[date] = file
+    return files
+
+
+def make_session(max_connections: int = 8) -> requests.Session:
+    """
+    Returns a `requests.Session` whose connection pool keeps up to max_connections connections per host open, so the segments
+    of a download reuse their connections instead of opening one per request.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max_connections, pool_maxsize=max_connections)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _progress_path(part_path: str) -> str:
+    return part_path + ".json"
+
+
+def _load_progress(part_path: str, size: int, segment_size: int) -> set:
+    """
+    Returns the numbers of the segments of a `.part` file that were downloaded completely by an earlier run.
+    A `.part` file without progress file is a prefix of the file, as left behind by a single connection download.
+    """
+    if not os.path.exists(part_path):
+        return set()
+    part_size = os.path.getsize(part_path)
+    try:
+        with open(_progress_path(part_path)) as f:
+            progress = json.load(f)
+    except (OSError, ValueError):
+        return set(range(min(part_size, size) // segment_size))
+    if progress.get("size") != size or progress.get("segment_size") != segment_size or part_size != size:
+        return set()
+    return set(progress.get("done", []))
+
+
+def _save_progress(part_path: str, size: int, segment_size: int, done: set):
+    temp_path = _progress_path(part_path) + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump({"size": size, "segment_size": segment_size, "done": sorted(done)}, f)
+    os.replace(temp_path, _progress_path(part_path))
+
+
+def _file_hash(file_path: str, algorithm: str) -> str:
+    digest = hashlib.new(algorithm)
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(STREAM_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def download_file(url: str, file_path: str, size: int = None, segment_size: int = 16 << 20, max_connections: int = 8,
+                  checksum: str = None, session: requests.Session = None, retries: int = 3, progress: bool = True) -> str:
+    """
+    Downloads a file with parallel HTTP Range requests, resuming from the `.part` file of an interrupted download.
+
+    The file is divided into segments of segment_size bytes, which are fetched by max_connections threads over a pooled session
+    and written in place into `<file_path>.part`. The segments that are complete are recorded in `<file_path>.part.json`, so an
+    interrupted download only fetches the missing segments when it is run again. Once every segment is there, the size (and the
+    checksum, if given) is verified and the `.part` file is renamed to file_path. Servers that do not support Range requests
+    get a single streamed request instead.
+
+    Parameters:
+        url (str): The URL of the file.
+
+        file_path (str): Where to save the file.
+
+        size (int): The expected size of the file in bytes. Default is the Content-Length reported by the server.
+
+        segment_size (int): Bytes per Range request. Default is 16 MiB.
+
+        max_connections (int): Number of segments downloaded at the same time. Default is 8.
+
+        checksum (str): Expected checksum of the file as "<algorithm>:<hex digest>", e.g. "sha256:9f86d0...". Default is None (size only).
+
+        session (requests.Session): Session to download with. Default is a new session from `make_session`.
+
+        retries (int): Number of attempts per segment before the download fails. Default is 3.
+
+        progress (bool): Whether to show a progress bar. Default is True.
+
+    Returns:
+        str: file_path.
+
+    Raises:
+        RuntimeError: If a segment cannot be downloaded or the downloaded file does not match its size or checksum. The `.part`
+        file is kept, so the next call resumes, unless the complete file failed verification.
+    """
+    if segment_size < 1 or max_connections < 1 or retries < 1:
+        raise ValueError("segment_size, max_connections and retries must be at least 1")
+    if session is None:
+        session = make_session(max_connections)
+    part_path = file_path + ".part"
+
+    # The size and whether the server serves byte ranges
+    with session.get(url, headers={"Range": "bytes=0-0"}, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        ranged = response.status_code == 206
+        if ranged:
+            total = int(response.headers.get("Content-Range", "/0").rsplit("/", 1)[1])
+        else:
+            total = int(response.headers.get("Content-Length", 0))
+    if size is None:
+        size = total
+    elif total != int(size):
+        raise RuntimeError(f"The server reports {total} bytes for {url}, expected {size}")
+    size = int(size)
+
+    pbar = tqdm(total=size, unit="iB", unit_scale=True, disable=not progress)
+    try:
+        if ranged and size > 0:
+            _download_segments(session, url, part_path, size, segment_size, max_connections, retries, pbar)
+        else:
+            _download_stream(session, url, part_path, pbar)
+    finally:
+        pbar.close()
+
+    # Verify before the file takes its final name
+    actual_size = os.path.getsize(part_path)
+    if actual_size != size:
+        raise RuntimeError(f"Downloaded {actual_size} bytes of {url}, expected {size}")
+    if checksum is not None:
+        algorithm, expected = checksum.split(":", 1)
+        actual = _file_hash(part_path, algorithm)
+        if actual != expected.lower():
+            os.remove(part_path)
+            raise RuntimeError(f"The {algorithm} checksum of {url} is {actual}, expected {expected}")
+    os.replace(part_path, file_path)
+    if os.path.exists(_progress_path(part_path)):
+        os.remove(_progress_path(part_path))
+    return file_path
+
+
+def _download_stream(session: requests.Session, url: str, part_path: str, pbar):
+    """
+    Downloads a file in one request, for servers without Range support.
+    """
+    with session.get(url, stream=True, timeout=60) as response, open(part_path, "wb") as f:
+        response.raise_for_status()
+        for block in response.iter_content(chunk_size=STREAM_BLOCK_SIZE):
+            f.write(block)
+            pbar.update(len(block))
+
+
+def _download_segments(session: requests.Session, url: str, part_path: str, size: int, segment_size: int, max_connections: int,
+                       retries: int, pbar):
+    """
+    Downloads the missing segments of a file into its `.part` file, recording each completed segment.
+    """
+    segment_count = (size + segment_size - 1) // segment_size
+    done = _load_progress(part_path, size, segment_size)
+    with open(part_path, "ab"):
+        pass
+    os.truncate(part_path, size)
+    _save_progress(part_path, size, segment_size, done)
+    pbar.update(sum(min(segment_size, size - segment * segment_size) for segment in done))
+
+    lock = threading.Lock()
+    fd = os.open(part_path, os.O_WRONLY)
+
+    def fetch(segment):
+        start = segment * segment_size
+        end = min(start + segment_size, size) - 1
+        for attempt in range(retries):
+            offset = start
+            try:
+                with session.get(url, headers={"Range": f"bytes={start}-{end}"}, stream=True, timeout=60) as response:
+                    if response.status_code != 206:
+                        raise RuntimeError(f"Expected a partial response for bytes {start}-{end} of {url}, got status {response.status_code}")
+                    for block in response.iter_content(chunk_size=STREAM_BLOCK_SIZE):
+                        block = block[:end + 1 - offset]
+                        os.pwrite(fd, block, offset)
+                        offset += len(block)
+                        pbar.update(len(block))
+                if offset != end + 1:
+                    raise RuntimeError(f"Received {offset - start} of {end + 1 - start} bytes for bytes {start}-{end} of {url}")
+            except (requests.RequestException, RuntimeError) as e:
+                # Retry the whole segment
+                pbar.update(start - offset)
+                if attempt == retries - 1:
+                    raise RuntimeError(f"Failed to download bytes {start}-{end} of {url}: {e}") from e
+                continue
+            with lock:
+                done.add(segment)
+                _save_progress(part_path, size, segment_size, done)
+            return
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_connections) as pool:
+            futures = [pool.submit(fetch, segment) for segment in range(segment_count) if segment not in done]
+            for future in futures:
+                future.result()
+    finally:
+        os.close(fd)
+
+
+def iter_hist_file(date_file: dict, tee_path: str = None, session: requests.Session = None, block_size: int = STREAM_BLOCK_SIZE):
+    """
+    Yields the body of a HIST file block by block as it arrives, e.g. to feed it to a parser without landing the file on disk
+    first (see the source parameter of `parse_file`).
+
+    Parameters:
+        date_file (dict): The file in the HIST index, as returned by `get_hist_data` or `get_hist_files`.
+
+        tee_path (str): If set, the blocks are also written to `<tee_path>.part`, which is renamed to tee_path once the whole
+        file has arrived with the size listed in the index. If the iteration stops early, the `.part` file holds a prefix of
+        the file, which `download_file` resumes from. Default is None.
+
+        session (requests.Session): Session to download with. Default is a plain request.
+
+        block_size (int): Bytes per block. Default is 1 MiB.
+
+    Yields:
+        bytes: The next block of the (compressed) file.
+
+    Raises:
+        RuntimeError: If the file that arrived does not have the size listed in the index.
+    """
+    expected_size = int(date_file.get("size"))
+    received = 0
+    tee = None
+    if tee_path is not None:
+        # The .part file is rewritten from the start, so the segments recorded by an earlier ranged download are void
+        if os.path.exists(tee_path + ".part.json"):
+            os.remove(tee_path + ".part.json")
+        tee = open(tee_path + ".part", "wb")
+    try:
+        with (session or requests).get(date_file.get("link"), stream=True, timeout=60) as response:
+            response.raise_for_status()
+            for block in response.iter_content(chunk_size=block_size):
+                if tee is not None:
+                    tee.write(block)
+                received += len(block)
+                yield block
+    finally:
+        if tee is not None:
+            tee.close()
+    if received != expected_size:
+        raise RuntimeError(f"Received {received} bytes of {date_file.get('link')}, expected {expected_size}")
+    if tee_path is not None:
+        os.replace(tee_path + ".part", tee_path)
+
+
+def download_hist_file(date: str, download_dir: str, max_connections: int = 8, segment_size_mb: int = 16, date_file: dict = None) -> bool:
     """
     Checks the hist_data JSON file for a specific file and downloads it if it doesn't exist.
-    
+
+    The file is downloaded in segments over parallel Range requests, and an interrupted download resumes from its `.part` file,
+    see `download_file`.
+
     Parameters:
         date (str): The date in the format YYYYMMDD.
-        
+
         download_dir (str): The directory to download the file to.
-        
+
+        max_connections (int): Number of segments downloaded at the same time. Default is 8.
+
+        segment_size_mb (int): Size of the segments in MB. Default is 16.
+
+        date_file (dict): The file of the date in the HIST index, as returned by `get_hist_files`. Default is to look it up.
+
     Returns:
         bool: True if the file was downloaded or already existed, False otherwise.
 
@@ -61,34 +443,31 @@ def download_hist_file(date: str, download_dir: str) -> bool:
         return False
 
     # Get available files for the date from IEX website
-    date_file = get_hist_data(date)
-    expected_file_size = date_file.get("size")
+    if date_file is None:
+        date_file = get_hist_data(date)
+    expected_file_size = int(date_file.get("size"))
 
     file_name = f"data_feeds_{date}_{date}_IEXTP1_DEEP1.0.pcap.gz"
 
     # Check if the file already exists
     file_path = f"{download_dir}/{file_name}"
     if os.path.exists(file_path):
-        if int(os.path.getsize(file_path)) == int(expected_file_size):
+        current_size = os.path.getsize(file_path)
+        if current_size == expected_file_size:
             print(f"File {file_name} already exists. Skipping download")
             return True
+        print(f"Expected file size {expected_file_size}. Current file size {current_size}. Resuming...")
+        # A smaller file is what a single connection download left behind, so its bytes are a prefix of the file
+        if current_size < expected_file_size and not os.path.exists(file_path + ".part"):
+            os.replace(file_path, file_path + ".part")
         else:
-            print(f"Expected file size {expected_file_size}. Current file size {os.path.getsize(file_path)}. Redownloading...")
-    
+            os.remove(file_path)
+
     # Download the file
     print(f"Downloading {file_name} to {download_dir}")
-    download_url = date_file.get("link")
-    response = requests.get(download_url, stream=True)
-    
-    total_size = int(response.headers.get("content-length", 0))
-    block_size = 1024
-    
-    with open(file_path, "wb") as f, tqdm(total=total_size, unit="iB", unit_scale=True) as pbar:
-        for chunk in response.iter_content(chunk_size=block_size):
-            if chunk:
-                pbar.update(len(chunk))
-                f.write(chunk)
-    
+    download_file(date_file.get("link"), file_path, size=expected_file_size, segment_size=segment_size_mb << 20,
+                  max_connections=max_connections)
+
     print(f"Downloaded {file_name}")
     return True
     
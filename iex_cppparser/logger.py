@@ -1,21 +1,90 @@
 import datetime
 import os
 import sys
-from dotenv import load_dotenv
+import tempfile
+import threading
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()  # Load environment variables from .env file
+except ImportError:  # python-dotenv is optional, the environment variables can be set directly
+    pass
+
+
+def log_config() -> dict:
+    """
+    Returns the log settings, read from the same environment variables as the parser binaries (see cpp/logger.h):
+
+    - "path": LOG_FILE_PATH, the log file. Default is `iex_parser.log` in the temporary directory. Empty to only log to the console.
+
+    - "first_n": LOG_FIRST_N, the number of warnings of each category that are logged in full. Default is 10.
+
+    - "summary_interval": LOG_SUMMARY_INTERVAL, the seconds between the counts of further warnings of each category. Default is 10.
+    """
+    def number(name, default):
+        value = os.getenv(name, "")
+        return int(value) if value.isdigit() else default
+
+    return {
+        "path": os.getenv('LOG_FILE_PATH', os.path.join(tempfile.gettempdir(), "iex_parser.log")),
+        "first_n": number("LOG_FIRST_N", 10),
+        "summary_interval": number("LOG_SUMMARY_INTERVAL", 10),
+    }
 
-load_dotenv()  # Load environment variables from .env file
 
 class Log:
     def __init__(self):
-        self.log_file_path = os.getenv('LOG_FILE_PATH', '/vagrant/logfile.log')
+        config = log_config()
+        self.log_file_path = config["path"]
+        self.first_n = config["first_n"]
+        self.summary_interval = config["summary_interval"]
+        self.counts = {}
+        self.summarized = {}
+        self.last_summary = datetime.datetime.now()
+        self.lock = threading.Lock()
 
     def write(self, message):
-        if not os.path.exists(self.log_file_path):
-            with open(self.log_file_path, 'w'):
-                pass  # Create an empty file if it doesn't exist
-        with open(self.log_file_path, 'a') as file:
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            file.write(f'{timestamp} - {message}\n')
+        if not self.log_file_path:
+            return
+        try:
+            with open(self.log_file_path, 'a') as file:
+                timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                file.write(f'{timestamp} - {message}\n')
+        except OSError:
+            print(f"Warning: Unable to open log file {self.log_file_path}, set LOG_FILE_PATH to change it", file=sys.stderr)
+            self.log_file_path = ""
+
+    def warn(self, category, message):
+        """
+        Prints a warning and writes it to the log file. Only the first LOG_FIRST_N warnings of each category are logged,
+        after that the number of further warnings is logged every LOG_SUMMARY_INTERVAL seconds and by `summarize`.
+        """
+        with self.lock:
+            count = self.counts.get(category, 0) + 1
+            self.counts[category] = count
+        if count <= self.first_n:
+            if count == self.first_n:
+                message += " (further warnings like this are counted)"
+            print(message)
+            self.write(message)
+        elif (datetime.datetime.now() - self.last_summary).total_seconds() >= self.summary_interval:
+            self.summarize()
+
+    def summarize(self):
+        """
+        Logs the number of warnings of each category that were not logged in full since the last summary.
+        """
+        with self.lock:
+            self.last_summary = datetime.datetime.now()
+            summaries = []
+            for category, count in self.counts.items():
+                summarized = max(self.summarized.get(category, 0), self.first_n)
+                if count > summarized:
+                    summaries.append(f"Warning: {count - summarized} more warnings of type '{category}' ({count} in total)")
+                    self.summarized[category] = count
+        for summary in summaries:
+            print(summary)
+            self.write(summary)
 
 # Example usage
 #logger = Log()
@@ -23,4 +92,3 @@ class Log:
 if __name__ == "__main__":
     log = Log()
     log.write(sys.argv[1])
-
@@ -0,0 +1,162 @@
+import os
+import glob
+import json
+import hashlib
+
+# Version of the manifest layout, stored in every manifest
+MANIFEST_VERSION = 1
+
+
+def output_prefix(file_path: str, parsed_folder: str) -> str:
+    """
+    Returns the path prefix of the output files of a parsed file, e.g. `parsed_folder/data_feeds_20231010_20231010_IEXTP1_DEEP1.0`.
+    """
+    return os.path.join(parsed_folder, os.path.basename(file_path).replace(".pcap.gz", "").replace(".pcap", ""))
+
+
+def manifest_path(file_path: str, parsed_folder: str) -> str:
+    """
+    Returns the path of the manifest of a parsed file, `<output prefix>.manifest.json`.
+    """
+    return output_prefix(file_path, parsed_folder) + ".manifest.json"
+
+
+def _output_files(prefix: str) -> list:
+    """
+    Returns the output files of a parse: the files and column directories starting with `<prefix>_`, and the `.txt` list of the split parser
+    with the files it lists, which are elsewhere for the hive layout.
+    """
+    files = []
+    for path in glob.glob(glob.escape(prefix) + "_*"):
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in names)
+        else:
+            files.append(path)
+    if os.path.exists(prefix + ".txt"):
+        files.append(prefix + ".txt")
+        with open(prefix + ".txt") as f:
+            files.extend(path for path in f.read().splitlines() if os.path.isfile(path))
+    return sorted(set(files))
+
+
+def _file_summary(path: str) -> dict:
+    """
+    Returns the size and SHA-256 hash of a file, and its number of records if it is a CSV file.
+    """
+    digest = hashlib.sha256()
+    lines = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+            lines += chunk.count(b"\n")
+    summary = {"size": os.path.getsize(path), "sha256": digest.hexdigest()}
+    if path.endswith(".csv"):
+        # Every CSV file starts with a header line
+        summary["records"] = max(lines - 1, 0)
+    return summary
+
+
+def _checkpoint_packets(checkpoint_path: str):
+    """
+    Returns the packet count of a complete parser checkpoint, or None.
+    """
+    if not os.path.exists(checkpoint_path):
+        return None
+    fields = {}
+    with open(checkpoint_path) as f:
+        for line in f:
+            name, _, value = line.rstrip("\n").partition(" ")
+            fields[name] = value
+    if fields.get("complete") != "1":
+        return None
+    return int(fields["packets"])
+
+
+def write_manifest(file_path: str, parsed_folder: str, options: dict = None, input_size: int = None) -> dict:
+    """
+    This function writes the manifest of a completely parsed file, which records what the parse produced so that
+    later runs can tell that the file does not need to be parsed again.
+
+    Parameters:
+        file_path (str): The path to the parsed file.
+
+        parsed_folder (str): The folder the output was written to.
+
+        options (dict): The settings of the parse (symbols, output format, ...). A manifest only counts as complete for the same settings.
+
+        input_size (int): The size of the parsed file in bytes, for a file that was streamed and is not on disk. Default is the size of file_path.
+
+    Returns:
+        dict: The manifest, with
+
+        - "input" and "input_size": The name and size in bytes of the parsed file.
+
+        - "packets": The number of packets read, if the parse was checkpointed (see `parse_file`), otherwise None.
+
+        - "options": The settings of the parse.
+
+        - "files": For every output file (relative to parsed_folder) its "size", "sha256" and, for CSV files, the number of "records".
+
+    Output:
+        The manifest is written to `<output prefix>.manifest.json`. A complete parser checkpoint of the file is removed,
+        as the manifest replaces it.
+    """
+    prefix = output_prefix(file_path, parsed_folder)
+    checkpoint_path = prefix + ".checkpoint"
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "input": os.path.basename(file_path),
+        "input_size": input_size if input_size is not None else os.path.getsize(file_path),
+        "packets": _checkpoint_packets(checkpoint_path),
+        # Round trip through JSON so that the settings compare equal to the ones read back from a manifest
+        "options": json.loads(json.dumps(options or {})),
+        "files": {os.path.relpath(path, parsed_folder): _file_summary(path) for path in _output_files(prefix)},
+    }
+
+    path = manifest_path(file_path, parsed_folder)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+    if manifest["packets"] is not None:
+        os.remove(checkpoint_path)
+    return manifest
+
+
+def is_complete(file_path: str, parsed_folder: str, options: dict = None, verify: bool = False) -> bool:
+    """
+    This function checks whether a file was parsed completely with the given settings, according to its manifest.
+
+    Parameters:
+        file_path (str): The path to the file.
+
+        parsed_folder (str): The folder the output was written to.
+
+        options (dict): The settings of the parse, as passed to `write_manifest`.
+
+        verify (bool): Whether to also check the hashes of the output files, which reads all of them. By default only
+        their sizes are checked, which is instant.
+
+    Returns:
+        bool: True if the manifest exists, is for the same input and settings and all output files are unchanged.
+    """
+    path = manifest_path(file_path, parsed_folder)
+    if not os.path.exists(path) or not os.path.exists(file_path):
+        return False
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except ValueError:
+        return False
+
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("input_size") != os.path.getsize(file_path):
+        return False
+    if manifest.get("options") != json.loads(json.dumps(options or {})):
+        return False
+    for name, summary in manifest.get("files", {}).items():
+        output_path = os.path.join(parsed_folder, name)
+        if not os.path.exists(output_path) or os.path.getsize(output_path) != summary["size"]:
+            return False
+        if verify and _file_summary(output_path)["sha256"] != summary["sha256"]:
+            return False
+    return True
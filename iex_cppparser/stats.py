@@ -0,0 +1,61 @@
+import os
+import json
+
+
+class ParseStats:
+    """
+    Throughput counters of a parse, as written by the parser binaries to `<output prefix>.stats.json` (see `parse_file`).
+
+    Every field of the stats file is an attribute:
+
+    - state (str): "running" while the parser runs, then "finished" or "failed".
+
+    - elapsed_seconds (float): Time since the parser started reading.
+
+    - packets_read, packets_parsed (int): Packets read, and packets in the time window whose messages were parsed.
+
+    - packets_malformed (int): Packets skipped as too short for the IEX-TP header, and packets whose remaining messages were skipped because a message ran past the payload.
+
+    - bytes_read (int): Decompressed bytes of the capture read.
+
+    - messages (dict): Number of messages of the parsed packets by message type, e.g. {"T": 1200, "8": 30000, ...}.
+
+    - filter_checked, filter_accepted (int), filter_hit_rate (float): Messages of the selected types checked against the symbols of interest and accepted.
+
+    - trade_records, price_level_records, order_records (int): Records written. order_records counts the DEEP+ order messages.
+
+    - packets_per_second, messages_per_second, megabytes_per_second (float): Throughput.
+
+    - queue_depth_max (int), queue_depth_mean (float), queue_capacity (int): Batches waiting in or being processed by the pipeline, out of its capacity.
+
+    - reader_blocked_seconds (float), worker_busy_seconds (list), writer_busy_seconds (float): Time the reader waited for the pipeline, and the busy time of each worker thread and of the writer thread.
+    """
+
+    def __init__(self, fields: dict):
+        self.fields = fields
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Reads a stats file. Returns None if it does not exist.
+        """
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def to_dict(self) -> dict:
+        return dict(self.fields)
+
+    def __repr__(self):
+        return (f"ParseStats(state={self.fields.get('state')!r}, packets_read={self.fields.get('packets_read')}, "
+                f"elapsed_seconds={self.fields.get('elapsed_seconds')}, megabytes_per_second={self.fields.get('megabytes_per_second')})")
+
+
+def stats_path(parsed_prefix: str) -> str:
+    """
+    Returns the path of the stats file of a parse, `<output prefix>.stats.json`.
+    """
+    return parsed_prefix + ".stats.json"
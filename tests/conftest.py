@@ -0,0 +1,19 @@
+import functools
+import resource
+import signal
+import subprocess
+import pytest
+
+
+def _limit_file_size():
+    # Writes past the limit fail with EFBIG instead of killing the parser
+    signal.signal(signal.SIGXFSZ, signal.SIG_IGN)
+    resource.setrlimit(resource.RLIMIT_FSIZE, (20000, 20000))
+
+
+@pytest.fixture
+def limited_file_size(monkeypatch):
+    """
+    Runs the parser binaries with a limit of 20000 bytes per written file, so writing larger outputs fails.
+    """
+    monkeypatch.setattr(subprocess, "run", functools.partial(subprocess.run, preexec_fn=_limit_file_size))
@@ -0,0 +1,67 @@
+import os
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from iex_cppparser.batches import iter_batches, LIBRARY_PATH
+
+dir = os.path.dirname(os.path.abspath(__file__))
+test_file = os.path.join(dir, "test.pcap.gz")
+
+
+@pytest.fixture(scope="module", autouse=True)
+def library():
+    if not os.path.exists(LIBRARY_PATH):
+        pytest.skip(f"{LIBRARY_PATH} is missing")
+
+
+def read_expected(file):
+    with open(os.path.join(dir, "expected_output", file)) as f:
+        return [line.rstrip("\n").split(",") for line in f][1:]
+
+
+def test_batches_match_csv_output():
+    batches = {"trades": [], "price_levels": []}
+    for record_type, batch in iter_batches(test_file, symbols=os.path.join(dir, "symbols.txt"), batch_size=3):
+        assert len(batch) <= 3
+        batches[record_type].append(batch)
+    trades = np.concatenate(batches["trades"])
+    price_levels = np.concatenate(batches["price_levels"])
+
+    rows = read_expected("test_trd.csv")
+    assert len(trades) == len(rows)
+    for trade, row in zip(trades, rows):
+        assert trade["capture_time"] == int(row[0])
+        assert trade["send_time"] == int(row[1])
+        assert trade["timestamp"] == int(row[2])
+        assert trade["symbol"].decode() == row[4]
+        assert trade["size"] == int(row[5])
+        assert f"{trade['price'] / 10000:.6f}" == row[6]
+        assert trade["trade_id"] == int(row[7])
+
+    rows = read_expected("test_prl.csv")
+    assert len(price_levels) == len(rows)
+    for update, row in zip(price_levels, rows):
+        assert update["side"] == int(row[2])
+        assert update["symbol"].decode() == row[5]
+        assert f"{update['price'] / 10000:.6f}" == row[6]
+        assert update["size"] == int(row[7])
+        assert update["event_flags"] == int(row[9])
+
+
+def test_batches_type_selection_and_early_stop():
+    batches = iter_batches(test_file, symbols=["AAPL", "MSFT", "TSLA", "GOOGL", "AMZN"], types="trades", batch_size=2)
+    record_type, batch = next(batches)
+    assert record_type == "trades" and len(batch) == 2
+    # Closing the generator stops the reader thread and releases the reader
+    batches.close()
+
+    total = sum(len(batch) for record_type, batch in iter_batches(test_file, types=["price_levels"]))
+    assert total > len(read_expected("test_prl.csv"))
+
+
+def test_batches_invalid_arguments():
+    with pytest.raises(ValueError):
+        next(iter_batches(test_file, types=["quotes"]))
+    with pytest.raises(FileNotFoundError):
+        next(iter_batches(os.path.join(dir, "missing.pcap.gz")))
@@ -0,0 +1,37 @@
+import os
+import pytest
+
+from benchmarks.generate import generate_capture
+from benchmarks.run import BINARIES, compare_to_baseline, run_benchmarks
+
+
+@pytest.fixture(scope="module")
+def capture(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("capture") / "synthetic.pcap")
+    return path, generate_capture(path, packets=2000, symbols=50, seed=1)
+
+
+def test_generated_capture_parses_with_every_binary(capture, tmp_path):
+    path, generated = capture
+    assert generated["bytes"] == os.path.getsize(path)
+    # The security directory of 50 symbols takes 13 packets of 4
+    assert generated["packets"] == 2000 + 13 + 6
+    assert 2000 < generated["events"] <= 4 * 2000
+    assert generated["trades"] > 0 and generated["price_levels"] > generated["trades"]
+
+    results = run_benchmarks(path, str(tmp_path), packets=generated["packets"])
+    assert [result["binary"] for result in results] == list(BINARIES)
+    for result in results:
+        assert result["seconds"] > 0
+        assert result["peak_rss_mb"] > 0
+        assert result["output_bytes"] > 0
+        assert result["packets_per_second"] > 0
+
+
+def test_baseline_regressions():
+    baseline = [{"binary": "iex_parser_threaded", "megabytes_per_second": 100.0, "packets_per_second": 1e6, "peak_rss_mb": 100.0}]
+    assert compare_to_baseline([dict(baseline[0], megabytes_per_second=95.0)], baseline) == []
+    regressions = compare_to_baseline([dict(baseline[0], megabytes_per_second=80.0, peak_rss_mb=150.0)], baseline)
+    assert len(regressions) == 2
+    assert regressions[0].startswith("iex_parser_threaded: megabytes_per_second")
+    assert compare_to_baseline([dict(baseline[0], binary="iex_parser", megabytes_per_second=1.0)], baseline) == []
@@ -0,0 +1,41 @@
+import shutil
+from iex_cppparser import parse_file
+import os
+import filecmp
+import gzip
+
+dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_parsing_chunked(tmp_path):
+    """
+    Decoding chunks of the capture on several workers writes the same files as the pipeline, for an uncompressed
+    capture and for a gzip capture read through its index.
+    """
+    test_file = tmp_path / "test.pcap"
+    with gzip.open(os.path.join(dir, "test.pcap.gz"), "rb") as src, open(test_file, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    gz_file = tmp_path / "test_gz.pcap.gz"
+    shutil.copy(os.path.join(dir, "test.pcap.gz"), gz_file)
+
+    pipeline_folder = tmp_path / "pipeline"
+    chunked_folder = tmp_path / "chunked"
+    pipeline_folder.mkdir()
+    chunked_folder.mkdir()
+    stats = parse_file(str(test_file), str(chunked_folder), os.path.join(dir, "symbols.txt"), chunked=True, chunk_size=65536, threads=3)
+    assert len(stats.worker_busy_seconds) == 3
+    assert stats.packets_read == 5000
+    for file in ["test_trd.csv", "test_prl.csv"]:
+        assert filecmp.cmp(os.path.join(dir, "expected_output", file), chunked_folder / file, shallow=False)
+
+    for options in ({"types": "T85IP"}, {"start_ns": 1696248005000000000, "end_ns": 1696248025000000000}):
+        parse_file(str(test_file), str(pipeline_folder), "ALL", **options)
+        parse_file(str(test_file), str(chunked_folder), "ALL", chunked=True, chunk_size=65536, threads=3, **options)
+        for file in ["test_trd.csv", "test_prl.csv"] + (["test_rli.csv", "test_ssp.csv"] if "types" in options else []):
+            assert filecmp.cmp(pipeline_folder / file, chunked_folder / file, shallow=False)
+
+    # The first parse writes the index, the second one is chunked through it
+    parse_file(str(gz_file), str(chunked_folder), os.path.join(dir, "symbols.txt"), index=True)
+    parse_file(str(gz_file), str(chunked_folder), os.path.join(dir, "symbols.txt"), index=True, chunked=True, threads=3)
+    for file in ["trd", "prl"]:
+        assert filecmp.cmp(os.path.join(dir, "expected_output", f"test_{file}.csv"), chunked_folder / f"test_gz_{file}.csv", shallow=False)
@@ -0,0 +1,51 @@
+import pytest
+from iex_cppparser import parse_file
+import os
+
+dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_parsing_columnar_output(tmp_path):
+    """
+    The npy output format holds the same records as the CSV output, as typed columns.
+    """
+    np = pytest.importorskip("numpy")
+    from iex_cppparser.columnar import load_columns, load_symbols, PRICE_SCALE
+
+    parse_file(os.path.join(dir, "test.pcap.gz"), str(tmp_path), os.path.join(dir, "symbols.txt"), output_format="npy", batch_size=4)
+
+    trades = load_columns(str(tmp_path / "test_trd"))
+    symbols = load_symbols(str(tmp_path / "test_trd"))
+    with open(os.path.join(dir, "expected_output", "test_trd.csv")) as f:
+        rows = [line.rstrip("\n").split(",") for line in f][1:]
+    assert trades["timestamp"].dtype == np.int64 and trades["size"].dtype == np.uint32
+    assert len(trades["timestamp"]) == len(rows)
+    for i, row in enumerate(rows):
+        assert trades["capture_time"][i] == int(row[0])
+        assert trades["timestamp"][i] == int(row[2])
+        assert symbols[trades["symbol"][i]] == row[4]
+        assert trades["size"][i] == int(row[5])
+        assert f"{trades['price'][i] / PRICE_SCALE:.6f}" == row[6]
+        assert trades["trade_id"][i] == int(row[7])
+
+    prl = load_columns(str(tmp_path / "test_prl"))
+    symbols = load_symbols(str(tmp_path / "test_prl"))
+    with open(os.path.join(dir, "expected_output", "test_prl.csv")) as f:
+        rows = [line.rstrip("\n").split(",") for line in f][1:]
+    assert len(prl["timestamp"]) == len(rows)
+    for i, row in enumerate(rows):
+        assert prl["side"][i] == int(row[2])
+        assert prl["timestamp"][i] == int(row[3])
+        assert symbols[prl["symbol"][i]] == row[5]
+        assert f"{prl['price'][i] / PRICE_SCALE:.6f}" == row[6]
+        assert prl["size"][i] == int(row[7])
+        assert prl["event_flags"][i] == int(row[9])
+
+
+@pytest.mark.parametrize("output_format", ["csv", "npy"])
+def test_parsing_fails_on_write_errors(tmp_path, limited_file_size, output_format):
+    """
+    A parser that cannot write its output exits with an error, so parse_file raises instead of reporting success.
+    """
+    with pytest.raises(RuntimeError):
+        parse_file(os.path.join(dir, "test.pcap.gz"), str(tmp_path), "ALL", output_format=output_format)
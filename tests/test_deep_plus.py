@@ -0,0 +1,65 @@
+import pytest
+from iex_cppparser import parse_file, DEEP_PLUS_TYPES
+import os
+
+from iex_cppparser.captures import ADD_ORDER, CLEAR_BOOK, ORDER_DELETE, ORDER_EXECUTED, ORDER_MODIFY, TRADE_REPORT, symbol_field, write_capture
+
+dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def _deep_plus_capture(path):
+    """
+    Writes a classic pcap capture of DEEP+ packets with the order messages of ZIEXT.
+    """
+    symbol = symbol_field("ZIEXT")
+
+    def add(side, order_id, size, price):
+        return ADD_ORDER.pack(b"a", side, 0, symbol, order_id, size, price)
+
+    def modify(flags, order_id, size, price):
+        return ORDER_MODIFY.pack(b"M", flags, 0, symbol, order_id, size, price)
+
+    def delete(order_id):
+        return ORDER_DELETE.pack(b"R", 0, 0, symbol, order_id)
+
+    def executed(order_id, size, price, trade_id):
+        return ORDER_EXECUTED.pack(b"L", 0, 0, symbol, order_id, size, price, trade_id)
+
+    write_capture(path, [
+        [add(b"8", 1, 100, 990500), add(b"8", 2, 200, 990500), add(b"5", 3, 300, 991000)],
+        [modify(1, 1, 50, 990500), executed(2, 200, 990500, 7), TRADE_REPORT.pack(b"T", 0, 0, symbol, 200, 990500, 7)],
+        [modify(0, 3, 300, 991500), delete(1), delete(99)],
+        [add(b"5", 4, 100, 992000), CLEAR_BOOK.pack(b"C", 0, 0, symbol)],
+    ])
+
+def test_parsing_deep_plus_orders(tmp_path):
+    """
+    The DEEP+ order messages are written as order events and applied to an order by order book, which writes every
+    price level an event changed.
+    """
+    test_file = str(tmp_path / "plus.pcap")
+    _deep_plus_capture(test_file)
+
+    stats = parse_file(test_file, str(tmp_path), "ALL", types=DEEP_PLUS_TYPES)
+    assert stats.order_records == 10
+    assert stats.trade_records == 1
+    with open(tmp_path / "plus_ord.csv") as f:
+        events = [line.rstrip("\n").split(",") for line in f][1:]
+    assert [event[3] for event in events] == list("aaaMLMRRaC")
+    assert events[0][4:] == ["ZIEXT", "0", "1", "100", "99.050000", "", ""]
+    assert events[3][4:] == ["ZIEXT", "", "1", "50", "99.050000", "", "MAINTAIN_PRIORITY"]
+    assert events[4][4:] == ["ZIEXT", "", "2", "200", "99.050000", "7", "REGULAR_HOURS"]
+    assert events[6][4:] == ["ZIEXT", "", "1", "", "", "", ""]
+
+    # Side, price, size and number of orders of the level after each change. The delete of the unknown order 99 changes nothing.
+    with open(tmp_path / "plus_lvl.csv") as f:
+        levels = [tuple(line.rstrip("\n").split(",")[4:]) for line in f][1:]
+    assert levels == [
+        ("0", "99.050000", "100", "1"), ("0", "99.050000", "300", "2"), ("1", "99.100000", "300", "1"),
+        ("0", "99.050000", "250", "2"), ("0", "99.050000", "50", "1"),
+        ("1", "99.100000", "0", "0"), ("1", "99.150000", "300", "1"), ("0", "99.050000", "0", "0"),
+        ("1", "99.200000", "100", "1"), ("1", "99.200000", "0", "0"), ("1", "99.150000", "0", "0"),
+    ]
+
+    with pytest.raises(ValueError):
+        parse_file(test_file, str(tmp_path), "ALL", output_format="npy", types=DEEP_PLUS_TYPES)
@@ -1,33 +1,12 @@
 import shutil
 import pytest
-from iex_cppparser import parse_file
+from iex_cppparser import parse_file, parse_dates
 import os
 import filecmp
 
 dir = os.path.dirname(os.path.abspath(__file__))
 
 
-
-def test_gunzip_installed():
-    """
-    Ensure that gunzip is installed on the system.
-    """
-    try:
-        if shutil.which("gunzip") is None:
-            pytest.fail("gunzip is not installed on the system.")
-    except (AttributeError, TypeError):
-        pytest.fail("gunzip is not installed on the system.")
-
-def test_tcpdump_installed():
-    """
-    Ensure that tcpdump is installed on the system.
-    """
-    try:
-        if shutil.which("tcpdump") is None:
-            pytest.fail("tcpdump is not installed on the system.")
-    except (AttributeError, TypeError):
-        pytest.fail("tcpdump is not installed on the system.")
-
 def test_parsing_selected_symbols():
     if not os.path.exists(os.path.join(dir, "parsed_folder")):
         os.mkdir(os.path.join(dir, "parsed_folder"))
@@ -50,3 +29,45 @@ def test_parsing_selected_symbols():
             pytest.fail(f"Output file {file} does not match the expected file.")
     
     shutil.rmtree(parsed_folder)
+
+def test_parsing_symbols_file_with_crlf(tmp_path):
+    """
+    Symbols files written on Windows (CRLF line endings, trailing blank lines) select the same symbols.
+    """
+    with open(os.path.join(dir, "symbols.txt")) as f:
+        symbols = f.read().split()
+    symbol = tmp_path / "symbols_crlf.txt"
+    symbol.write_bytes(("\r\n".join(symbols) + "\r\n\r\n").encode())
+
+    parsed_folder = tmp_path / "parsed"
+    parsed_folder.mkdir()
+    parse_file(os.path.join(dir, "test.pcap.gz"), str(parsed_folder), str(symbol))
+
+    for file in ["test_trd.csv", "test_prl.csv"]:
+        if not filecmp.cmp(os.path.join(dir, "expected_output", file), parsed_folder / file, shallow=False):
+            pytest.fail(f"Output file {file} does not match the expected file.")
+
+def test_parse_dates_summary(tmp_path):
+    """
+    parse_dates parses the downloaded days concurrently and reports every day in its summary instead of printing errors.
+    """
+    from iex_cppparser import parse_dates
+
+    download_dir = tmp_path / "downloads"
+    download_dir.mkdir()
+    for date in ["20231002", "20231003"]:
+        shutil.copy(os.path.join(dir, "test.pcap.gz"), download_dir / f"data_feeds_{date}_{date}_IEXTP1_DEEP1.0.pcap.gz")
+    # Not a capture, so the parser fails on it
+    (download_dir / "data_feeds_20231005_20231005_IEXTP1_DEEP1.0.pcap.gz").write_bytes(b"not a pcap file")
+
+    parsed_folder = tmp_path / "parsed"
+    parsed_folder.mkdir()
+    summary = parse_dates("2023-10-02", "2023-10-05", str(download_dir), str(parsed_folder), os.path.join(dir, "symbols.txt"),
+                          download=False, max_parallel_parses=2)
+
+    assert [summary[date]["status"] for date in sorted(summary)] == ["parsed", "parsed", "no_data", "failed"]
+    assert summary["2023-10-05"]["error"]
+    for date in ["20231002", "20231003"]:
+        prefix = f"data_feeds_{date}_{date}_IEXTP1_DEEP1.0"
+        for suffix in ["trd", "prl"]:
+            assert filecmp.cmp(os.path.join(dir, "expected_output", f"test_{suffix}.csv"), parsed_folder / f"{prefix}_{suffix}.csv", shallow=False)
@@ -0,0 +1,250 @@
+import os
+import re
+import json
+import threading
+import hashlib
+import filecmp
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from iex_cppparser import download, parse_date, parse_dates
+from iex_cppparser.download import download_file, get_hist_index, get_hist_files
+
+dir = os.path.dirname(os.path.abspath(__file__))
+
+
+class RangeServer:
+    """
+    Local stand-in for the IEX HIST file server, serving one file with optional Range support. Records the requested
+    ranges and fails the requests for the ranges listed in fail_ranges.
+    """
+
+    def __init__(self, data: bytes, ranges: bool = True, hist: dict = None):
+        self.data = data
+        self.ranges = ranges
+        self.requested = []
+        self.fail_ranges = set()
+        self.hist = hist
+        self.hist_requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/hist":
+                    # The HIST index, with an ETag of its contents
+                    body = json.dumps(server.hist).encode()
+                    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+                    server.hist_requests.append(self.headers.get("If-None-Match"))
+                    if self.headers.get("If-None-Match") == etag:
+                        self.send_response(304)
+                        self.end_headers()
+                        return
+                    self.send_response(200)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                match = re.fullmatch(r"bytes=(\d+)-(\d+)", self.headers.get("Range", ""))
+                if not server.ranges or match is None:
+                    self.send_response(200)
+                    self.send_header("Content-Length", str(len(server.data)))
+                    self.end_headers()
+                    self.wfile.write(server.data)
+                    return
+                start, end = int(match.group(1)), int(match.group(2))
+                server.requested.append((start, end))
+                if (start, end) in server.fail_ranges:
+                    self.send_error(500)
+                    return
+                body = server.data[start:end + 1]
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{len(server.data)}")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/deep.pcap.gz"
+        self.hist_url = f"http://127.0.0.1:{self.httpd.server_port}/hist"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def data():
+    return os.urandom(1000003)
+
+
+def test_parallel_ranged_download(tmp_path, data):
+    """
+    The segments are fetched with Range requests and put together into the same bytes, which are then verified.
+    """
+    server = RangeServer(data)
+    try:
+        file_path = str(tmp_path / "deep.pcap.gz")
+        checksum = "sha256:" + hashlib.sha256(data).hexdigest()
+        download_file(server.url, file_path, size=len(data), segment_size=100000, max_connections=4, checksum=checksum, progress=False)
+        with open(file_path, "rb") as f:
+            assert f.read() == data
+        assert not os.path.exists(file_path + ".part") and not os.path.exists(file_path + ".part.json")
+        # The probe for the size, then one request per segment
+        assert sorted(server.requested[1:]) == [(start, min(start + 100000, len(data)) - 1) for start in range(0, len(data), 100000)]
+
+        with pytest.raises(RuntimeError):
+            download_file(server.url, str(tmp_path / "other.pcap.gz"), segment_size=100000, checksum="sha256:" + "0" * 64, progress=False)
+        assert not os.path.exists(tmp_path / "other.pcap.gz")
+    finally:
+        server.close()
+
+
+def test_resuming_download(tmp_path, data):
+    """
+    An interrupted download keeps its completed segments and the next call only requests the missing ones.
+    """
+    server = RangeServer(data)
+    try:
+        file_path = str(tmp_path / "deep.pcap.gz")
+        server.fail_ranges = {(300000, 399999), (700000, 799999)}
+        with pytest.raises(RuntimeError):
+            download_file(server.url, file_path, segment_size=100000, max_connections=2, retries=2, progress=False)
+        assert not os.path.exists(file_path) and os.path.exists(file_path + ".part")
+
+        server.fail_ranges = set()
+        server.requested = []
+        download_file(server.url, file_path, segment_size=100000, max_connections=2, progress=False)
+        with open(file_path, "rb") as f:
+            assert f.read() == data
+        assert sorted(server.requested[1:]) == [(300000, 399999), (700000, 799999)]
+
+        # A .part file without progress file, as left behind by a single connection download, is a prefix of the file
+        os.remove(file_path)
+        with open(file_path + ".part", "wb") as f:
+            f.write(data[:250000])
+        server.requested = []
+        download_file(server.url, file_path, segment_size=100000, progress=False)
+        with open(file_path, "rb") as f:
+            assert f.read() == data
+        assert min(server.requested[1:]) == (200000, 299999)
+    finally:
+        server.close()
+
+
+def test_download_without_range_support(tmp_path, data):
+    """
+    Servers that ignore Range requests get a single streamed request.
+    """
+    server = RangeServer(data, ranges=False)
+    try:
+        file_path = str(tmp_path / "deep.pcap.gz")
+        download_file(server.url, file_path, segment_size=100000, progress=False)
+        with open(file_path, "rb") as f:
+            assert f.read() == data
+        with pytest.raises(RuntimeError):
+            download_file(server.url, str(tmp_path / "other.pcap.gz"), size=len(data) + 1, progress=False)
+    finally:
+        server.close()
+
+
+def _hist_entry(date, url, size, feed="DEEP"):
+    return {"link": url, "date": date, "feed": feed, "version": "1.0", "protocol": "IEXTP1", "size": str(size)}
+
+
+def test_cached_hist_index(tmp_path, monkeypatch):
+    """
+    The HIST index is downloaded once, used from the cache within its TTL and revalidated with its ETag after that.
+    get_hist_files resolves a range of dates from it, leaving out days without a DEEP file.
+    """
+    hist = {"20231006": [_hist_entry("20231006", "http://x/6", 6)],
+            "20231009": [_hist_entry("20231009", "http://x/9", 9, feed="TOPS"), _hist_entry("20231009", "http://x/9d", 9)],
+            "20231010": [_hist_entry("20231010", "http://x/10", 10, feed="TOPS")],
+            "20231011": [_hist_entry("20231011", "http://x/11", 11)]}
+    server = RangeServer(b"", hist=hist)
+    monkeypatch.setattr(download, "HIST_URL", server.hist_url)
+    monkeypatch.setenv("IEX_CACHE_DIR", str(tmp_path / "cache"))
+    try:
+        assert get_hist_index() == hist
+        assert get_hist_index() == hist
+        files = get_hist_files("20231007", "20231011")
+        assert list(files) == ["20231009", "20231011"]
+        assert files["20231009"]["link"] == "http://x/9d"
+        assert len(server.hist_requests) == 1
+
+        # Past the TTL the cached index is revalidated, and replaced when it changed
+        assert get_hist_index(ttl=0) == hist
+        assert len(server.hist_requests) == 2 and server.hist_requests[1] is not None
+        hist["20231012"] = [_hist_entry("20231012", "http://x/12", 12)]
+        assert "20231012" in get_hist_index(ttl=0)
+        assert "20231012" in get_hist_index()
+        assert len(server.hist_requests) == 3
+    finally:
+        server.close()
+
+
+def test_parse_dates_downloads_listed_days(tmp_path, monkeypatch):
+    """
+    parse_dates looks up the whole range in one index request and downloads nothing for days without a DEEP file.
+    """
+    with open(os.path.join(dir, "test.pcap.gz"), "rb") as f:
+        data = f.read()
+    server = RangeServer(data)
+    server.hist = {"20231002": [_hist_entry("20231002", server.url, len(data))],
+                   "20231004": [_hist_entry("20231004", server.url, len(data))]}
+    monkeypatch.setattr(download, "HIST_URL", server.hist_url)
+    monkeypatch.setenv("IEX_CACHE_DIR", str(tmp_path / "cache"))
+    download_dir = tmp_path / "downloads"
+    parsed_folder = tmp_path / "parsed"
+    download_dir.mkdir()
+    parsed_folder.mkdir()
+    try:
+        summary = parse_dates("2023-09-30", "2023-10-04", str(download_dir), str(parsed_folder), os.path.join(dir, "symbols.txt"))
+    finally:
+        server.close()
+    assert {date: entry["status"] for date, entry in summary.items()} == {
+        "2023-09-30": "no_data", "2023-10-01": "no_data", "2023-10-02": "parsed", "2023-10-03": "no_data", "2023-10-04": "parsed"}
+    assert len(server.hist_requests) == 1
+    assert sorted(os.listdir(download_dir)) == ["data_feeds_20231002_20231002_IEXTP1_DEEP1.0.pcap.gz",
+                                                "data_feeds_20231004_20231004_IEXTP1_DEEP1.0.pcap.gz"]
+
+
+def test_streaming_parse(tmp_path, monkeypatch):
+    """
+    parse_date with stream=True pipes the download into the parser, with the same output as parsing the downloaded file.
+    keep_download writes the file too, and completes it when the parser stops early.
+    """
+    with open(os.path.join(dir, "test.pcap.gz"), "rb") as f:
+        data = f.read()
+    server = RangeServer(data)
+    server.hist = {"20231002": [_hist_entry("20231002", server.url, len(data))]}
+    monkeypatch.setattr(download, "HIST_URL", server.hist_url)
+    monkeypatch.setenv("IEX_CACHE_DIR", str(tmp_path / "cache"))
+    download_dir = tmp_path / "downloads"
+    parsed_folder = tmp_path / "parsed"
+    download_dir.mkdir()
+    parsed_folder.mkdir()
+    prefix = "data_feeds_20231002_20231002_IEXTP1_DEEP1.0"
+    try:
+        stats = parse_date("2023-10-02", str(download_dir), str(parsed_folder), os.path.join(dir, "symbols.txt"), stream=True)
+        assert len(stats) == 1 and stats[0].packets_read > 0
+        assert os.listdir(download_dir) == []
+        for suffix in ["trd", "prl"]:
+            assert filecmp.cmp(os.path.join(dir, "expected_output", f"test_{suffix}.csv"), parsed_folder / f"{prefix}_{suffix}.csv", shallow=False)
+        with open(parsed_folder / f"{prefix}.manifest.json") as f:
+            assert json.load(f)["input_size"] == len(data)
+
+        parse_date("2023-10-02", str(download_dir), str(parsed_folder), "ALL", stream=True, keep_download=True,
+                   end_ns=1696248005000000000)
+        assert os.listdir(download_dir) == [prefix + ".pcap.gz"]
+        with open(download_dir / (prefix + ".pcap.gz"), "rb") as f:
+            assert f.read() == data
+
+        with pytest.raises(ValueError):
+            parse_date("2023-10-02", str(download_dir), str(parsed_folder), "ALL", stream=True, resume=True)
+    finally:
+        server.close()
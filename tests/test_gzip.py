@@ -0,0 +1,42 @@
+import pytest
+from iex_cppparser import parse_file
+import os
+import filecmp
+import gzip
+import zlib
+
+dir = os.path.dirname(os.path.abspath(__file__))
+
+# Size of the reads of compressed input, see COMPRESSED_CHUNK_SIZE in cpp/pcap_reader.cpp
+CHUNK_SIZE = 4 << 20
+
+
+def _gzip_member(data, size):
+    """
+    Returns a gzip member of data that is exactly size bytes long, padded with a comment in the header.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+    deflated = compressor.compress(data) + compressor.flush()
+    trailer = (zlib.crc32(data) & 0xffffffff).to_bytes(4, "little") + (len(data) & 0xffffffff).to_bytes(4, "little")
+    # Magic, deflate, FCOMMENT, no time, no extra flags, unknown OS
+    header = b"\x1f\x8b\x08\x10\x00\x00\x00\x00\x00\xff"
+    comment = b"x" * (size - len(header) - 1 - len(deflated) - len(trailer)) + b"\x00"
+    return header + comment + deflated + trailer
+
+
+@pytest.mark.parametrize("boundary", [CHUNK_SIZE - 1, CHUNK_SIZE - 2, CHUNK_SIZE])
+def test_parsing_multi_member_gzip(tmp_path, boundary):
+    """
+    Concatenated gzip members are all read, also when the magic bytes of a member straddle two reads of the input.
+    """
+    with gzip.open(os.path.join(dir, "test.pcap.gz"), "rb") as f:
+        data = f.read()
+    test_file = tmp_path / "test.pcap.gz"
+    with open(test_file, "wb") as f:
+        f.write(_gzip_member(data[:len(data) // 2], boundary))
+        f.write(gzip.compress(data[len(data) // 2:]))
+
+    stats = parse_file(str(test_file), str(tmp_path), os.path.join(dir, "symbols.txt"))
+    assert stats.state == "finished"
+    for file in ["test_trd.csv", "test_prl.csv"]:
+        assert filecmp.cmp(os.path.join(dir, "expected_output", file), tmp_path / file, shallow=False)
@@ -0,0 +1,38 @@
+import shutil
+from iex_cppparser import parse_file
+import os
+import filecmp
+
+dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_parsing_with_index(tmp_path):
+    """
+    Extractions through the sidecar index give the same output as reading the whole file.
+    """
+    test_file = tmp_path / "test.pcap.gz"
+    shutil.copyfile(os.path.join(dir, "test.pcap.gz"), test_file)
+
+    # The first parse writes the index
+    full_folder = tmp_path / "full"
+    full_folder.mkdir()
+    parse_file(str(test_file), str(full_folder), os.path.join(dir, "symbols.txt"), index=True)
+    assert os.path.exists(str(test_file) + ".idx")
+    for file in ["test_trd.csv", "test_prl.csv"]:
+        assert filecmp.cmp(os.path.join(dir, "expected_output", file), full_folder / file, shallow=False)
+
+    window = {"start_ns": 1696248005000000000, "end_ns": 1696248025000000000}
+    for symbol in (["IAUF", "ICU"], "ALL"):
+        scan_folder = tmp_path / "scan"
+        indexed_folder = tmp_path / "indexed"
+        scan_folder.mkdir(exist_ok=True)
+        indexed_folder.mkdir(exist_ok=True)
+        parse_file(str(test_file), str(scan_folder), symbol, **window)
+        parse_file(str(test_file), str(indexed_folder), symbol, index=True, **window)
+        for file in ["test_trd.csv", "test_prl.csv"]:
+            assert filecmp.cmp(scan_folder / file, indexed_folder / file, shallow=False)
+
+        with open(indexed_folder / "test_prl.csv") as f:
+            capture_times = [int(line.split(",")[0]) for line in f.read().splitlines()[1:]]
+        assert capture_times
+        assert all(window["start_ns"] <= t < window["end_ns"] for t in capture_times)
@@ -0,0 +1,35 @@
+from iex_cppparser import parse_file
+import os
+
+from iex_cppparser.captures import DEFAULT_START_NS, TOPS_PROTOCOL_ID, TRADE_REPORT, symbol_field, write_capture
+
+dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def _zero_size_trades_capture(path, packets=20, trades=10):
+    """
+    Writes a classic pcap capture of DEEP packets with zero size trade reports for ZVZZT.
+    """
+    write_capture(path, [[TRADE_REPORT.pack(b"T", 0, DEFAULT_START_NS + p, symbol_field("ZVZZT"), 0, 100000, p * trades + t)
+                          for t in range(trades)] for p in range(packets)], protocol_id=TOPS_PROTOCOL_ID)
+
+def test_rate_limited_warnings(tmp_path, monkeypatch, capfd):
+    """
+    Only the first LOG_FIRST_N warnings of a category are logged, followed by the count of the others.
+    """
+    test_file = str(tmp_path / "zero.pcap")
+    _zero_size_trades_capture(test_file)
+    log_file = tmp_path / "parser.log"
+    monkeypatch.setenv("LOG_FILE_PATH", str(log_file))
+    monkeypatch.setenv("LOG_FIRST_N", "3")
+
+    parse_file(test_file, str(tmp_path), "ALL")
+    output = capfd.readouterr().out
+    assert output.count("Warning: Zero size trade detected") == 3
+    assert "Warning: 197 more warnings of type 'zero size trade' (200 in total)" in output
+    with open(log_file) as f:
+        log = f.read()
+    assert log.count("Warning: Zero size trade detected") == 3
+    assert "(200 in total)" in log
+    with open(tmp_path / "zero_trd.csv") as f:
+        assert len(f.readlines()) == 201
@@ -0,0 +1,52 @@
+import pytest
+from iex_cppparser import parse_file
+import os
+import struct
+
+from iex_cppparser.captures import (DEFAULT_START_NS, IEX_HEADER, NETWORK_HEADERS, PCAP_GLOBAL_HEADER, PCAP_RECORD_HEADER, TRADE_REPORT,
+                                    packet, symbol_field)
+
+dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def _malformed_capture(path):
+    """
+    Writes a capture of trades of ZVZZT with a packet too short for the IEX header, and a packet whose second message
+    claims more bytes than are left in the payload.
+    """
+    def trade(trade_id):
+        return TRADE_REPORT.pack(b"T", 0, DEFAULT_START_NS, symbol_field("ZVZZT"), 100, 100000, trade_id)
+
+    with open(path, "wb") as f:
+        f.write(PCAP_GLOBAL_HEADER)
+        f.write(packet([trade(1)], DEFAULT_START_NS))
+        runt = NETWORK_HEADERS + b"\0" * 20
+        f.write(PCAP_RECORD_HEADER.pack(DEFAULT_START_NS // 1000000000, 1, len(runt), len(runt)))
+        f.write(runt)
+        messages = struct.pack("<H", len(trade(2))) + trade(2) + struct.pack("<H", 500) + trade(3)
+        header = IEX_HEADER.pack(1, 0, 0x8004, 1, 1, len(messages), 2, 0, 2, DEFAULT_START_NS)
+        data = NETWORK_HEADERS + header + messages
+        f.write(PCAP_RECORD_HEADER.pack(DEFAULT_START_NS // 1000000000, 2, len(data), len(data)))
+        f.write(data)
+        f.write(packet([trade(4)], DEFAULT_START_NS + 1000))
+
+
+@pytest.mark.parametrize("options", [{"symbol": "ALL"}, {"symbol": ["ZVZZT"]}, {"symbol": "ALL", "chunked": True},
+                                     {"symbol": "ALL", "split": True}, {"symbol": "ALL", "split": True, "shards": 2}])
+def test_malformed_packets_are_skipped(tmp_path, options):
+    """
+    Packets too short for the IEX header are skipped, and a message running past the payload ends its packet, instead
+    of the parser reading past the packet. Both are counted in the stats.
+    """
+    test_file = tmp_path / "malformed.pcap"
+    _malformed_capture(test_file)
+    options = dict(options)
+    symbol = options.pop("symbol")
+
+    stats = parse_file(str(test_file), str(tmp_path), symbol, **options)
+    assert stats.state == "finished"
+    assert stats.packets_malformed == 2
+    assert stats.trade_records == 3
+    if not options.get("split"):
+        with open(tmp_path / "malformed_trd.csv") as f:
+            assert [line.split(",")[7] for line in f.readlines()[1:]] == ["1", "2", "4"]
@@ -0,0 +1,37 @@
+import pytest
+from iex_cppparser import parse_file
+import os
+import filecmp
+
+dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_parsing_message_types(tmp_path):
+    """
+    types selects the DEEP message types that are parsed, and the other message types are written to files of their own.
+    """
+    test_file = os.path.join(dir, "test.pcap.gz")
+    trades_folder = tmp_path / "trades"
+    all_folder = tmp_path / "all"
+    trades_folder.mkdir()
+    all_folder.mkdir()
+
+    stats = parse_file(test_file, str(trades_folder), "ALL", types="T")
+    assert stats.price_level_records == 0
+    with open(trades_folder / "test_trd.csv") as f:
+        assert len(f.readlines()) == stats.messages["T"] + 1
+    with open(trades_folder / "test_prl.csv") as f:
+        assert len(f.readlines()) == 1
+
+    stats = parse_file(test_file, str(all_folder), "ALL", types="T85SDHOPI")
+    assert filecmp.cmp(trades_folder / "test_trd.csv", all_folder / "test_trd.csv", shallow=False)
+    for message_type, suffix in (("S", "sys"), ("D", "dir"), ("H", "sts"), ("O", "hlt"), ("P", "ssp"), ("I", "rli")):
+        with open(all_folder / f"test_{suffix}.csv") as f:
+            rows = [line.rstrip("\n").split(",") for line in f][1:]
+        assert len(rows) == stats.messages[message_type]
+        assert all(row[3] == message_type for row in rows)
+
+    with pytest.raises(ValueError):
+        parse_file(test_file, str(tmp_path), "ALL", types="TQ")
+    with pytest.raises(ValueError):
+        parse_file(test_file, str(tmp_path), "ALL", split=True, types="TD")
@@ -0,0 +1,45 @@
+from iex_cppparser import parse_file
+import os
+
+dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_parsing_order_book_snapshots(tmp_path):
+    """
+    The order book snapshots match books rebuilt from the price level updates in Python.
+    """
+    depth = 3
+    parsed_folder = tmp_path / "parsed"
+    parsed_folder.mkdir()
+    parse_file(os.path.join(dir, "test.pcap.gz"), str(parsed_folder), "ALL", book_depth=depth)
+
+    expected = []
+    books = {}
+    last_snapshots = {}
+    with open(parsed_folder / "test_prl.csv") as f:
+        for line in f.read().splitlines()[1:]:
+            capture_time, send_time, side, timestamp, _, symbol, price, size, _, event_flag = line.split(",")
+            bids, asks = books.setdefault(symbol, ({}, {}))
+            levels = asks if side == "1" else bids
+            if int(size) == 0:
+                levels.pop(price, None)
+            else:
+                levels[price] = size
+            if event_flag != "1":
+                continue
+
+            best_bids = sorted(bids.items(), key=lambda level: -float(level[0]))
+            best_asks = sorted(asks.items(), key=lambda level: float(level[0]))
+            snapshot = []
+            for i in range(depth):
+                snapshot += best_bids[i] if i < len(best_bids) else ("", "")
+                snapshot += best_asks[i] if i < len(best_asks) else ("", "")
+            if last_snapshots.get(symbol) != snapshot:
+                last_snapshots[symbol] = snapshot
+                expected.append(",".join([capture_time, send_time, timestamp, symbol] + snapshot))
+
+    with open(parsed_folder / "test_book.csv") as f:
+        lines = f.read().splitlines()
+    assert lines[0].endswith("Bid Price 3,Bid Size 3,Ask Price 3,Ask Size 3")
+    assert len(expected) > 0
+    assert lines[1:] == expected
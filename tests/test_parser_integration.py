@@ -7,12 +7,13 @@ Tests end-to-end functionality with mock data and real scenarios.
 import unittest
 import tempfile
 import os
-import struct
 import csv
 import gzip
 from datetime import datetime, timezone
 import sys
 
+from iex_cppparser.captures import PCAP_GLOBAL_HEADER, PRICE_LEVEL_UPDATE, SYSTEM_EVENT, TRADE_REPORT, packet, symbol_field
+
 class TestParserEndToEnd(unittest.TestCase):
     """End-to-end integration tests for the IEX parser."""
     
@@ -70,144 +71,30 @@ class TestParserEndToEnd(unittest.TestCase):
     
     def _create_pcap_global_header(self):
         """Create PCAP global header."""
-        magic = 0xa1b2c3d4
-        version_major = 2
-        version_minor = 4
-        thiszone = 0
-        sigfigs = 0
-        snaplen = 65535
-        network = 1  # Ethernet
-        
-        return struct.pack('<LHHLLLL', magic, version_major, version_minor,
-                          thiszone, sigfigs, snaplen, network)
-    
-    def _create_packet_header(self, payload_size, timestamp=None):
-        """Create PCAP packet header."""
-        if timestamp is None:
-            timestamp = int(datetime.now().timestamp())
-        
-        ts_sec = timestamp
-        ts_usec = 123456
-        incl_len = payload_size
-        orig_len = payload_size
-        
-        return struct.pack('<LLLL', ts_sec, ts_usec, incl_len, orig_len)
-    
-    def _create_ethernet_ip_udp_headers(self):
-        """Create mock Ethernet + IP + UDP headers (42 bytes)."""
-        # Simplified headers - just padding for testing
-        return b'\x00' * 42
-    
-    def _create_iex_header(self, payload_len, message_count, send_time=None):
-        """Create IEX transport header (40 bytes)."""
-        if send_time is None:
-            send_time = int(datetime.now().timestamp() * 1e9)  # nanoseconds
-        
-        header = b'\x00' * 12  # First 12 bytes (version, reserved, etc.)
-        header += struct.pack('<H', payload_len)  # Payload length
-        header += struct.pack('<H', message_count)  # Message count
-        header += b'\x00' * 16  # Bytes 16-31 (reserved)
-        header += struct.pack('<Q', send_time)  # Send time (8 bytes)
-        
-        return header
-    
-    def _create_trade_message(self):
-        """Create a trade report message."""
-        message_type = b'T'
-        sale_condition = b'\x40'  # REGULAR_HOURS
-        timestamp = struct.pack('<Q', int(datetime.now().timestamp() * 1e9))
-        symbol = b'AAPL    '  # 8 bytes, padded with spaces
-        size = struct.pack('<L', 100)  # 100 shares
-        price = struct.pack('<Q', 1500000)  # $150.00 (in 1e-4 units)
-        trade_id = struct.pack('<Q', 12345)
-        
-        message = (message_type + sale_condition + timestamp + symbol + 
-                  size + price + trade_id)
-        
-        # Add message length prefix
-        message_len = struct.pack('<H', len(message))
-        return message_len + message
-    
-    def _create_price_level_message(self, message_type):
-        """Create a price level update message."""
-        msg_type = message_type.encode()
-        event_flags = b'\x01'  # Some event flag
-        timestamp = struct.pack('<Q', int(datetime.now().timestamp() * 1e9))
-        symbol = b'AAPL    '  # 8 bytes
-        size = struct.pack('<L', 200)  # 200 shares
-        price = struct.pack('<L', 1510000)  # $151.00 (in 1e-4 units)
-        
-        message = (msg_type + event_flags + timestamp + symbol + size + price)
-        
-        # Add message length prefix
-        message_len = struct.pack('<H', len(message))
-        return message_len + message
+        return PCAP_GLOBAL_HEADER
     
-    def _create_system_event_message(self, event_type):
-        """Create a system event message."""
-        message_type = b'S'
-        system_event = event_type.encode()
-        timestamp = struct.pack('<Q', int(datetime.now().timestamp() * 1e9))
-        
-        message = message_type + system_event + timestamp
-        
-        # Add message length prefix
-        message_len = struct.pack('<H', len(message))
-        return message_len + message
+    def _now_ns(self):
+        """Current time in nanoseconds since epoch."""
+        return int(datetime.now().timestamp() * 1e9)
     
     def _create_trade_packet(self):
         """Create a complete packet with trade message."""
-        # Create trade message
-        trade_msg = self._create_trade_message()
-        
-        # Create IEX header
-        iex_header = self._create_iex_header(len(trade_msg), 1)
-        
-        # Create complete payload
-        iex_payload = iex_header + trade_msg
-        eth_headers = self._create_ethernet_ip_udp_headers()
-        full_payload = eth_headers + iex_payload
-        
-        # Create packet header
-        packet_header = self._create_packet_header(len(full_payload))
-        
-        return packet_header + full_payload
+        timestamp = self._now_ns()
+        # 100 shares at $150.00 (in 1e-4 units), REGULAR_HOURS sale condition
+        trade = TRADE_REPORT.pack(b'T', 0x40, timestamp, symbol_field('AAPL'), 100, 1500000, 12345)
+        return packet([trade], timestamp)
     
     def _create_price_level_packet(self, message_type):
         """Create a complete packet with price level message."""
-        # Create price level message
-        prl_msg = self._create_price_level_message(message_type)
-        
-        # Create IEX header
-        iex_header = self._create_iex_header(len(prl_msg), 1)
-        
-        # Create complete payload
-        iex_payload = iex_header + prl_msg
-        eth_headers = self._create_ethernet_ip_udp_headers()
-        full_payload = eth_headers + iex_payload
-        
-        # Create packet header
-        packet_header = self._create_packet_header(len(full_payload))
-        
-        return packet_header + full_payload
+        timestamp = self._now_ns()
+        # 200 shares at $151.00 (in 1e-4 units)
+        update = PRICE_LEVEL_UPDATE.pack(message_type.encode(), 1, timestamp, symbol_field('AAPL'), 200, 1510000)
+        return packet([update], timestamp)
     
     def _create_system_event_packet(self, event_type):
         """Create a complete packet with system event message."""
-        # Create system event message
-        sys_msg = self._create_system_event_message(event_type)
-        
-        # Create IEX header
-        iex_header = self._create_iex_header(len(sys_msg), 1)
-        
-        # Create complete payload
-        iex_payload = iex_header + sys_msg
-        eth_headers = self._create_ethernet_ip_udp_headers()
-        full_payload = eth_headers + iex_payload
-        
-        # Create packet header
-        packet_header = self._create_packet_header(len(full_payload))
-        
-        return packet_header + full_payload
+        timestamp = self._now_ns()
+        return packet([SYSTEM_EVENT.pack(b'S', ord(event_type), timestamp)], timestamp)
     
     def test_trade_message_parsing(self):
         """Test parsing of trade messages."""
@@ -0,0 +1,105 @@
+import shutil
+import pytest
+from iex_cppparser import parse_file, parse_date, parse_dates
+from iex_cppparser.manifest import is_complete, manifest_path
+import os
+import filecmp
+import json
+
+dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_resuming_parses(tmp_path):
+    """
+    Parses with resume=True write a manifest, and files that were parsed completely are skipped when parsing again.
+    """
+    download_dir = tmp_path / "download"
+    parsed_folder = tmp_path / "parsed"
+    download_dir.mkdir()
+    parsed_folder.mkdir()
+    test_file = download_dir / "data_feeds_20231002_20231002_IEXTP1_DEEP1.0.pcap.gz"
+    shutil.copy(os.path.join(dir, "test.pcap.gz"), test_file)
+    symbol = os.path.join(dir, "symbols.txt")
+
+    parse_date("2023-10-02", str(download_dir), str(parsed_folder), symbol, download=False, resume=True)
+    prefix = parsed_folder / "data_feeds_20231002_20231002_IEXTP1_DEEP1.0"
+    for file in ["test_trd.csv", "test_prl.csv"]:
+        parsed_file = str(prefix) + file[len("test"):]
+        assert filecmp.cmp(os.path.join(dir, "expected_output", file), parsed_file, shallow=False)
+    # The manifest replaces the checkpoint of the complete parse
+    assert not os.path.exists(str(prefix) + ".checkpoint")
+    assert is_complete(str(test_file), str(parsed_folder), {"split": False, "output_format": "csv", "symbol": symbol})
+
+    with open(manifest_path(str(test_file), str(parsed_folder))) as f:
+        manifest = json.load(f)
+    assert manifest["packets"] > 0
+    with open(str(prefix) + "_trd.csv") as f:
+        assert manifest["files"][prefix.name + "_trd.csv"]["records"] == len(f.readlines()) - 1
+
+    summary = parse_dates("2023-10-02", "2023-10-02", str(download_dir), str(parsed_folder), symbol, download=False, resume=True)
+    assert summary["2023-10-02"]["status"] == "skipped"
+
+    # A changed output file is parsed again
+    with open(str(prefix) + "_trd.csv", "a") as f:
+        f.write("garbage\n")
+    summary = parse_dates("2023-10-02", "2023-10-02", str(download_dir), str(parsed_folder), symbol, download=False, resume=True)
+    assert summary["2023-10-02"]["status"] == "parsed"
+    assert filecmp.cmp(os.path.join(dir, "expected_output", "test_trd.csv"), str(prefix) + "_trd.csv", shallow=False)
+
+    with pytest.raises(ValueError):
+        parse_file(str(test_file), str(parsed_folder), symbol, output_format="npy", checkpoint=True)
+
+def test_no_manifest_for_unfinished_parse(tmp_path, monkeypatch):
+    """
+    A parse whose stats do not show that it finished gets no manifest, even if the parser exited without an error code.
+    """
+    import iex_cppparser
+    from iex_cppparser.stats import ParseStats
+
+    download_dir = tmp_path / "download"
+    parsed_folder = tmp_path / "parsed"
+    download_dir.mkdir()
+    parsed_folder.mkdir()
+    test_file = download_dir / "data_feeds_20231002_20231002_IEXTP1_DEEP1.0.pcap.gz"
+    shutil.copy(os.path.join(dir, "test.pcap.gz"), test_file)
+    monkeypatch.setattr(iex_cppparser, "parse_file", lambda *args, **kwargs: ParseStats({"state": "failed"}))
+
+    summary = parse_dates("2023-10-02", "2023-10-02", str(download_dir), str(parsed_folder), "ALL", download=False, resume=True)
+    assert summary["2023-10-02"]["status"] == "failed"
+    assert not os.path.exists(manifest_path(str(test_file), str(parsed_folder)))
+
+def test_no_manifest_for_failed_split_write(tmp_path, limited_file_size, monkeypatch):
+    """
+    A split by first letter that fails to write its output gets no manifest, so resuming parses the file again.
+    """
+    download_dir = tmp_path / "download"
+    parsed_folder = tmp_path / "parsed"
+    download_dir.mkdir()
+    parsed_folder.mkdir()
+    test_file = download_dir / "data_feeds_20231002_20231002_IEXTP1_DEEP1.0.pcap.gz"
+    shutil.copy(os.path.join(dir, "test.pcap.gz"), test_file)
+
+    summary = parse_dates("2023-10-02", "2023-10-02", str(download_dir), str(parsed_folder), "ALL", download=False, split=True, resume=True)
+    assert summary["2023-10-02"]["status"] == "failed"
+    assert not os.path.exists(manifest_path(str(test_file), str(parsed_folder)))
+
+    monkeypatch.undo()
+    summary = parse_dates("2023-10-02", "2023-10-02", str(download_dir), str(parsed_folder), "ALL", download=False, split=True, resume=True)
+    assert summary["2023-10-02"]["status"] == "parsed"
+    assert os.path.exists(manifest_path(str(test_file), str(parsed_folder)))
+
+def test_checkpoint_with_symbol_list(tmp_path, capfd):
+    """
+    A checkpoint compares the symbols of a list by content, so it is resumed although every parse writes the symbols
+    to its own temporary file.
+    """
+    test_file = os.path.join(dir, "test.pcap.gz")
+    with open(os.path.join(dir, "symbols.txt")) as f:
+        symbols = [line.strip() for line in f if line.strip()]
+
+    parse_file(test_file, str(tmp_path), symbols, checkpoint=True)
+    capfd.readouterr()
+    parse_file(test_file, str(tmp_path), list(reversed(symbols)), checkpoint=True)
+    assert "Ignoring checkpoint" not in capfd.readouterr().err
+    parse_file(test_file, str(tmp_path), symbols[1:], checkpoint=True)
+    assert "Ignoring checkpoint" in capfd.readouterr().err
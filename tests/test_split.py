@@ -0,0 +1,128 @@
+import shutil
+import pytest
+from iex_cppparser import parse_file, parse_date
+from iex_cppparser.manifest import manifest_path
+import os
+import filecmp
+import json
+
+from iex_cppparser.captures import DEFAULT_START_NS, TRADE_REPORT, symbol_field, write_capture
+
+dir = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.mark.parametrize("shards", [3, "symbol"])
+def test_parsing_sharded_split(tmp_path, shards):
+    """
+    The sharded split writes the same rows as the unsplit parser, with all rows of a symbol in one file in feed order.
+    """
+    parsed_folder = tmp_path / "parsed"
+    parsed_folder.mkdir()
+    parse_file(os.path.join(dir, "test.pcap.gz"), str(parsed_folder), os.path.join(dir, "symbols.txt"), split=True, shards=shards)
+
+    with open(parsed_folder / "test.txt") as f:
+        output_files = f.read().split()
+    if shards == 3:
+        assert len(output_files) == 6
+
+    for message_type in ["trd", "prl"]:
+        with open(os.path.join(dir, "expected_output", f"test_{message_type}.csv")) as f:
+            expected = f.read().splitlines()[1:]
+        if message_type == "prl":
+            # The split files have the ASK flag as the last column instead of the third one
+            expected = [",".join(row[:2] + row[3:] + row[2:3]) for row in (line.split(",") for line in expected)]
+
+        rows_by_symbol = {}
+        for file in output_files:
+            if f"_{message_type}_" not in os.path.basename(file):
+                continue
+            with open(file) as f:
+                for line in f.read().splitlines()[1:]:
+                    symbol = line.split(",")[4]
+                    rows_by_symbol.setdefault(symbol, []).append(line)
+                    if shards == "symbol":
+                        assert os.path.basename(file) == f"test_{message_type}_{symbol}.csv"
+
+        expected_by_symbol = {}
+        for line in expected:
+            expected_by_symbol.setdefault(line.split(",")[4], []).append(line)
+        assert rows_by_symbol == expected_by_symbol
+
+def test_parsing_hive_layout(tmp_path):
+    """
+    The hive layout writes the same files as the split by symbol, partitioned by type, date and symbol, and parsing one
+    symbol again only replaces its own partitions.
+    """
+    file_path = tmp_path / "data_feeds_20231030_20231030_IEXTP1_DEEP1.0.pcap.gz"
+    shutil.copy(os.path.join(dir, "test.pcap.gz"), file_path)
+    flat_folder = tmp_path / "flat"
+    hive_folder = tmp_path / "hive"
+    flat_folder.mkdir()
+    hive_folder.mkdir()
+    parse_file(str(file_path), str(flat_folder), "ALL", split=True, shards="symbol")
+    parse_file(str(file_path), str(hive_folder), "ALL", layout="hive")
+
+    prefix = "data_feeds_20231030_20231030_IEXTP1_DEEP1.0"
+    flat_files = sorted(os.listdir(flat_folder))
+    partitions = sorted(os.path.relpath(os.path.join(root, name), hive_folder) for root, _, names in os.walk(hive_folder) for name in names)
+    assert len(partitions) == len(flat_files)
+    for file in flat_files:
+        if file.endswith(".csv"):
+            message_type, symbol = file[len(prefix) + 1:-len(".csv")].split("_", 1)
+            partition = f"type={message_type}/date=2023-10-30/symbol={symbol}/part-0.csv"
+            assert partition in partitions
+            assert filecmp.cmp(flat_folder / file, hive_folder / partition, shallow=False)
+
+    partition = hive_folder / "type=trd/date=2023-10-30/symbol=TSLA/part-0.csv"
+    other = hive_folder / "type=trd/date=2023-10-30/symbol=BABA/part-0.csv"
+    other_mtime = os.path.getmtime(other)
+    os.truncate(partition, 0)
+    parse_file(str(file_path), str(hive_folder), ["TSLA"], layout="hive")
+    assert filecmp.cmp(flat_folder / f"{prefix}_trd_TSLA.csv", partition, shallow=False)
+    assert os.path.getmtime(other) == other_mtime
+
+    # The manifest of a day parsed with parse_date lists its partitions
+    parse_date("2023-10-30", str(tmp_path), str(hive_folder), "ALL", download=False, layout="hive")
+    with open(manifest_path(str(file_path), str(hive_folder))) as f:
+        manifest = json.load(f)
+    assert manifest["options"]["layout"] == "hive"
+    assert "type=trd/date=2023-10-30/symbol=TSLA/part-0.csv" in manifest["files"]
+
+@pytest.mark.parametrize("shards", [None, 4])
+def test_split_truncated_capture(tmp_path, shards):
+    """
+    The split parser fails on a capture that ends in the middle of the gzip stream, so no manifest marks the day complete.
+    """
+    file_path = tmp_path / "data_feeds_20231002_20231002_IEXTP1_DEEP1.0.pcap.gz"
+    with open(os.path.join(dir, "test.pcap.gz"), "rb") as f:
+        file_path.write_bytes(f.read()[:150000])
+    parsed_folder = tmp_path / "parsed"
+    parsed_folder.mkdir()
+    with pytest.raises(RuntimeError):
+        parse_file(str(file_path), str(parsed_folder), "ALL", split=True, shards=shards)
+    with pytest.raises(RuntimeError):
+        parse_date("2023-10-02", str(tmp_path), str(parsed_folder), "ALL", download=False, split=True)
+    assert not os.path.exists(manifest_path(str(file_path), str(parsed_folder)))
+
+def test_symbol_file_names_are_escaped(tmp_path):
+    """
+    Symbols that only differ in characters escaped in the file names of the split by symbol still get their own files.
+    """
+    file_path = tmp_path / "symbols.pcap"
+    write_capture(str(file_path), [[TRADE_REPORT.pack(b"T", 0, DEFAULT_START_NS + p, symbol_field(symbol), 100, 100000, p)]
+                                   for p, symbol in enumerate(["AB/C", "AB_C", "AB%2FC"])])
+    parsed_folder = tmp_path / "parsed"
+    parsed_folder.mkdir()
+
+    parse_file(str(file_path), str(parsed_folder), "ALL", split=True, shards="symbol")
+    for file, symbol in [("AB%2FC", "AB/C"), ("AB_C", "AB_C"), ("AB%252FC", "AB%2FC")]:
+        with open(parsed_folder / f"symbols_trd_{file}.csv") as f:
+            rows = f.readlines()[1:]
+        assert [row.split(",")[4] for row in rows] == [symbol]
+
+def test_split_fails_on_write_errors(tmp_path, limited_file_size):
+    """
+    The split by first letter exits with an error when it cannot write its output files.
+    """
+    with pytest.raises(RuntimeError):
+        parse_file(os.path.join(dir, "test.pcap.gz"), str(tmp_path), "ALL", split=True)
@@ -0,0 +1,33 @@
+import pytest
+from iex_cppparser import parse_file
+import os
+import json
+
+dir = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.mark.parametrize("split", [False, True])
+def test_parse_stats(tmp_path, split):
+    """
+    parse_file returns the counters of the parse, which match the records written.
+    """
+    test_file = os.path.join(dir, "test.pcap.gz")
+    options = {"split": True, "shards": 2} if split else {}
+    stats = parse_file(test_file, str(tmp_path), os.path.join(dir, "symbols.txt"), **options)
+
+    assert stats.state == "finished"
+    assert stats.packets_read == stats.packets_parsed == 5000
+    assert stats.bytes_read > 0
+    assert stats.messages["T"] >= stats.trade_records
+    assert stats.filter_accepted == stats.trade_records + stats.price_level_records
+    assert 0 < stats.filter_hit_rate < 1
+    assert len(stats.worker_busy_seconds) >= 1
+    with open(tmp_path / "test.stats.json") as f:
+        assert json.load(f) == stats.to_dict()
+
+    records = 0
+    for file in os.listdir(tmp_path):
+        if file.endswith(".csv"):
+            with open(tmp_path / file) as f:
+                records += len(f.readlines()) - 1
+    assert records == stats.trade_records + stats.price_level_records
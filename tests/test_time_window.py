@@ -0,0 +1,45 @@
+import pytest
+from iex_cppparser import parse_file
+import os
+
+dir = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.mark.parametrize("split", [False, True])
+def test_parsing_time_window(tmp_path, split):
+    """
+    Packets outside the time window are not parsed, and parsing stops after the stop event.
+    """
+    test_file = os.path.join(dir, "test.pcap.gz")
+    options = {"split": True, "shards": 3} if split else {}
+    start_ns, end_ns = 1696248005000000000, 1696248025000000000
+    # Capture time of the packet with the start of system hours event
+    system_hours_ns = 1696248000001446000
+
+    runs = {"full": {}, "window": {"start_ns": start_ns, "end_ns": end_ns}, "event": {"stop_after_event": "S"},
+            "from_epoch": {"start_ns": 0}, "before_epoch": {"end_ns": 0}}
+    for name, window in runs.items():
+        (tmp_path / name).mkdir()
+        parse_file(test_file, str(tmp_path / name), "ALL", **options, **window)
+
+    for file in os.listdir(tmp_path / "full"):
+        if not file.endswith(".csv"):
+            continue
+        with open(tmp_path / "full" / file) as f:
+            header, *rows = f.read().splitlines()
+        capture_times = [int(row.split(",")[0]) for row in rows]
+        expected_window = [header] + [row for row, t in zip(rows, capture_times) if start_ns <= t < end_ns]
+        expected_event = [header] + [row for row, t in zip(rows, capture_times) if t <= system_hours_ns]
+        with open(tmp_path / "window" / file) as f:
+            assert f.read().splitlines() == expected_window
+        with open(tmp_path / "event" / file) as f:
+            assert f.read().splitlines() == expected_event
+        with open(tmp_path / "from_epoch" / file) as f:
+            assert f.read().splitlines() == [header] + rows
+        with open(tmp_path / "before_epoch" / file) as f:
+            assert f.read().splitlines() == [header]
+
+    with pytest.raises(ValueError):
+        parse_file(test_file, str(tmp_path), "ALL", stop_after_event="X")
+    with pytest.raises(ValueError):
+        parse_file(test_file, str(tmp_path), "ALL", start_ns=-1)
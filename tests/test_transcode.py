@@ -0,0 +1,32 @@
+import pytest
+from iex_cppparser import parse_file, transcode_file
+import os
+import filecmp
+import gzip
+
+dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_transcoded_file(tmp_path):
+    """
+    A transcoded file decompresses to the original capture and parses to the same output.
+    """
+    test_file = os.path.join(dir, "test.pcap.gz")
+    transcoded = transcode_file(test_file, str(tmp_path), block_size=65536)
+    assert transcoded == str(tmp_path / "test.pcap.gz")
+    with gzip.open(test_file) as original, gzip.open(transcoded) as f:
+        assert original.read() == f.read()
+
+    with open(transcoded + ".blocks.csv") as f:
+        rows = [line.split(",") for line in f.read().splitlines()[1:]]
+    assert len(rows) > 1
+    assert int(rows[-1][0]) + int(rows[-1][1]) == os.path.getsize(transcoded)
+
+    parsed_folder = tmp_path / "parsed"
+    parsed_folder.mkdir()
+    parse_file(transcoded, str(parsed_folder), os.path.join(dir, "symbols.txt"))
+    for file in ["test_trd.csv", "test_prl.csv"]:
+        assert filecmp.cmp(os.path.join(dir, "expected_output", file), parsed_folder / file, shallow=False)
+
+    with pytest.raises(ValueError):
+        transcode_file(test_file, dir)
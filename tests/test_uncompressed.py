@@ -0,0 +1,48 @@
+import shutil
+import pytest
+from iex_cppparser import parse_file
+import os
+import filecmp
+import gzip
+
+dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_parsing_uncompressed_pcap(tmp_path):
+    """
+    The parser reads uncompressed captures as well as the .pcap.gz files downloaded from IEX.
+    """
+    test_file = tmp_path / "test.pcap"
+    with gzip.open(os.path.join(dir, "test.pcap.gz"), "rb") as src, open(test_file, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+
+    parsed_folder = tmp_path / "parsed"
+    parsed_folder.mkdir()
+    parse_file(str(test_file), str(parsed_folder), os.path.join(dir, "symbols.txt"))
+
+    for file in ["test_trd.csv", "test_prl.csv"]:
+        if not filecmp.cmp(os.path.join(dir, "expected_output", file), parsed_folder / file, shallow=False):
+            pytest.fail(f"Output file {file} does not match the expected file.")
+
+def test_parsing_prefers_uncompressed_sibling(tmp_path):
+    """
+    A .pcap file next to the .pcap.gz file is parsed instead, with the same output, unless it is older.
+    """
+    gz_file = tmp_path / "test.pcap.gz"
+    shutil.copy(os.path.join(dir, "test.pcap.gz"), gz_file)
+    with gzip.open(gz_file, "rb") as src, open(tmp_path / "test.pcap", "wb") as dst:
+        shutil.copyfileobj(src, dst)
+
+    parsed_folder = tmp_path / "parsed"
+    parsed_folder.mkdir()
+    stats = parse_file(str(gz_file), str(parsed_folder), os.path.join(dir, "symbols.txt"))
+    assert stats.input == str(tmp_path / "test.pcap")
+    for file in ["test_trd.csv", "test_prl.csv"]:
+        if not filecmp.cmp(os.path.join(dir, "expected_output", file), parsed_folder / file, shallow=False):
+            pytest.fail(f"Output file {file} does not match the expected file.")
+
+    stats = parse_file(str(gz_file), str(parsed_folder), os.path.join(dir, "symbols.txt"), prefer_uncompressed=False)
+    assert stats.input == str(gz_file)
+    os.utime(tmp_path / "test.pcap", (0, 0))
+    stats = parse_file(str(gz_file), str(parsed_folder), os.path.join(dir, "symbols.txt"))
+    assert stats.input == str(gz_file)